@@ -17,8 +17,9 @@ As a rule of thumb:
 """
 
 import datetime as dt
+import numpy as np
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import List, Optional, Sequence, Union
 
 from common import constants
 from common.data import (
@@ -123,4 +124,154 @@ class ScorableMinerIndex(BaseModel):
         description="DataEntityBuckets the miner is serving, scored on uniqueness.",
         max_length=constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX_PROTOCOL_4,
     )
-    last_updated: dt.datetime = Field(description="Time last updated in UTC.")
\ No newline at end of file
+    last_updated: dt.datetime = Field(description="Time last updated in UTC.")
+
+
+class ColumnarScorableMinerIndex:
+    """A ScorableMinerIndex stored as typed arrays, with each bucket's label stored as an index into a labels table.
+
+    Creating and holding an index this way costs a fraction of creating a ScorableDataEntityBucket per bucket, so
+    buckets are only materialized when they are accessed.
+
+    Attributes:
+        labels: The distinct labels in the index. None for buckets without a label.
+        sources: The DataSource of each bucket.
+        label_ids: The index into labels of each bucket's label.
+        time_bucket_ids: The time bucket id of each bucket.
+        sizes_bytes: The size of each bucket.
+        scorable_bytes: The scorable bytes of each bucket. See ScorableDataEntityBucket.
+        last_updated: Time last updated in UTC.
+    """
+
+    __slots__ = (
+        "labels",
+        "sources",
+        "label_ids",
+        "time_bucket_ids",
+        "sizes_bytes",
+        "scorable_bytes",
+        "last_updated",
+        "_buckets",
+    )
+
+    def __init__(
+        self,
+        labels: Sequence[Optional[str]],
+        sources: np.ndarray,
+        label_ids: np.ndarray,
+        time_bucket_ids: np.ndarray,
+        sizes_bytes: np.ndarray,
+        scorable_bytes: np.ndarray,
+        last_updated: dt.datetime,
+    ):
+        self.labels = [label.casefold() if label else None for label in labels]
+        self.sources = np.asarray(sources, dtype=np.uint8)
+        self.label_ids = np.asarray(label_ids, dtype=np.uint32)
+        self.time_bucket_ids = np.asarray(time_bucket_ids, dtype=np.uint32)
+        self.sizes_bytes = np.asarray(sizes_bytes, dtype=np.int64)
+        self.scorable_bytes = np.asarray(scorable_bytes, dtype=np.int64)
+        self.last_updated = last_updated
+        self._buckets = None
+
+        # Apply the same validation as ScorableDataEntityBucket and ScorableMinerIndex, but to whole columns.
+        count = len(self.sources)
+        if not (
+            len(self.label_ids)
+            == len(self.time_bucket_ids)
+            == len(self.sizes_bytes)
+            == len(self.scorable_bytes)
+            == count
+        ):
+            raise ValueError("All columns must have the same length.")
+        if count > constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX_PROTOCOL_4:
+            raise ValueError(
+                f"Index cannot have more than {constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX_PROTOCOL_4} buckets."
+            )
+        if any(label and len(label) > constants.MAX_LABEL_LENGTH for label in self.labels):
+            raise ValueError("Label value cannot be longer than 140 characters.")
+        if count and self.label_ids.max() >= len(self.labels):
+            raise ValueError("Label ids must index into labels.")
+        if np.any(
+            (self.sizes_bytes < 0)
+            | (self.sizes_bytes > constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES)
+        ):
+            raise ValueError(
+                f"Size must be between 0 and {constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES}."
+            )
+        if np.any((self.scorable_bytes < 0) | (self.scorable_bytes > self.sizes_bytes)):
+            raise ValueError(
+                "Scorable bytes must be between 0 and size bytes."
+            )
+
+        # The index is immutable, like ScorableMinerIndex. Only the views are made read only since
+        # the arrays may be shared with the caller.
+        self.sources = self.sources.view()
+        self.label_ids = self.label_ids.view()
+        self.time_bucket_ids = self.time_bucket_ids.view()
+        self.sizes_bytes = self.sizes_bytes.view()
+        self.scorable_bytes = self.scorable_bytes.view()
+        for column in (
+            self.sources,
+            self.label_ids,
+            self.time_bucket_ids,
+            self.sizes_bytes,
+            self.scorable_bytes,
+        ):
+            column.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def get_bucket(self, i: int) -> ScorableDataEntityBucket:
+        """Creates the ScorableDataEntityBucket at position i of the index."""
+        return ScorableDataEntityBucket(
+            time_bucket_id=int(self.time_bucket_ids[i]),
+            source=int(self.sources[i]),
+            label=self.labels[self.label_ids[i]],
+            size_bytes=int(self.sizes_bytes[i]),
+            scorable_bytes=int(self.scorable_bytes[i]),
+        )
+
+    @property
+    def scorable_data_entity_buckets(self) -> List[ScorableDataEntityBucket]:
+        """All of the buckets in the index, created on first access."""
+        if self._buckets is None:
+            labels = self.labels
+            self._buckets = [
+                ScorableDataEntityBucket(
+                    time_bucket_id=time_bucket_id,
+                    source=source,
+                    label=labels[label_id],
+                    size_bytes=size_bytes,
+                    scorable_bytes=scorable_bytes,
+                )
+                for source, label_id, time_bucket_id, size_bytes, scorable_bytes in zip(
+                    self.sources.tolist(),
+                    self.label_ids.tolist(),
+                    self.time_bucket_ids.tolist(),
+                    self.sizes_bytes.tolist(),
+                    self.scorable_bytes.tolist(),
+                )
+            ]
+        return self._buckets
+
+    @classmethod
+    def from_index(
+        cls, index: Union[ScorableMinerIndex, "ColumnarScorableMinerIndex"]
+    ) -> "ColumnarScorableMinerIndex":
+        """Returns the index as a ColumnarScorableMinerIndex, converting it if necessary."""
+        if isinstance(index, ColumnarScorableMinerIndex):
+            return index
+
+        buckets = index.scorable_data_entity_buckets
+        labels = {}
+        label_ids = [labels.setdefault(bucket.label, len(labels)) for bucket in buckets]
+        return ColumnarScorableMinerIndex(
+            labels=list(labels),
+            sources=[bucket.source for bucket in buckets],
+            label_ids=label_ids,
+            time_bucket_ids=[bucket.time_bucket_id for bucket in buckets],
+            sizes_bytes=[bucket.size_bytes for bucket in buckets],
+            scorable_bytes=[bucket.scorable_bytes for bucket in buckets],
+            last_updated=index.last_updated,
+        )
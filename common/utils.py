@@ -1,14 +1,18 @@
 """General utility functions."""
 
+import contextlib
 import datetime as dt
 import functools
 import concurrent
 import pickle
+import random
 import sys
+import threading
 import time
 from math import floor
-from typing import Any, Callable, List, Optional, Dict
+from typing import Any, Callable, List, Optional, Dict, Sequence
 import bittensor as bt
+import numpy as np
 from functools import lru_cache, update_wrapper
 from common.date_range import DateRange
 
@@ -279,3 +283,102 @@ def run_in_thread(func: functools.partial, ttl: int, name=None) -> Any:
         bt.logging.trace(f"Completed {name}")
         executor.shutdown(wait=False)
         bt.logging.trace(f"{name} cleaned up successfully")
+
+
+class ReadWriteLock:
+    """A lock that can be held by any number of readers at once or by a single writer.
+
+    Waiting writers take priority over new readers so that a steady stream of readers cannot starve them.
+    Not reentrant: a thread holding the lock must not acquire it again.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self):
+        """Holds the lock shared with other readers for the duration of the context."""
+        with self._condition:
+            while self._writing or self._waiting_writers > 0:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self):
+        """Holds the lock exclusively for the duration of the context."""
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers > 0:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class WeightedSampler:
+    """Chooses indexes at random, with each index chosen in proportion to its weight.
+
+    The cumulative weights are computed once, after which each sample is a binary search over them.
+    """
+
+    def __init__(self, weights: Sequence[float]):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.cumulative_weights = np.cumsum(self.weights)
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    def sample(self, k: int = 1, rng: random.Random = random) -> List[int]:
+        """Chooses min(k, len(self)) distinct indexes, without replacement.
+
+        Each index is chosen by picking a random point in the total weight of the indexes that haven't been chosen
+        yet, and then finding the index whose weight covers that point, skipping over the chosen indexes.
+        If only indexes with a weight of 0 remain, they are chosen in order.
+        """
+        count = len(self.weights)
+        chosen = []
+        # The (start, weight) of each chosen index, ordered by start, where start is the total weight before the index.
+        chosen_spans = []
+        remaining_weight = float(self.cumulative_weights[-1]) if count else 0.0
+
+        for _ in range(min(k, count)):
+            chosen_index = None
+            if remaining_weight > 0:
+                point = rng.uniform(0, remaining_weight)
+                # Map the point in the remaining weight to a point in the total weight.
+                for start, weight in chosen_spans:
+                    if point > start:
+                        point += weight
+                chosen_index = min(
+                    int(np.searchsorted(self.cumulative_weights, point, side="left")),
+                    count - 1,
+                )
+
+            # Only possible due to rounding, or if no weight remains.
+            if chosen_index is None or chosen_index in chosen:
+                chosen_index = next(i for i in range(count) if i not in chosen)
+
+            chosen.append(chosen_index)
+            weight = float(self.weights[chosen_index])
+            chosen_spans.append(
+                (float(self.cumulative_weights[chosen_index]) - weight, weight)
+            )
+            chosen_spans.sort()
+            remaining_weight -= weight
+
+        return chosen
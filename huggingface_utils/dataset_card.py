@@ -204,7 +204,8 @@ To report issues or contribute to the dataset, please contact the miner or use t
 
 ### Top 10 Subreddits
 
-For full statistics, please refer to the `stats.json` file in the repository.
+Counts are kept by a bounded summary of the most common topics, so they may be slightly lower than the true counts and
+rare topics are not listed. For more topics, please refer to the `stats.json` file in the repository.
 
 [TOP_SUBREDDITS]
 
@@ -334,7 +335,8 @@ To report issues or contribute to the dataset, please contact the miner or use t
 
 ### Top 10 Hashtags
 
-For full statistics, please refer to the `stats.json` file in the repository.
+Counts are kept by a bounded summary of the most common topics, so they may be slightly lower than the true counts and
+rare topics are not listed. For more topics, please refer to the `stats.json` file in the repository.
 
 [TOP_HASHTAGS]
 
@@ -0,0 +1,269 @@
+"""Statistics of an exported dataset, kept locally and updated from each exported chunk alone."""
+
+import collections
+import heapq
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from huggingface_utils.utils import STATS_VERSION, value_counts
+
+
+class TopItemsSketch:
+    """Counts how often items occur, keeping only the most frequent ones so that memory stays bounded.
+
+    This is a Misra-Gries summary. Once more than capacity items are tracked, the largest count below that of the
+    capacity-th most frequent item is subtracted from every count and the items left without a count are dropped. Each
+    count is an underestimate by at most max_error, and every item that occurred more often than that is tracked.
+    Merging two sketches adds their counts and prunes again, with the same bound over the combined total.
+
+    Items tied with the capacity-th most frequent are kept along with it, so up to twice capacity items may be tracked.
+    Only if even more items are tied with it are they all dropped, to keep memory bounded.
+    """
+
+    def __init__(self, capacity: int, counts: Optional[Dict[str, int]] = None, total: int = 0):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = dict(counts or {})
+        # The exact number of occurrences added, including those of items that are not tracked.
+        self.total = total
+
+    def add(self, counts: Dict[str, int]):
+        """Adds the occurrences of each item."""
+        for item, count in counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+            self.total += count
+        self._prune()
+
+    def merge(self, other: "TopItemsSketch"):
+        """Adds the occurrences counted by the other sketch."""
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+        self.total += other.total
+        self._prune()
+
+    def _prune(self):
+        if len(self.counts) <= self.capacity:
+            return
+        largest = heapq.nlargest(2 * self.capacity + 1, self.counts.values())
+        cut = largest[self.capacity - 1]
+        below_cut = [count for count in largest[self.capacity:] if count < cut]
+        if below_cut:
+            # Keep the items tied at the cut, as they fit within twice capacity.
+            threshold = below_cut[0]
+        elif len(largest) <= 2 * self.capacity:
+            # Every item past the cut is tied with it and they all fit.
+            return
+        else:
+            threshold = cut
+        self.counts = {item: count - threshold for item, count in self.counts.items() if count > threshold}
+
+    @property
+    def max_error(self) -> int:
+        """Returns how much any count may be below the true number of occurrences."""
+        return (self.total - sum(self.counts.values())) // (self.capacity + 1)
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Returns the tracked items and their counts, most frequent first."""
+        items = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return items if limit is None else items[:limit]
+
+
+class DatasetStats:
+    """The statistics of the rows exported to a dataset, from which its stats.json and card are generated.
+
+    Totals are counted exactly and topics, meaning subreddits or hashtags, are counted by a TopItemsSketch. Statistics
+    of separate rows merge by adding them up, so the statistics of a dataset are updated from the new rows alone.
+    """
+
+    # How many topics are tracked, which bounds the error of each topic's count to the topic total divided by this. It
+    # is large enough that only topics too rare to matter are dropped, while keeping the statistics small enough to
+    # checkpoint with every upload.
+    TOPIC_CAPACITY = 10_000
+
+    def __init__(self, platform: str):
+        self.platform = platform
+        self.total_rows = 0
+        # The first and last dates of the rows, in ISO format.
+        self.start_date: Optional[str] = None
+        self.end_date: Optional[str] = None
+        # Exact counts of the rows by kind, such as posts_count or tweets_with_hashtags_count.
+        self.counters: Dict[str, int] = collections.Counter()
+        self.topics = TopItemsSketch(DatasetStats.TOPIC_CAPACITY)
+        self.update_history: List[Dict[str, Any]] = []
+        # The id of the last chunk counted, so that a chunk is not counted twice when an update is retried.
+        self.last_chunk_id: Optional[int] = None
+
+    @property
+    def topic_type(self) -> str:
+        return "subreddit" if self.platform == "reddit" else "hashtag"
+
+    def add_table(self, table: pa.Table):
+        """Adds a table of preprocessed rows in the dataset's schema."""
+        if len(table) == 0:
+            return
+
+        self.total_rows += len(table)
+        # The dates of the rows are in ISO format, so the first and last strings are the first and last dates.
+        dates = pc.min_max(table['datetime']).as_py()
+        self._add_dates(dates['min'], dates['max'])
+
+        if self.platform == "reddit":
+            data_type_counts = value_counts(table['dataType'])
+            self.counters['posts_count'] += data_type_counts.get('post', 0)
+            self.counters['comments_count'] += data_type_counts.get('comment', 0)
+            self.topics.add(value_counts(table['communityName']))
+        else:
+            # Only tweets labelled "NULL" count as without hashtags. Tweets without a label count as with hashtags,
+            # although they have none, as they always have in stats.json.
+            without_hashtags = pc.fill_null(pc.equal(table['label'], 'NULL'), False)
+            labels_with_hashtags = table['label'].filter(pc.invert(without_hashtags))
+            tweets_without_hashtags = len(table) - len(labels_with_hashtags)
+            self.counters['tweets_with_hashtags_count'] += len(labels_with_hashtags)
+            self.counters['tweets_without_hashtags_count'] += tweets_without_hashtags
+
+            all_hashtags = pc.list_flatten(pc.utf8_split_whitespace(labels_with_hashtags))
+            # Splitting keeps empty strings around leading and trailing whitespace, unlike str.split.
+            hashtag_counts = value_counts(all_hashtags.filter(pc.not_equal(all_hashtags, '')))
+            # Tweets without hashtags are counted as the "NULL" topic.
+            hashtag_counts['NULL'] = tweets_without_hashtags
+            self.topics.add(hashtag_counts)
+
+    def _add_dates(self, start_date: Optional[str], end_date: Optional[str]):
+        if start_date is not None and (self.start_date is None or start_date < self.start_date):
+            self.start_date = start_date
+        if end_date is not None and (self.end_date is None or end_date > self.end_date):
+            self.end_date = end_date
+
+    def merge(self, other: "DatasetStats"):
+        """Adds the statistics of other rows of the same dataset."""
+        self.total_rows += other.total_rows
+        self._add_dates(other.start_date, other.end_date)
+        self.counters.update(other.counters)
+        self.topics.merge(other.topics)
+        if other.last_chunk_id is not None:
+            self.last_chunk_id = max(self.last_chunk_id if self.last_chunk_id is not None else -1, other.last_chunk_id)
+
+    def includes(self, other: "DatasetStats") -> bool:
+        """Returns whether the chunks counted by the other statistics have already been counted by these."""
+        return (
+            other.last_chunk_id is not None
+            and self.last_chunk_id is not None
+            and other.last_chunk_id <= self.last_chunk_id
+        )
+
+    def record_update(self, timestamp: str, rows: int):
+        self.update_history.append({"timestamp": timestamp, "count": rows})
+
+    def _percentage(self, count: int, total: int) -> float:
+        return (count / total) * 100 if total > 0 else 0
+
+    def to_stats_json(self) -> Dict[str, Any]:
+        """Returns the statistics in the format of the stats.json of a dataset."""
+        if self.platform == "reddit":
+            metadata = {
+                "posts_percentage": self._percentage(self.counters['posts_count'], self.total_rows),
+                "comments_percentage": self._percentage(self.counters['comments_count'], self.total_rows),
+            }
+        else:
+            metadata = {
+                "tweets_with_hashtags_percentage": self._percentage(
+                    self.counters['tweets_with_hashtags_count'], self.total_rows
+                ),
+                "tweets_without_hashtags_percentage": self._percentage(
+                    self.counters['tweets_without_hashtags_count'], self.total_rows
+                ),
+            }
+
+        return {
+            "version": STATS_VERSION,
+            "data_source": self.platform,
+            "summary": {
+                "total_rows": self.total_rows,
+                "last_update_dt": self.update_history[-1]["timestamp"] if self.update_history else None,
+                "start_dt": f"{self.start_date}T00:00:00Z" if self.start_date else None,
+                "end_dt": f"{self.end_date}T00:00:00Z" if self.end_date else None,
+                "update_history": self.update_history,
+                "metadata": metadata,
+            },
+            "topics": [
+                {
+                    "topic": topic,
+                    "topic_type": self.topic_type,
+                    "total_count": count,
+                    "total_percentage": self._percentage(count, self.topics.total),
+                }
+                for topic, count in self.topics.top()
+            ],
+            **self.counters,
+        }
+
+    @classmethod
+    def from_stats_json(cls, stats: Dict[str, Any], platform: str) -> "DatasetStats":
+        """Returns the statistics of a stats.json in the version 2 format, as written by earlier exports."""
+        dataset_stats = cls(platform)
+        summary = stats.get("summary", {})
+        dataset_stats.total_rows = summary.get("total_rows", 0)
+        dataset_stats._add_dates(
+            (summary.get("start_dt") or "")[:10] or None,
+            (summary.get("end_dt") or "")[:10] or None,
+        )
+        dataset_stats.update_history = list(summary.get("update_history", []))
+
+        counter_names = (
+            ["posts_count", "comments_count"]
+            if platform == "reddit"
+            else ["tweets_with_hashtags_count", "tweets_without_hashtags_count"]
+        )
+        for name in counter_names:
+            dataset_stats.counters[name] += stats.get(name, 0)
+
+        # Earlier exports kept the count of every topic, which is more exact than the topics list if present.
+        topic_counts = stats.get("subreddits" if platform == "reddit" else "hashtags")
+        if topic_counts:
+            dataset_stats.topics.add({topic: item["count"] for topic, item in topic_counts.items()})
+        else:
+            dataset_stats.topics.add({
+                topic["topic"]: topic["total_count"]
+                for topic in stats.get("topics", [])
+                if topic.get("topic_type") == dataset_stats.topic_type
+            })
+        return dataset_stats
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "platform": self.platform,
+            "total_rows": self.total_rows,
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "counters": dict(self.counters),
+            "topics": {"capacity": self.topics.capacity, "counts": dict(self.topics.counts), "total": self.topics.total},
+            "update_history": list(self.update_history),
+            "last_chunk_id": self.last_chunk_id,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DatasetStats":
+        dataset_stats = cls(data["platform"])
+        dataset_stats.total_rows = data["total_rows"]
+        dataset_stats.start_date = data["start_date"]
+        dataset_stats.end_date = data["end_date"]
+        dataset_stats.counters.update(data["counters"])
+        dataset_stats.topics = TopItemsSketch(**data["topics"])
+        dataset_stats.update_history = list(data["update_history"])
+        dataset_stats.last_chunk_id = data["last_chunk_id"]
+        return dataset_stats
+
+    def save(self, path: str):
+        """Saves the statistics, replacing the file in one step so that a crash leaves the previous statistics."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DatasetStats":
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
@@ -1,24 +1,37 @@
 import os
 import json
+import collections
 import datetime as dt
-import pandas as pd
+import multiprocessing
+import threading
 import bittensor as bt
+import pyarrow as pa
+import pyarrow.parquet as pq
 import sqlite3
 import re
 import time
 import requests
+from concurrent.futures import Future, ProcessPoolExecutor
 from contextlib import contextmanager
 from huggingface_hub import HfApi, hf_hub_download
 from huggingface_utils.utils import(
-    preprocess_reddit_df,
-    preprocess_twitter_df,
+    preprocess_in_worker,
+    preprocess_reddit_table,
+    preprocess_twitter_table,
+    REDDIT_DATASET_SCHEMA,
+    TWEET_DATASET_SCHEMA,
     generate_static_integer,
+    get_optimal_threads,
     migrate_stats_to_v2,
     get_default_stats_structure
 )
+from huggingface_utils.dataset_stats import DatasetStats
 from huggingface_utils.encoding_system import EncodingKeyManager
+from huggingface_utils.pipeline import BackgroundIterator, BackgroundWorker, StageStats
 from common.data import HuggingFaceMetadata, DataSource
-from typing import List, Dict, Union, Any
+from storage.miner.content_codec import ContentCodec
+from storage.miner.partitioned_sqlite_miner_storage import PartitionedSqliteMinerStorage
+from typing import Deque, List, Dict, Optional, Tuple, Any
 from huggingface_utils.dataset_card import DatasetCardGenerator, NumpyEncoder
 from requests.exceptions import RequestException
 from functools import wraps
@@ -43,13 +56,28 @@ def retry_upload(max_retries: int = 3, delay: int = 5):
 
 
 class HuggingFaceUploader:
+    # How many parquet chunks are uploaded to the repo at once.
+    CHUNKS_PER_UPLOAD = 10
+    # How many rows are fetched from the database at a time, which bounds the Python objects alive while reading.
+    READ_BATCH_SIZE = 50_000
+    # The columns of the chunks read from the database, with the content already decoded.
+    CHUNK_SCHEMA = pa.schema([
+        ('datetime', pa.string()),
+        ('uri', pa.string()),
+        ('label', pa.string()),
+        # Large so that the content of a whole chunk fits in one array.
+        ('content', pa.large_binary()),
+    ])
+
     def __init__(self, db_path: str,
                  miner_hotkey: str,
                  encoding_key_manager: EncodingKeyManager,  # USED FOR ENCODING USERNAMES
                  private_encoding_key_manager: EncodingKeyManager,   # USED FOR ENCODING URLS
                  state_file: str,
                  output_dir: str = 'hf_storage',
-                 chunk_size: int = 1_000_000):
+                 chunk_size: int = 1_000_000,
+                 max_workers: Optional[int] = None,
+                 pipeline_depth: int = 2):
         self.db_path = db_path
         self.miner_hotkey = miner_hotkey
         self.output_dir = os.path.join(output_dir, self.miner_hotkey)
@@ -61,10 +89,21 @@ class HuggingFaceUploader:
         self.state_file = f"{state_file.split('.json')[0]}_{self.unique_id}.json"
         self.chunk_size = chunk_size
         self.wal_size_limit_mb = 2000  # 2 GB WAL size limit
+        # The number of processes preprocessing each chunk.
+        self.max_workers = max_workers or get_optimal_threads()
+        # The number of chunks each stage may hold ahead of the next stage, which together with the chunk size bounds
+        # the memory used by the export.
+        self.pipeline_depth = pipeline_depth
+
+    def get_db_paths(self) -> List[str]:
+        """Returns the miner databases to read from, which are the day partitions if db_path is a directory."""
+        if os.path.isdir(self.db_path):
+            return PartitionedSqliteMinerStorage.list_partition_paths(self.db_path)
+        return [self.db_path]
 
     @contextmanager
-    def get_db_connection(self):
-        conn = sqlite3.connect(self.db_path, timeout=60.0)  # Added timeout
+    def get_db_connection(self, db_path: str = None):
+        conn = sqlite3.connect(db_path or self.db_path, timeout=60.0)  # Added timeout
         try:
             # Enhanced optimization settings
             conn.execute("PRAGMA journal_mode=WAL")
@@ -110,8 +149,24 @@ class HuggingFaceUploader:
                             state['last_upload'][source] = None
                     else:
                         state['last_upload'][source] = None
+                # State saved before chunks were checkpointed has no checkpoints yet.
+                for key, default in self.get_default_checkpoints().items():
+                    state.setdefault(key, default)
                 return state
-        return {'last_upload': {'1': None, '2': None}, 'total_rows': {'1': 0, '2': 0}}
+        return {'last_upload': {'1': None, '2': None}, 'total_rows': {'1': 0, '2': 0}, **self.get_default_checkpoints()}
+
+    def get_default_checkpoints(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the checkpoint part of the state before any chunk has been exported."""
+        return {
+            # The stored datetime and uri of the last uploaded row, from which the export resumes.
+            'watermark': {'1': None, '2': None},
+            # The chunks written but not uploaded yet, in order, which are uploaded before any new chunk is read.
+            'pending_chunks': {'1': [], '2': []},
+            # The id of the next chunk to write, which takes precedence over the chunks found in the repo.
+            'next_chunk_id': {'1': None, '2': None},
+            # The statistics and row count of the uploaded rows that are not in stats.json yet.
+            'unpublished_stats': {'1': None, '2': None},
+        }
 
     def save_state(self, state):
         state_to_save = {
@@ -119,10 +174,17 @@ class HuggingFaceUploader:
                 source: (last_upload.strftime('%Y-%m-%d %H:%M:%S') if isinstance(last_upload, dt.datetime) else None)
                 for source, last_upload in state['last_upload'].items()
             },
-            'total_rows': state['total_rows']
+            'total_rows': state['total_rows'],
+            'watermark': state['watermark'],
+            'pending_chunks': state['pending_chunks'],
+            'next_chunk_id': state['next_chunk_id'],
+            'unpublished_stats': state['unpublished_stats'],
         }
-        with open(self.state_file, 'w') as f:
-            json.dump(state_to_save, f)
+        # Replace the state in one step, so that a crash while saving leaves the previous checkpoint.
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state_to_save, f, cls=NumpyEncoder)
+        os.replace(tmp_file, self.state_file)
 
     def get_next_chunk_id(self, repo_id):
         try:
@@ -136,58 +198,122 @@ class HuggingFaceUploader:
             bt.logging.error(f"Error getting next chunk id: {e}")
             return 0
 
-    def get_data_for_huggingface_upload(self, source, last_upload):
+    def get_data_for_huggingface_upload(self, source, last_upload, last_uri: Optional[str] = None):
+        """Yields the rows of the source stored after last_upload as tables of up to chunk_size rows.
+
+        If last_uri is given, last_upload is the stored datetime of the row with that uri, and only the rows after it
+        in (datetime, uri) order are read.
+
+        The rows are read a page at a time, each page starting after the last row of the previous one, so that no read
+        transaction stays open while a chunk is collected or processed.
+        """
+        batches = []
+        chunk_rows = 0
+        # Partitions hold consecutive days so reading them in order keeps the rows ordered by datetime.
+        for db_path in self.get_db_paths():
+            # Each database has its own compression dictionaries.
+            content_codec = ContentCodec()
+            with self.get_db_connection(db_path) as conn:
+                while True:
+                    page_size = min(HuggingFaceUploader.READ_BATCH_SIZE, self.chunk_size - chunk_rows)
+                    rows = self.read_page(conn, source, last_upload, last_uri, page_size)
+                    if rows:
+                        batches.append(self._to_record_batch(conn, content_codec, rows))
+                        chunk_rows += len(rows)
+                        last_upload, last_uri = rows[-1][0], rows[-1][1]
+                    if chunk_rows >= self.chunk_size:
+                        yield pa.Table.from_batches(batches, schema=HuggingFaceUploader.CHUNK_SCHEMA)
+                        batches = []
+                        chunk_rows = 0
+                    if len(rows) < page_size:
+                        break
+
+        if batches:
+            yield pa.Table.from_batches(batches, schema=HuggingFaceUploader.CHUNK_SCHEMA)
+
+    def read_page(self, conn: sqlite3.Connection, source: int, last_upload, last_uri: Optional[str],
+                  page_size: int) -> List[Tuple[str, str, str, bytes, int]]:
+        """Reads up to page_size rows of the source after (last_upload, last_uri) in (datetime, uri) order.
+
+        Uses data_entity_export_index to start at the first row after the key, rather than sorting the whole source.
+        The rows are fetched at once, so the read transaction ends before they are returned.
+        """
         if last_upload is None:
             query = """
-                SELECT datetime, label, content
+                SELECT datetime, uri, label, content, contentCodec
                 FROM DataEntity
                 WHERE source = ?
-                ORDER BY datetime ASC
-                LIMIT 200000000
+                ORDER BY datetime ASC, uri ASC
+                LIMIT ?
             """
-            params = [source]
-        else:
+            params = [source, page_size]
+        elif last_uri is None:
+            # State saved before chunks were checkpointed only has the datetime of the last upload.
             query = """
-                SELECT datetime, label, content
+                SELECT datetime, uri, label, content, contentCodec
                 FROM DataEntity
                 WHERE source = ?
                 AND datetime > ?
-                ORDER BY datetime ASC
+                ORDER BY datetime ASC, uri ASC
+                LIMIT ?
             """
-            params = [source, last_upload]
-
-        with self.get_db_connection() as conn:
-            for chunk in pd.read_sql_query(
-                    sql=query,
-                    con=conn,
-                    params=params,
-                    chunksize=self.chunk_size,
-                    parse_dates=['datetime']
-            ):
-                yield chunk
-
-    def preprocess_data(self, df, source):
+            params = [source, last_upload, page_size]
+        else:
+            query = """
+                SELECT datetime, uri, label, content, contentCodec
+                FROM DataEntity
+                WHERE source = ?
+                AND (datetime, uri) > (?, ?)
+                ORDER BY datetime ASC, uri ASC
+                LIMIT ?
+            """
+            params = [source, last_upload, last_uri, page_size]
+        return conn.execute(query, params).fetchall()
+
+    def _to_record_batch(self, conn: sqlite3.Connection, content_codec: ContentCodec,
+                         rows: List[Tuple[str, str, str, bytes, int]]) -> pa.RecordBatch:
+        datetimes, uris, labels, contents, codec_ids = zip(*rows)
+        # Content may be compressed at rest so decode it before it is preprocessed.
+        contents = content_codec.decode_all(conn, list(codec_ids), list(contents))
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array(datetimes, type=pa.string()),
+                pa.array(uris, type=pa.string()),
+                pa.array(labels, type=pa.string()),
+                pa.array(contents, type=pa.large_binary()),
+            ],
+            schema=HuggingFaceUploader.CHUNK_SCHEMA,
+        )
+
+    def preprocess_data(self, table, source):
         if source == DataSource.REDDIT.value:
-            return preprocess_reddit_df(df, self.encoding_key_manager, self.private_encoding_key_manager)
+            return preprocess_reddit_table(table, self.encoding_key_manager, self.private_encoding_key_manager)
         else:
-            return preprocess_twitter_df(df, self.encoding_key_manager, self.private_encoding_key_manager)
+            return preprocess_twitter_table(table, self.encoding_key_manager, self.private_encoding_key_manager)
 
 
     @retry_upload(max_retries=5)
-    def upload_parquet_to_hf(self, repo_id):
+    def upload_parquet_to_hf(self, repo_id, folder_path: str = None, filenames: Optional[List[str]] = None):
+        """Uploads the parquet files in the folder, or only the named ones, to the data folder of the repo.
+
+        The files are left in place, so that a failed upload can be retried with the same files and the caller removes
+        them once it has recorded that they were uploaded.
+        """
+        folder_path = folder_path or self.output_dir
         if not self.check_hf_connection():
             bt.logging.error("Network connection is unstable. Upload aborted.")
-            return
+            # Raise rather than return, so that the export stops before recording the chunks as uploaded.
+            raise ConnectionError("Network connection to Hugging Face is unstable.")
 
         try:
 
             self.hf_api.upload_folder(
                 token=self.hf_token,
-                folder_path=self.output_dir,
+                folder_path=folder_path,
                 repo_id=repo_id,
                 repo_type="dataset",
                 path_in_repo='data/',
-                allow_patterns="*.parquet",
+                allow_patterns=filenames or "*.parquet",
             )
             bt.logging.info(f"Successfully uploaded files to {repo_id}")
 
@@ -195,11 +321,259 @@ class HuggingFaceUploader:
             bt.logging.error(f"Error during upload: {str(e)}")
             raise  # Re-raise the exception to trigger the retry
 
+    @staticmethod
+    def get_chunk_filename(chunk_id: int) -> str:
+        return f"train-DataEntity_chunk_{chunk_id}.parquet"
+
+    def retain_pending_chunks(self, state: Dict[str, Any], source: int, folder_path: str) -> List[Dict[str, Any]]:
+        """Returns the pending chunks of the source that can still be uploaded, removing every other local chunk.
+
+        Chunks are dropped from the first one whose file is missing, since the chunks after it would leave a gap
+        in the repo. The dropped rows are exported again from the watermark of the last retained chunk and under the
+        same chunk ids, so that they replace any copy of the dropped chunks that was uploaded.
+        """
+        pending_chunks = state['pending_chunks'][str(source)]
+        retained = []
+        for chunk in pending_chunks:
+            if not os.path.exists(os.path.join(folder_path, self.get_chunk_filename(chunk['chunk_id']))):
+                bt.logging.warning(f"Chunk {chunk['chunk_id']} of source {source} is missing. "
+                                   f"Exporting its rows again.")
+                state['next_chunk_id'][str(source)] = chunk['chunk_id']
+                break
+            retained.append(chunk)
+        state['pending_chunks'][str(source)] = retained
+        self.save_state(state)
+
+        # Chunks written before a crash but never recorded, or uploaded but not removed, are not needed any more.
+        retained_filenames = {self.get_chunk_filename(chunk['chunk_id']) for chunk in retained}
+        for filename in os.listdir(folder_path):
+            if filename not in retained_filenames:
+                os.remove(os.path.join(folder_path, filename))
+        return retained
+
+    def export_source(self, source: int, repo_id: str, state: Dict[str, Any],
+                      next_chunk_id: int) -> DatasetStats:
+        """Uploads the rows of the source stored after its watermark to the repo as parquet chunks.
+
+        Reading, preprocessing, writing and uploading run concurrently: chunks are read into Arrow tables on a
+        background thread, preprocessed by a pool of worker processes, written to parquet on this thread and uploaded
+        in batches on another background thread. Each stage holds at most pipeline_depth chunks ahead of the next one.
+
+        The state is checkpointed as each chunk is written and as each batch is uploaded. Chunks that were written but
+        not uploaded by a previous export are uploaded first, under their original chunk ids, so that a chunk is never
+        in the repo twice even if its upload succeeded before the export was interrupted. If an upload fails, the
+        export stops and the chunks that were not uploaded are kept for the next export.
+
+        Returns the statistics of the uploaded rows that are not in the dataset's statistics yet.
+        """
+        read_stats = StageStats("read")
+        preprocess_stats = StageStats("preprocess", parallelism=self.max_workers)
+        write_stats = StageStats("write")
+        upload_stats = StageStats("upload")
+        start = time.perf_counter()
+
+        key = str(source)
+        folder_path = os.path.join(self.output_dir, f"source_{source}")
+        os.makedirs(folder_path, exist_ok=True)
+        retained = self.retain_pending_chunks(state, source, folder_path)
+
+        # Resume reading after the last chunk written, whether or not it has been uploaded yet.
+        watermark = retained[-1] if retained else state['watermark'][key]
+        if watermark is not None:
+            last_upload, last_uri = watermark['datetime'], watermark['uri']
+        else:
+            # State saved before chunks were checkpointed only has the datetime of the last upload.
+            last_upload, last_uri = state['last_upload'].get(key), None
+        if state['next_chunk_id'][key] is not None:
+            next_chunk_id = state['next_chunk_id'][key]
+        # The rows written, including those not uploaded yet, which count towards the limits.
+        written_rows = state['total_rows'].get(key, 0) + sum(chunk['rows'] for chunk in retained)
+        exported_rows = 0
+
+        platform = 'reddit' if source == DataSource.REDDIT.value else 'x'
+        unpublished = (
+            DatasetStats.from_dict(state['unpublished_stats'][key])
+            if state['unpublished_stats'][key] is not None
+            else DatasetStats(platform)
+        )
+        # Guards the state, which is checkpointed from this thread and the upload thread.
+        state_lock = threading.Lock()
+        # The chunks that have been written but not submitted for upload yet, with their statistics.
+        batch: List[Tuple[Dict[str, Any], DatasetStats]] = []
+
+        def upload_batch(chunks: List[Tuple[Dict[str, Any], DatasetStats]]):
+            filenames = [self.get_chunk_filename(chunk['chunk_id']) for chunk, _ in chunks]
+            rows = sum(chunk['rows'] for chunk, _ in chunks)
+            try:
+                with upload_stats.measure(rows):
+                    self.upload_parquet_to_hf(repo_id, folder_path, filenames)
+            except Exception:
+                with state_lock:
+                    for chunk, _ in chunks:
+                        chunk['status'] = 'failed'
+                    self.save_state(state)
+                raise
+            bt.logging.info(f'Uploaded {len(chunks)} chunks to {repo_id}')
+
+            with state_lock:
+                # Batches are uploaded in order, so they are always the oldest pending chunks.
+                del state['pending_chunks'][key][:len(chunks)]
+                last_chunk = chunks[-1][0]
+                state['watermark'][key] = {'datetime': last_chunk['datetime'], 'uri': last_chunk['uri']}
+                state['last_upload'][key] = dt.datetime.fromisoformat(last_chunk['datetime'])
+                state['total_rows'][key] = state['total_rows'].get(key, 0) + rows
+                for _, chunk_stats in chunks:
+                    unpublished.merge(chunk_stats)
+                state['unpublished_stats'][key] = unpublished.to_dict()
+                self.save_state(state)
+
+            # Only remove the chunks once they are recorded as uploaded, so that a crash cannot lose them.
+            for filename in filenames:
+                os.remove(os.path.join(folder_path, filename))
+            for db_path in self.get_db_paths():
+                with self.get_db_connection(db_path) as conn:
+                    self.manage_wal(conn, db_path)
+
+        def collect_chunk_statistics(table: pa.Table, chunk_id: int) -> DatasetStats:
+            bt.logging.info("Collecting statistics for the current chunk")
+            chunk_stats = DatasetStats(platform)
+            chunk_stats.add_table(table)
+            chunk_stats.last_chunk_id = chunk_id
+            return chunk_stats
+
+        schema = REDDIT_DATASET_SCHEMA if source == DataSource.REDDIT.value else TWEET_DATASET_SCHEMA
+
+        def write_chunk(chunk_last_upload: str, chunk_last_uri: str, futures: List[Future]) -> bool:
+            """Writes a preprocessed chunk, returning False once no more chunks should be written."""
+            nonlocal next_chunk_id, written_rows, exported_rows, batch
+
+            bt.logging.info(f"Current total rows: {written_rows}")
+            if written_rows >= 200_000_000: # TODO
+                bt.logging.info(f"Reached 200 million rows limit for source {source}. Stopping upload.")
+                return False
+
+            parts = [future.result() for future in futures]
+            # Concatenating tables only collects their chunks, without copying the rows.
+            table = pa.concat_tables([part for part, _ in parts])
+            preprocess_stats.add(len(table), sum(secs for _, secs in parts))
+
+            with write_stats.measure(len(table)):
+                rows_to_upload = min(len(table), 400_000_000 - written_rows)
+                if rows_to_upload < len(table):
+                    table = table.slice(0, rows_to_upload)  # Trim the table if necessary
+
+                parquet_path = os.path.join(folder_path, self.get_chunk_filename(next_chunk_id))
+                bt.logging.info(f"Saving chunk to Parquet file: {parquet_path}")
+                # Write the parts one row group at a time rather than combining them first.
+                with pq.ParquetWriter(parquet_path, schema) as writer:
+                    for record_batch in table.to_batches():
+                        writer.write_batch(record_batch)
+
+                chunk_stats = collect_chunk_statistics(table, next_chunk_id)
+
+            chunk = {
+                'chunk_id': next_chunk_id,
+                'rows': len(table),
+                'datetime': chunk_last_upload,
+                'uri': chunk_last_uri,
+                'status': 'written',
+            }
+            with state_lock:
+                state['pending_chunks'][key].append(chunk)
+                state['next_chunk_id'][key] = next_chunk_id + 1
+                self.save_state(state)
+
+            next_chunk_id += 1
+            written_rows += len(table)
+            exported_rows += len(table)
+            batch.append((chunk, chunk_stats))
+            if len(batch) == HuggingFaceUploader.CHUNKS_PER_UPLOAD:
+                uploader.submit(batch)
+                batch = []
+            return True
+
+        # Start the workers from a fork server rather than forking this process, since the reader and uploader threads
+        # may be holding locks (e.g. of logging or sqlite) that a forked child would never see released.
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context("forkserver")
+        )
+        uploader = BackgroundWorker(upload_batch, maxsize=1, name="hf-upload")
+        chunks = BackgroundIterator(
+            self.get_data_for_huggingface_upload(source, last_upload, last_uri),
+            maxsize=self.pipeline_depth,
+            stats=read_stats,
+            name="hf-read",
+        )
+        # The chunks being preprocessed, in order, as the datetime and uri of their last row and the futures of their
+        # parts.
+        pending: Deque[Tuple[str, str, List[Future]]] = collections.deque()
+        try:
+            # Retry the chunks left by the previous export before uploading any new one, keeping them in order.
+            for i in range(0, len(retained), HuggingFaceUploader.CHUNKS_PER_UPLOAD):
+                bt.logging.info(f"Retrying upload of chunks left by the previous export for source {source}")
+                uploader.submit([
+                    (chunk, collect_chunk_statistics(
+                        pq.read_table(os.path.join(folder_path, self.get_chunk_filename(chunk['chunk_id']))),
+                        chunk['chunk_id'],
+                    ))
+                    for chunk in retained[i:i + HuggingFaceUploader.CHUNKS_PER_UPLOAD]
+                ])
+
+            should_continue = True
+            for table in chunks:
+                bt.logging.info(f"Processing new chunk for source {source}")
+
+                if len(table) == 0:
+                    bt.logging.info(f"Encountered empty chunk for source {source}. Skipping.")
+                    continue
+
+                # Split the chunk so that every worker preprocesses a part of it.
+                part_size = -(-len(table) // self.max_workers)
+                bt.logging.info(f"Starting preprocessing for chunk with {len(table)} rows")
+                pending.append((
+                    # Rows are read in (datetime, uri) order, so the last row is the watermark of the chunk.
+                    table['datetime'][-1].as_py(),
+                    table['uri'][-1].as_py(),
+                    [
+                        executor.submit(
+                            preprocess_in_worker,
+                            table.slice(i, part_size),
+                            source,
+                            self.encoding_key_manager.sym_key.decode(),
+                            self.private_encoding_key_manager.sym_key.decode(),
+                        )
+                        for i in range(0, len(table), part_size)
+                    ],
+                ))
+                del table
+
+                # Write the oldest chunk once enough are being preprocessed, leaving the workers busy with the rest.
+                if len(pending) >= self.pipeline_depth:
+                    should_continue = write_chunk(*pending.popleft())
+                    if not should_continue:
+                        break
+
+            while should_continue and pending:
+                should_continue = write_chunk(*pending.popleft())
+
+            if batch:
+                uploader.submit(batch)
         finally:
-            # Clean up local parquet files after upload attempt
-            for filename in os.listdir(self.output_dir):
-                if filename.endswith(".parquet"):
-                    os.remove(os.path.join(self.output_dir, filename))
+            chunks.close()
+            executor.shutdown(wait=True, cancel_futures=True)
+            # Wait for the submitted uploads, raising if any of them failed.
+            uploader.close()
+
+            wall_secs = time.perf_counter() - start
+            bt.logging.info(
+                f"Exported {exported_rows} rows of source {source} in {wall_secs:.1f}s. "
+                + "; ".join(
+                    stats.summary(wall_secs)
+                    for stats in [read_stats, preprocess_stats, write_stats, upload_stats]
+                )
+            )
+
+        return unpublished
 
     def upload_sql_to_huggingface(self) -> List[HuggingFaceMetadata]:
         if not self.hf_token:
@@ -236,80 +610,25 @@ class HuggingFaceUploader:
                 bt.logging.info(f"Created new repository: {repo_id}")
                 next_chunk_id = 0
 
-            last_upload = state['last_upload'].get(str(source))
-            total_rows = state['total_rows'].get(str(source), 0)
-            chunk_count = 0
-
-            all_stats = {}
-            new_rows = 0
-
             try:
-                for df in self.get_data_for_huggingface_upload(source, last_upload):
-                    bt.logging.info(f"Processing new DataFrame for source {source}")
-
-                    if df.empty:
-                        bt.logging.info(f"Encountered empty DataFrame for source {source}. Skipping.")
-                        continue
-
-                    bt.logging.info(f"Current total rows: {total_rows}")
-                    if total_rows >= 200_000_000: # TODO
-                        bt.logging.info(f"Reached 200 million rows limit for source {source}. Stopping upload.")
-                        break
-
-                    last_upload = df['datetime'].max()
-
-                    bt.logging.info(f"Starting preprocessing for DataFrame with {len(df)} rows")
-                    df = self.preprocess_data(df, source)
-                    rows_to_upload = min(len(df), 400_000_000 - total_rows)
-
-                    if rows_to_upload < len(df):
-                        df = df.iloc[:rows_to_upload]  # Trim the dataframe if necessary
-
-                    parquet_path = os.path.join(self.output_dir,
-                                                f"train-DataEntity_chunk_{next_chunk_id + chunk_count}.parquet")
-                    df.to_parquet(parquet_path, index=False)
-
-                    bt.logging.info(f"Saving chunk to Parquet file: {parquet_path}")
+                # Checkpoints the state as it goes, so an interrupted export resumes from its last chunk.
+                unpublished = self.export_source(source, repo_id, state, next_chunk_id)
 
-                    bt.logging.info("Collecting statistics for the current chunk")
-                    chunk_stats = self.collect_statistics(df, source)
-                    all_stats = self.merge_statistics(all_stats, chunk_stats)
-
-                    chunk_count += 1
-                    total_rows += len(df)
-                    new_rows += len(df)
-
-                    if chunk_count == 10:
-                        self.upload_parquet_to_hf(repo_id)
-                        bt.logging.info(f'Uploaded {chunk_count} chunks to {repo_id}')
-                        next_chunk_id += chunk_count
-                        chunk_count = 0
-                        with self.get_db_connection() as conn:
-                            self.manage_wal(conn)
-
-                if chunk_count > 0:
-                    self.upload_parquet_to_hf(repo_id)
-                    with self.get_db_connection() as conn:
-                        self.manage_wal(conn)
-                    bt.logging.info(f'Uploaded final {chunk_count} chunks to {repo_id}')
-
-                state['last_upload'][str(source)] = last_upload
-                state['total_rows'][str(source)] = total_rows
-                self.save_state(state)
-
-                if new_rows > 0:
+                if unpublished.total_rows > 0:
                     # Update stats
-                    updated_stats = self.save_stats_json(all_stats, platform, new_rows, repo_id)
+                    dataset_stats = self.publish_statistics(unpublished, platform, repo_id)
+                    state['unpublished_stats'][str(source)] = None
+                    self.save_state(state)
 
                     # Update README and save stats.json
-                    update_history = updated_stats['summary']['update_history']
+                    update_history = dataset_stats.update_history
                     cumulative_total = 0
                     formatted_history = []
                     for item in update_history:
                         cumulative_total += item['count']
                         formatted_history.append((item['timestamp'], item['count'], cumulative_total))
 
-                    card_generator.update_or_create_card(updated_stats, formatted_history)
+                    card_generator.update_or_create_card(dataset_stats.to_stats_json(), formatted_history)
 
                 # Save metadata
                 hf_metadata = HuggingFaceMetadata(
@@ -321,134 +640,14 @@ class HuggingFaceUploader:
                 hf_metadata_list.append(hf_metadata)
 
                 bt.logging.success(
-                    f"Finished uploading data for source {source} to {repo_id}. Total rows uploaded: {total_rows}")
+                    f"Finished uploading data for source {source} to {repo_id}. "
+                    f"Total rows uploaded: {state['total_rows'][str(source)]}")
 
             except Exception as e:
                 bt.logging.error(f"Error during upload for source {source}: {e}")
 
         return hf_metadata_list
 
-    def collect_statistics(self, df: pd.DataFrame, source: int) -> Dict[str, Any]:
-        df['datetime'] = pd.to_datetime(df['datetime'])
-        stats = {
-            'total_rows': len(df),
-            'start_date': df['datetime'].min().strftime('%Y-%m-%dT%H:%M:%SZ'),
-            'end_date': df['datetime'].max().strftime('%Y-%m-%dT%H:%M:%SZ'),
-            'metadata': {}
-        }
-
-        if source == DataSource.REDDIT.value:
-            stats['posts_count'] = df[df['dataType'] == 'post'].shape[0]
-            stats['comments_count'] = df[df['dataType'] == 'comment'].shape[0]
-            stats['metadata']['posts_percentage'] = (stats['posts_count'] / len(df)) * 100
-            stats['metadata']['comments_percentage'] = (stats['comments_count'] / len(df)) * 100
-            subreddit_counts = df['communityName'].value_counts().to_dict()
-            stats['subreddits'] = {subreddit: {'count': count, 'percentage': (count / len(df)) * 100}
-                                   for subreddit, count in subreddit_counts.items()}
-        else:  # X (Twitter)
-            # Count tweets with and without hashtags
-            tweets_with_hashtags = df[df['label'] != 'NULL']
-            tweets_without_hashtags = df[df['label'] == 'NULL']
-            stats['tweets_with_hashtags_count'] = len(tweets_with_hashtags)
-            stats['tweets_without_hashtags_count'] = len(tweets_without_hashtags)
-            stats['metadata']['tweets_with_hashtags_percentage'] = (stats['tweets_with_hashtags_count'] / len(df)) * 100
-            stats['metadata']['tweets_without_hashtags_percentage'] = (stats['tweets_without_hashtags_count'] / len(
-                df)) * 100
-
-            # Extract and count hashtags
-            all_hashtags = tweets_with_hashtags['label'].str.split().explode()
-            hashtag_counts = all_hashtags.value_counts().to_dict()
-
-            stats['hashtags'] = {
-                hashtag: {
-                    'count': count,
-                    'percentage': (count / len(df)) * 100
-                }
-                for hashtag, count in hashtag_counts.items()
-            }
-
-            # Add "NULL" for tweets without hashtags
-            stats['hashtags']['NULL'] = {
-                'count': stats['tweets_without_hashtags_count'],
-                'percentage': stats['metadata']['tweets_without_hashtags_percentage']
-            }
-
-        return stats
-
-    def merge_statistics(self, old_stats: Dict[str, Any], new_stats: Dict[str, Any]) -> Dict[str, Any]:
-        merged = old_stats.copy()
-        for key, value in new_stats.items():
-            if key in ['total_rows', 'posts_count', 'comments_count', 'tweets_with_hashtags_count',
-                       'tweets_without_hashtags_count']:
-                merged[key] = merged.get(key, 0) + value
-            elif key in ['start_date', 'end_date']:
-                if key == 'start_date':
-                    merged[key] = min(merged.get(key, value), value)
-                else:
-                    merged[key] = max(merged.get(key, value), value)
-            elif key in ['subreddits', 'hashtags']:
-                merged[key] = self.merge_top_items(merged.get(key, {}), value)
-            elif key == 'metadata':
-                merged[key] = self.merge_metadata(merged.get(key, {}), value)
-        return merged
-
-    def merge_metadata(self, old_metadata: Dict[str, float], new_metadata: Dict[str, float]) -> Dict[str, float]:
-        merged_metadata = old_metadata.copy()
-        for key, value in new_metadata.items():
-            if key in merged_metadata:
-                # For percentages, we take the average
-                merged_metadata[key] = (merged_metadata[key] + value) / 2
-            else:
-                merged_metadata[key] = value
-        return merged_metadata
-
-    def merge_top_items(self, old_items: Dict[str, Dict[str, Union[int, float]]],
-                        new_items: Dict[str, Dict[str, Union[int, float]]]) -> Dict[str, Dict[str, Union[int, float]]]:
-        merged = {k: v.copy() for k, v in old_items.items()}
-        for k, v in new_items.items():
-            if k in merged:
-                merged[k]['count'] += v['count']
-            else:
-                merged[k] = v.copy()
-
-        total_count = sum(item['count'] for item in merged.values())
-        for item in merged.values():
-            item['percentage'] = (item['count'] / total_count) * 100 if total_count > 0 else 0
-
-        return merged
-
-    def update_topics(self, existing_topics: List[Dict[str, Any]], new_topics: Dict[str, Dict[str, Any]],
-                      platform: str) -> List[Dict[str, Any]]:
-        """
-        Updated method to handle topics without update history
-        """
-        topic_type = "subreddit" if platform == "reddit" else "hashtag"
-        topic_dict = {topic["topic"]: topic for topic in existing_topics if topic["topic_type"] == topic_type}
-
-        for topic_name, data in new_topics.items():
-            if topic_name in topic_dict:
-                # Update existing topic counts
-                topic_dict[topic_name]["total_count"] += data["count"]
-            else:
-                # Create new topic
-                topic_dict[topic_name] = {
-                    "topic": topic_name,
-                    "topic_type": topic_type,
-                    "total_count": data["count"],
-                    "total_percentage": 0  # Will be calculated below
-                }
-
-        # Recalculate total percentages
-        total_count = sum(topic["total_count"] for topic in topic_dict.values())
-        if total_count > 0:
-            for topic in topic_dict.values():
-                topic["total_percentage"] = (topic["total_count"] / total_count) * 100
-        else:
-            for topic in topic_dict.values():
-                topic["total_percentage"] = 0
-
-        return list(topic_dict.values())
-
     def load_existing_stats(self, repo_id: str) -> Dict[str, Any]:
         """
         Load and sanitize existing stats from stats.json in the HF repo.
@@ -481,62 +680,38 @@ class HuggingFaceUploader:
             bt.logging.error(f"Error loading existing stats: {e}")
             return get_default_stats_structure()
 
-    @retry_upload()
-    def save_stats_json(self, platform_stats: Dict[str, Any], platform: str, new_rows: int, repo_id: str) -> Dict[
-        str, Any]:
-        """
-        Updated method to save stats with the new structure
-        """
-        filename = "stats.json"
-
-        try:
-            existing_stats = self.load_existing_stats(repo_id)
-
-            # Ensure version is set to 2.0.0
-            existing_stats["version"] = "2.0.0"
+    def get_stats_file(self, platform: str) -> str:
+        return f"{self.state_file.split('.json')[0]}_{platform}_stats.json"
 
-            if existing_stats["data_source"] is None:
-                existing_stats["data_source"] = platform
+    def load_dataset_stats(self, platform: str, repo_id: str) -> DatasetStats:
+        """Returns the statistics of the rows uploaded to the repo.
 
-            merged_stats = self.merge_statistics(existing_stats, platform_stats)
-
-            merged_stats["summary"]["total_rows"] += new_rows
-            merged_stats["summary"]["last_update_dt"] = dt.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-
-            if merged_stats["summary"]["start_dt"] is None or platform_stats["start_date"] < merged_stats["summary"][
-                "start_dt"]:
-                merged_stats["summary"]["start_dt"] = platform_stats["start_date"]
-
-            if merged_stats["summary"]["end_dt"] is None or platform_stats["end_date"] > merged_stats["summary"][
-                "end_dt"]:
-                merged_stats["summary"]["end_dt"] = platform_stats["end_date"]
-
-            merged_stats["summary"]["update_history"].append({
-                "timestamp": merged_stats["summary"]["last_update_dt"],
-                "count": new_rows
-            })
+        They are kept locally, so stats.json is only downloaded the first time, to carry on from earlier exports.
+        """
+        stats_file = self.get_stats_file(platform)
+        if os.path.exists(stats_file):
+            return DatasetStats.load(stats_file)
+        bt.logging.info(f"No local statistics for {repo_id}. Starting from its stats.json.")
+        return DatasetStats.from_stats_json(self.load_existing_stats(repo_id), platform)
+
+    def publish_statistics(self, unpublished: DatasetStats, platform: str, repo_id: str) -> DatasetStats:
+        """Adds the statistics of newly uploaded rows to those of the dataset and uploads them as stats.json."""
+        dataset_stats = self.load_dataset_stats(platform, repo_id)
+        # The statistics may have been saved by an export that stopped before it could clear them from the state.
+        if not dataset_stats.includes(unpublished):
+            dataset_stats.merge(unpublished)
+            dataset_stats.record_update(dt.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"), unpublished.total_rows)
+            dataset_stats.save(self.get_stats_file(platform))
+
+        self.save_stats_json(dataset_stats.to_stats_json(), platform, repo_id)
+        return dataset_stats
 
-            # Update topics with simplified structure
-            merged_stats["topics"] = self.update_topics(
-                merged_stats.get("topics", []),
-                platform_stats.get('subreddits' if platform == 'reddit' else 'hashtags', {}),
-                platform
-            )
+    @retry_upload()
+    def save_stats_json(self, stats: Dict[str, Any], platform: str, repo_id: str):
+        filename = "stats.json"
 
-            # Update metadata percentages
-            total_rows = merged_stats["summary"]["total_rows"]
-            if platform == 'reddit':
-                merged_stats["summary"]["metadata"]["posts_percentage"] = (
-                                merged_stats.get("posts_count", 0) / total_rows) * 100 if total_rows > 0 else 0
-                merged_stats["summary"]["metadata"]["comments_percentage"] = (
-                                merged_stats.get("comments_count", 0) / total_rows) * 100 if total_rows > 0 else 0
-            else:  # X (Twitter)
-                merged_stats["summary"]["metadata"]["tweets_with_hashtags_percentage"] = (
-                                merged_stats.get("tweets_with_hashtags_count", 0) / total_rows) * 100 if total_rows > 0 else 0
-                merged_stats["summary"]["metadata"]["tweets_without_hashtags_percentage"] = (
-                                merged_stats.get("tweets_without_hashtags_count", 0) / total_rows) * 100 if total_rows > 0 else 0
-
-            stats_json = json.dumps(merged_stats, indent=2, cls=NumpyEncoder)
+        try:
+            stats_json = json.dumps(stats, indent=2, cls=NumpyEncoder)
             sanitized_stats_json = self.sanitize_json(stats_json)
 
             self.hf_api.upload_file(
@@ -548,23 +723,23 @@ class HuggingFaceUploader:
             )
 
             bt.logging.info(f"Successfully updated {filename} for {platform} dataset in {repo_id}")
-            return merged_stats
 
         except Exception as e:
-            bt.logging.error(f"Error saving merged stats JSON: {e}")
+            bt.logging.error(f"Error saving stats JSON: {e}")
             raise
-    def check_wal_size(self):
-        wal_file = f"{self.db_path}-wal"
+
+    def check_wal_size(self, db_path: str = None):
+        wal_file = f"{db_path or self.db_path}-wal"
         if os.path.exists(wal_file):
             size_mb = os.path.getsize(wal_file) / (1024 * 1024)
             bt.logging.info(f"Current WAL file size: {size_mb:.2f} MB")
             return size_mb
         return 0
 
-    def manage_wal(self, conn):
-        wal_size = self.check_wal_size()
+    def manage_wal(self, conn, db_path: str = None):
+        wal_size = self.check_wal_size(db_path)
         if wal_size > self.wal_size_limit_mb:
             bt.logging.warning(f"WAL file exceeded {self.wal_size_limit_mb} MB. Performing checkpoint.")
             conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
-            new_size = self.check_wal_size()
+            new_size = self.check_wal_size(db_path)
             bt.logging.info(f"After checkpoint, WAL size: {new_size:.2f} MB")
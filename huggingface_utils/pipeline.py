@@ -0,0 +1,162 @@
+"""Building blocks for running the stages of the HuggingFace export concurrently with bounded queues between them."""
+
+import contextlib
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import bittensor as bt
+
+
+class StageStats:
+    """The rows handled by a pipeline stage and the time it spent busy handling them."""
+
+    def __init__(self, name: str, parallelism: int = 1):
+        self.name = name
+        # How many items the stage can handle at once, e.g. the number of worker processes.
+        self.parallelism = parallelism
+        self.rows = 0
+        self.busy_secs = 0.0
+
+    def add(self, rows: int, busy_secs: float):
+        self.rows += rows
+        self.busy_secs += busy_secs
+
+    @contextlib.contextmanager
+    def measure(self, rows: int) -> Iterator[None]:
+        """Adds the rows and the time spent in the context."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(rows, time.perf_counter() - start)
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.busy_secs if self.busy_secs > 0 else 0.0
+
+    def utilization(self, wall_secs: float) -> float:
+        """Returns the fraction of the wall time the stage was busy. The bottleneck stage is busy all the time."""
+        if wall_secs <= 0:
+            return 0.0
+        return self.busy_secs / (wall_secs * self.parallelism)
+
+    def summary(self, wall_secs: float) -> str:
+        return (
+            f"{self.name}: {self.rows} rows in {self.busy_secs:.1f}s "
+            f"({self.rows_per_sec:.0f} rows/sec), busy {self.utilization(wall_secs):.0%} of the time"
+        )
+
+
+class BackgroundIterator:
+    """Iterates an iterable on a background thread, holding at most maxsize items that have not been consumed yet.
+
+    The iterable is created and consumed entirely on the background thread, so it may hold thread bound resources such
+    as a sqlite connection. Exceptions raised by the iterable are re-raised to the consumer.
+    """
+
+    _DONE = object()
+
+    def __init__(self, iterable: Iterable, maxsize: int, stats: Optional[StageStats] = None, name: str = "reader"):
+        self.iterable = iterable
+        self.stats = stats
+        self.items: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _put(self, item: Any) -> bool:
+        """Waits for room to put the item, returning False if the consumer stopped first."""
+        while not self.stopped.is_set():
+            try:
+                self.items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        iterator = iter(self.iterable)
+        try:
+            while not self.stopped.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                if self.stats is not None:
+                    self.stats.add(len(item), time.perf_counter() - start)
+                if not self._put(item):
+                    break
+        except BaseException as e:
+            self.error = e
+        finally:
+            # Release whatever the iterable holds on this thread, e.g. by closing a generator.
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self._put(BackgroundIterator._DONE)
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                item = self.items.get()
+                if item is BackgroundIterator._DONE:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                yield item
+        finally:
+            # Let the background thread exit if the consumer stops iterating early, even without calling close.
+            self.stopped.set()
+
+    def close(self):
+        """Stops iterating, discarding any items that were not consumed."""
+        self.stopped.set()
+        self.thread.join()
+
+
+class BackgroundWorker:
+    """Calls fn with each submitted item on a background thread, holding at most maxsize items waiting to be handled.
+
+    Once fn raises, the exception is re-raised by the next call to submit or close and later items are discarded.
+    """
+
+    _DONE = object()
+
+    def __init__(self, fn: Callable[[Any], None], maxsize: int, name: str = "worker"):
+        self.fn = fn
+        self.items: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.items.get()
+            if item is BackgroundWorker._DONE:
+                return
+            if self.error is not None:
+                continue
+            try:
+                self.fn(item)
+            except BaseException as e:
+                bt.logging.error(f"{self.thread.name} failed: {e}")
+                self.error = e
+
+    def _raise_if_failed(self):
+        if self.error is not None:
+            raise self.error
+
+    def submit(self, item: Any):
+        """Queues the item, waiting for room if maxsize items are already waiting."""
+        self._raise_if_failed()
+        self.items.put(item)
+
+    def close(self):
+        """Waits for every submitted item to be handled."""
+        self.items.put(BackgroundWorker._DONE)
+        self.thread.join()
+        self._raise_if_failed()
@@ -2,20 +2,50 @@
 
 import json
 import hashlib
-from typing import Dict, Any, List, Optional
-import pandas as pd
-import numpy as np
+from typing import Dict, Any, List, Optional, Tuple, Union
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
 import psutil
 import os
-from concurrent.futures import ThreadPoolExecutor
-from functools import partial
+import time
 import bittensor as bt
-from huggingface_utils.encoding_system import EncodingKeyManager, encode_url
+from common.data import DataSource
+from huggingface_utils.encoding_system import EncodingKeyManager, SymKeyEncodingKeyManager, encode_url
 
 # Constants
 TWEET_DATASET_COLUMNS = ['text', 'label', 'tweet_hashtags', 'datetime', 'username_encoded', 'url_encoded']
 REDDIT_DATASET_COLUMNS = ['text', 'label', 'dataType', 'communityName', 'datetime', 'username_encoded', 'url_encoded']
 
+# Arrow types of the dataset columns, so that every parquet file of a dataset has the same schema.
+DATASET_COLUMN_TYPES = {
+    'text': pa.string(),
+    'label': pa.string(),
+    'tweet_hashtags': pa.list_(pa.string()),
+    'dataType': pa.string(),
+    'communityName': pa.string(),
+    'datetime': pa.string(),
+    'username_encoded': pa.string(),
+    'url_encoded': pa.string(),
+}
+TWEET_DATASET_SCHEMA = pa.schema([(column, DATASET_COLUMN_TYPES[column]) for column in TWEET_DATASET_COLUMNS])
+REDDIT_DATASET_SCHEMA = pa.schema([(column, DATASET_COLUMN_TYPES[column]) for column in REDDIT_DATASET_COLUMNS])
+
+# The fields read from the JSON content of each source. Any other field is skipped by the parser.
+TWEET_CONTENT_SCHEMA = pa.schema([
+    ('text', pa.string()),
+    ('tweet_hashtags', pa.list_(pa.string())),
+    ('username', pa.string()),
+    ('url', pa.string()),
+])
+REDDIT_CONTENT_SCHEMA = pa.schema([
+    ('body', pa.string()),
+    ('dataType', pa.string()),
+    ('communityName', pa.string()),
+    ('username', pa.string()),
+    ('url', pa.string()),
+])
+
 # Stats Related Constants
 STATS_VERSION = "2.0.0"
 DEFAULT_STATS_STRUCTURE = {
@@ -144,158 +174,161 @@ def decode_content(content: bytes) -> Dict[str, Any]:
         return {}
 
 
-def batch_encode(data: pd.Series, fernet, batch_size: int = 10000) -> pd.Series:
-    """Efficiently encode data in batches using specified Fernet key."""
-    result = np.empty(len(data), dtype=object)
-    
-    # Adjust batch size based on available memory
-    available_memory_gb = psutil.virtual_memory().available / (1024 ** 3)
-    if available_memory_gb < 4:
-        batch_size = 5000
-    elif available_memory_gb < 8:
-        batch_size = 7500
-    
-    for i in range(0, len(data), batch_size):
-        batch = data.iloc[i:i+batch_size]
-        # Vectorized null check
-        mask = batch.notna()
-        if mask.any():
-            result[i:i+batch_size][mask] = [encode_url(url, fernet) for url in batch[mask]]
-        result[i:i+batch_size][~mask] = None
-        
-    return pd.Series(result, index=data.index)
+def _has_type(value: Any, data_type: pa.DataType) -> bool:
+    """Returns whether a decoded JSON value can be stored as the given string or list of strings type."""
+    if pa.types.is_list(data_type):
+        return isinstance(value, list) and all(item is None or isinstance(item, str) for item in value)
+    return isinstance(value, str)
 
 
-def parallel_encode_batch(items: pd.Series, fernet) -> pd.Series:
-    """Encode items in parallel using thread pool."""
-    if items.empty:
-        return items
-        
-    # Get optimal thread count based on system resources
-    n_threads = get_optimal_threads()
-    bt.logging.info(f"Using {n_threads} threads for parallel encoding")
-    
-    # Calculate optimal chunk size based on data size and thread count
-    total_items = len(items)
-    chunk_size = max(1000, total_items // (n_threads * 2))
-    
-    # Split into chunks for parallel processing
-    chunks = [items[i:i + chunk_size] for i in range(0, total_items, chunk_size)]
-    
-    # Process chunks in parallel
-    with ThreadPoolExecutor(max_workers=n_threads) as executor:
-        encode_func = partial(batch_encode, fernet=fernet)
-        results = list(executor.map(encode_func, chunks))
-    
-    return pd.concat(results) if results else pd.Series(dtype=object)
+def _parse_json_contents_one_by_one(contents: pa.Array, schema: pa.Schema) -> pa.Table:
+    """Parses each content on its own, reading contents that are not JSON objects and fields of another type as null."""
+    rows = [decode_content(content) for content in contents.to_pylist()]
+    rows = [row if isinstance(row, dict) else {} for row in rows]
+    columns = []
+    for field in schema:
+        values = [row.get(field.name) for row in rows]
+        columns.append(pa.array([value if _has_type(value, field.type) else None for value in values], type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
 
 
-def preprocess_twitter_df(df: pd.DataFrame, encoding_key_manager: EncodingKeyManager,
-                          private_encoding_key_manager: EncodingKeyManager) -> pd.DataFrame:
-    """Preprocess Twitter DataFrame with empty text filtering and dual-key encoding."""
-    try:
-        # Log initial count
-        initial_count = len(df)
-        bt.logging.info(f"Starting Twitter preprocessing with {initial_count} rows")
-        
-        # Vectorized content decoding
-        df['content'] = df['content'].apply(decode_content)
-        
-        # Extract fields using vectorized operations
-        result_df = pd.DataFrame({
-            'text': df['content'].apply(lambda x: x.get('text')),
-            'tweet_hashtags': df['content'].apply(lambda x: x.get('tweet_hashtags')),
-            'label': df['label'],
-            'datetime': pd.to_datetime(df['datetime']).dt.strftime('%Y-%m-%d')
-        })
-        
-        # Filter out rows with empty text
-        valid_text_mask = result_df['text'].notna() & (result_df['text'].str.strip() != '')
-        result_df = result_df[valid_text_mask]
-        
-        if len(result_df) == 0:
-            bt.logging.warning("All Twitter rows filtered out due to empty text fields")
-            return pd.DataFrame(columns=TWEET_DATASET_COLUMNS)
-            
-        # Log filtered count
-        filtered_count = len(result_df)
-        removed_count = initial_count - filtered_count
-        bt.logging.info(f"Removed {removed_count} Twitter rows with empty text. Remaining rows: {filtered_count}")
-        
-        # Extract username and URL series from original data
-        filtered_content = df.loc[valid_text_mask, 'content']
-        usernames = filtered_content.apply(lambda x: x.get('username', ''))
-        urls = filtered_content.apply(lambda x: x.get('url', ''))
-        
-        # Get Fernet instances
-        public_fernet = encoding_key_manager.get_fernet()
-        private_fernet = private_encoding_key_manager.get_fernet()
-        
-        # Parallel encoding with respective keys (username with public key, URL with private key)
-        result_df['username_encoded'] = parallel_encode_batch(usernames, public_fernet)
-        result_df['url_encoded'] = parallel_encode_batch(urls, private_fernet)
-        
-        # Memory cleanup
-        df = None
-        filtered_content = None
-        
-        return result_df[TWEET_DATASET_COLUMNS]
-        
-    except Exception as e:
-        bt.logging.error(f"Error in Twitter preprocessing: {e}")
-        raise
+def parse_json_contents(contents: Union[pa.Array, pa.ChunkedArray], schema: pa.Schema) -> pa.Table:
+    """Parses the JSON object in each content into the fields of the schema, with a row per content.
+
+    The contents are parsed together by Arrow's JSON reader. Missing fields are null. If any content is not a JSON
+    object or has a field of another type, the contents are parsed one at a time instead and those are read as null.
+    """
+    if len(contents) == 0:
+        return schema.empty_table()
+
+    if isinstance(contents, pa.ChunkedArray):
+        contents = contents.combine_chunks()
+    # Valid JSON only has newlines between tokens, so replacing them leaves each content on a line of its own.
+    lines = contents.cast(pa.large_binary())
+    for newline in [b"\n", b"\r"]:
+        lines = pc.replace_substring(lines, newline, b" ")
+    joined = pc.binary_join(
+        pa.LargeListArray.from_arrays(pa.array([0, len(lines)], type=pa.int64()), lines),
+        pa.scalar(b"\n", type=pa.large_binary()),
+    )
 
-def preprocess_reddit_df(df: pd.DataFrame, encoding_key_manager: EncodingKeyManager, private_encoding_key_manager: EncodingKeyManager) -> pd.DataFrame:
-    """Preprocess Reddit DataFrame with empty text filtering and dual-key encoding."""
     try:
-        # Log initial count
-        initial_count = len(df)
-        bt.logging.info(f"Starting Reddit preprocessing with {initial_count} rows")
-        
-        # Vectorized content decoding
-        df['content'] = df['content'].apply(decode_content)
-        
-        # Extract fields using vectorized operations
-        result_df = pd.DataFrame({
-            'text': df['content'].apply(lambda x: x.get('body')),
-            'dataType': df['content'].apply(lambda x: x.get('dataType')),
-            'communityName': df['content'].apply(lambda x: x.get('communityName')),
-            'label': df['label'],
-            'datetime': pd.to_datetime(df['datetime']).dt.strftime('%Y-%m-%d')
-        })
-        
-        # Filter out rows with empty text
-        valid_text_mask = result_df['text'].notna() & (result_df['text'].str.strip() != '')
-        result_df = result_df[valid_text_mask]
-        
-        if len(result_df) == 0:
-            bt.logging.warning("All Reddit rows filtered out due to empty text fields")
-            return pd.DataFrame(columns=REDDIT_DATASET_COLUMNS)
-            
-        # Log filtered count
-        filtered_count = len(result_df)
-        removed_count = initial_count - filtered_count
-        bt.logging.info(f"Removed {removed_count} Reddit rows with empty text. Remaining rows: {filtered_count}")
-        
-        # Extract username and URL series from original data
-        filtered_content = df.loc[valid_text_mask, 'content']
-        usernames = filtered_content.apply(lambda x: x.get('username', ''))
-        urls = filtered_content.apply(lambda x: x.get('url', ''))
-        
-        # Get Fernet instances
-        public_fernet = encoding_key_manager.get_fernet()
-        private_fernet = private_encoding_key_manager.get_fernet()
-        
-        # Parallel encoding with respective keys (username with public key, URL with private key)
-        result_df['username_encoded'] = parallel_encode_batch(usernames, public_fernet)
-        result_df['url_encoded'] = parallel_encode_batch(urls, private_fernet)
-        
-        # Memory cleanup
-        df = None
-        filtered_content = None
-        
-        return result_df[REDDIT_DATASET_COLUMNS]
-        
-    except Exception as e:
-        bt.logging.error(f"Error in Reddit preprocessing: {e}")
-        raise
+        table = pa_json.read_json(
+            pa.BufferReader(joined[0].as_buffer()),
+            # The export already parses in a process per core.
+            read_options=pa_json.ReadOptions(use_threads=False),
+            parse_options=pa_json.ParseOptions(explicit_schema=schema, unexpected_field_behavior="ignore"),
+        )
+        # The reader does not check that strings are valid UTF-8, which decode_content requires.
+        table.validate(full=True)
+        # Blank contents have no line of their own, so the rows would no longer line up with the contents.
+        if len(table) == len(contents):
+            return table
+    except ValueError:
+        pass
+    return _parse_json_contents_one_by_one(contents, schema)
+
+
+def encode_array(values: Union[pa.Array, pa.ChunkedArray], fernet) -> pa.Array:
+    """Encodes each string with the Fernet key, keeping nulls."""
+    return pa.array(
+        [None if value is None else encode_url(value, fernet) for value in values.to_pylist()],
+        type=pa.string(),
+    )
+
+
+def _filter_empty_text(table: pa.Table, content: pa.Table, text_field: str, platform: str) -> Tuple[pa.Table, pa.Table]:
+    """Filters out the rows of the table and its parsed content whose text is missing or blank."""
+    initial_count = len(table)
+    # Comparing a null text gives null, which the filter drops.
+    valid_text_mask = pc.not_equal(pc.utf8_trim_whitespace(content[text_field]), "")
+    table = table.filter(valid_text_mask)
+    content = content.filter(valid_text_mask)
+
+    if len(table) == 0:
+        bt.logging.warning(f"All {platform} rows filtered out due to empty text fields")
+    else:
+        bt.logging.info(f"Removed {initial_count - len(table)} {platform} rows with empty text. "
+                        f"Remaining rows: {len(table)}")
+    return table, content
+
+
+def _encode_user_columns(content: pa.Table, encoding_key_manager: EncodingKeyManager,
+                         private_encoding_key_manager: EncodingKeyManager) -> Dict[str, pa.Array]:
+    """Encodes the username with the public key and the URL with the private key."""
+    # Missing usernames and URLs are encoded as empty strings.
+    return {
+        'username_encoded': encode_array(content['username'].fill_null(''), encoding_key_manager.get_fernet()),
+        'url_encoded': encode_array(content['url'].fill_null(''), private_encoding_key_manager.get_fernet()),
+    }
+
+
+def _to_date(datetimes: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Returns the dates of the datetimes stored by the miner, which start with the date in ISO format."""
+    return pc.utf8_slice_codeunits(datetimes, 0, 10)
+
+
+def preprocess_twitter_table(table: pa.Table, encoding_key_manager: EncodingKeyManager,
+                             private_encoding_key_manager: EncodingKeyManager) -> pa.Table:
+    """Preprocess a table of Twitter rows into the dataset's columns, without building Python objects for each row.
+
+    The table has the datetime, label and decoded content of each row as stored by the miner.
+    """
+    bt.logging.info(f"Starting Twitter preprocessing with {len(table)} rows")
+    content = parse_json_contents(table['content'], TWEET_CONTENT_SCHEMA)
+    table, content = _filter_empty_text(table, content, 'text', 'Twitter')
+
+    return pa.table({
+        'text': content['text'],
+        'label': table['label'],
+        'tweet_hashtags': content['tweet_hashtags'],
+        'datetime': _to_date(table['datetime']),
+        **_encode_user_columns(content, encoding_key_manager, private_encoding_key_manager),
+    }, schema=TWEET_DATASET_SCHEMA)
+
+
+def preprocess_reddit_table(table: pa.Table, encoding_key_manager: EncodingKeyManager,
+                            private_encoding_key_manager: EncodingKeyManager) -> pa.Table:
+    """Preprocess a table of Reddit rows into the dataset's columns, without building Python objects for each row.
+
+    The table has the datetime, label and decoded content of each row as stored by the miner.
+    """
+    bt.logging.info(f"Starting Reddit preprocessing with {len(table)} rows")
+    content = parse_json_contents(table['content'], REDDIT_CONTENT_SCHEMA)
+    table, content = _filter_empty_text(table, content, 'body', 'Reddit')
+
+    return pa.table({
+        'text': content['body'],
+        'label': table['label'],
+        'dataType': content['dataType'],
+        'communityName': content['communityName'],
+        'datetime': _to_date(table['datetime']),
+        **_encode_user_columns(content, encoding_key_manager, private_encoding_key_manager),
+    }, schema=REDDIT_DATASET_SCHEMA)
+
+
+def preprocess_in_worker(table: pa.Table, source: int, sym_key: str, private_sym_key: str) -> Tuple[pa.Table, float]:
+    """Preprocesses part of a chunk in a worker process, returning the result and the seconds it took.
+
+    Takes the encoding keys rather than their managers, so that only the keys are sent to the worker. Lives here rather
+    than with the uploader so that the worker can import it without importing the miner's storage.
+    """
+    start = time.perf_counter()
+    encoding_key_manager = SymKeyEncodingKeyManager(sym_key)
+    private_encoding_key_manager = SymKeyEncodingKeyManager(private_sym_key)
+    if source == DataSource.REDDIT.value:
+        table = preprocess_reddit_table(table, encoding_key_manager, private_encoding_key_manager)
+    else:
+        table = preprocess_twitter_table(table, encoding_key_manager, private_encoding_key_manager)
+    return table, time.perf_counter() - start
+
+
+def value_counts(values: Union[pa.Array, pa.ChunkedArray]) -> Dict[Any, int]:
+    """Counts each non-null value, most common first like pandas' value_counts."""
+    counts = pc.value_counts(values)
+    pairs = zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist())
+    return {
+        value: count
+        for value, count in sorted(pairs, key=lambda pair: pair[1], reverse=True)
+        if value is not None
+    }
@@ -138,6 +138,21 @@ def add_args(neuron_type: NeuronType, parser):
             default=os.path.join(Path(os.path.dirname(__file__)).parent, "hf_validation.parquet"),
         )
 
+        parser.add_argument(
+            "--neuron.validator_storage_type",
+            type=str,
+            choices=["sqlite_memory", "columnar"],
+            help="The storage for miner indexes. columnar holds each index as NumPy columns with a maintained per bucket aggregate.",
+            default="sqlite_memory",
+        )
+
+        parser.add_argument(
+            "--neuron.max_concurrent_evaluations",
+            type=int,
+            help="The maximum number of miners to evaluate at once.",
+            default=15,
+        )
+
         parser.add_argument(
             "--neuron.api_on",
             action="store_true",
@@ -160,6 +175,14 @@ def add_args(neuron_type: NeuronType, parser):
             default="SqliteMinerStorage.sqlite",
         )
 
+        parser.add_argument(
+            "--neuron.storage_type",
+            type=str,
+            choices=["sqlite", "partitioned_sqlite"],
+            help="The miner storage to use. partitioned_sqlite stores each day of data in its own file in a directory named by --neuron.database_name.",
+            default="sqlite",
+        )
+
         parser.add_argument(
             "--neuron.max_database_size_gb_hint",
             type=int,
@@ -169,6 +192,41 @@ def add_args(neuron_type: NeuronType, parser):
             default=250,
         )
 
+        parser.add_argument(
+            "--neuron.database_reader_connections",
+            type=int,
+            help="How many pooled reader connections the miner storage keeps open for serving requests. 0 disables pooling.",
+            default=8,
+        )
+
+        parser.add_argument(
+            "--neuron.compress_content",
+            action="store_true",
+            help="Compress stored content with a dictionary trained per source. Use scripts/migrate_content_compression.py to convert existing content.",
+            default=False,
+        )
+
+        parser.add_argument(
+            "--neuron.ingest_flush_size",
+            type=int,
+            help="The number of scraped entities to coalesce into a single storage transaction.",
+            default=10_000,
+        )
+
+        parser.add_argument(
+            "--neuron.ingest_flush_latency_seconds",
+            type=float,
+            help="The longest a scraped entity waits before it is flushed to storage, even if the batch is not full.",
+            default=10.0,
+        )
+
+        parser.add_argument(
+            "--neuron.ingest_max_pending_entities",
+            type=int,
+            help="The number of scraped entities that can wait to be stored before scraping is paused.",
+            default=100_000,
+        )
+
         root_dir = Path(os.path.dirname(__file__)).parent
         default_file = os.path.join(
             os.path.join(root_dir, "scraping/config/scraping_config.json"),
@@ -25,7 +25,7 @@ import typing
 import bittensor as bt
 import datetime as dt
 from common import constants, utils
-from common.data import CompressedMinerIndex, TimeBucket
+from common.data import TimeBucket
 from common.protocol import (
     GetDataEntityBucket,
     GetMinerIndex,
@@ -38,6 +38,7 @@ from common.protocol import (
 from scraping.config.config_reader import ConfigReader
 from scraping.coordinator import ScraperCoordinator
 from scraping.provider import ScraperProvider
+from storage.miner.partitioned_sqlite_miner_storage import PartitionedSqliteMinerStorage
 from storage.miner.sqlite_miner_storage import SqliteMinerStorage
 from neurons.config import NeuronType, check_config, create_config
 from huggingface_utils.huggingface_uploader import HuggingFaceUploader
@@ -161,9 +162,16 @@ class Miner:
             )
 
         # Instantiate storage.
-        self.storage = SqliteMinerStorage(
+        storage_class = (
+            PartitionedSqliteMinerStorage
+            if self.config.neuron.storage_type == "partitioned_sqlite"
+            else SqliteMinerStorage
+        )
+        self.storage = storage_class(
             self.config.neuron.database_name,
             self.config.neuron.max_database_size_gb_hint,
+            self.config.neuron.database_reader_connections,
+            self.config.neuron.compress_content,
         )
 
         bt.logging.success(
@@ -183,6 +191,11 @@ class Miner:
             scraper_provider=ScraperProvider(),
             miner_storage=self.storage,
             config=scraping_config,
+            ingest_flush_size=self.config.neuron.ingest_flush_size,
+            ingest_flush_latency=dt.timedelta(
+                seconds=self.config.neuron.ingest_flush_latency_seconds
+            ),
+            ingest_max_pending_entities=self.config.neuron.ingest_max_pending_entities,
         )
 
         # Configure per hotkey per request limits.
@@ -229,8 +242,10 @@ class Miner:
                 # Check if it's a new day and we haven't updated yet
                 if last_update is None or current_datetime.date() > last_update.date():
                     bt.logging.info("Retrieving the latest dynamic lookup...")
-                    sync_run_retrieval(self.config)
+                    lookup = sync_run_retrieval(self.config)
                     bt.logging.info(f"New desirable data list has been written to total.json")
+                    # Clear the least desirable data first when storage is full.
+                    self.storage.update_desirability_lookup(lookup)
                     last_update = current_datetime
                     bt.logging.info(f"Updated dynamic lookup at {last_update}")
                 else:
@@ -434,14 +449,13 @@ class Miner:
             bt.logging.error(f"Unsupported protocol version: {synapse.version}.")
             return synapse
 
-        # Return the appropriate amount of max buckets based on protocol of the requesting validator.
-        compressed_index = self.storage.get_compressed_index(
-            bucket_count_limit=constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX_PROTOCOL_4
-        )
-        synapse.compressed_index_serialized = compressed_index.model_dump_json()
+        # Return the index serialized at refresh time rather than serializing it for every request.
+        serialized_index = self.storage.get_serialized_compressed_index()
+        synapse.compressed_index_serialized = serialized_index.json
         bt.logging.success(
-            f"Returning compressed miner index of {CompressedMinerIndex.size_bytes(compressed_index)} bytes "
-            + f"across {CompressedMinerIndex.bucket_count(compressed_index)} buckets to {synapse.dendrite.hotkey}."
+            f"Returning compressed miner index of {serialized_index.size_bytes} bytes "
+            + f"across {serialized_index.bucket_count} buckets to {synapse.dendrite.hotkey}. "
+            + f"Serialization time saved so far: {self.storage.index_serialization_seconds_saved:.2f}s."
         )
 
         synapse.version = constants.PROTOCOL_VERSION
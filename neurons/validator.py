@@ -282,6 +282,7 @@ class Validator:
             # If someone intentionally stops the validator, it'll safely terminate operations.
             except KeyboardInterrupt:
                 self.axon.stop()
+                self.loop.run_until_complete(self.evaluator.close())
                 bt.logging.success("Validator killed by keyboard interrupt.")
                 sys.exit()
 
@@ -289,6 +290,8 @@ class Validator:
             except Exception as err:
                 bt.logging.error("Error during validation", str(err))
 
+        self.loop.run_until_complete(self.evaluator.close())
+
     def run_in_background_thread(self):
         """
         Starts the validator's operations in a background thread upon entering the context.
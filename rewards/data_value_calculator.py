@@ -1,7 +1,12 @@
 import datetime as dt
-from typing import Optional
+from typing import Dict, Iterable, Optional, Union
+import numpy as np
 from common.data import DataSource, TimeBucket
-from common.data_v2 import ScorableDataEntityBucket
+from common.data_v2 import (
+    ColumnarScorableMinerIndex,
+    ScorableDataEntityBucket,
+    ScorableMinerIndex,
+)
 from rewards.data import DataDesirabilityLookup
 from scraping.scraper import HFValidationResult
 
@@ -14,6 +19,34 @@ class DataValueCalculator:
     def __init__(self, model: DataDesirabilityLookup = data_desirability_lookup.LOOKUP):
         self.model = DataDesirabilityLookup.to_primitive_data_desirability_lookup(model)
 
+        # For batched scoring, every label with an explicit scale factor gets an id, and the
+        # source weight multiplied by the label scale factor is precomputed for each source and label id.
+        # The last id is for all other labels, which are scaled by the default scale factor.
+        labels = {
+            label
+            for data_source_reward in self.model.distribution.values()
+            for label in data_source_reward.label_scale_factors
+        }
+        self.label_ids: Dict[Optional[str], int] = {
+            label: label_id
+            for label_id, label in enumerate(
+                sorted(labels, key=lambda label: (label is not None, label or ""))
+            )
+        }
+        self.default_label_id = len(self.label_ids)
+        # Sources without a desirability are scored 0.
+        self.scale_factors = np.zeros(
+            (max(DataSource) + 1, self.default_label_id + 1), dtype=np.float64
+        )
+        for data_source, data_source_reward in self.model.distribution.items():
+            self.scale_factors[data_source] = (
+                data_source_reward.weight * data_source_reward.default_scale_factor
+            )
+            for label, label_factor in data_source_reward.label_scale_factors.items():
+                self.scale_factors[data_source, self.label_ids[label]] = (
+                    data_source_reward.weight * label_factor
+                )
+
     def get_score_for_data_entity_bucket(
         self,
         scorable_data_entity_bucket: ScorableDataEntityBucket,
@@ -40,6 +73,83 @@ class DataValueCalculator:
             * scorable_data_entity_bucket.scorable_bytes
         )
 
+    def get_label_ids(self, labels: Iterable[Optional[str]]) -> np.ndarray:
+        """Returns the ids used by get_scores_for_buckets for the given labels."""
+        label_ids = self.label_ids
+        default_label_id = self.default_label_id
+        return np.fromiter(
+            (label_ids.get(label, default_label_id) for label in labels),
+            dtype=np.int64,
+        )
+
+    def get_scores_for_buckets(
+        self,
+        sources: np.ndarray,
+        label_ids: np.ndarray,
+        time_bucket_ids: np.ndarray,
+        scorable_bytes: np.ndarray,
+        current_time_bucket_id: int,
+    ) -> np.ndarray:
+        """Returns the score of each bucket given as columns, scored the same way as get_score_for_data_entity_bucket.
+
+        Args:
+            sources (np.ndarray): The DataSource of each bucket.
+            label_ids (np.ndarray): The id of each bucket's label, from get_label_ids.
+            time_bucket_ids (np.ndarray): The time bucket id of each bucket.
+            scorable_bytes (np.ndarray): The scorable bytes of each bucket.
+            current_time_bucket_id (int): The id of the current time bucket.
+        """
+        data_type_scale_factors = self.scale_factors[
+            np.asarray(sources, dtype=np.int64), np.asarray(label_ids, dtype=np.int64)
+        ]
+
+        # Mirrors _scale_factor_for_age.
+        max_age_in_hours = self.model.max_age_in_hours
+        data_age_in_hours = np.maximum(
+            current_time_bucket_id - np.asarray(time_bucket_ids, dtype=np.int64), 0
+        )
+        time_scalars = np.where(
+            data_age_in_hours > max_age_in_hours,
+            0.0,
+            1.0 - data_age_in_hours / (2 * max_age_in_hours),
+        )
+
+        return data_type_scale_factors * time_scalars * scorable_bytes
+
+    def get_total_score_for_index(
+        self,
+        index: Union[ScorableMinerIndex, ColumnarScorableMinerIndex],
+        current_time_bucket: TimeBucket,
+    ) -> float:
+        """Returns the sum of get_score_for_data_entity_bucket over all of the buckets in the index, computed as a batch."""
+        index = ColumnarScorableMinerIndex.from_index(index)
+        if len(index) == 0:
+            return 0.0
+
+        # Only the labels table needs to be looked up, rather than the label of every bucket.
+        label_ids = self.get_label_ids(index.labels)[index.label_ids]
+        return float(
+            self.get_scores_for_buckets(
+                index.sources,
+                label_ids,
+                index.time_bucket_ids,
+                index.scorable_bytes,
+                current_time_bucket.id,
+            ).sum()
+        )
+
+    def get_score_per_byte(
+        self,
+        data_source: DataSource,
+        label: Optional[str],
+        time_bucket_id: int,
+        current_time_bucket_id: int,
+    ) -> float:
+        """Returns the score for a single byte of data with the given source, label and time bucket."""
+        return self._scale_factor_for_source_and_label(
+            data_source, label
+        ) * self._scale_factor_for_age(time_bucket_id, current_time_bucket_id)
+
     def _scale_factor_for_source_and_label(
         self, data_source: DataSource, label: Optional[str]
     ) -> float:
@@ -1,10 +1,10 @@
 import threading
-from typing import List, Optional
+from typing import List, Optional, Union
 import torch
 import bittensor as bt
 import datetime as dt
 from common.data import TimeBucket
-from common.data_v2 import ScorableMinerIndex
+from common.data_v2 import ColumnarScorableMinerIndex, ScorableMinerIndex
 from rewards.data_value_calculator import DataValueCalculator
 from scraping.scraper import ValidationResult, HFValidationResult
 
@@ -142,7 +142,7 @@ class MinerScorer:
     def on_miner_evaluated(
         self,
         uid: int,
-        index: Optional[ScorableMinerIndex],
+        index: Optional[Union[ScorableMinerIndex, ColumnarScorableMinerIndex]],
         validation_results: List[ValidationResult]
     ) -> None:
         """Notifies the scorer that a miner has been evaluated and should have its score updated.
@@ -153,21 +153,24 @@ class MinerScorer:
             validation_results (List[ValidationResult]): The results of data validation performed on the data provided by the miner.
             hf_validation_result (Optional, HFValidationResult): The overall result from a validation process on a 10,000 row sample from a miner's HF dataset. 
         """
+        # Compute the raw miner score based on the amount of data it has, scaled based on
+        # the reward distribution. This only reads the index, so it's done before taking the lock.
+        raw_score = 0.0
+        if index is not None:
+            current_time_bucket = TimeBucket.from_datetime(
+                dt.datetime.now(tz=dt.timezone.utc)
+            )
+            raw_score = self.value_calculator.get_total_score_for_index(
+                index, current_time_bucket
+            )
+
         with self.lock:
             score = 0.0
 
             # If the miner has an index, update it's credibility based on the validation result and score the current index.
             # Otherwise, score the miner 0 for this round, but don't touch its credibility.
-            if index:
-                # Compute the raw miner score based on the amount of data it has, scaled based on
-                # the reward distribution.
-                current_time_bucket = TimeBucket.from_datetime(
-                    dt.datetime.now(tz=dt.timezone.utc)
-                )
-                for bucket in index.scorable_data_entity_buckets:
-                    score += self.value_calculator.get_score_for_data_entity_bucket(
-                        bucket, current_time_bucket
-                    )
+            if index is not None:
+                score = raw_score
 
                 # If the score has increased since the last eval, decrease credibility so that the
                 # new score remains unchanged. i.e. "you've told us you now have more valuable data, prove it".
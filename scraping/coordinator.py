@@ -10,6 +10,7 @@ import numpy
 from pydantic import Field, PositiveInt, ConfigDict
 
 from common.data import DataLabel, DataSource, StrictBaseModel, TimeBucket
+from scraping.ingest_pipeline import IngestPipeline
 from scraping.provider import ScraperProvider
 from scraping.scraper import ScrapeConfig, ScraperId
 from storage.miner.miner_storage import MinerStorage
@@ -145,11 +146,22 @@ class ScraperCoordinator:
         scraper_provider: ScraperProvider,
         miner_storage: MinerStorage,
         config: CoordinatorConfig,
+        ingest_flush_size: int = 10_000,
+        ingest_flush_latency: dt.timedelta = dt.timedelta(seconds=10),
+        ingest_max_pending_entities: int = 100_000,
     ):
         self.provider = scraper_provider
         self.storage = miner_storage
         self.config = config
 
+        # Scraped data is written to storage in large batches on a dedicated thread rather than by each worker.
+        self.ingest_pipeline = IngestPipeline(
+            miner_storage,
+            flush_size=ingest_flush_size,
+            flush_latency=ingest_flush_latency,
+            max_pending_entities=ingest_max_pending_entities,
+        )
+
         self.tracker = ScraperCoordinator.Tracker(self.config, dt.datetime.utcnow())
         self.max_workers = 5
         self.is_running = False
@@ -175,6 +187,8 @@ class ScraperCoordinator:
         self.is_running = False
 
     async def _start(self):
+        ingest = asyncio.create_task(self.ingest_pipeline.run())
+
         workers = []
         for i in range(self.max_workers):
             worker = asyncio.create_task(
@@ -211,6 +225,9 @@ class ScraperCoordinator:
 
         bt.logging.info("Coordinator shutting down. Waiting for workers to finish.")
         await asyncio.gather(*workers)
+        bt.logging.info("Flushing scraped data to storage.")
+        await self.ingest_pipeline.stop()
+        await ingest
         bt.logging.info("Coordinator stopped.")
 
     async def _worker(self, name):
@@ -222,7 +239,8 @@ class ScraperCoordinator:
 
                 # Perform the scrape
                 data_entities = await scrape_fn()
-                self.storage.store_data_entities(data_entities)
+                # Hand off to the ingest pipeline. This waits if storage is falling behind.
+                await self.ingest_pipeline.put(data_entities)
                 self.queue.task_done()
             except Exception as e:
                 bt.logging.error("Worker " + name + ": " + traceback.format_exc())
@@ -0,0 +1,118 @@
+import asyncio
+import time
+import traceback
+import bittensor as bt
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from common.data import DataEntity
+from storage.miner.miner_storage import MinerStorage
+
+
+class IngestPipeline:
+    """Write-behind path from the scrapers to MinerStorage.
+
+    Scraped DataEntities are put on a bounded asyncio queue and coalesced into large batches, which are stored by a
+    dedicated writer thread so that SQLite I/O never blocks the event loop. A batch is flushed once it reaches
+    flush_size entities or once its oldest entity has waited flush_latency, whichever comes first.
+
+    When the writer falls behind and max_pending_entities are waiting, put() blocks, which applies backpressure to
+    the scraping workers.
+    """
+
+    # Marks the end of the stream so the pipeline can flush and exit.
+    _STOP = object()
+
+    def __init__(
+        self,
+        storage: MinerStorage,
+        flush_size: int = 10_000,
+        flush_latency: dt.timedelta = dt.timedelta(seconds=10),
+        max_pending_entities: int = 100_000,
+    ):
+        if flush_size <= 0:
+            raise ValueError("flush_size must be positive.")
+        if max_pending_entities < flush_size:
+            raise ValueError("max_pending_entities must be at least flush_size.")
+
+        self.storage = storage
+        self.flush_size = flush_size
+        self.flush_latency = flush_latency
+        self.max_pending_entities = max_pending_entities
+        self.queue = asyncio.Queue(maxsize=max_pending_entities)
+
+    async def put(self, data_entities: List[DataEntity]):
+        """Queues DataEntities to be stored, waiting if the writer is too far behind."""
+        for data_entity in data_entities:
+            await self.queue.put(data_entity)
+
+    async def stop(self):
+        """Signals the pipeline to flush everything queued so far and exit."""
+        await self.queue.put(IngestPipeline._STOP)
+
+    async def run(self):
+        """Runs the pipeline until stop() is called. It can be run again once it has stopped."""
+        loop = asyncio.get_running_loop()
+        # Each run has its own writer thread, so that a stopped pipeline can be run again.
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        try:
+            while True:
+                batch, stopped = await self._next_batch(loop)
+                if batch:
+                    await loop.run_in_executor(executor, self._store, batch)
+                if stopped:
+                    return
+        finally:
+            executor.shutdown(wait=True)
+            self._rebind_queue()
+
+    def _rebind_queue(self):
+        """Moves anything still queued to a new queue, since an asyncio queue is bound to the loop it was used on.
+
+        The next run may be on another event loop, e.g. when a stopped coordinator is started again.
+        """
+        queue = asyncio.Queue(maxsize=self.max_pending_entities)
+        while not self.queue.empty():
+            queue.put_nowait(self.queue.get_nowait())
+        self.queue = queue
+
+    async def _next_batch(self, loop: asyncio.AbstractEventLoop):
+        """Waits for the next batch to flush. Returns the batch and whether the pipeline was stopped."""
+        first = await self.queue.get()
+        if first is IngestPipeline._STOP:
+            return [], True
+
+        batch = [first]
+        deadline = loop.time() + self.flush_latency.total_seconds()
+        while len(batch) < self.flush_size:
+            try:
+                data_entity = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    data_entity = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            if data_entity is IngestPipeline._STOP:
+                return batch, True
+            batch.append(data_entity)
+
+        return batch, False
+
+    def _store(self, batch: List[DataEntity]):
+        """Stores a batch on the writer thread."""
+        start = time.perf_counter()
+        try:
+            self.storage.store_data_entities(batch)
+            bt.logging.trace(
+                f"Ingest writer stored {len(batch)} entities in {time.perf_counter() - start:.3f}s. "
+                + f"{self.queue.qsize()} entities pending."
+            )
+        except Exception:
+            bt.logging.error(
+                f"Ingest writer failed to store {len(batch)} entities: {traceback.format_exc()}"
+            )
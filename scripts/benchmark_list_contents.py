@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Compares the query plan and latency of list_contents_in_data_entity_buckets against the previous OR-chain query.
+
+Example:
+    python scripts/benchmark_list_contents.py --entities 500000 --requests 50 --buckets_per_request 100
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from benchmark_miner_storage import generate_database, list_bucket_ids
+from common import constants
+from storage.miner.sqlite_miner_storage import SqliteMinerStorage
+
+
+# The query used before bucket ids were joined against the index, kept here for comparison.
+def or_chain_query(bucket_count):
+    return f"""SELECT timeBucketId, source, label, content, contentSizeBytes FROM DataEntity
+                WHERE timeBucketId = ? AND label = ?
+                {"OR timeBucketId = ? AND label = ?" * (bucket_count - 1)}
+                LIMIT ?"""
+
+
+def or_chain_parameters(bucket_ids):
+    parameters = []
+    for bucket_id in bucket_ids:
+        parameters.append(bucket_id.time_bucket.id)
+        parameters.append("NULL" if bucket_id.label is None else bucket_id.label.value)
+    return parameters + [constants.BULK_CONTENTS_COUNT_LIMIT]
+
+
+def run_or_chain(storage, bucket_ids):
+    """Runs the OR-chain query, applying the total size limit in Python as it used to."""
+    with storage.connection_pool.reader() as connection:
+        cursor = connection.execute(
+            or_chain_query(len(bucket_ids)), or_chain_parameters(bucket_ids)
+        )
+        running_size = 0
+        for row in cursor:
+            if running_size >= constants.BULK_CONTENTS_SIZE_LIMIT_BYTES:
+                break
+            running_size += row["contentSizeBytes"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark list_contents_in_data_entity_buckets query plans"
+    )
+    parser.add_argument("--entities", type=int, default=200_000,
+                        help="Number of synthetic entities to store (default: 200000)")
+    parser.add_argument("--labels", type=int, default=200,
+                        help="Number of distinct labels (default: 200)")
+    parser.add_argument("--hours", type=int, default=24 * 7,
+                        help="Number of distinct hourly time buckets (default: 168)")
+    parser.add_argument("--content_bytes", type=int, default=500,
+                        help="Size of each entity's content in bytes (default: 500)")
+    parser.add_argument("--requests", type=int, default=50,
+                        help="Number of requests to issue per query (default: 50)")
+    parser.add_argument("--buckets_per_request", type=int, default=constants.BULK_BUCKETS_COUNT_LIMIT,
+                        help=f"Bucket ids per request (default: {constants.BULK_BUCKETS_COUNT_LIMIT})")
+    parser.add_argument("--db_path", type=str, default=None,
+                        help="Reuse an existing database instead of generating a temporary one")
+    return parser.parse_args()
+
+
+def print_plan(storage, title, query, parameters):
+    print(f"\n{title} query plan:")
+    with storage.connection_pool.reader() as connection:
+        for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", parameters):
+            print(f"  {row['detail']}")
+
+
+def main():
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = args.db_path
+        if db_path is None:
+            db_path = os.path.join(temp_dir, "benchmark.sqlite")
+            print(f"Generating {args.entities} entities into {db_path}...")
+            bucket_ids = generate_database(
+                db_path, args.entities, args.labels, args.hours, args.content_bytes
+            )
+        else:
+            bucket_ids = list_bucket_ids(db_path)
+
+        storage = SqliteMinerStorage(db_path, max_database_size_gb_hint=1024)
+        requests = [
+            random.sample(bucket_ids, min(args.buckets_per_request, len(bucket_ids)))
+            for _ in range(args.requests)
+        ]
+
+        print_plan(
+            storage, "OR-chain", or_chain_query(len(requests[0])), or_chain_parameters(requests[0])
+        )
+        # Capture the statement list_contents_in_data_entity_buckets issues to show its plan.
+        statements = []
+        with storage.connection_pool.reader() as connection:
+            connection.set_trace_callback(statements.append)
+        storage.list_contents_in_data_entity_buckets(requests[0])
+        with storage.connection_pool.reader() as connection:
+            connection.set_trace_callback(None)
+        joined_query = next(statement for statement in statements if "WITH requested" in statement)
+        print_plan(storage, "Joined", joined_query, [])
+
+        print(f"\nIssuing {args.requests} requests of {len(requests[0])} buckets across {len(bucket_ids)} buckets.")
+        for name, run in [
+            ("or-chain", lambda ids: run_or_chain(storage, ids)),
+            ("joined", storage.list_contents_in_data_entity_buckets),
+        ]:
+            latencies = []
+            for bucket_ids_to_request in requests:
+                start = time.perf_counter()
+                run(bucket_ids_to_request)
+                latencies.append(time.perf_counter() - start)
+            print(
+                f"{name:<10} mean={statistics.mean(latencies) * 1000:8.2f}ms "
+                f"p50={statistics.median(latencies) * 1000:8.2f}ms "
+                f"max={max(latencies) * 1000:8.2f}ms"
+            )
+
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""Benchmarks request latency of SqliteMinerStorage against a synthetic database.
+
+Example:
+    python scripts/benchmark_miner_storage.py --entities 200000 --requests 500 --threads 8
+"""
+
+import argparse
+import datetime as dt
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from common.data import (
+    DataEntity,
+    DataEntityBucketId,
+    DataLabel,
+    DataSource,
+    TimeBucket,
+)
+from storage.miner.sqlite_miner_storage import SqliteMinerStorage
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark SqliteMinerStorage request latency")
+    parser.add_argument("--entities", type=int, default=100_000,
+                        help="Number of synthetic entities to store (default: 100000)")
+    parser.add_argument("--labels", type=int, default=50,
+                        help="Number of distinct labels (default: 50)")
+    parser.add_argument("--hours", type=int, default=24 * 7,
+                        help="Number of distinct hourly time buckets (default: 168)")
+    parser.add_argument("--content_bytes", type=int, default=1000,
+                        help="Size of each entity's content in bytes (default: 1000)")
+    parser.add_argument("--requests", type=int, default=500,
+                        help="Number of requests to issue per configuration (default: 500)")
+    parser.add_argument("--threads", type=int, default=8,
+                        help="Number of concurrent request threads (default: 8)")
+    parser.add_argument("--pool_size", type=int, default=8,
+                        help="Reader connections to use for the pooled configuration (default: 8)")
+    parser.add_argument("--db_path", type=str, default=None,
+                        help="Reuse an existing database instead of generating a temporary one")
+    return parser.parse_args()
+
+
+def generate_database(db_path, entities, labels, hours, content_bytes):
+    """Fills a new database with synthetic entities spread across labels and hours. Returns the bucket ids used."""
+    storage = SqliteMinerStorage(db_path, max_database_size_gb_hint=1024)
+    now = dt.datetime.now(tz=dt.timezone.utc)
+    label_values = [f"#label{i}" for i in range(labels)]
+    bucket_ids = set()
+
+    batch = []
+    for i in range(entities):
+        datetime = now - dt.timedelta(hours=random.randrange(hours), seconds=random.randrange(3600))
+        source = DataSource.X if i % 2 else DataSource.REDDIT
+        label = DataLabel(value=random.choice(label_values))
+        batch.append(
+            DataEntity(
+                uri=f"https://example.com/{i}",
+                datetime=datetime,
+                source=source,
+                label=label,
+                content=os.urandom(content_bytes),
+                content_size_bytes=content_bytes,
+            )
+        )
+        bucket_ids.add(
+            DataEntityBucketId(
+                time_bucket=TimeBucket.from_datetime(datetime), source=source, label=label
+            )
+        )
+        if len(batch) == 10_000:
+            storage.store_data_entities(batch)
+            batch = []
+    if batch:
+        storage.store_data_entities(batch)
+
+    storage.close()
+    return list(bucket_ids)
+
+
+def list_bucket_ids(db_path):
+    """Reads the distinct bucket ids out of an existing database."""
+    storage = SqliteMinerStorage(db_path, max_database_size_gb_hint=1024)
+    bucket_ids = [bucket.id for bucket in storage.list_data_entity_buckets()]
+    storage.close()
+    return bucket_ids
+
+
+def run_requests(storage, bucket_ids, requests, threads):
+    """Issues a mix of GetDataEntityBucket and GetContentsByBuckets style reads. Returns per request latencies."""
+
+    def one_request(i):
+        start = time.perf_counter()
+        if i % 2:
+            storage.list_data_entities_in_data_entity_bucket(random.choice(bucket_ids))
+        else:
+            storage.list_contents_in_data_entity_buckets(
+                random.sample(bucket_ids, min(10, len(bucket_ids)))
+            )
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(one_request, range(requests)))
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(
+        f"{name:<12} mean={statistics.mean(latencies) * 1000:8.2f}ms "
+        f"p50={statistics.median(latencies) * 1000:8.2f}ms "
+        f"p99={p99 * 1000:8.2f}ms"
+    )
+
+
+def main():
+    args = parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_path = args.db_path
+        if db_path is None:
+            db_path = os.path.join(temp_dir, "benchmark.sqlite")
+            print(f"Generating {args.entities} entities into {db_path}...")
+            bucket_ids = generate_database(
+                db_path, args.entities, args.labels, args.hours, args.content_bytes
+            )
+        else:
+            bucket_ids = list_bucket_ids(db_path)
+
+        print(f"Issuing {args.requests} requests across {len(bucket_ids)} buckets on {args.threads} threads.")
+        for name, pool_size in [("unpooled", 0), ("pooled", args.pool_size)]:
+            storage = SqliteMinerStorage(
+                db_path, max_database_size_gb_hint=1024, max_reader_connections=pool_size
+            )
+            # Warm up so both configurations start from the same OS page cache state.
+            run_requests(storage, bucket_ids, args.threads, args.threads)
+            report(name, run_requests(storage, bucket_ids, args.requests, args.threads))
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Compares the memory use and latency of the validator storages on synthetic miner indexes.
+
+Example:
+    python scripts/benchmark_validator_storage.py --miners 64 --buckets_per_miner 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from common.data import CompressedEntityBucket, CompressedMinerIndex, DataSource
+from storage.validator.columnar_validator_storage import ColumnarValidatorStorage
+from storage.validator.sqlite_memory_validator_storage import (
+    SqliteMemoryValidatorStorage,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark validator storage memory use and latency")
+    parser.add_argument("--miners", type=int, default=32,
+                        help="Number of miners to store indexes for (default: 32)")
+    parser.add_argument("--buckets_per_miner", type=int, default=50_000,
+                        help="Number of buckets in each miner's index (default: 50000)")
+    parser.add_argument("--labels", type=int, default=2_000,
+                        help="Number of distinct labels across all indexes (default: 2000)")
+    parser.add_argument("--hours", type=int, default=24 * 30,
+                        help="Number of distinct hourly time buckets (default: 720)")
+    parser.add_argument("--storage", type=str, choices=["sqlite_memory", "columnar", "both"], default="both",
+                        help="Which storage to benchmark (default: both)")
+    return parser.parse_args()
+
+
+def generate_index(rng, labels, time_bucket_ids, bucket_count):
+    """Creates an index with bucket_count buckets drawn from the shared label and hour space."""
+    buckets_per_label = min(len(time_bucket_ids), 100)
+    sources = {DataSource.REDDIT.value: [], DataSource.X.value: []}
+    remaining = bucket_count
+    while remaining > 0:
+        count = min(remaining, buckets_per_label)
+        source = rng.choice(list(sources))
+        sources[source].append(
+            CompressedEntityBucket(
+                label=rng.choice(labels),
+                time_bucket_ids=rng.sample(time_bucket_ids, count),
+                sizes_bytes=[rng.randint(1, 100_000) for _ in range(count)],
+            )
+        )
+        remaining -= count
+    return CompressedMinerIndex(sources=sources)
+
+
+def format_latencies(name, latencies):
+    return (
+        f"{name:<8} mean={statistics.mean(latencies) * 1000:9.2f}ms "
+        f"p50={statistics.median(latencies) * 1000:9.2f}ms "
+        f"max={max(latencies) * 1000:9.2f}ms"
+    )
+
+
+def create_storage(storage_name):
+    return (
+        ColumnarValidatorStorage()
+        if storage_name == "columnar"
+        else SqliteMemoryValidatorStorage()
+    )
+
+
+def measure_memory(storage_name, indexes):
+    """Returns the Python heap and SQLite database bytes used to hold all of the indexes."""
+    tracemalloc.start()
+    storage = create_storage(storage_name)
+    for hotkey, index in indexes.items():
+        storage.upsert_compressed_miner_index(index, hotkey, random.random())
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # tracemalloc does not see the pages of the shared in-memory database.
+    database_bytes = storage.read_database_size_bytes() if storage_name == "sqlite_memory" else 0
+    for hotkey in indexes:
+        storage.delete_miner(hotkey)
+    return python_bytes, database_bytes
+
+
+def run(storage_name, indexes):
+    # Memory is measured in a separate pass since tracing allocations slows everything down.
+    python_bytes, database_bytes = measure_memory(storage_name, indexes)
+    storage = create_storage(storage_name)
+
+    upsert_latencies = []
+    for hotkey, index in indexes.items():
+        start = time.perf_counter()
+        storage.upsert_compressed_miner_index(index, hotkey, random.random())
+        upsert_latencies.append(time.perf_counter() - start)
+
+    # Re-upsert everything so that updates of existing indexes are measured too.
+    update_latencies = []
+    for hotkey, index in indexes.items():
+        start = time.perf_counter()
+        storage.upsert_compressed_miner_index(index, hotkey, random.random())
+        update_latencies.append(time.perf_counter() - start)
+
+    read_latencies = []
+    for hotkey in indexes:
+        start = time.perf_counter()
+        storage.read_miner_index(hotkey)
+        read_latencies.append(time.perf_counter() - start)
+
+    print(f"\n{storage_name}:")
+    print(f"  memory: python={python_bytes / 2**20:.1f}MiB database={database_bytes / 2**20:.1f}MiB")
+    print(f"  {format_latencies('insert', upsert_latencies)}")
+    print(f"  {format_latencies('update', update_latencies)}")
+    print(f"  {format_latencies('read', read_latencies)}")
+
+    for hotkey in indexes:
+        storage.delete_miner(hotkey)
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(0)
+    labels = [None] + [f"#label{i}" for i in range(args.labels)]
+    time_bucket_ids = list(range(480_000, 480_000 + args.hours))
+
+    print(f"Generating {args.miners} indexes of {args.buckets_per_miner} buckets...")
+    indexes = {
+        f"hotkey{i}": generate_index(rng, labels, time_bucket_ids, args.buckets_per_miner)
+        for i in range(args.miners)
+    }
+
+    storage_names = ["sqlite_memory", "columnar"] if args.storage == "both" else [args.storage]
+    for storage_name in storage_names:
+        run(storage_name, indexes)
+
+
+if __name__ == "__main__":
+    main()
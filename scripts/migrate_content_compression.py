@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Compresses (or decompresses) the content already stored in a miner database.
+
+Run it with the miner stopped, or alongside a miner started with the matching --neuron.compress_content setting.
+
+Example:
+    python scripts/migrate_content_compression.py --db_path SqliteMinerStorage.sqlite --vacuum
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from storage.miner.sqlite_miner_storage import SqliteMinerStorage
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compress or decompress the content stored in a miner database"
+    )
+    parser.add_argument("--db_path", type=str, required=True,
+                        help="Path to the miner's database")
+    parser.add_argument("--decompress", action="store_true",
+                        help="Store all content uncompressed instead of compressing it")
+    parser.add_argument("--retrain", action="store_true",
+                        help="Train new dictionaries from the current content before compressing")
+    parser.add_argument("--batch_size", type=int, default=1_000,
+                        help="Number of rows to re-encode per transaction (default: 1000)")
+    parser.add_argument("--vacuum", action="store_true",
+                        help="Vacuum the database afterwards to return the freed space to the filesystem")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.db_path):
+        print(f"Error: Database not found at {args.db_path}")
+        sys.exit(1)
+
+    # A large size hint so that opening the database never clears content.
+    storage = SqliteMinerStorage(
+        args.db_path, max_database_size_gb_hint=1024 * 1024, compress_content=not args.decompress
+    )
+    if args.retrain and not args.decompress:
+        codec_ids = storage.train_content_dictionaries()
+        print(f"Trained dictionaries for sources: {sorted(codec_ids)}")
+
+    before = storage.get_stored_content_size_bytes()
+    start = time.perf_counter()
+    migrated_rows = storage.migrate_content_encoding(batch_size=args.batch_size)
+    after = storage.get_stored_content_size_bytes()
+
+    print(f"Re-encoded {migrated_rows} rows in {time.perf_counter() - start:.1f}s.")
+    print(f"Reported content size: {storage.get_content_size_bytes()} bytes.")
+    print(f"Stored content size: {before} -> {after} bytes.")
+    storage.close()
+
+    if args.vacuum:
+        print("Vacuuming database...")
+        connection = sqlite3.connect(args.db_path)
+        connection.execute("VACUUM")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
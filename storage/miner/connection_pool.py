@@ -0,0 +1,128 @@
+import contextlib
+import queue
+import sqlite3
+import threading
+from typing import Iterator
+
+
+class SqliteConnectionPool:
+    """A bounded pool of reader connections plus one dedicated writer connection for a Sqlite database.
+
+    Connections are created lazily, configured once with the per-connection PRAGMAs and then reused across requests,
+    so the connection setup and page cache warmup are only paid for the first time a connection is used.
+
+    Readers are bounded by max_reader_connections. If max_reader_connections is 0, connections are not pooled and a
+    fresh connection is opened and closed for every reader. All writes go through the single writer connection, which
+    is serialized by a reentrant lock so a writer may call back into other writing methods on the same thread.
+
+    Thread safe.
+    """
+
+    def __init__(
+        self,
+        database: str,
+        max_reader_connections: int = 8,
+        mmap_size_bytes: int = 256 * 1024 * 1024,
+        cache_size_kib: int = 32 * 1024,
+        timeout: float = 60.0,
+    ):
+        if max_reader_connections < 0:
+            raise ValueError("max_reader_connections must be non-negative.")
+
+        self.database = database
+        self.max_reader_connections = max_reader_connections
+        self.mmap_size_bytes = mmap_size_bytes
+        self.cache_size_kib = cache_size_kib
+        self.timeout = timeout
+
+        # Idle reader connections. Use a LIFO queue so the most recently used (warmest) connection is reused first.
+        self._idle_readers = queue.LifoQueue()
+        # Bounds the number of reader connections that can be checked out at once.
+        self._reader_slots = threading.BoundedSemaphore(max(1, max_reader_connections))
+
+        self._writer_lock = threading.RLock()
+        self._writer = None
+
+        self._closed = False
+
+    def create_connection(self) -> sqlite3.Connection:
+        """Creates a new, unpooled connection configured with the pool's PRAGMAs. The caller must close it."""
+        # Create the database if it doesn't exist, defaulting to the local directory.
+        # Use PARSE_DECLTYPES to convert accessed values into the appropriate type.
+        # Connections are handed between threads by the pool but are only ever used by one thread at a time.
+        connection = sqlite3.connect(
+            self.database,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            timeout=self.timeout,
+            check_same_thread=False,
+        )
+        # Allow this connection to parse results from returned rows by column name.
+        connection.row_factory = sqlite3.Row
+
+        # Note: cache_size is negative to specify the size in KiB rather than in pages.
+        connection.execute(f"PRAGMA mmap_size={int(self.mmap_size_bytes)}")
+        connection.execute(f"PRAGMA cache_size=-{int(self.cache_size_kib)}")
+        connection.execute("PRAGMA temp_store=MEMORY")
+
+        return connection
+
+    @contextlib.contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Checks out a reader connection for the duration of the context, blocking if all readers are in use."""
+        if self.max_reader_connections == 0:
+            with contextlib.closing(self.create_connection()) as connection:
+                yield connection
+            return
+
+        with self._reader_slots:
+            try:
+                connection = self._idle_readers.get_nowait()
+            except queue.Empty:
+                connection = self.create_connection()
+
+            try:
+                yield connection
+            finally:
+                # Never hand out a connection holding an open transaction, as it would pin the WAL.
+                if connection.in_transaction:
+                    connection.rollback()
+
+                if self._closed:
+                    connection.close()
+                else:
+                    self._idle_readers.put(connection)
+
+    @contextlib.contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Acquires the single writer connection for the duration of the context.
+
+        Any transaction left uncommitted when the context exits with an exception is rolled back.
+        """
+        with self._writer_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("Cannot use a closed connection pool.")
+
+            if self._writer is None:
+                self._writer = self.create_connection()
+
+            try:
+                yield self._writer
+            except BaseException:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+
+    def close(self):
+        """Closes all idle connections. Connections still checked out are closed when they are returned."""
+        self._closed = True
+
+        while True:
+            try:
+                self._idle_readers.get_nowait().close()
+            except queue.Empty:
+                break
+
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -0,0 +1,147 @@
+from collections import Counter
+import re
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+
+# Content stored as provided by the scraper.
+RAW_CODEC = 0
+
+# zlib only uses the last 32KB of a preset dictionary.
+MAX_DICTIONARY_SIZE_BYTES = 32 * 1024
+
+# Fragments of a serialized entity between JSON punctuation and digits, e.g. '"url": "https://x.com/'. These recur
+# across entities of the same source, while ids, timestamps and counts between them do not.
+_FRAGMENT_PATTERN = re.compile(rb"[^{}\[\],0-9]{4,128}")
+
+
+def train_dictionary(
+    samples: Iterable[bytes], size_bytes: int = MAX_DICTIONARY_SIZE_BYTES
+) -> bytes:
+    """Builds a zlib preset dictionary from sample contents of a single source.
+
+    zlib has no dictionary trainer, so this approximates one: the fragments shared by the most samples are packed
+    until the dictionary is full, with the most valuable fragments last where zlib's matches are cheapest.
+    """
+    document_counts = Counter()
+    sample_count = 0
+    for sample in samples:
+        document_counts.update(set(_FRAGMENT_PATTERN.findall(sample)))
+        sample_count += 1
+
+    # A fragment only helps if it recurs, and it is worth as much as the bytes it saves across all samples.
+    fragments = [
+        (count * len(fragment), fragment)
+        for fragment, count in document_counts.items()
+        if count > 1 and count * 10 >= sample_count
+    ]
+    fragments.sort(reverse=True)
+
+    selected = []
+    remaining = size_bytes
+    for _, fragment in fragments:
+        if len(fragment) <= remaining:
+            selected.append(fragment)
+            remaining -= len(fragment)
+
+    return b"".join(reversed(selected))
+
+
+class ContentCodec:
+    """Encodes DataEntity content at rest with zlib and a preset dictionary trained per source.
+
+    Every stored row records the codec it was encoded with: RAW_CODEC, or the id of the ContentDictionary row whose
+    dictionary it was compressed with. Dictionaries are never modified or deleted once added, so rows stay decodable
+    after a source is retrained.
+    """
+
+    CONTENT_DICTIONARY_TABLE_CREATE = """CREATE TABLE IF NOT EXISTS ContentDictionary (
+                                id                  INTEGER         PRIMARY KEY,
+                                source              INTEGER         NOT NULL,
+                                dictionary          BLOB            NOT NULL
+                                )"""
+
+    def __init__(self, compression_level: int = 6):
+        self.compression_level = compression_level
+        self.lock = threading.Lock()
+        # Dictionary by codec id, and the codec id new content from each source is encoded with.
+        self.dictionaries: Dict[int, bytes] = {}
+        self.codec_by_source: Dict[int, int] = {}
+
+    def load(self, connection: sqlite3.Connection):
+        """Loads every dictionary stored in the database."""
+        rows = connection.execute(
+            "SELECT id, source, dictionary FROM ContentDictionary ORDER BY id"
+        ).fetchall()
+        with self.lock:
+            for codec_id, source, dictionary in rows:
+                self.dictionaries[codec_id] = dictionary
+                self.codec_by_source[source] = codec_id
+
+    def add_dictionary(
+        self, connection: sqlite3.Connection, source: int, dictionary: bytes
+    ) -> int:
+        """Stores a new dictionary for the source and makes it the one new content is encoded with.
+
+        The caller is responsible for committing. Returns the codec id of the dictionary.
+        """
+        cursor = connection.execute(
+            "INSERT INTO ContentDictionary (source, dictionary) VALUES (?, ?)",
+            [source, dictionary],
+        )
+        with self.lock:
+            self.dictionaries[cursor.lastrowid] = dictionary
+            self.codec_by_source[source] = cursor.lastrowid
+        return cursor.lastrowid
+
+    def has_dictionary(self, source: int) -> bool:
+        """Returns whether the source has a dictionary to encode content with."""
+        with self.lock:
+            return source in self.codec_by_source
+
+    def codec_for_source(self, source: int) -> int:
+        """Returns the codec new content from the source is encoded with."""
+        with self.lock:
+            return self.codec_by_source.get(source, RAW_CODEC)
+
+    def encode(self, source: int, content: bytes) -> Tuple[int, bytes]:
+        """Encodes content with the source's current dictionary. Returns the codec id and the encoded content."""
+        with self.lock:
+            codec_id = self.codec_by_source.get(source, RAW_CODEC)
+            dictionary = self.dictionaries.get(codec_id)
+        if codec_id == RAW_CODEC:
+            return RAW_CODEC, content
+
+        compressor = zlib.compressobj(self.compression_level, zdict=dictionary)
+        return codec_id, compressor.compress(content) + compressor.flush()
+
+    def decode(self, codec_id: int, content: bytes) -> bytes:
+        """Decodes content stored with the given codec.
+
+        Raises KeyError if the codec's dictionary has not been loaded.
+        """
+        if codec_id == RAW_CODEC:
+            return content
+
+        with self.lock:
+            dictionary = self.dictionaries[codec_id]
+        decompressor = zlib.decompressobj(zdict=dictionary)
+        return decompressor.decompress(content) + decompressor.flush()
+
+    def decode_all(
+        self, connection: sqlite3.Connection, codec_ids: List[int], contents: List[bytes]
+    ) -> List[bytes]:
+        """Decodes many contents, first loading any dictionaries added by other connections since the last load."""
+        with self.lock:
+            missing = any(
+                codec_id != RAW_CODEC and codec_id not in self.dictionaries
+                for codec_id in codec_ids
+            )
+        if missing:
+            self.load(connection)
+        return [
+            self.decode(codec_id, content)
+            for codec_id, content in zip(codec_ids, contents)
+        ]
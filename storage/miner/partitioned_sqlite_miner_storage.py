@@ -0,0 +1,455 @@
+from collections import defaultdict
+import datetime as dt
+import heapq
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import bittensor as bt
+
+from common import constants
+from common.data import DataEntity, DataEntityBucketId, TimeBucket
+from common.utils import ReadWriteLock
+from rewards.data import DataDesirabilityLookup
+from storage.miner.sqlite_miner_storage import SqliteMinerStorage
+
+
+# Time buckets are hours since the epoch so each day partition holds 24 of them.
+TIME_BUCKETS_PER_PARTITION = 24
+
+
+def partition_id_from_time_bucket_id(time_bucket_id: int) -> int:
+    """Returns the id of the day partition that holds the given time bucket."""
+    return time_bucket_id // TIME_BUCKETS_PER_PARTITION
+
+
+class PartitionedSqliteMinerStorage(SqliteMinerStorage):
+    """SqliteMinerStorage that keeps each day of DataEntities in its own database file.
+
+    The directory holds a catalog database, which stores the Hugging Face metadata, and one SqliteMinerStorage per
+    UTC day named DataEntity_<partition id>.sqlite. Expiring a day of data deletes its file instead of running a
+    large DELETE through the WAL, and each request only touches the partitions that hold the buckets it asks for.
+    """
+
+    CATALOG_FILE_NAME = "Catalog.sqlite"
+
+    PARTITION_FILE_PATTERN = re.compile(r"^DataEntity_(\d+)\.sqlite$")
+
+    # Every partition has its own connection pool, so each one gets a fraction of the connections, memory map and
+    # page cache of a single database. A month of partitions then uses about as much as one database did.
+    PARTITION_MAX_READER_CONNECTIONS = 2
+    PARTITION_MMAP_SIZE_BYTES = 16 * 1024 * 1024
+    PARTITION_CACHE_SIZE_KIB = 2 * 1024
+
+    # Tables created in the catalog by earlier versions, which only the partitions use.
+    UNUSED_CATALOG_TABLES = ["DataEntity", "ContentSizeLedger", "BucketSummary", "ContentDictionary"]
+
+    def __init__(
+        self,
+        directory="SqliteMinerStorage.partitions",
+        max_database_size_gb_hint=250,
+        max_reader_connections=8,
+        compress_content=False,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_database_size_gb_hint = max_database_size_gb_hint
+        self.max_reader_connections = max_reader_connections
+
+        # Open partitions by partition id. partitions_mutex guards the dict itself while partitions_lock is held
+        # shared by every operation that uses a partition and exclusively to delete one.
+        self.partitions: Dict[int, SqliteMinerStorage] = {}
+        self.partitions_mutex = threading.Lock()
+        self.partitions_lock = ReadWriteLock()
+
+        super().__init__(
+            os.path.join(directory, PartitionedSqliteMinerStorage.CATALOG_FILE_NAME),
+            max_database_size_gb_hint,
+            max_reader_connections,
+            compress_content,
+        )
+
+        for path in PartitionedSqliteMinerStorage.list_partition_paths(directory):
+            self._get_or_create_partition(self._partition_id_from_path(path))
+
+        self.drop_expired_partitions()
+
+    @staticmethod
+    def list_partition_paths(directory: str) -> List[str]:
+        """Lists the partition database files in the directory, oldest first."""
+        partition_ids = []
+        for file_name in os.listdir(directory):
+            match = PartitionedSqliteMinerStorage.PARTITION_FILE_PATTERN.match(file_name)
+            if match:
+                partition_ids.append(int(match.group(1)))
+
+        return [
+            os.path.join(directory, f"DataEntity_{partition_id}.sqlite")
+            for partition_id in sorted(partition_ids)
+        ]
+
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Creates the catalog, which only holds the Hugging Face metadata. DataEntities live in the partitions."""
+        for table in PartitionedSqliteMinerStorage.UNUSED_CATALOG_TABLES:
+            # Dropping a table also drops its indexes and triggers.
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(SqliteMinerStorage.HF_METADATA_TABLE_CREATE)
+
+    def _load_content_dictionaries(self):
+        # Each partition loads its own dictionaries.
+        pass
+
+    def _partition_id_from_path(self, path: str) -> int:
+        return int(
+            PartitionedSqliteMinerStorage.PARTITION_FILE_PATTERN.match(
+                os.path.basename(path)
+            ).group(1)
+        )
+
+    def _get_or_create_partition(self, partition_id: int) -> SqliteMinerStorage:
+        with self.partitions_mutex:
+            partition = self.partitions.get(partition_id)
+            if partition is None:
+                partition = SqliteMinerStorage(
+                    os.path.join(self.directory, f"DataEntity_{partition_id}.sqlite"),
+                    self.max_database_size_gb_hint,
+                    min(
+                        self.max_reader_connections,
+                        PartitionedSqliteMinerStorage.PARTITION_MAX_READER_CONNECTIONS,
+                    ),
+                    self.compress_content,
+                    mmap_size_bytes=PartitionedSqliteMinerStorage.PARTITION_MMAP_SIZE_BYTES,
+                    cache_size_kib=PartitionedSqliteMinerStorage.PARTITION_CACHE_SIZE_KIB,
+                )
+                partition.data_value_calculator = self.data_value_calculator
+                self.partitions[partition_id] = partition
+            return partition
+
+    def _get_partition(self, partition_id: int) -> Optional[SqliteMinerStorage]:
+        with self.partitions_mutex:
+            return self.partitions.get(partition_id)
+
+    def _list_partitions(self) -> List[Tuple[int, SqliteMinerStorage]]:
+        """Returns every open partition with its id, oldest first."""
+        with self.partitions_mutex:
+            return sorted(self.partitions.items())
+
+    def _drop_partition(self, partition_id: int):
+        """Closes a partition and deletes its files. The caller must hold partitions_lock for writing."""
+        with self.partitions_mutex:
+            partition = self.partitions.pop(partition_id, None)
+        if partition is None:
+            return
+
+        partition.close()
+        for suffix in ["", "-wal", "-shm"]:
+            path = partition.database + suffix
+            if os.path.exists(path):
+                os.remove(path)
+
+        bt.logging.info(f"Dropped partition {partition.database}.")
+
+    def _oldest_retained_partition_id(self) -> int:
+        """Returns the id of the oldest partition that still holds data within the age limit."""
+        return partition_id_from_time_bucket_id(
+            TimeBucket.from_datetime(
+                dt.datetime.now(tz=dt.timezone.utc)
+                - dt.timedelta(days=constants.DATA_ENTITY_BUCKET_AGE_LIMIT_DAYS)
+            ).id
+        )
+
+    def drop_expired_partitions(self) -> int:
+        """Deletes every partition older than the DataEntityBucket age limit. Returns the number deleted."""
+        oldest_retained_partition_id = self._oldest_retained_partition_id()
+        with self.partitions_lock.write():
+            expired_partition_ids = [
+                partition_id
+                for partition_id, _ in self._list_partitions()
+                if partition_id < oldest_retained_partition_id
+            ]
+            for partition_id in expired_partition_ids:
+                self._drop_partition(partition_id)
+        return len(expired_partition_ids)
+
+    def close(self):
+        """Closes all connections to the catalog and to every partition."""
+        for _, partition in self._list_partitions():
+            partition.close()
+        super().close()
+
+    def store_data_entities(self, data_entities: List[DataEntity]):
+        """Stores any number of DataEntities, making space if necessary.
+
+        DataEntities from days that are already past the age limit are not stored.
+        """
+
+        added_content_size = 0
+        for data_entity in data_entities:
+            added_content_size += data_entity.content_size_bytes
+
+        # If the total size of the store is larger than our maximum configured stored content size then except.
+        if added_content_size > self.database_max_content_size_bytes:
+            raise ValueError(
+                "Content size to store: "
+                + str(added_content_size)
+                + " exceeds configured max: "
+                + str(self.database_max_content_size_bytes)
+            )
+
+        oldest_retained_partition_id = self._oldest_retained_partition_id()
+        data_entities_by_partition = defaultdict(list)
+        for data_entity in data_entities:
+            partition_id = partition_id_from_time_bucket_id(
+                TimeBucket.from_datetime(data_entity.datetime).id
+            )
+            if partition_id >= oldest_retained_partition_id:
+                data_entities_by_partition[partition_id].append(data_entity)
+
+        # Ensure only one thread is clearing space when necessary.
+        with self.clearing_space_lock:
+            # Content is compressed by the partitions, so this may clear space slightly before it is needed.
+            current_capacity_bytes = self._get_capacity_bytes()
+            if (
+                current_capacity_bytes + added_content_size
+                > self.database_max_content_size_bytes
+            ):
+                content_bytes_to_clear = (
+                    self.database_max_content_size_bytes // 10
+                    if self.database_max_content_size_bytes // 10 > added_content_size
+                    else added_content_size
+                )
+                self.clear_content_from_oldest(content_bytes_to_clear)
+
+        with self.partitions_lock.read():
+            for partition_id, partition_entities in sorted(
+                data_entities_by_partition.items()
+            ):
+                self._get_or_create_partition(partition_id).store_data_entities(
+                    partition_entities
+                )
+
+    def _get_partition_capacity_bytes(self, partition: SqliteMinerStorage) -> int:
+        """Returns how much of the configured maximum size the partition uses."""
+        if self.compress_content:
+            return partition.get_stored_content_size_bytes()
+        return partition.get_content_size_bytes()
+
+    def _get_capacity_bytes(self) -> int:
+        with self.partitions_lock.read():
+            return sum(
+                self._get_partition_capacity_bytes(partition)
+                for _, partition in self._list_partitions()
+            )
+
+    def get_content_size_bytes(self) -> int:
+        """Returns the total size of all stored content in bytes."""
+        with self.partitions_lock.read():
+            return sum(
+                partition.get_content_size_bytes()
+                for _, partition in self._list_partitions()
+            )
+
+    def get_stored_content_size_bytes(self) -> int:
+        """Returns the total size of all stored content in bytes as it is encoded on disk."""
+        with self.partitions_lock.read():
+            return sum(
+                partition.get_stored_content_size_bytes()
+                for _, partition in self._list_partitions()
+            )
+
+    def reconcile_content_size_ledger(self) -> bool:
+        """Rebuilds the content size ledger and the bucket summary of every partition from its DataEntity table.
+
+        Returns True if any partition had drifted and was corrected.
+        """
+        drifted = False
+        with self.partitions_lock.read():
+            for _, partition in self._list_partitions():
+                drifted = partition.reconcile_content_size_ledger() or drifted
+        return drifted
+
+    def train_content_dictionaries(self, only_missing: bool = False) -> Dict[int, int]:
+        """Trains a compression dictionary for each source in every partition.
+
+        Returns the codec id of each new dictionary by source in the newest partition that trained one.
+        """
+        codec_ids = {}
+        with self.partitions_lock.read():
+            for _, partition in self._list_partitions():
+                codec_ids.update(partition.train_content_dictionaries(only_missing))
+        return codec_ids
+
+    def migrate_content_encoding(self, batch_size: int = 1_000) -> int:
+        """Re-encodes the content of every partition. Returns the number of rows re-encoded."""
+        with self.partitions_lock.read():
+            return sum(
+                partition.migrate_content_encoding(batch_size)
+                for _, partition in self._list_partitions()
+            )
+
+    def update_desirability_lookup(self, lookup: DataDesirabilityLookup):
+        """Sets the desirability lookup used to choose which content to clear first when full."""
+        super().update_desirability_lookup(lookup)
+        for _, partition in self._list_partitions():
+            partition.data_value_calculator = self.data_value_calculator
+
+    def get_earliest_data_datetime(self, source):
+        with self.partitions_lock.read():
+            for _, partition in self._list_partitions():
+                earliest_datetime = partition.get_earliest_data_datetime(source)
+                if earliest_datetime is not None:
+                    return earliest_datetime
+        return None
+
+    def list_data_entities_in_data_entity_bucket(
+        self, data_entity_bucket_id: DataEntityBucketId
+    ) -> List[DataEntity]:
+        """Lists from storage all DataEntities matching the provided DataEntityBucketId."""
+        with self.partitions_lock.read():
+            partition = self._get_partition(
+                partition_id_from_time_bucket_id(data_entity_bucket_id.time_bucket.id)
+            )
+            if partition is None:
+                return []
+            return partition.list_data_entities_in_data_entity_bucket(
+                data_entity_bucket_id
+            )
+
+    def refresh_compressed_index(self, time_delta: dt.timedelta):
+        """Refreshes the compressed MinerIndex, first deleting any partitions that have expired."""
+        self.drop_expired_partitions()
+        super().refresh_compressed_index(time_delta)
+
+    def _list_largest_buckets(
+        self, oldest_time_bucket_id: int, limit: int
+    ) -> List[sqlite3.Row]:
+        """Lists the largest DataEntityBuckets no older than the given time bucket across all partitions."""
+        oldest_partition_id = partition_id_from_time_bucket_id(oldest_time_bucket_id)
+        rows = []
+        with self.partitions_lock.read():
+            for partition_id, partition in self._list_partitions():
+                if partition_id >= oldest_partition_id:
+                    rows.extend(
+                        partition._list_largest_buckets(oldest_time_bucket_id, limit)
+                    )
+        return heapq.nlargest(limit, rows, key=lambda row: row["bucketSize"])
+
+    def _list_contents_in_data_entity_buckets(
+        self,
+        data_entity_bucket_ids: List[DataEntityBucketId],
+        size_limit_bytes: int,
+        count_limit: int,
+    ) -> Tuple[Dict[DataEntityBucketId, List[bytes]], int, int]:
+        """Lists contents for each requested DataEntityBucketId up to the given overall size and count limits.
+
+        Partitions are read oldest first, each with whatever is left of the limits, which matches the order a single
+        database applies them in.
+        """
+        bucket_ids_by_partition = defaultdict(list)
+        for bucket_id in data_entity_bucket_ids:
+            bucket_ids_by_partition[
+                partition_id_from_time_bucket_id(bucket_id.time_bucket.id)
+            ].append(bucket_id)
+
+        buckets_ids_to_contents = defaultdict(list)
+        total_size = 0
+        total_count = 0
+        with self.partitions_lock.read():
+            for partition_id, bucket_ids in sorted(bucket_ids_by_partition.items()):
+                if total_size >= size_limit_bytes or total_count >= count_limit:
+                    break
+
+                partition = self._get_partition(partition_id)
+                if partition is None:
+                    continue
+
+                contents, size, count = partition._list_contents_in_data_entity_buckets(
+                    bucket_ids, size_limit_bytes - total_size, count_limit - total_count
+                )
+                # Each bucket lives in a single partition so the results never overlap.
+                buckets_ids_to_contents.update(contents)
+                total_size += size
+                total_count += count
+
+        return buckets_ids_to_contents, total_size, total_count
+
+    def clear_content_from_oldest(self, content_bytes_to_clear: int):
+        """Deletes entries until we have cleared the specified amount of content.
+
+        Without a desirability lookup whole partitions are deleted oldest first, falling back to clearing the oldest
+        time buckets within a partition for the remainder. With a lookup the DataEntityBuckets worth the least per
+        byte across all partitions are cleared first.
+        """
+
+        bt.logging.debug(f"Database full. Clearing {content_bytes_to_clear} bytes.")
+
+        if self.data_value_calculator is None:
+            self._clear_oldest_partitions(content_bytes_to_clear)
+        else:
+            self._clear_least_desirable_partition_buckets(content_bytes_to_clear)
+
+    def _clear_oldest_partitions(self, content_bytes_to_clear: int):
+        cleared_bytes = 0
+        # Hold the lock for writing throughout, so that no partition is created or dropped between listing the
+        # partitions and measuring or dropping them.
+        with self.partitions_lock.write():
+            for partition_id, partition in self._list_partitions():
+                if cleared_bytes >= content_bytes_to_clear:
+                    return
+
+                partition_bytes = self._get_partition_capacity_bytes(partition)
+                if partition_bytes > content_bytes_to_clear - cleared_bytes:
+                    partition.clear_content_from_oldest(
+                        content_bytes_to_clear - cleared_bytes
+                    )
+                    return
+
+                self._drop_partition(partition_id)
+                cleared_bytes += partition_bytes
+
+    def _clear_least_desirable_partition_buckets(self, content_bytes_to_clear: int):
+        with self.partitions_lock.read():
+            partitions = self._list_partitions()
+            ranked_buckets = []
+            for partition_id, partition in partitions:
+                with partition.connection_pool.reader() as connection:
+                    ranked_buckets.extend(
+                        bucket + (partition_id,)
+                        for bucket in partition._rank_buckets_by_value(connection)
+                    )
+            ranked_buckets.sort(key=lambda bucket: (bucket[0], bucket[1]))
+
+            cleared_bytes = 0
+            for _, time_bucket_id, source, label, bucket_size, partition_id in ranked_buckets:
+                if cleared_bytes >= content_bytes_to_clear:
+                    break
+                partition = self._get_partition(partition_id)
+                with partition.connection_pool.writer() as connection:
+                    partition._delete_in_batches(
+                        connection,
+                        "timeBucketId = ? AND source = ? AND label = ?",
+                        [time_bucket_id, source, label],
+                    )
+                cleared_bytes += bucket_size
+
+            empty_partition_ids = []
+            for partition_id, partition in partitions:
+                with partition.connection_pool.reader() as connection:
+                    cursor = connection.execute("SELECT 1 FROM ContentSizeLedger LIMIT 1")
+                    if cursor.fetchone() is None:
+                        empty_partition_ids.append(partition_id)
+
+        # Partitions that were emptied are deleted entirely, unless they were dropped or written to in the meantime.
+        if empty_partition_ids:
+            with self.partitions_lock.write():
+                for partition_id in empty_partition_ids:
+                    partition = self._get_partition(partition_id)
+                    if partition is None:
+                        continue
+                    with partition.connection_pool.reader() as connection:
+                        cursor = connection.execute("SELECT 1 FROM ContentSizeLedger LIMIT 1")
+                        if cursor.fetchone() is not None:
+                            continue
+                    self._drop_partition(partition_id)
@@ -1,5 +1,7 @@
 from collections import defaultdict
+import gzip
 import threading
+import time
 from common import constants, utils
 from common.data import (
     CompressedEntityBucket,
@@ -12,8 +14,12 @@ from common.data import (
     TimeBucket,
     HuggingFaceMetadata,
 )
+from rewards.data import DataDesirabilityLookup
+from rewards.data_value_calculator import DataValueCalculator
+from storage.miner.connection_pool import SqliteConnectionPool
+from storage.miner.content_codec import RAW_CODEC, ContentCodec, train_dictionary
 from storage.miner.miner_storage import MinerStorage
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import datetime as dt
 import sqlite3
 import contextlib
@@ -56,6 +62,33 @@ def tz_aware_timestamp_adapter(val):
     return val
 
 
+class SerializedMinerIndex:
+    """A CompressedMinerIndex serialized once at refresh time so it can be returned to many validators.
+
+    Attributes:
+        json: The index serialized as it is sent in GetMinerIndex.compressed_index_serialized.
+        size_bytes: The total size of all buckets in the index.
+        bucket_count: The number of buckets in the index.
+        serialization_seconds: How long serializing the index took.
+    """
+
+    __slots__ = "json", "size_bytes", "bucket_count", "serialization_seconds", "_gzip"
+
+    def __init__(self, compressed_index: CompressedMinerIndex):
+        start = time.perf_counter()
+        self.json = compressed_index.model_dump_json()
+        self.serialization_seconds = time.perf_counter() - start
+        self.size_bytes = CompressedMinerIndex.size_bytes(compressed_index)
+        self.bucket_count = CompressedMinerIndex.bucket_count(compressed_index)
+        self._gzip = None
+
+    def gzip(self) -> bytes:
+        """Returns the serialized index gzip compressed. Compressed on first use and cached thereafter."""
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.json.encode("utf-8"), compresslevel=6)
+        return self._gzip
+
+
 class SqliteMinerStorage(MinerStorage):
     """Sqlite backed MinerStorage"""
 
@@ -68,7 +101,8 @@ class SqliteMinerStorage(MinerStorage):
                                 source              INTEGER         NOT NULL,
                                 label               CHAR(32)                ,
                                 content             BLOB            NOT NULL,
-                                contentSizeBytes    INTEGER         NOT NULL
+                                contentSizeBytes    INTEGER         NOT NULL,
+                                contentCodec        INTEGER         NOT NULL    DEFAULT 0
                                 ) WITHOUT ROWID"""
 
     DELETE_OLD_INDEX = """DROP INDEX IF EXISTS data_entity_bucket_index"""
@@ -76,6 +110,117 @@ class SqliteMinerStorage(MinerStorage):
     DATA_ENTITY_TABLE_INDEX = """CREATE INDEX IF NOT EXISTS data_entity_bucket_index2
                                 ON DataEntity (timeBucketId, source, label, contentSizeBytes)"""
 
+    # Lets the Hugging Face export read the entities of a source in (datetime, uri) order, one page at a time.
+    DATA_ENTITY_EXPORT_INDEX = """CREATE INDEX IF NOT EXISTS data_entity_export_index
+                                ON DataEntity (source, datetime, uri)"""
+
+    # Running total of content size per (timeBucketId, source), kept in sync with DataEntity by the triggers below.
+    # contentSizeBytes is the size reported to validators and storedSizeBytes is the size of the content on disk.
+    CONTENT_SIZE_LEDGER_TABLE_CREATE = """CREATE TABLE IF NOT EXISTS ContentSizeLedger (
+                                timeBucketId        INTEGER         NOT NULL,
+                                source              INTEGER         NOT NULL,
+                                contentSizeBytes    INTEGER         NOT NULL,
+                                entityCount         INTEGER         NOT NULL,
+                                storedSizeBytes     INTEGER         NOT NULL    DEFAULT 0,
+                                PRIMARY KEY (timeBucketId, source)
+                                ) WITHOUT ROWID"""
+
+    CONTENT_SIZE_LEDGER_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS content_size_ledger_insert
+                                AFTER INSERT ON DataEntity
+                                BEGIN
+                                    INSERT INTO ContentSizeLedger (timeBucketId, source, contentSizeBytes, entityCount, storedSizeBytes)
+                                    VALUES (NEW.timeBucketId, NEW.source, NEW.contentSizeBytes, 1, LENGTH(NEW.content))
+                                    ON CONFLICT (timeBucketId, source) DO UPDATE SET
+                                        contentSizeBytes = contentSizeBytes + excluded.contentSizeBytes,
+                                        entityCount = entityCount + 1,
+                                        storedSizeBytes = storedSizeBytes + excluded.storedSizeBytes;
+                                END"""
+
+    CONTENT_SIZE_LEDGER_DELETE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS content_size_ledger_delete
+                                AFTER DELETE ON DataEntity
+                                BEGIN
+                                    UPDATE ContentSizeLedger SET
+                                        contentSizeBytes = contentSizeBytes - OLD.contentSizeBytes,
+                                        entityCount = entityCount - 1,
+                                        storedSizeBytes = storedSizeBytes - LENGTH(OLD.content)
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source;
+                                    DELETE FROM ContentSizeLedger
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source AND entityCount <= 0;
+                                END"""
+
+    CONTENT_SIZE_LEDGER_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS content_size_ledger_update
+                                AFTER UPDATE OF timeBucketId, source, contentSizeBytes, content ON DataEntity
+                                BEGIN
+                                    UPDATE ContentSizeLedger SET
+                                        contentSizeBytes = contentSizeBytes - OLD.contentSizeBytes,
+                                        entityCount = entityCount - 1,
+                                        storedSizeBytes = storedSizeBytes - LENGTH(OLD.content)
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source;
+                                    DELETE FROM ContentSizeLedger
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source AND entityCount <= 0;
+                                    INSERT INTO ContentSizeLedger (timeBucketId, source, contentSizeBytes, entityCount, storedSizeBytes)
+                                    VALUES (NEW.timeBucketId, NEW.source, NEW.contentSizeBytes, 1, LENGTH(NEW.content))
+                                    ON CONFLICT (timeBucketId, source) DO UPDATE SET
+                                        contentSizeBytes = contentSizeBytes + excluded.contentSizeBytes,
+                                        entityCount = entityCount + 1,
+                                        storedSizeBytes = storedSizeBytes + excluded.storedSizeBytes;
+                                END"""
+
+    # Size of each DataEntityBucket, kept in sync with DataEntity by the triggers below.
+    BUCKET_SUMMARY_TABLE_CREATE = """CREATE TABLE IF NOT EXISTS BucketSummary (
+                                timeBucketId        INTEGER         NOT NULL,
+                                source              INTEGER         NOT NULL,
+                                label               CHAR(32)        NOT NULL,
+                                contentSizeBytes    INTEGER         NOT NULL,
+                                entityCount         INTEGER         NOT NULL,
+                                storedSizeBytes     INTEGER         NOT NULL    DEFAULT 0,
+                                PRIMARY KEY (timeBucketId, source, label)
+                                ) WITHOUT ROWID"""
+
+    BUCKET_SUMMARY_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_summary_insert
+                                AFTER INSERT ON DataEntity
+                                BEGIN
+                                    INSERT INTO BucketSummary (timeBucketId, source, label, contentSizeBytes, entityCount, storedSizeBytes)
+                                    VALUES (NEW.timeBucketId, NEW.source, NEW.label, NEW.contentSizeBytes, 1, LENGTH(NEW.content))
+                                    ON CONFLICT (timeBucketId, source, label) DO UPDATE SET
+                                        contentSizeBytes = contentSizeBytes + excluded.contentSizeBytes,
+                                        entityCount = entityCount + 1,
+                                        storedSizeBytes = storedSizeBytes + excluded.storedSizeBytes;
+                                END"""
+
+    BUCKET_SUMMARY_DELETE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_summary_delete
+                                AFTER DELETE ON DataEntity
+                                BEGIN
+                                    UPDATE BucketSummary SET
+                                        contentSizeBytes = contentSizeBytes - OLD.contentSizeBytes,
+                                        entityCount = entityCount - 1,
+                                        storedSizeBytes = storedSizeBytes - LENGTH(OLD.content)
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source AND label = OLD.label;
+                                    DELETE FROM BucketSummary
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source AND label = OLD.label
+                                        AND entityCount <= 0;
+                                END"""
+
+    # Overwritten or re-encoded entities move their old size out of the old bucket and their new size into the new bucket.
+    BUCKET_SUMMARY_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_summary_update
+                                AFTER UPDATE OF timeBucketId, source, label, contentSizeBytes, content ON DataEntity
+                                BEGIN
+                                    UPDATE BucketSummary SET
+                                        contentSizeBytes = contentSizeBytes - OLD.contentSizeBytes,
+                                        entityCount = entityCount - 1,
+                                        storedSizeBytes = storedSizeBytes - LENGTH(OLD.content)
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source AND label = OLD.label;
+                                    DELETE FROM BucketSummary
+                                    WHERE timeBucketId = OLD.timeBucketId AND source = OLD.source AND label = OLD.label
+                                        AND entityCount <= 0;
+                                    INSERT INTO BucketSummary (timeBucketId, source, label, contentSizeBytes, entityCount, storedSizeBytes)
+                                    VALUES (NEW.timeBucketId, NEW.source, NEW.label, NEW.contentSizeBytes, 1, LENGTH(NEW.content))
+                                    ON CONFLICT (timeBucketId, source, label) DO UPDATE SET
+                                        contentSizeBytes = contentSizeBytes + excluded.contentSizeBytes,
+                                        entityCount = entityCount + 1,
+                                        storedSizeBytes = storedSizeBytes + excluded.storedSizeBytes;
+                                END"""
+
     HF_METADATA_TABLE_CREATE = """CREATE TABLE IF NOT EXISTS HFMetaData (
                                 uri                 TEXT            PRIMARY KEY,
                                 source              INTEGER         NOT NULL,
@@ -83,62 +228,131 @@ class SqliteMinerStorage(MinerStorage):
                                 encodingKey         TEXT
                                 ) WITHOUT ROWID"""
 
+    # The number of recent entities per source used to train a content compression dictionary.
+    DICTIONARY_TRAINING_SAMPLE_COUNT = 1_000
+
+    # The fewest entities a dictionary is trained from. Until then content from the source is stored uncompressed.
+    MIN_DICTIONARY_TRAINING_SAMPLE_COUNT = 100
+
     def __init__(
         self,
         database="SqliteMinerStorage.sqlite",
         max_database_size_gb_hint=250,
+        max_reader_connections=8,
+        compress_content=False,
+        mmap_size_bytes=256 * 1024 * 1024,
+        cache_size_kib=32 * 1024,
     ):
         sqlite3.register_converter("timestamp", tz_aware_timestamp_adapter)
         self.database = database
 
+        # When enabled new content is compressed with a dictionary per source and space is managed by the size of
+        # the content on disk. Content is always decoded on the way out, whether or not this is enabled.
+        self.compress_content = compress_content
+        self.content_codec = ContentCodec()
+        self.capacity_size_column = (
+            "storedSizeBytes" if compress_content else "contentSizeBytes"
+        )
+
+        # Reuse connections across requests instead of opening a new one for every call.
+        # Reads go through a bounded pool of readers and all writes go through a single writer connection.
+        self.connection_pool = SqliteConnectionPool(
+            database,
+            max_reader_connections=max_reader_connections,
+            mmap_size_bytes=mmap_size_bytes,
+            cache_size_kib=cache_size_kib,
+        )
+
         # TODO Account for non-content columns when restricting total database size.
         self.database_max_content_size_bytes = utils.gb_to_bytes(
             max_database_size_gb_hint
         )
 
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.writer() as connection:
             cursor = connection.cursor()
 
-            # Create the DataEntity table (if it does not already exist).
-            cursor.execute(SqliteMinerStorage.DATA_ENTITY_TABLE_CREATE)
-
-            # Delete the old index (if it exists).
-            cursor.execute(SqliteMinerStorage.DELETE_OLD_INDEX)
+            self._create_schema(cursor)
 
-            # Create the Index (if it does not already exist).
-            cursor.execute(SqliteMinerStorage.DATA_ENTITY_TABLE_INDEX)
-
-            # Create the huggingface table to store HF Info
-            cursor.execute(SqliteMinerStorage.HF_METADATA_TABLE_CREATE)
             # Use Write Ahead Logging to avoid blocking reads.
-            cursor.execute("pragma journal_mode=wal")
+            cursor.execute("pragma journal_mode=wal").fetchone()
 
         # Update the HFMetaData for miners who created this table in previous versions
         self._ensure_hf_metadata_schema()
+
+        # Backfill the ledger and bucket summary for databases created in previous versions and correct any drift.
+        self.reconcile_content_size_ledger()
+
+        self._load_content_dictionaries()
+        if compress_content:
+            self.train_content_dictionaries(only_missing=True)
+
         # Lock to avoid concurrency issues on clearing space when full.
         self.clearing_space_lock = threading.Lock()
 
+        # Number of rows to delete per transaction when clearing space.
+        self.eviction_batch_size = 10_000
+
+        # Used to clear the least valuable content first when full. Until a lookup is set the oldest content is cleared.
+        self.data_value_calculator = None
+
         # Lock around the refresh for the index.
         self.cached_index_refresh_lock = threading.Lock()
 
         # Lock around the cached get miner index.
         self.cached_index_lock = threading.Lock()
         self.cached_index_4 = None
+        self.cached_index_4_serialized = None
         self.cached_index_updated = dt.datetime.min
+        # Total time saved by serving the pre-serialized index instead of serializing it per request.
+        self.index_serialization_seconds_saved = 0.0
+
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Creates the tables, indexes and triggers that do not exist yet."""
+        # Create the DataEntity table (if it does not already exist).
+        cursor.execute(SqliteMinerStorage.DATA_ENTITY_TABLE_CREATE)
+
+        # Delete the old index (if it exists).
+        cursor.execute(SqliteMinerStorage.DELETE_OLD_INDEX)
+
+        # Create the Index (if it does not already exist).
+        cursor.execute(SqliteMinerStorage.DATA_ENTITY_TABLE_INDEX)
+        cursor.execute(SqliteMinerStorage.DATA_ENTITY_EXPORT_INDEX)
+
+        # Create the content size ledger and bucket summary, and add any columns missing from previous versions.
+        cursor.execute(SqliteMinerStorage.CONTENT_SIZE_LEDGER_TABLE_CREATE)
+        cursor.execute(SqliteMinerStorage.BUCKET_SUMMARY_TABLE_CREATE)
+        self._ensure_content_schema(cursor)
+
+        # Create the triggers that maintain the ledger (if they do not already exist).
+        cursor.execute(SqliteMinerStorage.CONTENT_SIZE_LEDGER_INSERT_TRIGGER)
+        cursor.execute(SqliteMinerStorage.CONTENT_SIZE_LEDGER_DELETE_TRIGGER)
+        cursor.execute(SqliteMinerStorage.CONTENT_SIZE_LEDGER_UPDATE_TRIGGER)
+
+        # Create the triggers that maintain the bucket summary (if they do not already exist).
+        cursor.execute(SqliteMinerStorage.BUCKET_SUMMARY_INSERT_TRIGGER)
+        cursor.execute(SqliteMinerStorage.BUCKET_SUMMARY_DELETE_TRIGGER)
+        cursor.execute(SqliteMinerStorage.BUCKET_SUMMARY_UPDATE_TRIGGER)
+
+        # Create the table of content compression dictionaries.
+        cursor.execute(ContentCodec.CONTENT_DICTIONARY_TABLE_CREATE)
+
+        # Create the huggingface table to store HF Info
+        cursor.execute(SqliteMinerStorage.HF_METADATA_TABLE_CREATE)
+
+    def _load_content_dictionaries(self):
+        with self.connection_pool.reader() as connection:
+            self.content_codec.load(connection)
 
     def _create_connection(self):
-        # Create the database if it doesn't exist, defaulting to the local directory.
-        # Use PARSE_DECLTYPES to convert accessed values into the appropriate type.
-        connection = sqlite3.connect(
-            self.database, detect_types=sqlite3.PARSE_DECLTYPES, timeout=60.0
-        )
-        # Allow this connection to parse results from returned rows by column name.
-        connection.row_factory = sqlite3.Row
+        """Creates a new unpooled connection. Prefer self.connection_pool for regular reads and writes."""
+        return self.connection_pool.create_connection()
 
-        return connection
+    def close(self):
+        """Closes all pooled connections to the database."""
+        self.connection_pool.close()
 
     def _ensure_hf_metadata_schema(self):
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.writer() as connection:
             cursor = connection.cursor()
 
             # Check if the encodingKey column exists
@@ -152,6 +366,31 @@ class SqliteMinerStorage(MinerStorage):
 
             connection.commit()
 
+    def _ensure_content_schema(self, cursor: sqlite3.Cursor):
+        """Adds the content encoding columns to tables created in previous versions."""
+        cursor.execute("PRAGMA table_info(DataEntity)")
+        if "contentCodec" not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute(
+                "ALTER TABLE DataEntity ADD COLUMN contentCodec INTEGER NOT NULL DEFAULT 0"
+            )
+            bt.logging.info("Added contentCodec column to DataEntity table")
+
+        for table, trigger_prefix in [
+            ("ContentSizeLedger", "content_size_ledger"),
+            ("BucketSummary", "bucket_summary"),
+        ]:
+            cursor.execute(f"PRAGMA table_info({table})")
+            if "storedSizeBytes" in [column[1] for column in cursor.fetchall()]:
+                continue
+
+            # The previous triggers do not maintain the new column so they are replaced. Reconciling fills it in.
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN storedSizeBytes INTEGER NOT NULL DEFAULT 0"
+            )
+            for operation in ["insert", "delete", "update"]:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {trigger_prefix}_{operation}")
+            bt.logging.info(f"Added storedSizeBytes column to {table} table")
+
     def store_data_entities(self, data_entities: List[DataEntity]):
         """Stores any number of DataEntities, making space if necessary."""
 
@@ -168,37 +407,28 @@ class SqliteMinerStorage(MinerStorage):
                 + str(self.database_max_content_size_bytes)
             )
 
-        with contextlib.closing(self._create_connection()) as connection:
-            # Ensure only one thread is clearing space when necessary.
-            with self.clearing_space_lock:
-                # If we would exceed our maximum configured stored content size then clear space.
-                cursor = connection.cursor()
-                cursor.execute("SELECT SUM(contentSizeBytes) FROM DataEntity")
-
-                # If there are no rows we convert the None result to 0
-                result = cursor.fetchone()
-                current_content_size = result[0] if result[0] else 0
-
-                if (
-                    current_content_size + added_content_size
-                    > self.database_max_content_size_bytes
-                ):
-                    content_bytes_to_clear = (
-                        self.database_max_content_size_bytes // 10
-                        if self.database_max_content_size_bytes // 10
-                        > added_content_size
-                        else added_content_size
-                    )
-                    self.clear_content_from_oldest(content_bytes_to_clear)
+        with self.connection_pool.writer() as connection:
+            cursor = connection.cursor()
+            if self.compress_content:
+                self._train_missing_dictionaries(connection, data_entities)
 
             # Parse every DataEntity into an list of value lists for inserting.
             values = []
+            added_capacity_bytes = 0
 
             for data_entity in data_entities:
                 label = (
                     "NULL" if (data_entity.label is None) else data_entity.label.value
                 )
                 time_bucket_id = TimeBucket.from_datetime(data_entity.datetime).id
+                codec_id, content = self.content_codec.encode(
+                    data_entity.source, data_entity.content
+                )
+                added_capacity_bytes += (
+                    len(content)
+                    if self.compress_content
+                    else data_entity.content_size_bytes
+                )
                 values.append(
                     [
                         data_entity.uri,
@@ -206,19 +436,255 @@ class SqliteMinerStorage(MinerStorage):
                         time_bucket_id,
                         data_entity.source,
                         label,
-                        data_entity.content,
+                        content,
                         data_entity.content_size_bytes,
+                        codec_id,
                     ]
                 )
 
+            # Ensure only one thread is clearing space when necessary.
+            with self.clearing_space_lock:
+                # If we would exceed our maximum configured stored content size then clear space.
+                current_capacity_bytes = self._get_content_size_bytes(
+                    cursor, self.capacity_size_column
+                )
+
+                if (
+                    current_capacity_bytes + added_capacity_bytes
+                    > self.database_max_content_size_bytes
+                ):
+                    content_bytes_to_clear = (
+                        self.database_max_content_size_bytes // 10
+                        if self.database_max_content_size_bytes // 10
+                        > added_capacity_bytes
+                        else added_capacity_bytes
+                    )
+                    self.clear_content_from_oldest(content_bytes_to_clear)
+
             # Insert overwriting duplicate keys (in case of updated content).
-            cursor.executemany("REPLACE INTO DataEntity VALUES (?,?,?,?,?,?,?)", values)
+            # An UPSERT rather than REPLACE so the ledger triggers see overwrites as updates.
+            cursor.executemany(
+                """INSERT INTO DataEntity
+                    (uri, datetime, timeBucketId, source, label, content, contentSizeBytes, contentCodec)
+                    VALUES (?,?,?,?,?,?,?,?)
+                    ON CONFLICT (uri) DO UPDATE SET
+                        datetime = excluded.datetime,
+                        timeBucketId = excluded.timeBucketId,
+                        source = excluded.source,
+                        label = excluded.label,
+                        content = excluded.content,
+                        contentSizeBytes = excluded.contentSizeBytes,
+                        contentCodec = excluded.contentCodec""",
+                values,
+            )
 
             # Commit the insert.
             connection.commit()
 
+    def _get_content_size_bytes(
+        self, cursor: sqlite3.Cursor, size_column: str = "contentSizeBytes"
+    ) -> int:
+        """Returns the total of the given size column from the ledger using the provided cursor."""
+        cursor.execute(f"SELECT SUM({size_column}) FROM ContentSizeLedger")
+
+        # If there are no rows we convert the None result to 0
+        result = cursor.fetchone()
+        return result[0] if result[0] else 0
+
+    def get_content_size_bytes(self) -> int:
+        """Returns the total size of all stored content in bytes."""
+        with self.connection_pool.reader() as connection:
+            return self._get_content_size_bytes(connection.cursor())
+
+    def get_stored_content_size_bytes(self) -> int:
+        """Returns the total size of all stored content in bytes as it is encoded on disk."""
+        with self.connection_pool.reader() as connection:
+            return self._get_content_size_bytes(
+                connection.cursor(), "storedSizeBytes"
+            )
+
+    def reconcile_content_size_ledger(self) -> bool:
+        """Rebuilds the content size ledger and the bucket summary from the DataEntity table.
+
+        Returns True if either had drifted from the stored content and was corrected.
+        """
+        with self.connection_pool.writer() as connection:
+            # Hold the write lock across the comparison and rebuild so no store can interleave.
+            connection.execute("BEGIN IMMEDIATE")
+            cursor = connection.cursor()
+
+            # A single pass over DataEntity provides both the bucket summary and the ledger. LENGTH is answered from
+            # the record header so the content itself is not read.
+            cursor.execute(
+                """SELECT timeBucketId, source, label, SUM(contentSizeBytes), COUNT(*), SUM(LENGTH(content))
+                    FROM DataEntity
+                    GROUP BY timeBucketId, source, label"""
+            )
+            expected_summary = set(tuple(row) for row in cursor.fetchall())
+
+            ledger_totals = defaultdict(lambda: [0, 0, 0])
+            for time_bucket_id, source, _, size, count, stored_size in expected_summary:
+                totals = ledger_totals[(time_bucket_id, source)]
+                totals[0] += size
+                totals[1] += count
+                totals[2] += stored_size
+            expected_ledger = set(
+                (time_bucket_id, source, size, count, stored_size)
+                for (time_bucket_id, source), (size, count, stored_size) in ledger_totals.items()
+            )
+
+            drifted = False
+            for table, columns, expected in [
+                (
+                    "BucketSummary",
+                    "timeBucketId, source, label, contentSizeBytes, entityCount, storedSizeBytes",
+                    expected_summary,
+                ),
+                (
+                    "ContentSizeLedger",
+                    "timeBucketId, source, contentSizeBytes, entityCount, storedSizeBytes",
+                    expected_ledger,
+                ),
+            ]:
+                cursor.execute(f"SELECT {columns} FROM {table}")
+                actual = set(tuple(row) for row in cursor.fetchall())
+                if expected == actual:
+                    continue
+
+                drifted = True
+                bt.logging.warning(
+                    f"{table} out of date on {len(expected ^ actual)} entries. Rebuilding from DataEntity."
+                )
+                cursor.execute(f"DELETE FROM {table}")
+                if expected:
+                    placeholders = ",".join("?" * len(next(iter(expected))))
+                    cursor.executemany(
+                        f"INSERT INTO {table} ({columns}) VALUES ({placeholders})",
+                        expected,
+                    )
+
+            connection.commit()
+            return drifted
+
+    def train_content_dictionaries(self, only_missing: bool = False) -> Dict[int, int]:
+        """Trains a compression dictionary for each source from a sample of its most recent content.
+
+        New content is compressed with the new dictionaries. Existing content keeps the dictionary it was compressed
+        with until it is migrated. Returns the codec id of each new dictionary by source.
+        """
+        codec_ids = {}
+        with self.connection_pool.writer() as connection:
+            sources = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT DISTINCT source FROM ContentSizeLedger"
+                ).fetchall()
+            ]
+            for source in sources:
+                if only_missing and self.content_codec.has_dictionary(source):
+                    continue
+
+                rows = connection.execute(
+                    """SELECT contentCodec, content FROM DataEntity WHERE source = ?
+                        ORDER BY timeBucketId DESC LIMIT ?""",
+                    [source, SqliteMinerStorage.DICTIONARY_TRAINING_SAMPLE_COUNT],
+                ).fetchall()
+                if len(rows) < SqliteMinerStorage.MIN_DICTIONARY_TRAINING_SAMPLE_COUNT:
+                    continue
+
+                samples = self.content_codec.decode_all(
+                    connection, [row[0] for row in rows], [row[1] for row in rows]
+                )
+                codec_ids[source] = self.content_codec.add_dictionary(
+                    connection, source, train_dictionary(samples)
+                )
+                bt.logging.info(
+                    f"Trained content dictionary {codec_ids[source]} for source {source} from {len(samples)} samples."
+                )
+
+            connection.commit()
+        return codec_ids
+
+    def _train_missing_dictionaries(
+        self, connection: sqlite3.Connection, data_entities: List[DataEntity]
+    ):
+        """Trains a dictionary from the batch for each source that does not have one yet, if the batch is large enough."""
+        samples_by_source = defaultdict(list)
+        for data_entity in data_entities:
+            if not self.content_codec.has_dictionary(data_entity.source):
+                samples_by_source[data_entity.source].append(data_entity.content)
+
+        for source, samples in samples_by_source.items():
+            if len(samples) >= SqliteMinerStorage.MIN_DICTIONARY_TRAINING_SAMPLE_COUNT:
+                self.content_codec.add_dictionary(
+                    connection,
+                    source,
+                    train_dictionary(
+                        samples[: SqliteMinerStorage.DICTIONARY_TRAINING_SAMPLE_COUNT]
+                    ),
+                )
+
+    def migrate_content_encoding(self, batch_size: int = 1_000) -> int:
+        """Re-encodes stored content with the codec new content from its source is stored with.
+
+        Compresses existing content with the current dictionary of its source when compress_content is enabled and
+        decompresses it otherwise. Each batch is its own transaction so the miner can keep serving while this runs.
+        Returns the number of rows re-encoded.
+        """
+        with self.connection_pool.reader() as connection:
+            sources = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT DISTINCT source FROM ContentSizeLedger"
+                ).fetchall()
+            ]
+
+        migrated_rows = 0
+        for source in sources:
+            target_codec_id = (
+                self.content_codec.codec_for_source(source)
+                if self.compress_content
+                else RAW_CODEC
+            )
+            last_uri = ""
+            while True:
+                with self.connection_pool.writer() as connection:
+                    rows = connection.execute(
+                        """SELECT uri, contentCodec, content FROM DataEntity
+                            WHERE source = ? AND contentCodec != ? AND uri > ?
+                            ORDER BY uri LIMIT ?""",
+                        [source, target_codec_id, last_uri, batch_size],
+                    ).fetchall()
+                    if not rows:
+                        break
+
+                    contents = self.content_codec.decode_all(
+                        connection, [row[1] for row in rows], [row[2] for row in rows]
+                    )
+                    values = []
+                    for row, content in zip(rows, contents):
+                        codec_id, encoded_content = (
+                            self.content_codec.encode(source, content)
+                            if self.compress_content
+                            else (RAW_CODEC, content)
+                        )
+                        values.append([encoded_content, codec_id, row[0]])
+                    connection.executemany(
+                        "UPDATE DataEntity SET content = ?, contentCodec = ? WHERE uri = ?",
+                        values,
+                    )
+                    connection.commit()
+
+                migrated_rows += len(rows)
+                last_uri = rows[-1][0]
+                bt.logging.debug(
+                    f"Re-encoded {migrated_rows} rows. Last uri: {last_uri}."
+                )
+
+        return migrated_rows
+
     def store_hf_dataset_info(self, hf_metadatas: List[HuggingFaceMetadata]):
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.writer() as connection:
             cursor = connection.cursor()
             values = []
             for hf_metadata in hf_metadatas:
@@ -238,7 +704,7 @@ class SqliteMinerStorage(MinerStorage):
 
     def get_earliest_data_datetime(self, source):
         query = "SELECT MIN(datetime) as earliest_date FROM DataEntity WHERE source = ?"
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.reader() as connection:
             cursor = connection.cursor()
             cursor.execute(query, (source,))
             result = cursor.fetchone()
@@ -256,7 +722,7 @@ class SqliteMinerStorage(MinerStorage):
             );
         """
         try:
-            with contextlib.closing(self._create_connection()) as connection:
+            with self.connection_pool.reader() as connection:
                 cursor = connection.cursor()
                 cursor.execute(sql_query, (f"%_{unique_id}",))
                 result = cursor.fetchone()
@@ -288,7 +754,7 @@ class SqliteMinerStorage(MinerStorage):
             LIMIT 2;
         """
 
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.reader() as connection:
             cursor = connection.cursor()
             cursor.execute(sql_query, (f"%_{unique_id}",))
             hf_metadatas = []
@@ -315,47 +781,73 @@ class SqliteMinerStorage(MinerStorage):
             else data_entity_bucket_id.label.value
         )
 
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.reader() as connection:
             cursor = connection.cursor()
+            # Apply the max DataEntityBucket size with a running sum over the covering index so that content is only
+            # read for the rows that are returned. A row is included if the bucket is not yet full before it.
             cursor.execute(
-                """SELECT * FROM DataEntity 
-                        WHERE timeBucketId = ? AND source = ? AND label = ?""",
+                """SELECT DataEntity.uri, DataEntity.datetime, DataEntity.source, DataEntity.content,
+                        DataEntity.contentSizeBytes, DataEntity.contentCodec
+                    FROM (
+                        SELECT uri, SUM(contentSizeBytes) OVER (
+                            ORDER BY contentSizeBytes, uri ROWS UNBOUNDED PRECEDING
+                        ) - contentSizeBytes AS precedingSize
+                        FROM DataEntity
+                        WHERE timeBucketId = ? AND source = ? AND label = ?
+                    ) AS bucket
+                    JOIN DataEntity ON DataEntity.uri = bucket.uri
+                    WHERE bucket.precedingSize < ?""",
                 [
                     data_entity_bucket_id.time_bucket.id,
                     data_entity_bucket_id.source,
                     label,
+                    constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES,
                 ],
             )
 
-            # Convert the rows into DataEntity objects and return them up to the configured max chuck size.
-            data_entities = []
-
-            running_size = 0
-
-            for row in cursor:
-                # If we have already reached the max DataEntityBucket size instead return early.
-                if running_size >= constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES:
-                    return data_entities
-                else:
-                    # Construct the new DataEntity with all non null columns.
-                    data_entity = DataEntity(
-                        uri=row["uri"],
-                        datetime=row["datetime"],
-                        source=DataSource(row["source"]),
-                        content=row["content"],
-                        content_size_bytes=row["contentSizeBytes"],
-                        label=DataLabel(value=row["label"]) if row["label"] != "NULL" else None
-                    )
+            rows = cursor.fetchall()
+            contents = self.content_codec.decode_all(
+                connection,
+                [row["contentCodec"] for row in rows],
+                [row["content"] for row in rows],
+            )
 
-                    data_entities.append(data_entity)
-                    running_size += row["contentSizeBytes"]
+            # Rows were validated when they were stored so skip re-validating each one on the way out.
+            source = DataSource(data_entity_bucket_id.source)
+            data_label = data_entity_bucket_id.label
+            data_entities = [
+                DataEntity.model_construct(
+                    uri=row["uri"],
+                    datetime=row["datetime"],
+                    source=source,
+                    label=data_label,
+                    content=content,
+                    content_size_bytes=row["contentSizeBytes"],
+                )
+                for row, content in zip(rows, contents)
+            ]
 
-            # If we reach the end of the cursor then return all of the data entities for this DataEntityBucket.
             bt.logging.trace(
                 f"Returning {len(data_entities)} data entities for bucket {data_entity_bucket_id}"
             )
             return data_entities
 
+    def _list_largest_buckets(
+        self, oldest_time_bucket_id: int, limit: int
+    ) -> List[sqlite3.Row]:
+        """Lists the largest DataEntityBuckets no older than the given time bucket from the maintained summary."""
+        with self.connection_pool.reader() as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """SELECT contentSizeBytes AS bucketSize, timeBucketId, source, label FROM BucketSummary
+                        WHERE timeBucketId >= ?
+                        ORDER BY bucketSize DESC
+                        LIMIT ?
+                        """,
+                [oldest_time_bucket_id, limit],
+            )
+            return cursor.fetchall()
+
     def refresh_compressed_index(self, time_delta: dt.timedelta):
         """Refreshes the compressed MinerIndex."""
         # First check if we already have a fresh enough index, if so return immediately.
@@ -382,64 +874,59 @@ class SqliteMinerStorage(MinerStorage):
                     )
                     return
 
-            with contextlib.closing(self._create_connection()) as connection:
-                cursor = connection.cursor()
+            oldest_time_bucket_id = TimeBucket.from_datetime(
+                dt.datetime.now()
+                - dt.timedelta(constants.DATA_ENTITY_BUCKET_AGE_LIMIT_DAYS)
+            ).id
 
-                oldest_time_bucket_id = TimeBucket.from_datetime(
-                    dt.datetime.now()
-                    - dt.timedelta(constants.DATA_ENTITY_BUCKET_AGE_LIMIT_DAYS)
-                ).id
-
-                # Get sum of content_size_bytes for all rows grouped by DataEntityBucket.
-                cursor.execute(
-                    """SELECT SUM(contentSizeBytes) AS bucketSize, timeBucketId, source, label FROM DataEntity
-                            WHERE timeBucketId >= ?
-                            GROUP BY timeBucketId, source, label
-                            ORDER BY bucketSize DESC
-                            LIMIT ?
-                            """,
-                    [
-                        oldest_time_bucket_id,
-                        constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX_PROTOCOL_4,
-                    ],  # Always get the max for caching and truncate to each necessary size.
-                )
+            # Always get the max for caching and truncate to each necessary size.
+            rows = self._list_largest_buckets(
+                oldest_time_bucket_id,
+                constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX_PROTOCOL_4,
+            )
 
-                buckets_by_source_by_label = defaultdict(dict)
+            buckets_by_source_by_label = defaultdict(dict)
 
-                for row in cursor:
-                    # Ensure the miner does not attempt to report more than the max DataEntityBucket size.
-                    size = (
-                        constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
-                        if row["bucketSize"]
-                        >= constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
-                        else row["bucketSize"]
-                    )
+            for row in rows:
+                # Ensure the miner does not attempt to report more than the max DataEntityBucket size.
+                size = (
+                    constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
+                    if row["bucketSize"]
+                    >= constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
+                    else row["bucketSize"]
+                )
 
-                    label = row["label"] if row["label"] != "NULL" else None
+                label = row["label"] if row["label"] != "NULL" else None
 
-                    bucket = buckets_by_source_by_label[DataSource(row["source"])].get(
-                        label, CompressedEntityBucket(label=label)
-                    )
-                    bucket.sizes_bytes.append(size)
-                    bucket.time_bucket_ids.append(row["timeBucketId"])
-                    buckets_by_source_by_label[DataSource(row["source"])][
-                        label
-                    ] = bucket
-
-                # Convert the buckets_by_source_by_label into a list of lists of CompressedEntityBucket and return
-                bt.logging.trace("Creating protocol 4 cached index.")
-                with self.cached_index_lock:
-                    self.cached_index_4 = CompressedMinerIndex(
-                        sources={
-                            source: list(labels_to_buckets.values())
-                            for source, labels_to_buckets in buckets_by_source_by_label.items()
-                        }
-                    )
-                    self.cached_index_updated = dt.datetime.now()
-                    bt.logging.success(
-                        f"Created cached index of {CompressedMinerIndex.size_bytes(self.cached_index_4)} bytes "
-                        + f"across {CompressedMinerIndex.bucket_count(self.cached_index_4)} buckets."
-                    )
+                bucket = buckets_by_source_by_label[DataSource(row["source"])].get(
+                    label, CompressedEntityBucket(label=label)
+                )
+                bucket.sizes_bytes.append(size)
+                bucket.time_bucket_ids.append(row["timeBucketId"])
+                buckets_by_source_by_label[DataSource(row["source"])][
+                    label
+                ] = bucket
+
+            # Convert the buckets_by_source_by_label into a list of lists of CompressedEntityBucket and return
+            bt.logging.trace("Creating protocol 4 cached index.")
+            compressed_index = CompressedMinerIndex(
+                sources={
+                    source: list(labels_to_buckets.values())
+                    for source, labels_to_buckets in buckets_by_source_by_label.items()
+                }
+            )
+            # Serialize once per refresh rather than once per GetMinerIndex request.
+            serialized_index = SerializedMinerIndex(compressed_index)
+
+            with self.cached_index_lock:
+                self.cached_index_4 = compressed_index
+                self.cached_index_4_serialized = serialized_index
+                self.cached_index_updated = dt.datetime.now()
+                bt.logging.success(
+                    f"Created cached index of {serialized_index.size_bytes} bytes "
+                    + f"across {serialized_index.bucket_count} buckets. "
+                    + f"Serialized to {len(serialized_index.json)} characters in {serialized_index.serialization_seconds:.3f}s."
+                )
 
     def list_contents_in_data_entity_buckets(
         self, data_entity_bucket_ids: List[DataEntityBucketId]
@@ -457,48 +944,91 @@ class SqliteMinerStorage(MinerStorage):
         ):
             return defaultdict(list)
 
-        # Get rows that match the DataEntityBucketIds.
-        # Use a list of alternating ids and labels to match the upcoming sql query.
-        time_bucket_ids_and_labels = list()
+        buckets_ids_to_contents, _, _ = self._list_contents_in_data_entity_buckets(
+            data_entity_bucket_ids,
+            constants.BULK_CONTENTS_SIZE_LIMIT_BYTES,
+            constants.BULK_CONTENTS_COUNT_LIMIT,
+        )
+        return buckets_ids_to_contents
+
+    def _list_contents_in_data_entity_buckets(
+        self,
+        data_entity_bucket_ids: List[DataEntityBucketId],
+        size_limit_bytes: int,
+        count_limit: int,
+    ) -> Tuple[Dict[DataEntityBucketId, List[bytes]], int, int]:
+        """Lists contents for each requested DataEntityBucketId up to the given overall size and count limits.
+
+        Contents are taken in order of (time bucket, source, label) and a content is included if the contents before
+        it total less than size_limit_bytes. Returns the contents with their total size and count.
+        """
+        # Key each requested bucket by its column values so rows can be mapped back without parsing them.
+        requested_bucket_ids = {}
         for bucket_id in data_entity_bucket_ids:
-            time_bucket_ids_and_labels.append(bucket_id.time_bucket.id)
-            # Note that only twitter has NULL label and that all twitter labels are prefixed with #.
-            # Therefore we do not need to distinguish labels by source.
             label = "NULL" if (bucket_id.label is None) else bucket_id.label.value
-            time_bucket_ids_and_labels.append(label)
+            requested_bucket_ids[(bucket_id.time_bucket.id, bucket_id.source, label)] = bucket_id
 
-        with contextlib.closing(self._create_connection()) as connection:
+        with self.connection_pool.reader() as connection:
             cursor = connection.cursor()
+            # Join the requested buckets against the bucket index, then apply the per bucket size limit and the
+            # overall size limit with running sums so that content is only read for the rows that are returned.
             cursor.execute(
-                f"""SELECT timeBucketId, source, label, content, contentSizeBytes FROM DataEntity
-                    WHERE timeBucketId = ? AND label = ?
-                    {"OR timeBucketId = ? AND label = ?" * (len(data_entity_bucket_ids) - 1)}
-                    LIMIT ?
-                 """,
-                list(time_bucket_ids_and_labels)
-                + [constants.BULK_CONTENTS_COUNT_LIMIT],
+                f"""WITH requested(timeBucketId, source, label) AS (
+                        VALUES {",".join(["(?,?,?)"] * len(requested_bucket_ids))}
+                    ),
+                    bucketed AS (
+                        SELECT DataEntity.uri, DataEntity.timeBucketId, DataEntity.source, DataEntity.label,
+                            DataEntity.contentSizeBytes,
+                            SUM(DataEntity.contentSizeBytes) OVER (
+                                PARTITION BY DataEntity.timeBucketId, DataEntity.source, DataEntity.label
+                                ORDER BY DataEntity.contentSizeBytes, DataEntity.uri ROWS UNBOUNDED PRECEDING
+                            ) - DataEntity.contentSizeBytes AS bucketPrecedingSize
+                        FROM requested
+                        JOIN DataEntity ON DataEntity.timeBucketId = requested.timeBucketId
+                            AND DataEntity.source = requested.source
+                            AND DataEntity.label = requested.label
+                    ),
+                    limited AS (
+                        SELECT uri, timeBucketId, source, label,
+                            SUM(contentSizeBytes) OVER (
+                                ORDER BY timeBucketId, source, label, contentSizeBytes, uri ROWS UNBOUNDED PRECEDING
+                            ) - contentSizeBytes AS totalPrecedingSize
+                        FROM bucketed
+                        WHERE bucketPrecedingSize < ?
+                    )
+                    SELECT limited.timeBucketId, limited.source, limited.label, DataEntity.content,
+                        DataEntity.contentCodec, DataEntity.contentSizeBytes
+                    FROM limited
+                    JOIN DataEntity ON DataEntity.uri = limited.uri
+                    WHERE limited.totalPrecedingSize < ?
+                    LIMIT ?""",
+                [value for key in requested_bucket_ids for value in key]
+                + [
+                    constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES,
+                    size_limit_bytes,
+                    count_limit,
+                ],
             )
 
-            # Get the contents from each row and return them up to the configured max size.
-            buckets_ids_to_contents = defaultdict(list)
-            running_size = 0
-
-            for row in cursor:
-                if running_size < constants.BULK_CONTENTS_SIZE_LIMIT_BYTES:
-                    data_entity_bucket_id = DataEntityBucketId(
-                        time_bucket=TimeBucket(id=row["timeBucketId"]),
-                        source=DataSource(row["source"]),
-                        label=DataLabel(value=row["label"]) if row["label"] != "NULL" else None
-                    )
-                    buckets_ids_to_contents[data_entity_bucket_id].append(
-                        row["content"]
-                    )
-                    running_size += row["contentSizeBytes"]
-                else:
-                    # Return early since we hit the size limit.
-                    break
+            rows = cursor.fetchall()
+            contents = self.content_codec.decode_all(
+                connection,
+                [row["contentCodec"] for row in rows],
+                [row["content"] for row in rows],
+            )
 
-            return buckets_ids_to_contents
+            buckets_ids_to_contents = defaultdict(list)
+            for row, content in zip(rows, contents):
+                data_entity_bucket_id = requested_bucket_ids[
+                    (row["timeBucketId"], row["source"], row["label"])
+                ]
+                buckets_ids_to_contents[data_entity_bucket_id].append(content)
+
+            return (
+                buckets_ids_to_contents,
+                sum(row["contentSizeBytes"] for row in rows),
+                len(rows),
+            )
 
     def get_compressed_index(
         self,
@@ -515,84 +1045,181 @@ class SqliteMinerStorage(MinerStorage):
             # Only protocol 4 is supported at this time.
             return self.cached_index_4
 
+    def get_serialized_compressed_index(self) -> "SerializedMinerIndex":
+        """Gets the compressed MinerIndex in its pre-serialized form, ready to be returned to a validator."""
+
+        # Force refresh index if 10 minutes beyond refersh period. Expected to be refreshed earlier by refresh loop.
+        self.refresh_compressed_index(
+            time_delta=(constants.MINER_CACHE_FRESHNESS + dt.timedelta(minutes=10))
+        )
+
+        with self.cached_index_lock:
+            # Every request served from the cache saves re-serializing the index.
+            self.index_serialization_seconds_saved += (
+                self.cached_index_4_serialized.serialization_seconds
+            )
+            return self.cached_index_4_serialized
+
+    def update_desirability_lookup(self, lookup: DataDesirabilityLookup):
+        """Sets the desirability lookup used to choose which content to clear first when full."""
+        self.data_value_calculator = DataValueCalculator(model=lookup)
+
     def clear_content_from_oldest(self, content_bytes_to_clear: int):
-        """Deletes entries starting from the oldest until we have cleared the specified amount of content."""
+        """Deletes entries until we have cleared the specified amount of content.
+
+        Content is cleared a whole DataEntityBucket at a time. If a desirability lookup has been set then the buckets
+        worth the least per byte are cleared first, otherwise the oldest buckets are cleared first.
+        """
 
         bt.logging.debug(f"Database full. Clearing {content_bytes_to_clear} bytes.")
 
-        with contextlib.closing(self._create_connection()) as connection:
-            cursor = connection.cursor()
+        with self.connection_pool.writer() as connection:
+            if self.data_value_calculator is None:
+                self._clear_oldest_time_buckets(connection, content_bytes_to_clear)
+            else:
+                self._clear_least_desirable_buckets(
+                    connection, content_bytes_to_clear
+                )
 
-            # TODO Investigate way to select last X bytes worth of entries in a single query.
-            # Get the contentSizeBytes of each row by timestamp desc.
-            cursor.execute(
-                "SELECT contentSizeBytes, datetime FROM DataEntity ORDER BY datetime ASC"
+    def _clear_oldest_time_buckets(
+        self, connection: sqlite3.Connection, content_bytes_to_clear: int
+    ):
+        """Deletes every time bucket up to the first one where the running total of content reaches the amount to clear."""
+        cursor = connection.cursor()
+        # Find the cutoff with a running sum over the ledger, falling back to everything if there isn't enough content.
+        cursor.execute(
+            f"""SELECT COALESCE(
+                    (SELECT timeBucketId FROM (
+                        SELECT timeBucketId, SUM(SUM({self.capacity_size_column})) OVER (ORDER BY timeBucketId) AS runningBytes
+                        FROM ContentSizeLedger
+                        GROUP BY timeBucketId
+                    ) WHERE runningBytes >= ? ORDER BY timeBucketId LIMIT 1),
+                    (SELECT MAX(timeBucketId) FROM ContentSizeLedger)
+                )""",
+            [content_bytes_to_clear],
+        )
+        cutoff_time_bucket_id = cursor.fetchone()[0]
+        if cutoff_time_bucket_id is None:
+            return
+
+        self._delete_in_batches(
+            connection, "timeBucketId <= ?", [cutoff_time_bucket_id]
+        )
+
+    def _clear_least_desirable_buckets(
+        self, connection: sqlite3.Connection, content_bytes_to_clear: int
+    ):
+        """Deletes the DataEntityBuckets worth the least per byte until the amount to clear is reached."""
+        cleared_bytes = 0
+        for _, time_bucket_id, source, label, bucket_size in self._rank_buckets_by_value(
+            connection
+        ):
+            if cleared_bytes >= content_bytes_to_clear:
+                break
+            self._delete_in_batches(
+                connection,
+                "timeBucketId = ? AND source = ? AND label = ?",
+                [time_bucket_id, source, label],
             )
+            cleared_bytes += bucket_size
 
-            running_bytes = 0
-            earliest_datetime_to_clear = dt.datetime.min
-            # Iterate over rows until we have found bytes to clear or we reach the end and fail.
-            for row in cursor:
-                running_bytes += row["contentSizeBytes"]
-                earliest_datetime_to_clear = row["datetime"]
-                # Once we have enough content to clear then we do so.
-                if running_bytes >= content_bytes_to_clear:
-                    cursor.execute(
-                        "DELETE FROM DataEntity WHERE datetime <= ?",
-                        [earliest_datetime_to_clear],
-                    )
-                    connection.commit()
+    def _rank_buckets_by_value(self, connection: sqlite3.Connection) -> List[Tuple]:
+        """Returns (value per byte, timeBucketId, source, label, size) for every DataEntityBucket, least valuable first.
+
+        Requires a desirability lookup to have been set.
+        """
+        cursor = connection.cursor()
+        cursor.execute(
+            f"""SELECT timeBucketId, source, label, contentSizeBytes, {self.capacity_size_column} AS bucketSize
+                FROM BucketSummary"""
+        )
+
+        current_time_bucket_id = TimeBucket.from_datetime(
+            dt.datetime.now(tz=dt.timezone.utc)
+        ).id
+        scored_buckets = []
+        for row in cursor:
+            score_per_byte = self.data_value_calculator.get_score_per_byte(
+                DataSource(row["source"]),
+                None if row["label"] == "NULL" else row["label"],
+                row["timeBucketId"],
+                current_time_bucket_id,
+            )
+            # Scores are earned per reported byte but space is freed per stored byte.
+            scored_buckets.append(
+                (
+                    score_per_byte * row["contentSizeBytes"] / max(row["bucketSize"], 1),
+                    row["timeBucketId"],
+                    row["source"],
+                    row["label"],
+                    row["bucketSize"],
+                )
+            )
+
+        # Ties (e.g. data that is too old to score at all) are broken by clearing the oldest first.
+        scored_buckets.sort(key=lambda bucket: (bucket[0], bucket[1]))
+        return scored_buckets
+
+    def _delete_in_batches(
+        self, connection: sqlite3.Connection, where_clause: str, parameters: List
+    ) -> int:
+        """Deletes all DataEntities matching the where clause, committing every eviction_batch_size rows.
+
+        Committing between batches keeps each transaction (and the WAL it produces) bounded and lets readers and
+        checkpoints make progress during large evictions. Returns the number of deleted rows.
+        """
+        deleted_rows = 0
+        while True:
+            cursor = connection.execute(
+                f"""DELETE FROM DataEntity WHERE uri IN (
+                        SELECT uri FROM DataEntity WHERE {where_clause} LIMIT ?
+                    )""",
+                parameters + [self.eviction_batch_size],
+            )
+            connection.commit()
+            deleted_rows += cursor.rowcount
+            if cursor.rowcount < self.eviction_batch_size:
+                return deleted_rows
 
     def list_data_entity_buckets(self) -> List[DataEntityBucket]:
         """Lists all DataEntityBuckets for all the DataEntities that this MinerStorage is currently serving."""
 
-        with contextlib.closing(self._create_connection()) as connection:
-            cursor = connection.cursor()
-            oldest_time_bucket_id = TimeBucket.from_datetime(
-                dt.datetime.now()
-                - dt.timedelta(constants.DATA_ENTITY_BUCKET_AGE_LIMIT_DAYS)
-            ).id
-            # Get sum of content_size_bytes for all rows grouped by DataEntityBucket.
-            cursor.execute(
-                """SELECT SUM(contentSizeBytes) AS bucketSize, timeBucketId, source, label FROM DataEntity
-                        WHERE timeBucketId >= ?
-                        GROUP BY timeBucketId, source, label
-                        ORDER BY bucketSize DESC
-                        LIMIT ?
-                        """,
-                [
-                    oldest_time_bucket_id,
-                    constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX,
-                ],
-            )
+        oldest_time_bucket_id = TimeBucket.from_datetime(
+            dt.datetime.now()
+            - dt.timedelta(constants.DATA_ENTITY_BUCKET_AGE_LIMIT_DAYS)
+        ).id
+        # Get sum of content_size_bytes for all rows grouped by DataEntityBucket.
+        rows = self._list_largest_buckets(
+            oldest_time_bucket_id, constants.DATA_ENTITY_BUCKET_COUNT_LIMIT_PER_MINER_INDEX
+        )
 
-            data_entity_buckets = []
+        data_entity_buckets = []
 
-            for row in cursor:
-                # Ensure the miner does not attempt to report more than the max DataEntityBucket size.
-                size = (
-                    constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
-                    if row["bucketSize"]
-                    >= constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
-                    else row["bucketSize"]
-                )
+        for row in rows:
+            # Ensure the miner does not attempt to report more than the max DataEntityBucket size.
+            size = (
+                constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
+                if row["bucketSize"]
+                >= constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES
+                else row["bucketSize"]
+            )
 
-                # Construct the new DataEntityBucket with all non null columns.
-                data_entity_bucket_id = DataEntityBucketId(
-                    time_bucket=TimeBucket(id=row["timeBucketId"]),
-                    source=DataSource(row["source"]),
-                    label=(
-                        DataLabel(value=row["label"])
-                        if row["label"] != "NULL"
-                        else None
-                    ),
-                )
+            # Construct the new DataEntityBucket with all non null columns.
+            data_entity_bucket_id = DataEntityBucketId(
+                time_bucket=TimeBucket(id=row["timeBucketId"]),
+                source=DataSource(row["source"]),
+                label=(
+                    DataLabel(value=row["label"])
+                    if row["label"] != "NULL"
+                    else None
+                ),
+            )
 
-                data_entity_bucket = DataEntityBucket(
-                    id=data_entity_bucket_id, size_bytes=size
-                )
+            data_entity_bucket = DataEntityBucket(
+                id=data_entity_bucket_id, size_bytes=size
+            )
 
-                data_entity_buckets.append(data_entity_bucket)
+            data_entity_buckets.append(data_entity_bucket)
 
-            # If we reach the end of the cursor then return all of the data entity buckets.
-            return data_entity_buckets
+        # If we reach the end of the rows then return all of the data entity buckets.
+        return data_entity_buckets
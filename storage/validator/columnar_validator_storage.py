@@ -0,0 +1,688 @@
+import datetime as dt
+from typing import Dict, List, Optional, Tuple
+
+import bittensor as bt
+import numpy as np
+
+from common.data import CompressedMinerIndex, HuggingFaceMetadata
+from common.data_v2 import ColumnarScorableMinerIndex
+from common.utils import ReadWriteLock
+from storage.validator.label_table import LabelTable
+from storage.validator.miner_index_snapshot import MinerIndexSnapshot
+from storage.validator.validator_storage import MinerIndexDiff, ValidatorStorage
+
+
+# A bucket is keyed by packing (source, labelId, timeBucketId) into a single int64, so that sorting keys orders buckets
+# the same way as the MinerIndex primary key does. Time bucket ids are hours since the epoch, which fit in 24 bits.
+_SOURCE_SHIFT = 56
+_LABEL_ID_SHIFT = 24
+_LABEL_ID_MASK = ((1 << (_SOURCE_SHIFT - _LABEL_ID_SHIFT)) - 1) << _LABEL_ID_SHIFT
+
+
+def pack_bucket_keys(
+    sources: np.ndarray, label_ids: np.ndarray, time_bucket_ids: np.ndarray
+) -> np.ndarray:
+    """Packs the (source, labelId, timeBucketId) columns of buckets into int64 bucket keys."""
+    return (
+        (sources.astype(np.int64) << _SOURCE_SHIFT)
+        | (label_ids.astype(np.int64) << _LABEL_ID_SHIFT)
+        | time_bucket_ids.astype(np.int64)
+    )
+
+
+class BucketAggregate:
+    """The total credibility weighted bytes of every bucket held by at least one miner.
+
+    Each distinct bucket key is assigned a slot in flat arrays, so that miners can keep the slots of their buckets and
+    add, remove or read their contributions with vectorized operations. Keys are found with a binary search over a
+    sorted key array rather than a dict, which would cost an order of magnitude more memory per bucket. Slots are
+    recycled once no miner holds the bucket.
+
+    Not thread safe.
+    """
+
+    def __init__(self, initial_capacity: int = 1024):
+        # The live keys in sorted order, and the slot of each.
+        self.sorted_keys = np.empty(0, dtype=np.int64)
+        self.sorted_slots = np.empty(0, dtype=np.int32)
+        self.free_slots = np.empty(0, dtype=np.int32)
+        self.used_slots = 0
+
+        # By slot.
+        self.keys = np.zeros(initial_capacity, dtype=np.int64)
+        self.totals = np.zeros(initial_capacity, dtype=np.float64)
+        self.miner_counts = np.zeros(initial_capacity, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.sorted_keys)
+
+    def _grow(self, required_capacity: int):
+        capacity = len(self.keys)
+        while capacity < required_capacity:
+            capacity *= 2
+        if capacity == len(self.keys):
+            return
+
+        for name in ("keys", "totals", "miner_counts"):
+            current = getattr(self, name)
+            grown = np.zeros(capacity, dtype=current.dtype)
+            grown[: len(current)] = current
+            setattr(self, name, grown)
+
+    def _allocate_slots(self, count: int) -> np.ndarray:
+        """Takes count slots, reusing released slots before new ones."""
+        reused = self.free_slots[len(self.free_slots) - min(count, len(self.free_slots)) :]
+        self.free_slots = self.free_slots[: len(self.free_slots) - len(reused)]
+
+        new_count = count - len(reused)
+        self._grow(self.used_slots + new_count)
+        new = np.arange(self.used_slots, self.used_slots + new_count, dtype=np.int32)
+        self.used_slots += new_count
+        return np.concatenate([reused, new])
+
+    def add(self, keys: np.ndarray, weighted_sizes: np.ndarray) -> np.ndarray:
+        """Adds one miner's contribution to the given sorted, distinct bucket keys. Returns the slots of the keys."""
+        positions = np.searchsorted(self.sorted_keys, keys)
+        found = np.zeros(len(keys), dtype=bool)
+        in_range = positions < len(self.sorted_keys)
+        found[in_range] = self.sorted_keys[positions[in_range]] == keys[in_range]
+
+        slots = np.empty(len(keys), dtype=np.int32)
+        slots[found] = self.sorted_slots[positions[found]]
+
+        new = ~found
+        new_slots = self._allocate_slots(int(np.count_nonzero(new)))
+        slots[new] = new_slots
+        self.keys[new_slots] = keys[new]
+        self.sorted_keys = np.insert(self.sorted_keys, positions[new], keys[new])
+        self.sorted_slots = np.insert(self.sorted_slots, positions[new], new_slots)
+
+        # Slots are distinct for distinct keys so fancy indexed addition is safe.
+        self.totals[slots] += weighted_sizes
+        self.miner_counts[slots] += 1
+        return slots
+
+    def adjust(self, slots: np.ndarray, weighted_size_deltas: np.ndarray):
+        """Applies the change in one miner's contribution to the given distinct slots it already holds."""
+        self.totals[slots] += weighted_size_deltas
+
+    def remove(self, slots: np.ndarray, weighted_sizes: np.ndarray):
+        """Removes one miner's contribution from the given distinct slots, releasing slots no miner holds anymore."""
+        self.totals[slots] -= weighted_sizes
+        self.miner_counts[slots] -= 1
+
+        released = slots[self.miner_counts[slots] == 0]
+        # Reset released totals exactly, rather than leaving behind any floating point error from the subtraction.
+        self.totals[released] = 0
+        positions = np.searchsorted(self.sorted_keys, self.keys[released])
+        self.sorted_keys = np.delete(self.sorted_keys, positions)
+        self.sorted_slots = np.delete(self.sorted_slots, positions)
+        self.free_slots = np.concatenate([self.free_slots, released])
+
+    def get_totals(self, slots: np.ndarray) -> np.ndarray:
+        """Returns the total credibility weighted bytes of the buckets in the given slots."""
+        return self.totals[slots]
+
+    def remap_label_ids(self, id_map: np.ndarray):
+        """Replaces the labelId of every live key with id_map[labelId].
+
+        The map must preserve the order of the label ids in use, so that the keys stay sorted and keep their slots.
+        """
+        label_ids = (self.sorted_keys & _LABEL_ID_MASK) >> _LABEL_ID_SHIFT
+        self.sorted_keys = (self.sorted_keys & ~_LABEL_ID_MASK) | (
+            id_map[label_ids] << _LABEL_ID_SHIFT
+        )
+        self.keys[self.sorted_slots] = self.sorted_keys
+
+
+class MinerIndexColumns:
+    """A miner's index stored as columns, ordered by (source, labelId, timeBucketId)."""
+
+    __slots__ = (
+        "sources",
+        "label_ids",
+        "time_bucket_ids",
+        "sizes_bytes",
+        "slots",
+        "credibility",
+        "last_updated",
+    )
+
+    def __init__(
+        self,
+        sources: np.ndarray,
+        label_ids: np.ndarray,
+        time_bucket_ids: np.ndarray,
+        sizes_bytes: np.ndarray,
+        slots: np.ndarray,
+        credibility: float,
+        last_updated: dt.datetime,
+    ):
+        self.sources = sources
+        self.label_ids = label_ids
+        self.time_bucket_ids = time_bucket_ids
+        self.sizes_bytes = sizes_bytes
+        self.slots = slots
+        self.credibility = credibility
+        self.last_updated = last_updated
+
+    def weighted_sizes(self) -> np.ndarray:
+        return self.sizes_bytes * self.credibility
+
+
+class ColumnarValidatorStorage(ValidatorStorage):
+    """In-memory Validator Storage that holds each miner's index as NumPy columns.
+
+    Alongside the per miner columns it maintains a BucketAggregate of the credibility weighted bytes of every bucket,
+    so that computing a miner's scorable bytes is a lookup of its bucket totals rather than a re-aggregation across
+    all miners.
+    """
+
+    def __init__(self):
+        self.label_table = LabelTable()
+        self.bucket_aggregate = BucketAggregate()
+        self.miners: Dict[str, MinerIndexColumns] = {}
+        self.hf_metadata: Dict[str, Dict[str, HuggingFaceMetadata]] = {}
+
+        # Readers share the lock and writers hold it exclusively.
+        self.lock = ReadWriteLock()
+
+    def _label_value_parse_str(self, label: Optional[str]) -> str:
+        """Parses the label value to store in the label table."""
+        return "NULL" if (label is None) else label.casefold()
+
+    def _index_to_columns(
+        self, index: CompressedMinerIndex
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Converts an index into distinct bucket key, source, labelId, timeBucketId and size columns.
+
+        Must be called with the write lock held, since it assigns ids to new labels.
+        """
+        sources = []
+        label_ids = []
+        time_bucket_ids = []
+        sizes_bytes = []
+        for source, compressed_buckets in index.sources.items():
+            for compressed_bucket in compressed_buckets:
+                try:
+                    label_id = self.label_table.get_or_insert(
+                        self._label_value_parse_str(compressed_bucket.label)
+                    )
+                except:
+                    # In the case that we fail to get a label (due to unsupported characters) we drop just that bucket.
+                    continue
+
+                bucket_count = len(compressed_bucket.time_bucket_ids)
+                sources.append(np.full(bucket_count, int(source), dtype=np.uint8))
+                label_ids.append(np.full(bucket_count, label_id, dtype=np.uint32))
+                time_bucket_ids.append(
+                    np.asarray(compressed_bucket.time_bucket_ids, dtype=np.uint32)
+                )
+                sizes_bytes.append(
+                    np.asarray(compressed_bucket.sizes_bytes, dtype=np.int64)
+                )
+
+        if not sources:
+            empty = np.empty(0, dtype=np.int64)
+            return (
+                empty,
+                empty.astype(np.uint8),
+                empty.astype(np.uint32),
+                empty.astype(np.uint32),
+                empty,
+            )
+
+        return self._distinct_bucket_columns(
+            np.concatenate(sources),
+            np.concatenate(label_ids),
+            np.concatenate(time_bucket_ids),
+            np.concatenate(sizes_bytes),
+        )
+
+    def _distinct_bucket_columns(
+        self,
+        sources: np.ndarray,
+        label_ids: np.ndarray,
+        time_bucket_ids: np.ndarray,
+        sizes_bytes: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the bucket key, source, labelId, timeBucketId and size columns of the distinct buckets."""
+        # Keep the first occurrence of each bucket to defend against a miner giving us duplicates, which also sorts
+        # the columns by bucket key as the BucketAggregate requires.
+        keys, first_indexes = np.unique(
+            pack_bucket_keys(sources, label_ids, time_bucket_ids), return_index=True
+        )
+        return (
+            keys,
+            sources[first_indexes],
+            label_ids[first_indexes],
+            time_bucket_ids[first_indexes],
+            sizes_bytes[first_indexes],
+        )
+
+    def _delete_miner_index(self, hotkey: str):
+        """Removes the index for the specified miner from the bucket aggregate. Must be called with the lock held."""
+        miner = self.miners.pop(hotkey, None)
+        if miner is not None:
+            self.bucket_aggregate.remove(miner.slots, miner.weighted_sizes())
+            self.label_table.remove_references(miner.label_ids)
+
+    def _compact_label_ids(self):
+        """Renumbers the label ids once enough of them are free. Must be called with the write lock held."""
+        id_map = self.label_table.compact()
+        if id_map is None:
+            return
+
+        self.bucket_aggregate.remap_label_ids(id_map)
+        # Replace rather than modify the columns, since readers may still hold the previous ones.
+        for miner in self.miners.values():
+            miner.label_ids = id_map[miner.label_ids].astype(np.uint32)
+        bt.logging.trace(f"Compacted label ids to {len(self.label_table)} labels")
+
+    def _store_miner_columns(
+        self,
+        hotkey: str,
+        keys: np.ndarray,
+        sources: np.ndarray,
+        label_ids: np.ndarray,
+        time_bucket_ids: np.ndarray,
+        sizes_bytes: np.ndarray,
+        credibility: float,
+        last_updated: dt.datetime,
+    ) -> MinerIndexDiff:
+        """Stores the distinct bucket columns as the miner's index and returns how it changed.
+
+        Must be called with the write lock held.
+        """
+        weighted_sizes = sizes_bytes * credibility
+
+        previous = self.miners.get(hotkey)
+        if previous is None:
+            slots = self.bucket_aggregate.add(keys, weighted_sizes)
+            diff = MinerIndexDiff(inserted=len(keys))
+        else:
+            # Match the new buckets against the previous ones, which are also sorted by key.
+            previous_keys = self.bucket_aggregate.keys[previous.slots]
+            positions = np.searchsorted(previous_keys, keys)
+            kept = np.zeros(len(keys), dtype=bool)
+            in_range = positions < len(previous_keys)
+            kept[in_range] = previous_keys[positions[in_range]] == keys[in_range]
+            kept_positions = positions[kept]
+            removed = np.ones(len(previous_keys), dtype=bool)
+            removed[kept_positions] = False
+
+            previous_weighted_sizes = previous.weighted_sizes()
+            slots = np.empty(len(keys), dtype=np.int32)
+            slots[kept] = previous.slots[kept_positions]
+            deltas = weighted_sizes[kept] - previous_weighted_sizes[kept_positions]
+            changed = deltas != 0
+            self.bucket_aggregate.adjust(slots[kept][changed], deltas[changed])
+            self.bucket_aggregate.remove(
+                previous.slots[removed], previous_weighted_sizes[removed]
+            )
+            slots[~kept] = self.bucket_aggregate.add(
+                keys[~kept], weighted_sizes[~kept]
+            )
+
+            resized = int(
+                np.count_nonzero(
+                    sizes_bytes[kept] != previous.sizes_bytes[kept_positions]
+                )
+            )
+            diff = MinerIndexDiff(
+                inserted=int(np.count_nonzero(~kept)),
+                removed=int(np.count_nonzero(removed)),
+                resized=resized,
+                unchanged=len(kept_positions) - resized,
+            )
+
+        self.miners[hotkey] = MinerIndexColumns(
+            sources=sources,
+            label_ids=label_ids,
+            time_bucket_ids=time_bucket_ids,
+            sizes_bytes=sizes_bytes,
+            slots=slots,
+            credibility=credibility,
+            last_updated=last_updated,
+        )
+        # Reference the new labels before releasing the previous ones, so that labels in both keep their ids.
+        self.label_table.add_references(label_ids)
+        if previous is not None:
+            self.label_table.remove_references(previous.label_ids)
+
+        return diff
+
+    def upsert_compressed_miner_index(
+        self, index: CompressedMinerIndex, hotkey: str, credibility: float = 0
+    ) -> MinerIndexDiff:
+        """Stores the index for all of the data that a specific miner promises to provide.
+
+        Only the buckets that changed since the miner's previous index, or all of them if its credibility changed, are
+        applied to the bucket aggregate. Returns how the stored index changed.
+        """
+
+        bt.logging.trace(
+            f"{hotkey}: Upserting miner index with {CompressedMinerIndex.bucket_count(index)} buckets"
+        )
+
+        now = dt.datetime.utcnow()
+
+        with self.lock.write():
+            diff = self._store_miner_columns(
+                hotkey, *self._index_to_columns(index), credibility, now
+            )
+            self._compact_label_ids()
+
+        bt.logging.trace(f"{hotkey}: Upserted miner index with changes {diff}")
+        return diff
+
+    def read_miner_index(
+        self,
+        miner_hotkey: str,
+    ) -> Optional[ColumnarScorableMinerIndex]:
+        """Gets a scored index for all of the data that a specific miner promises to provide."""
+
+        with self.lock.read():
+            miner = self.miners.get(miner_hotkey)
+            if miner is None:
+                return None
+
+            # The miner's columns are replaced rather than modified, so only the totals need to be read under the lock.
+            totals = self.bucket_aggregate.get_totals(miner.slots)
+            distinct_label_ids, index_label_ids = np.unique(
+                miner.label_ids, return_inverse=True
+            )
+            label_values = [
+                self.label_table.get_by_id(label_id)
+                for label_id in distinct_label_ids.tolist()
+            ]
+
+        # Credit the miner with its share of the credibility weighted bytes of the bucket across all miners.
+        sizes_bytes = miner.sizes_bytes
+        scorable_bytes = np.zeros(len(sizes_bytes), dtype=np.float64)
+        np.divide(
+            sizes_bytes * (sizes_bytes * miner.credibility),
+            totals,
+            out=scorable_bytes,
+            where=totals > 0,
+        )
+        scorable_bytes = np.minimum(scorable_bytes.astype(np.int64), sizes_bytes)
+
+        return ColumnarScorableMinerIndex(
+            labels=[
+                label_value if label_value != "NULL" else None
+                for label_value in label_values
+            ],
+            sources=miner.sources,
+            label_ids=index_label_ids,
+            time_bucket_ids=miner.time_bucket_ids,
+            sizes_bytes=sizes_bytes,
+            scorable_bytes=scorable_bytes,
+            last_updated=miner.last_updated,
+        )
+
+    def delete_miner(self, hotkey: str):
+        """Removes the index and miner details for the specified miner."""
+        with self.lock.write():
+            self._delete_miner_index(hotkey)
+            self.hf_metadata.pop(hotkey, None)
+            self._compact_label_ids()
+
+    def read_miner_last_updated(self, miner_hotkey: str) -> Optional[dt.datetime]:
+        """Gets when a specific miner was last updated."""
+        with self.lock.read():
+            miner = self.miners.get(miner_hotkey)
+            return miner.last_updated if miner is not None else None
+
+    def export_snapshot(self) -> MinerIndexSnapshot:
+        """Gets a consistent snapshot of every stored miner index, with each miner's credibility and last update."""
+        with self.lock.read():
+            hotkeys = list(self.miners)
+            miners = [self.miners[hotkey] for hotkey in hotkeys]
+            label_ids = np.concatenate(
+                [np.empty(0, dtype=np.uint32)] + [miner.label_ids for miner in miners]
+            )
+            # Only the labels that are in use are included.
+            distinct_label_ids, snapshot_label_ids = np.unique(
+                label_ids, return_inverse=True
+            )
+            labels = [
+                self.label_table.get_by_id(label_id)
+                for label_id in distinct_label_ids.tolist()
+            ]
+
+        return MinerIndexSnapshot(
+            labels=labels,
+            hotkeys=hotkeys,
+            credibilities=np.array(
+                [miner.credibility for miner in miners], dtype=np.float64
+            ),
+            last_updated=[miner.last_updated for miner in miners],
+            bucket_offsets=np.concatenate(
+                [[0], np.cumsum([len(miner.sources) for miner in miners])]
+            ).astype(np.int64),
+            sources=np.concatenate(
+                [np.empty(0, dtype=np.uint8)] + [miner.sources for miner in miners]
+            ),
+            label_ids=snapshot_label_ids.astype(np.uint32),
+            time_bucket_ids=np.concatenate(
+                [np.empty(0, dtype=np.uint32)]
+                + [miner.time_bucket_ids for miner in miners]
+            ),
+            sizes_bytes=np.concatenate(
+                [np.empty(0, dtype=np.int64)] + [miner.sizes_bytes for miner in miners]
+            ),
+        )
+
+    def import_snapshot(self, snapshot: MinerIndexSnapshot):
+        """Stores the miner indexes in the snapshot, as of when the snapshot was taken, replacing any stored indexes
+        for the same miners."""
+        with self.lock.write():
+            # Map the snapshot's labels to ids in this storage's label table.
+            label_ids = np.array(
+                [self.label_table.get_or_insert(label) for label in snapshot.labels],
+                dtype=np.uint32,
+            )
+            # Hold the mapped labels while importing, so that replacing one miner's index cannot free a label that a later
+            # miner in the snapshot uses.
+            self.label_table.add_references(label_ids)
+
+            for i, hotkey in enumerate(snapshot.hotkeys):
+                start, end = snapshot.bucket_offsets[i], snapshot.bucket_offsets[i + 1]
+                self._store_miner_columns(
+                    hotkey,
+                    *self._distinct_bucket_columns(
+                        snapshot.sources[start:end].astype(np.uint8),
+                        label_ids[snapshot.label_ids[start:end]],
+                        snapshot.time_bucket_ids[start:end].astype(np.uint32),
+                        snapshot.sizes_bytes[start:end].astype(np.int64),
+                    ),
+                    float(snapshot.credibilities[i]),
+                    snapshot.last_updated[i],
+                )
+            self.label_table.remove_references(label_ids)
+            # Only compact once every miner is stored, since compacting renumbers the ids mapped above.
+            self._compact_label_ids()
+
+    def _select_source_columns(
+        self, source: int
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Concatenates the labelId, timeBucketId, size and weighted size columns of every miner's buckets of a source.
+
+        Must be called with the lock held.
+        """
+        label_ids = []
+        time_bucket_ids = []
+        sizes_bytes = []
+        weighted_sizes = []
+        for miner in self.miners.values():
+            mask = miner.sources == source
+            label_ids.append(miner.label_ids[mask])
+            time_bucket_ids.append(miner.time_bucket_ids[mask])
+            sizes_bytes.append(miner.sizes_bytes[mask])
+            weighted_sizes.append(miner.sizes_bytes[mask] * miner.credibility)
+
+        if not label_ids:
+            return (
+                np.empty(0, dtype=np.uint32),
+                np.empty(0, dtype=np.uint32),
+                np.empty(0, dtype=np.int64),
+                np.empty(0, dtype=np.float64),
+            )
+        return (
+            np.concatenate(label_ids),
+            np.concatenate(time_bucket_ids),
+            np.concatenate(sizes_bytes),
+            np.concatenate(weighted_sizes),
+        )
+
+    def read_label_sizes(
+        self, source: int, limit: int = 1000
+    ) -> List[Tuple[str, int, float]]:
+        """Gets the (label, total bytes, credibility weighted bytes) across all miners of a source's labels, largest
+        weighted first."""
+        with self.lock.read():
+            label_ids, _, sizes_bytes, weighted_sizes = self._select_source_columns(
+                source
+            )
+
+            label_count = self.label_table.capacity
+            total_sizes = np.bincount(label_ids, weights=sizes_bytes, minlength=label_count)
+            total_weighted_sizes = np.bincount(
+                label_ids, weights=weighted_sizes, minlength=label_count
+            )
+            present_label_ids = np.unique(label_ids)
+            top_label_ids = present_label_ids[
+                np.argsort(-total_weighted_sizes[present_label_ids], kind="stable")
+            ][:limit]
+
+            return [
+                (
+                    self.label_table.get_by_id(label_id),
+                    int(total_sizes[label_id]),
+                    float(total_weighted_sizes[label_id]),
+                )
+                for label_id in top_label_ids.tolist()
+            ]
+
+    def read_time_bucket_sizes(
+        self, source: int, limit: int = 1000
+    ) -> List[Tuple[int, int, float]]:
+        """Gets the (time bucket id, total bytes, credibility weighted bytes) across all miners of a source's time
+        buckets, newest first."""
+        with self.lock.read():
+            _, time_bucket_ids, sizes_bytes, weighted_sizes = (
+                self._select_source_columns(source)
+            )
+
+        distinct_time_bucket_ids, inverse = np.unique(time_bucket_ids, return_inverse=True)
+        total_sizes = np.bincount(inverse, weights=sizes_bytes, minlength=len(distinct_time_bucket_ids))
+        total_weighted_sizes = np.bincount(
+            inverse, weights=weighted_sizes, minlength=len(distinct_time_bucket_ids)
+        )
+        return [
+            (int(time_bucket_id), int(total_size), float(total_weighted_size))
+            for time_bucket_id, total_size, total_weighted_size in zip(
+                distinct_time_bucket_ids[::-1][:limit].tolist(),
+                total_sizes[::-1][:limit].tolist(),
+                total_weighted_sizes[::-1][:limit].tolist(),
+            )
+        ]
+
+    def read_label_total_bytes(self, label: Optional[str]) -> Tuple[int, float]:
+        """Gets the total bytes and credibility weighted bytes of a label across all sources and miners."""
+        with self.lock.read():
+            label_id = self.label_table.get_id(self._label_value_parse_str(label))
+            if label_id is None:
+                return 0, 0.0
+
+            total_size = 0
+            total_weighted_size = 0.0
+            for miner in self.miners.values():
+                size = int(miner.sizes_bytes[miner.label_ids == label_id].sum())
+                total_size += size
+                total_weighted_size += size * miner.credibility
+            return total_size, total_weighted_size
+
+    def find_latest_bucket_miner(
+        self,
+        source: int,
+        start_time_bucket_id: int,
+        end_time_bucket_id: int,
+        label: Optional[str] = None,
+    ) -> Optional[Tuple[str, float, int, int]]:
+        """Finds the most credible miner holding the latest time bucket of a source within the inclusive range.
+
+        If a label is provided, only the miners holding that label in the latest time bucket are considered.
+        Returns the miner's (hotkey, credibility, bucket size bytes, time bucket id), or None if there is no such miner.
+        """
+        with self.lock.read():
+            label_id = None
+            if label is not None:
+                label_id = self.label_table.get_id(self._label_value_parse_str(label))
+                if label_id is None:
+                    return None
+
+            latest_time_bucket_id = None
+            for miner in self.miners.values():
+                in_range = miner.time_bucket_ids[
+                    (miner.sources == source)
+                    & (miner.time_bucket_ids >= start_time_bucket_id)
+                    & (miner.time_bucket_ids <= end_time_bucket_id)
+                ]
+                if len(in_range) > 0:
+                    latest_time_bucket_id = max(
+                        int(in_range.max()), latest_time_bucket_id or 0
+                    )
+            if latest_time_bucket_id is None:
+                return None
+
+            best = None
+            for hotkey, miner in self.miners.items():
+                mask = (miner.sources == source) & (
+                    miner.time_bucket_ids == latest_time_bucket_id
+                )
+                if label_id is not None:
+                    mask &= miner.label_ids == label_id
+                sizes_bytes = miner.sizes_bytes[mask]
+                if len(sizes_bytes) > 0 and (best is None or miner.credibility > best[1]):
+                    best = (
+                        hotkey,
+                        miner.credibility,
+                        int(sizes_bytes[0]),
+                        latest_time_bucket_id,
+                    )
+            return best
+
+    # Hugging face functionality
+    def upsert_hf_metadata(self, hotkey: str, metadata: List[HuggingFaceMetadata]):
+        """Stores or updates the HuggingFace metadata for a specific miner."""
+        bt.logging.trace(f"{hotkey}: Upserting HuggingFace metadata with {len(metadata)} entries")
+
+        with self.lock.write():
+            if hotkey not in self.miners:
+                bt.logging.warning(f"{hotkey}: Attempted to upsert HF metadata for non-existent miner")
+                return
+
+            miner_metadata = self.hf_metadata.setdefault(hotkey, {})
+            for entry in metadata:
+                miner_metadata[entry.repo_name] = entry
+
+    def read_hf_metadata(self, miner_hotkey: str) -> List[HuggingFaceMetadata]:
+        """Gets the HuggingFace metadata for a specific miner."""
+        with self.lock.read():
+            miner_metadata = self.hf_metadata.get(miner_hotkey, {})
+            return [miner_metadata[repo_name] for repo_name in sorted(miner_metadata)]
+
+    def has_hf_metadata(self, miner_hotkey: str) -> bool:
+        """Checks if a specific miner has any HuggingFace metadata."""
+        with self.lock.read():
+            return bool(self.hf_metadata.get(miner_hotkey))
+
+    def read_hf_metadata_last_updated(self, miner_hotkey: str) -> Optional[dt.datetime]:
+        """Gets when a specific miner's HuggingFace metadata was last updated."""
+        with self.lock.read():
+            miner_metadata = self.hf_metadata.get(miner_hotkey)
+            if not miner_metadata:
+                return None
+            return max(entry.updated_at for entry in miner_metadata.values())
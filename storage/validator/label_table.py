@@ -0,0 +1,109 @@
+import heapq
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class LabelTable:
+    """Interns label values as small integer ids, counting how many stored buckets reference each id.
+
+    An id is freed as soon as no bucket references it, and freed ids are reused lowest first so that the ids in use
+    stay dense. Ids that were handed out but never referenced, e.g. because storing the index that needed them failed,
+    are only reclaimed by compact.
+
+    Not thread safe. Reading labels by id or id by label is safe alongside a single writer, as long as the ids read
+    are referenced by the stored buckets being read.
+    """
+
+    # Ids are only renumbered once this many, and at least as many as are in use, are free.
+    MIN_FREE_IDS_TO_COMPACT = 1000
+
+    def __init__(self):
+        # By id, with None for free ids.
+        self.labels: List[Optional[str]] = []
+        self.reference_counts = np.zeros(0, dtype=np.int64)
+        self.ids: Dict[str, int] = {}
+        # A min heap of the free ids below len(self.labels).
+        self.free_ids: List[int] = []
+
+    def __len__(self) -> int:
+        """Returns the number of labels with an id."""
+        return len(self.ids)
+
+    @property
+    def capacity(self) -> int:
+        """Returns one more than the largest id that has been handed out, which bounds every id in use."""
+        return len(self.labels)
+
+    def get_or_insert(self, label: str) -> int:
+        """Returns the id of the label, assigning it one if it has none.
+
+        The id is not referenced until add_references is called with it.
+        """
+        label_id = self.ids.get(label)
+        if label_id is not None:
+            return label_id
+
+        if self.free_ids:
+            label_id = heapq.heappop(self.free_ids)
+            self.labels[label_id] = label
+        else:
+            label_id = len(self.labels)
+            self.labels.append(label)
+            if label_id == len(self.reference_counts):
+                grown = np.zeros(max(16, 2 * label_id), dtype=np.int64)
+                grown[:label_id] = self.reference_counts
+                self.reference_counts = grown
+        self.ids[label] = label_id
+        return label_id
+
+    def get_id(self, label: str) -> Optional[int]:
+        """Returns the id of the label, without assigning one if it is missing."""
+        return self.ids.get(label)
+
+    def get_by_id(self, label_id: int) -> Optional[str]:
+        """Returns the label with the id, or None if the id is free."""
+        return self.labels[label_id]
+
+    def add_references(self, label_ids: np.ndarray):
+        """Adds a reference to the label of each id, counting repeated ids once per occurrence."""
+        counts = np.bincount(label_ids.astype(np.int64), minlength=self.capacity)
+        self.reference_counts[: self.capacity] += counts
+
+    def remove_references(self, label_ids: np.ndarray):
+        """Removes a reference to the label of each id, freeing the ids that are no longer referenced."""
+        counts = np.bincount(label_ids.astype(np.int64), minlength=self.capacity)
+        self.reference_counts[: self.capacity] -= counts
+
+        for label_id in np.flatnonzero(
+            (counts > 0) & (self.reference_counts[: self.capacity] == 0)
+        ).tolist():
+            self._free(label_id)
+
+    def _free(self, label_id: int):
+        del self.ids[self.labels[label_id]]
+        self.labels[label_id] = None
+        heapq.heappush(self.free_ids, label_id)
+
+    def compact(self) -> Optional[np.ndarray]:
+        """Renumbers the referenced ids to 0..n-1 once enough ids are free, preserving their order.
+
+        Returns an array mapping each old id to its new id, or to -1 for ids that were dropped, which the caller must
+        apply to every stored id. Returns None if nothing was renumbered.
+        """
+        referenced = self.reference_counts[: self.capacity] > 0
+        referenced_count = int(np.count_nonzero(referenced))
+        if self.capacity - referenced_count < max(
+            LabelTable.MIN_FREE_IDS_TO_COMPACT, referenced_count
+        ):
+            return None
+
+        id_map = np.full(self.capacity, -1, dtype=np.int64)
+        id_map[referenced] = np.arange(referenced_count)
+
+        # Rebuild rather than shrink the containers, since a dict never releases its table as keys are deleted.
+        self.reference_counts = self.reference_counts[: self.capacity][referenced]
+        self.labels = [self.labels[label_id] for label_id in np.flatnonzero(referenced).tolist()]
+        self.ids = {label: label_id for label_id, label in enumerate(self.labels)}
+        self.free_ids = []
+        return id_map
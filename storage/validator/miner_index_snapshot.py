@@ -0,0 +1,91 @@
+import dataclasses
+import datetime as dt
+import os
+from typing import List
+
+import numpy as np
+
+
+# Naive UTC datetimes are stored as microseconds since the epoch.
+_EPOCH = dt.datetime(1970, 1, 1)
+
+
+@dataclasses.dataclass
+class MinerIndexSnapshot:
+    """Every miner index held by a ValidatorStorage, as columns that can be saved to and loaded from disk in bulk.
+
+    The buckets of all miners are concatenated, with the buckets of the miner at position i of hotkeys in the range
+    [bucket_offsets[i], bucket_offsets[i + 1]). Labels are stored once, with each bucket's label being an index into
+    labels.
+    """
+
+    # Bumped whenever the saved format changes, so that snapshots in an older format are not loaded.
+    VERSION = 1
+
+    labels: List[str]
+    hotkeys: List[str]
+    credibilities: np.ndarray
+    last_updated: List[dt.datetime]
+    bucket_offsets: np.ndarray
+    sources: np.ndarray
+    label_ids: np.ndarray
+    time_bucket_ids: np.ndarray
+    sizes_bytes: np.ndarray
+
+    @property
+    def bucket_count(self) -> int:
+        return len(self.sources)
+
+    def save(self, path: str) -> None:
+        """Saves the snapshot to path, replacing any existing snapshot only once the new one is fully written."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as file:
+            np.savez(
+                file,
+                version=np.array(MinerIndexSnapshot.VERSION),
+                labels=np.array(self.labels, dtype=np.str_),
+                hotkeys=np.array(self.hotkeys, dtype=np.str_),
+                credibilities=np.asarray(self.credibilities, dtype=np.float64),
+                last_updated=np.array(
+                    [
+                        (last_updated - _EPOCH) // dt.timedelta(microseconds=1)
+                        for last_updated in self.last_updated
+                    ],
+                    dtype=np.int64,
+                ),
+                bucket_offsets=np.asarray(self.bucket_offsets, dtype=np.int64),
+                sources=np.asarray(self.sources, dtype=np.uint8),
+                label_ids=np.asarray(self.label_ids, dtype=np.uint32),
+                time_bucket_ids=np.asarray(self.time_bucket_ids, dtype=np.uint32),
+                sizes_bytes=np.asarray(self.sizes_bytes, dtype=np.int64),
+            )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MinerIndexSnapshot":
+        """Loads a snapshot saved by save.
+
+        Raises:
+            ValueError: If the snapshot was saved in a different format version.
+        """
+        with np.load(path, allow_pickle=False) as arrays:
+            version = int(arrays["version"])
+            if version != MinerIndexSnapshot.VERSION:
+                raise ValueError(
+                    f"Snapshot version {version} does not match the supported version {MinerIndexSnapshot.VERSION}."
+                )
+
+            return MinerIndexSnapshot(
+                labels=arrays["labels"].tolist(),
+                hotkeys=arrays["hotkeys"].tolist(),
+                credibilities=arrays["credibilities"],
+                last_updated=[
+                    _EPOCH + dt.timedelta(microseconds=microseconds)
+                    for microseconds in arrays["last_updated"].tolist()
+                ],
+                bucket_offsets=arrays["bucket_offsets"],
+                sources=arrays["sources"],
+                label_ids=arrays["label_ids"],
+                time_bucket_ids=arrays["time_bucket_ids"],
+                sizes_bytes=arrays["sizes_bytes"],
+            )
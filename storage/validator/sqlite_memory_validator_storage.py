@@ -1,48 +1,17 @@
 import contextlib
 import datetime as dt
+import itertools
+import numpy as np
 import bittensor as bt
 import sqlite3
 import threading
 from typing import Any, Dict, Optional, Set, Tuple, List
 from common.data import CompressedMinerIndex, DataLabel, HuggingFaceMetadata
-from common.data_v2 import ScorableDataEntityBucket, ScorableMinerIndex
-from storage.validator.validator_storage import ValidatorStorage
-
-
-class AutoIncrementDict:
-    """A dictionary that automatically assigns ids to keys.
-
-    Provides O(1) ability to insert a key and get its id, and to lookup the key for an id.
-
-    Not thread safe.
-    """
-
-    def __init__(self):
-        self.available_ids = set()
-        self.items = []
-        self.indexes = {}
-
-    def get_or_insert(self, key: Any) -> int:
-        if key not in self.indexes:
-            if self.available_ids:
-                key_id = self.available_ids.pop()
-                self.items[key_id] = key
-                self.indexes[key] = key_id
-            else:
-                self.items.append(key)
-                self.indexes[key] = len(self.items) - 1
-
-        return self.indexes[key]
-
-    def get_by_id(self, id: int) -> Any:
-        return self.items[id]
-
-    def delete_key(self, key: Any):
-        if key in self.indexes:
-            key_id = self.indexes[key]
-            self.items[key_id] = None
-            del self.indexes[key]
-            self.available_ids.add(key_id)
+from common.utils import ReadWriteLock
+from common.data_v2 import ColumnarScorableMinerIndex
+from storage.validator.label_table import LabelTable
+from storage.validator.miner_index_snapshot import MinerIndexSnapshot
+from storage.validator.validator_storage import MinerIndexDiff, ValidatorStorage
 
 
 # Use a timezone aware adapter for timestamp columns.
@@ -108,6 +77,64 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
     MINER_INDEX_TABLE_BUCKET_SIZE_INDEX = """CREATE INDEX IF NOT EXISTS bucket_size_index
                                              ON MinerIndex (source, labelId, timeBucketId, contentSizeBytes)"""
 
+    # The credibility weighted size of each bucket summed across all miners, maintained by the triggers below so that
+    # scoring a miner only looks up the totals of its own buckets.
+    BUCKET_TOTALS_TABLE_CREATE = """CREATE TABLE IF NOT EXISTS BucketTotals (
+                                    source                      TINYINT         NOT NULL,
+                                    labelId                     INTEGER         NOT NULL,
+                                    timeBucketId                INTEGER         NOT NULL,
+                                    minerCount                  INTEGER         NOT NULL,
+                                    totalAdjContentSizeBytes    FLOAT           NOT NULL,
+                                    PRIMARY KEY(source, labelId, timeBucketId)
+                                    ) WITHOUT ROWID"""
+
+    BUCKET_TOTALS_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_totals_insert AFTER INSERT ON MinerIndex
+                                      BEGIN
+                                        INSERT INTO BucketTotals (source, labelId, timeBucketId, minerCount, totalAdjContentSizeBytes)
+                                        VALUES (NEW.source, NEW.labelId, NEW.timeBucketId, 1,
+                                            NEW.contentSizeBytes * (SELECT credibility FROM Miner WHERE minerId = NEW.minerId))
+                                        ON CONFLICT (source, labelId, timeBucketId) DO UPDATE SET
+                                            minerCount = minerCount + 1,
+                                            totalAdjContentSizeBytes = totalAdjContentSizeBytes + excluded.totalAdjContentSizeBytes;
+                                      END"""
+
+    # Buckets no miner holds anymore are deleted rather than decremented, so no floating point error is left behind.
+    BUCKET_TOTALS_DELETE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_totals_delete AFTER DELETE ON MinerIndex
+                                      BEGIN
+                                        DELETE FROM BucketTotals
+                                        WHERE source = OLD.source AND labelId = OLD.labelId AND timeBucketId = OLD.timeBucketId
+                                            AND minerCount = 1;
+                                        UPDATE BucketTotals SET
+                                            minerCount = minerCount - 1,
+                                            totalAdjContentSizeBytes = totalAdjContentSizeBytes
+                                                - OLD.contentSizeBytes * (SELECT credibility FROM Miner WHERE minerId = OLD.minerId)
+                                        WHERE source = OLD.source AND labelId = OLD.labelId AND timeBucketId = OLD.timeBucketId;
+                                      END"""
+
+    BUCKET_TOTALS_UPDATE_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_totals_update
+                                      AFTER UPDATE OF contentSizeBytes ON MinerIndex
+                                      BEGIN
+                                        UPDATE BucketTotals SET
+                                            totalAdjContentSizeBytes = totalAdjContentSizeBytes
+                                                + (NEW.contentSizeBytes - OLD.contentSizeBytes)
+                                                    * (SELECT credibility FROM Miner WHERE minerId = NEW.minerId)
+                                        WHERE source = NEW.source AND labelId = NEW.labelId AND timeBucketId = NEW.timeBucketId;
+                                      END"""
+
+    BUCKET_TOTALS_CREDIBILITY_TRIGGER = """CREATE TRIGGER IF NOT EXISTS bucket_totals_credibility
+                                           AFTER UPDATE OF credibility ON Miner
+                                           WHEN OLD.credibility != NEW.credibility
+                                           BEGIN
+                                             UPDATE BucketTotals SET
+                                                totalAdjContentSizeBytes = totalAdjContentSizeBytes
+                                                    + MinerIndex.contentSizeBytes * (NEW.credibility - OLD.credibility)
+                                             FROM MinerIndex
+                                             WHERE MinerIndex.minerId = NEW.minerId
+                                                AND BucketTotals.source = MinerIndex.source
+                                                AND BucketTotals.labelId = MinerIndex.labelId
+                                                AND BucketTotals.timeBucketId = MinerIndex.timeBucketId;
+                                           END"""
+
     HF_METADATA_TABLE_CREATE = """CREATE TABLE IF NOT EXISTS HFMetadata (
                                         minerId     INTEGER         NOT NULL,
                                         repo_name   TEXT            NOT NULL,
@@ -121,7 +148,7 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
         sqlite3.register_converter("timestamp", tz_aware_timestamp_adapter)
 
         self.continuous_connection_do_not_reuse = self._create_connection()
-        self.label_dict = AutoIncrementDict()
+        self.label_table = LabelTable()
 
         with contextlib.closing(self._create_connection()) as connection:
             cursor = connection.cursor()
@@ -136,10 +163,22 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
                 SqliteMemoryValidatorStorage.MINER_INDEX_TABLE_BUCKET_SIZE_INDEX
             )
 
+            # Create the BucketTotals table and the triggers that maintain it.
+            cursor.execute(SqliteMemoryValidatorStorage.BUCKET_TOTALS_TABLE_CREATE)
+            cursor.execute(SqliteMemoryValidatorStorage.BUCKET_TOTALS_INSERT_TRIGGER)
+            cursor.execute(SqliteMemoryValidatorStorage.BUCKET_TOTALS_DELETE_TRIGGER)
+            cursor.execute(SqliteMemoryValidatorStorage.BUCKET_TOTALS_UPDATE_TRIGGER)
+            cursor.execute(
+                SqliteMemoryValidatorStorage.BUCKET_TOTALS_CREDIBILITY_TRIGGER
+            )
+
             cursor.execute(SqliteMemoryValidatorStorage.HF_METADATA_TABLE_CREATE)
 
-            # Lock to avoid concurrency issues on interacting with the database.
-            self.lock = threading.RLock()
+            # Readers share the lock and writers hold it exclusively. Shared cache connections fail rather than wait
+            # when reading a table that is being written, so every access must go through the lock.
+            self.lock = ReadWriteLock()
+            # Serializes writers, so that an index read to compute a diff cannot change before the diff is applied.
+            self.write_mutex = threading.Lock()
 
     def _create_connection(self):
         # Create the database if it doesn't exist, defaulting to the local directory.
@@ -156,25 +195,25 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
         return connection
 
     def _upsert_miner(self, hotkey: str, now_str: str, credibility: float) -> int:
+        """Stores the miner's details, returning its minerId. Must be called with the write lock held."""
         miner_id = 0
 
-        with self.lock:
-            with contextlib.closing(self._create_connection()) as connection:
-                cursor = connection.cursor()
+        with contextlib.closing(self._create_connection()) as connection:
+            cursor = connection.cursor()
 
-                cursor.execute(
-                    "UPDATE OR IGNORE Miner SET lastUpdated=?, credibility=? WHERE hotkey=?",
-                    [now_str, credibility, hotkey],
-                )
-                cursor.execute(
-                    """INSERT OR IGNORE INTO Miner (hotkey, lastUpdated, credibility) VALUES (?, ?, ?)""",
-                    [hotkey, now_str, credibility],
-                )
-                connection.commit()
+            cursor.execute(
+                "UPDATE OR IGNORE Miner SET lastUpdated=?, credibility=? WHERE hotkey=?",
+                [now_str, credibility, hotkey],
+            )
+            cursor.execute(
+                """INSERT OR IGNORE INTO Miner (hotkey, lastUpdated, credibility) VALUES (?, ?, ?)""",
+                [hotkey, now_str, credibility],
+            )
+            connection.commit()
 
-                # Then we get the existing or newly created minerId
-                cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [hotkey])
-                miner_id = cursor.fetchone()[0]
+            # Then we get the existing or newly created minerId
+            cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [hotkey])
+            miner_id = cursor.fetchone()[0]
 
         return miner_id
 
@@ -188,8 +227,11 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
 
     def upsert_compressed_miner_index(
         self, index: CompressedMinerIndex, hotkey: str, credibility: float
-    ):
-        """Stores the index for all of the data that a specific miner promises to provide."""
+    ) -> MinerIndexDiff:
+        """Stores the index for all of the data that a specific miner promises to provide.
+
+        Only the buckets that changed since the miner's previous index are written. Returns how the stored index changed.
+        """
 
         bt.logging.trace(
             f"{hotkey}: Upserting miner index with {CompressedMinerIndex.bucket_count(index)} buckets"
@@ -197,57 +239,106 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
 
         now_str = dt.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
 
-        # Upsert this Validator's minerId for the specified hotkey.
-        miner_id = self._upsert_miner(hotkey, now_str, credibility)
-
-        # Parse every DataEntityBucket from the index into a list of values to insert.
-        values = []
-        for source, compressed_buckets in index.sources.items():
-            for compressed_bucket in compressed_buckets:
-                for time_bucket_id, size_bytes in zip(
-                    compressed_bucket.time_bucket_ids, compressed_bucket.sizes_bytes
-                ):
-                    try:
-                        values.append(
-                            [
-                                miner_id,
-                                int(source),
-                                self.label_dict.get_or_insert(
-                                    self._label_value_parse_str(compressed_bucket.label)
+        with self.write_mutex:
+            # Parse every DataEntityBucket from the index into its size by (source, labelId, timeBucketId).
+            # Keep the first of any duplicates to defend against a miner giving us multiple duplicate rows.
+            sizes_by_bucket = {}
+            for source, compressed_buckets in index.sources.items():
+                for compressed_bucket in compressed_buckets:
+                    for time_bucket_id, size_bytes in zip(
+                        compressed_bucket.time_bucket_ids, compressed_bucket.sizes_bytes
+                    ):
+                        try:
+                            sizes_by_bucket.setdefault(
+                                (
+                                    int(source),
+                                    self.label_table.get_or_insert(
+                                        self._label_value_parse_str(compressed_bucket.label)
+                                    ),
+                                    time_bucket_id,
                                 ),
-                                time_bucket_id,
                                 size_bytes,
-                            ]
-                        )
-                    except:
-                        # In the case that we fail to get a label (due to unsupported characters) we drop just that one bucket.
-                        pass
-
-        with self.lock:
-            # Clear the previous keys for this miner.
-            self._delete_miner_index(hotkey)
-
-            with contextlib.closing(self._create_connection()) as connection:
-                cursor = connection.cursor()
-                # Insert the new keys. (Ignore into to defend against a miner giving us multiple duplicate rows.)
-                # Batch in groups of 1m if necessary to avoid congestion issues.
-                value_subsets = [
-                    values[x : x + 1_000_000] for x in range(0, len(values), 1_000_000)
-                ]
-                for value_subset in value_subsets:
+                            )
+                        except:
+                            # In the case that we fail to get a label (due to unsupported characters) we drop just that one bucket.
+                            pass
+
+            # Read the stored index alongside other readers.
+            stored_sizes_by_bucket = {}
+            with self.lock.read():
+                with contextlib.closing(self._create_connection()) as connection:
+                    cursor = connection.cursor()
+                    cursor.execute(
+                        """SELECT source, labelId, timeBucketId, contentSizeBytes FROM MinerIndex
+                        WHERE minerId = (SELECT minerId FROM Miner WHERE hotkey = ?)""",
+                        [hotkey],
+                    )
+                    stored_sizes_by_bucket = {
+                        (row[0], row[1], row[2]): row[3] for row in cursor
+                    }
+
+            inserted = []
+            resized = []
+            unchanged = 0
+            for bucket, size_bytes in sizes_by_bucket.items():
+                stored_size_bytes = stored_sizes_by_bucket.pop(bucket, None)
+                if stored_size_bytes is None:
+                    inserted.append([*bucket, size_bytes])
+                elif stored_size_bytes != size_bytes:
+                    resized.append([size_bytes, *bucket])
+                else:
+                    unchanged += 1
+            # Whatever was not in the new index is removed.
+            removed = list(stored_sizes_by_bucket)
+
+            # Only the changes are applied exclusively.
+            with self.lock.write():
+                # Upsert this Validator's minerId for the specified hotkey. Updating the credibility first lets the
+                # BucketTotals triggers reweight the buckets that stay and subtract the removed ones at the new credibility.
+                miner_id = self._upsert_miner(hotkey, now_str, credibility)
+
+                with contextlib.closing(self._create_connection()) as connection:
+                    cursor = connection.cursor()
+                    cursor.execute("BEGIN")
                     cursor.executemany(
-                        """INSERT OR IGNORE INTO MinerIndex (minerId, source, labelId, timeBucketId, contentSizeBytes) VALUES (?, ?, ?, ?, ?)""",
-                        value_subset,
+                        "DELETE FROM MinerIndex WHERE minerId = ? AND source = ? AND labelId = ? AND timeBucketId = ?",
+                        ([miner_id, *bucket] for bucket in removed),
                     )
-                connection.commit()
+                    cursor.executemany(
+                        "UPDATE MinerIndex SET contentSizeBytes = ? WHERE minerId = ? AND source = ? AND labelId = ? AND timeBucketId = ?",
+                        ([size_bytes, miner_id, *bucket] for size_bytes, *bucket in resized),
+                    )
+                    cursor.executemany(
+                        """INSERT INTO MinerIndex (minerId, source, labelId, timeBucketId, contentSizeBytes) VALUES (?, ?, ?, ?, ?)""",
+                        ([miner_id, *value] for value in inserted),
+                    )
+                    connection.commit()
+
+                # Reference the inserted labels before releasing the removed ones, so that labels in both keep their ids.
+                self.label_table.add_references(
+                    np.array([bucket[1] for bucket in inserted], dtype=np.int64)
+                )
+                self.label_table.remove_references(
+                    np.array([bucket[1] for bucket in removed], dtype=np.int64)
+                )
+                self._compact_label_ids()
+
+        diff = MinerIndexDiff(
+            inserted=len(inserted),
+            removed=len(removed),
+            resized=len(resized),
+            unchanged=unchanged,
+        )
+        bt.logging.trace(f"{hotkey}: Upserted miner index with changes {diff}")
+        return diff
 
     def read_miner_index(
         self,
         miner_hotkey: str,
-    ) -> Optional[ScorableMinerIndex]:
+    ) -> Optional[ColumnarScorableMinerIndex]:
         """Gets a scored index for all of the data that a specific miner promises to provide."""
 
-        with self.lock:
+        with self.lock.read():
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute(
@@ -263,52 +354,39 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
                 miner_credibility = result[2]
 
                 # Get all the DataEntityBuckets for this miner joined to the total content size of like buckets.
-                sql_string = """WITH
-                                TempBuckets AS (
-                                    SELECT source, labelId, timeBucketId
-                                    FROM MinerIndex
-                                    WHERE MinerId = ?
-                                ),
-                                TempAgg AS (
-                                    SELECT source, labelId, timeBucketId,
-                                    SUM(contentSizeBytes * credibility) as totalAdjContentSizeBytes
-                                    FROM MinerIndex
-                                    INNER JOIN TempBuckets USING (source, labelId, timeBucketId)
-                                    JOIN Miner USING (minerId)
-                                    GROUP BY source, labelId, timeBucketId
-                                )
-                                SELECT source, labelId, timeBucketId, contentSizeBytes,
-                                    (contentSizeBytes * (contentSizeBytes * ?) / TempAgg.totalAdjContentSizeBytes) as scorableBytes
+                sql_string = """SELECT source, labelId, timeBucketId, contentSizeBytes,
+                                    (contentSizeBytes * (contentSizeBytes * ?) / BucketTotals.totalAdjContentSizeBytes) as scorableBytes
                                 FROM MinerIndex
-                                LEFT JOIN TempAgg USING (source, labelId, timeBucketId)
+                                LEFT JOIN BucketTotals USING (source, labelId, timeBucketId)
                                 WHERE minerId = ?"""
 
-                cursor.execute(sql_string, [miner_id, miner_credibility, miner_id])
-
-                # Create to a list to hold each of the ScorableDataEntityBuckets we generate for this miner.
-                scored_data_entity_buckets = []
+                cursor.execute(sql_string, [miner_credibility, miner_id])
+                rows = cursor.fetchall()
 
-                # For each row (representing a DataEntityBucket and Uniqueness) turn it into a ScorableDataEntityBucket.
-                for row in cursor:
-                    label_value = self.label_dict.get_by_id(row[1])
-
-                    # Add the bucket to the list of scored buckets on the overall index.
-                    scored_data_entity_buckets.append(
-                        ScorableDataEntityBucket(
-                            time_bucket_id=int(row[2]),
-                            source=int(row[0]),
-                            label=label_value if label_value != "NULL" else None,
-                            size_bytes=int(row[3] if row[3] else 0),
-                            scorable_bytes=int(row[4] if row[4] else 0),
-                        )
-                    )
-
-                scored_index = ScorableMinerIndex(
-                    scorable_data_entity_buckets=scored_data_entity_buckets,
-                    last_updated=last_updated,
-                )
-
-                return scored_index
+            # Turn the rows (each representing a DataEntityBucket and Uniqueness) into columns.
+            # Buckets without totals have NULL scorable bytes, which become NaN and then 0.
+            columns = np.array(rows, dtype=np.float64).reshape(-1, 5)
+            distinct_label_ids, index_label_ids = np.unique(
+                columns[:, 1].astype(np.int64), return_inverse=True
+            )
+            # Label ids are only stable while the lock is held.
+            label_values = [
+                self.label_table.get_by_id(label_id)
+                for label_id in distinct_label_ids.tolist()
+            ]
+
+        return ColumnarScorableMinerIndex(
+            labels=[
+                label_value if label_value != "NULL" else None
+                for label_value in label_values
+            ],
+            sources=columns[:, 0],
+            label_ids=index_label_ids,
+            time_bucket_ids=columns[:, 2],
+            sizes_bytes=np.nan_to_num(columns[:, 3]),
+            scorable_bytes=np.nan_to_num(columns[:, 4]),
+            last_updated=last_updated,
+        )
 
     def _delete_miner_index(self, miner_hotkey: str):
         """Removes the index for the specified miner."""
@@ -320,24 +398,62 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
 
             cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [miner_hotkey])
 
-            # Delete the rows for the specified miner.
+            # Delete the rows for the specified miner, releasing their labels.
             result = cursor.fetchone()
             if result is not None:
+                self.label_table.remove_references(
+                    self._read_miner_label_ids(cursor, result[0])
+                )
                 cursor.execute("DELETE FROM MinerIndex WHERE minerId = ?", [result[0]])
                 connection.commit()
 
+    def _read_miner_label_ids(self, cursor: sqlite3.Cursor, miner_id: int) -> np.ndarray:
+        """Reads the labelId of every bucket in the miner's index."""
+        cursor.execute("SELECT labelId FROM MinerIndex WHERE minerId = ?", [miner_id])
+        return np.fromiter((row[0] for row in cursor), dtype=np.int64)
+
+    def _compact_label_ids(self):
+        """Renumbers the label ids once enough of them are free.
+
+        Must be called with the write mutex and the write lock held.
+        """
+        id_map = self.label_table.compact()
+        if id_map is None:
+            return
+
+        with contextlib.closing(self._create_connection()) as connection:
+            cursor = connection.cursor()
+            cursor.execute("BEGIN")
+            # Restricting by source lets each update use the (source, labelId, ...) indexes rather than a table scan.
+            cursor.execute("SELECT DISTINCT source FROM BucketTotals")
+            sources = [row[0] for row in cursor.fetchall()]
+            source_filter = f"source IN ({', '.join('?' * len(sources))})"
+            # New ids are never larger than old ones, so moving ids in ascending order never collides with an id that
+            # is still in use. The totals triggers only track sizes, so both tables are updated directly.
+            for old_id, new_id in enumerate(id_map.tolist()):
+                if new_id < 0 or new_id == old_id:
+                    continue
+                for table in ("MinerIndex", "BucketTotals"):
+                    cursor.execute(
+                        f"UPDATE {table} SET labelId = ? WHERE {source_filter} AND labelId = ?",
+                        [new_id, *sources, old_id],
+                    )
+            connection.commit()
+        bt.logging.trace(f"Compacted label ids to {len(self.label_table)} labels")
+
     def delete_miner(self, hotkey: str):
         """Removes the index and miner details for the specified miner."""
-        with self.lock:
+        with self.write_mutex, self.lock.write():
             self._delete_miner_index(hotkey)
             self._delete_hf_metadata(hotkey)
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute("DELETE FROM Miner WHERE hotkey = ?", [hotkey])
+            self._compact_label_ids()
 
     def read_miner_last_updated(self, miner_hotkey: str) -> Optional[dt.datetime]:
         """Gets when a specific miner was last updated."""
-        with self.lock:
+        with self.lock.read():
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute(
@@ -349,12 +465,235 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
                 else:
                     return None
 
+    def export_snapshot(self) -> MinerIndexSnapshot:
+        """Gets a consistent snapshot of every stored miner index, with each miner's credibility and last update."""
+        hotkeys = []
+        credibilities = []
+        last_updated = []
+        # The (source, labelId, timeBucketId, contentSizeBytes) columns of each miner's index.
+        miner_columns = []
+        with self.lock.read():
+            with contextlib.closing(self._create_connection()) as connection:
+                cursor = connection.cursor()
+                cursor.execute(
+                    "SELECT minerId, hotkey, credibility, lastUpdated FROM Miner ORDER BY minerId"
+                )
+                miners = cursor.fetchall()
+
+                # Read one miner at a time to avoid holding every row of every miner as tuples at once.
+                for miner_id, hotkey, credibility, miner_last_updated in miners:
+                    cursor.execute(
+                        "SELECT source, labelId, timeBucketId, contentSizeBytes FROM MinerIndex WHERE minerId = ?",
+                        [miner_id],
+                    )
+                    hotkeys.append(hotkey)
+                    credibilities.append(credibility)
+                    last_updated.append(miner_last_updated)
+                    miner_columns.append(
+                        np.array(cursor.fetchall(), dtype=np.int64).reshape(-1, 4)
+                    )
+
+            columns = np.concatenate(
+                [np.empty((0, 4), dtype=np.int64)] + miner_columns
+            )
+            # Only the labels that are in use are included.
+            distinct_label_ids, snapshot_label_ids = np.unique(
+                columns[:, 1], return_inverse=True
+            )
+            labels = [
+                self.label_table.get_by_id(label_id)
+                for label_id in distinct_label_ids.tolist()
+            ]
+
+        return MinerIndexSnapshot(
+            labels=labels,
+            hotkeys=hotkeys,
+            credibilities=np.array(credibilities, dtype=np.float64),
+            last_updated=last_updated,
+            bucket_offsets=np.concatenate(
+                [[0], np.cumsum([len(columns) for columns in miner_columns])]
+            ).astype(np.int64),
+            sources=columns[:, 0].astype(np.uint8),
+            label_ids=snapshot_label_ids.astype(np.uint32),
+            time_bucket_ids=columns[:, 2].astype(np.uint32),
+            sizes_bytes=columns[:, 3],
+        )
+
+    def import_snapshot(self, snapshot: MinerIndexSnapshot):
+        """Stores the miner indexes in the snapshot, as of when the snapshot was taken, replacing any stored indexes
+        for the same miners."""
+        with self.write_mutex, self.lock.write():
+            # Map the snapshot's labels to ids in this storage's label table.
+            label_ids = np.array(
+                [self.label_table.get_or_insert(label) for label in snapshot.labels],
+                dtype=np.int64,
+            )
+            # Hold the mapped labels while importing, so that replacing one miner's index cannot free a label that a later
+            # miner in the snapshot uses.
+            self.label_table.add_references(label_ids)
+
+            for i, hotkey in enumerate(snapshot.hotkeys):
+                start, end = snapshot.bucket_offsets[i], snapshot.bucket_offsets[i + 1]
+                miner_id = self._upsert_miner(
+                    hotkey,
+                    snapshot.last_updated[i].strftime("%Y-%m-%d %H:%M:%S.%f"),
+                    float(snapshot.credibilities[i]),
+                )
+
+                with contextlib.closing(self._create_connection()) as connection:
+                    cursor = connection.cursor()
+                    cursor.execute("BEGIN")
+                    previous_label_ids = self._read_miner_label_ids(cursor, miner_id)
+                    cursor.execute("DELETE FROM MinerIndex WHERE minerId = ?", [miner_id])
+                    # Keep the first of any duplicate buckets, as when upserting an index.
+                    cursor.executemany(
+                        """INSERT OR IGNORE INTO MinerIndex (minerId, source, labelId, timeBucketId, contentSizeBytes) VALUES (?, ?, ?, ?, ?)""",
+                        zip(
+                            itertools.repeat(miner_id),
+                            snapshot.sources[start:end].tolist(),
+                            label_ids[snapshot.label_ids[start:end]].tolist(),
+                            snapshot.time_bucket_ids[start:end].tolist(),
+                            snapshot.sizes_bytes[start:end].tolist(),
+                        ),
+                    )
+                    # Count the references of the rows actually stored, since duplicates were ignored.
+                    self.label_table.add_references(
+                        self._read_miner_label_ids(cursor, miner_id)
+                    )
+                    connection.commit()
+                self.label_table.remove_references(previous_label_ids)
+
+            self.label_table.remove_references(label_ids)
+            # Only compact once every miner is stored, since compacting renumbers the ids mapped above.
+            self._compact_label_ids()
+
+    def read_label_sizes(
+        self, source: int, limit: int = 1000
+    ) -> List[Tuple[str, int, float]]:
+        """Gets the (label, total bytes, credibility weighted bytes) across all miners of a source's labels, largest
+        weighted first."""
+        with self.lock.read():
+            with contextlib.closing(self._create_connection()) as connection:
+                cursor = connection.cursor()
+                cursor.execute(
+                    """SELECT labelId,
+                        SUM(contentSizeBytes) as contentSizeBytes,
+                        SUM(contentSizeBytes * credibility) as adjContentSizeBytes
+                    FROM MinerIndex
+                    JOIN Miner USING (minerId)
+                    WHERE source = ?
+                    GROUP BY labelId
+                    ORDER BY adjContentSizeBytes DESC
+                    LIMIT ?""",
+                    [source, limit],
+                )
+
+                # Label ids are only stable while the lock is held.
+                return [
+                    (self.label_table.get_by_id(row[0]), int(row[1]), float(row[2]))
+                    for row in cursor.fetchall()
+                ]
+
+    def read_time_bucket_sizes(
+        self, source: int, limit: int = 1000
+    ) -> List[Tuple[int, int, float]]:
+        """Gets the (time bucket id, total bytes, credibility weighted bytes) across all miners of a source's time
+        buckets, newest first."""
+        with self.lock.read():
+            with contextlib.closing(self._create_connection()) as connection:
+                cursor = connection.cursor()
+                cursor.execute(
+                    """SELECT timeBucketId,
+                        SUM(contentSizeBytes) as contentSizeBytes,
+                        SUM(contentSizeBytes * credibility) as adjContentSizeBytes
+                    FROM MinerIndex
+                    JOIN Miner USING (minerId)
+                    WHERE source = ?
+                    GROUP BY timeBucketId
+                    ORDER BY timeBucketId DESC
+                    LIMIT ?""",
+                    [source, limit],
+                )
+                rows = cursor.fetchall()
+
+        return [(int(row[0]), int(row[1]), float(row[2])) for row in rows]
+
+    def read_label_total_bytes(self, label: Optional[str]) -> Tuple[int, float]:
+        """Gets the total bytes and credibility weighted bytes of a label across all sources and miners."""
+        with self.lock.read():
+            # Label ids are only stable while the lock is held.
+            label_id = self.label_table.get_id(self._label_value_parse_str(label))
+            if label_id is None:
+                return 0, 0.0
+
+            with contextlib.closing(self._create_connection()) as connection:
+                cursor = connection.cursor()
+                cursor.execute(
+                    """SELECT SUM(contentSizeBytes), SUM(contentSizeBytes * credibility)
+                    FROM MinerIndex
+                    JOIN Miner USING (minerId)
+                    WHERE labelId = ?""",
+                    [label_id],
+                )
+                row = cursor.fetchone()
+
+        return int(row[0] or 0), float(row[1] or 0.0)
+
+    def read_database_size_bytes(self) -> int:
+        """Gets the bytes of the pages of the shared in-memory database, which Python's allocator does not see."""
+        with self.lock.read():
+            with contextlib.closing(self._create_connection()) as connection:
+                cursor = connection.cursor()
+                page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+                page_size = cursor.execute("PRAGMA page_size").fetchone()[0]
+
+        return page_count * page_size
+
+    def find_latest_bucket_miner(
+        self,
+        source: int,
+        start_time_bucket_id: int,
+        end_time_bucket_id: int,
+        label: Optional[str] = None,
+    ) -> Optional[Tuple[str, float, int, int]]:
+        """Finds the most credible miner holding the latest time bucket of a source within the inclusive range.
+
+        If a label is provided, only the miners holding that label in the latest time bucket are considered.
+        Returns the miner's (hotkey, credibility, bucket size bytes, time bucket id), or None if there is no such miner.
+        """
+        query = """WITH LatestBucket AS (
+                        SELECT MAX(timeBucketId) as timeBucketId
+                        FROM MinerIndex
+                        WHERE source = ? AND timeBucketId BETWEEN ? AND ?
+                    )
+                    SELECT hotkey, credibility, contentSizeBytes, MinerIndex.timeBucketId
+                    FROM MinerIndex
+                    JOIN Miner USING (minerId)
+                    JOIN LatestBucket USING (timeBucketId)
+                    WHERE source = ?"""
+        params = [source, start_time_bucket_id, end_time_bucket_id, source]
+
+        with self.lock.read():
+            # Label ids are only stable while the lock is held.
+            if label is not None:
+                label_id = self.label_table.get_id(self._label_value_parse_str(label))
+                if label_id is None:
+                    return None
+                query += " AND labelId = ?"
+                params.append(label_id)
+            query += " ORDER BY credibility DESC LIMIT 1"
+
+            with contextlib.closing(self._create_connection()) as connection:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                return cursor.fetchone()
+
     # Hugging face functionality
     def upsert_hf_metadata(self, hotkey: str, metadata: List[HuggingFaceMetadata]):
         """Stores or updates the HuggingFace metadata for a specific miner."""
         bt.logging.trace(f"{hotkey}: Upserting HuggingFace metadata with {len(metadata)} entries")
 
-        with self.lock:
+        with self.lock.write():
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [hotkey])
@@ -374,7 +713,7 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
 
     def read_hf_metadata(self, miner_hotkey: str) -> List[HuggingFaceMetadata]:
         """Gets the HuggingFace metadata for a specific miner."""
-        with self.lock:
+        with self.lock.read():
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [miner_hotkey])
@@ -408,7 +747,7 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
 
     def has_hf_metadata(self, miner_hotkey: str) -> bool:
         """Checks if a specific miner has any HuggingFace metadata."""
-        with self.lock:
+        with self.lock.read():
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [miner_hotkey])
@@ -422,7 +761,7 @@ class SqliteMemoryValidatorStorage(ValidatorStorage):
 
     def read_hf_metadata_last_updated(self, miner_hotkey: str) -> Optional[dt.datetime]:
         """Gets when a specific miner's HuggingFace metadata was last updated."""
-        with self.lock:
+        with self.lock.read():
             with contextlib.closing(self._create_connection()) as connection:
                 cursor = connection.cursor()
                 cursor.execute("SELECT minerId FROM Miner WHERE hotkey = ?", [miner_hotkey])
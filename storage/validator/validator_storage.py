@@ -1,9 +1,21 @@
 from abc import ABC, abstractmethod
+import dataclasses
 from common.data import CompressedMinerIndex
-from typing import Optional
+from typing import List, Optional, Tuple
 import datetime as dt
 
-from common.data_v2 import ScorableMinerIndex
+from common.data_v2 import ColumnarScorableMinerIndex
+from storage.validator.miner_index_snapshot import MinerIndexSnapshot
+
+
+@dataclasses.dataclass(frozen=True)
+class MinerIndexDiff:
+    """The number of buckets an upsert inserted, removed, resized and left unchanged in a miner's stored index."""
+
+    inserted: int = 0
+    removed: int = 0
+    resized: int = 0
+    unchanged: int = 0
 
 
 class ValidatorStorage(ABC):
@@ -12,12 +24,17 @@ class ValidatorStorage(ABC):
     @abstractmethod
     def upsert_compressed_miner_index(
         self, index: CompressedMinerIndex, hotkey: str, credibility: float = 0
-    ):
-        """Stores the index for all of the data that a specific miner promises to provide."""
+    ) -> MinerIndexDiff:
+        """Stores the index for all of the data that a specific miner promises to provide.
+
+        Returns how the stored index changed.
+        """
         raise NotImplemented
 
     @abstractmethod
-    def read_miner_index(self, miner_hotkey: str) -> Optional[ScorableMinerIndex]:
+    def read_miner_index(
+        self, miner_hotkey: str
+    ) -> Optional[ColumnarScorableMinerIndex]:
         """Gets a scored index for all of the data that a specific miner promises to provide."""
         raise NotImplemented
 
@@ -30,3 +47,49 @@ class ValidatorStorage(ABC):
     def read_miner_last_updated(self, miner_hotkey: str) -> Optional[dt.datetime]:
         """Gets when a specific miner was last updated."""
         raise NotImplemented
+
+    @abstractmethod
+    def export_snapshot(self) -> MinerIndexSnapshot:
+        """Gets a consistent snapshot of every stored miner index, with each miner's credibility and last update."""
+        raise NotImplemented
+
+    @abstractmethod
+    def import_snapshot(self, snapshot: MinerIndexSnapshot):
+        """Stores the miner indexes in the snapshot, as of when the snapshot was taken, replacing any stored indexes
+        for the same miners."""
+        raise NotImplemented
+
+    @abstractmethod
+    def read_label_sizes(
+        self, source: int, limit: int = 1000
+    ) -> List[Tuple[str, int, float]]:
+        """Gets the (label, total bytes, credibility weighted bytes) across all miners of a source's labels, largest
+        weighted first."""
+        raise NotImplemented
+
+    @abstractmethod
+    def read_time_bucket_sizes(
+        self, source: int, limit: int = 1000
+    ) -> List[Tuple[int, int, float]]:
+        """Gets the (time bucket id, total bytes, credibility weighted bytes) across all miners of a source's time
+        buckets, newest first."""
+        raise NotImplemented
+
+    @abstractmethod
+    def read_label_total_bytes(self, label: Optional[str]) -> Tuple[int, float]:
+        """Gets the total bytes and credibility weighted bytes of a label across all sources and miners."""
+        raise NotImplemented
+
+    @abstractmethod
+    def find_latest_bucket_miner(
+        self,
+        source: int,
+        start_time_bucket_id: int,
+        end_time_bucket_id: int,
+        label: Optional[str] = None,
+    ) -> Optional[Tuple[str, float, int, int]]:
+        """Finds the most credible miner holding the latest time bucket of a source within the inclusive range.
+
+        Returns the miner's (hotkey, credibility, bucket size bytes, time bucket id), or None if there is no such miner.
+        """
+        raise NotImplemented
@@ -1,6 +1,12 @@
+import datetime as dt
 import unittest
 from common.data import DataEntityBucketId, DataLabel, DataSource, TimeBucket
-from common.data_v2 import ScorableDataEntityBucket, DataEntityBucket
+from common.data_v2 import (
+    ColumnarScorableMinerIndex,
+    DataEntityBucket,
+    ScorableDataEntityBucket,
+    ScorableMinerIndex,
+)
 
 
 class TestDataV2(unittest.TestCase):
@@ -87,5 +93,68 @@ class TestDataV2(unittest.TestCase):
         self.assertEqual(scorable_data_entity_bucket_1, scorable_data_entity_bucket_2)
 
 
+    def test_columnar_scorable_miner_index_from_index(self):
+        """Tests that converting a ScorableMinerIndex to columns preserves every bucket."""
+        buckets = [
+            ScorableDataEntityBucket(
+                time_bucket_id=100 + i,
+                source=DataSource.REDDIT.value if i % 2 else DataSource.X.value,
+                label=[None, "Label_1", "label_2"][i % 3],
+                size_bytes=1000 + i,
+                scorable_bytes=500 + i,
+            )
+            for i in range(10)
+        ]
+        index = ScorableMinerIndex(
+            scorable_data_entity_buckets=buckets,
+            last_updated=dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc),
+        )
+
+        columnar_index = ColumnarScorableMinerIndex.from_index(index)
+
+        self.assertEqual(len(columnar_index), 10)
+        self.assertEqual(columnar_index.labels, [None, "label_1", "label_2"])
+        self.assertEqual(columnar_index.last_updated, index.last_updated)
+        self.assertEqual(columnar_index.get_bucket(4), buckets[4])
+        self.assertEqual(columnar_index.scorable_data_entity_buckets, buckets)
+        # Buckets are only created once.
+        self.assertIs(
+            columnar_index.scorable_data_entity_buckets,
+            columnar_index.scorable_data_entity_buckets,
+        )
+        self.assertIs(ColumnarScorableMinerIndex.from_index(columnar_index), columnar_index)
+
+        # The columns can't be modified.
+        with self.assertRaises(ValueError):
+            columnar_index.sizes_bytes[0] = 0
+
+    def test_columnar_scorable_miner_index_validation(self):
+        """Tests that the columns are validated like the buckets they represent."""
+
+        def create_index(**kwargs):
+            columns = dict(
+                labels=["label"],
+                sources=[DataSource.REDDIT.value],
+                label_ids=[0],
+                time_bucket_ids=[100],
+                sizes_bytes=[1000],
+                scorable_bytes=[500],
+                last_updated=dt.datetime.now(tz=dt.timezone.utc),
+            )
+            columns.update(kwargs)
+            return ColumnarScorableMinerIndex(**columns)
+
+        create_index()
+        with self.assertRaises(ValueError):
+            create_index(scorable_bytes=[1001])
+        with self.assertRaises(ValueError):
+            create_index(sizes_bytes=[-1], scorable_bytes=[-1])
+        with self.assertRaises(ValueError):
+            create_index(label_ids=[1])
+        with self.assertRaises(ValueError):
+            create_index(labels=["a" * 141])
+        with self.assertRaises(ValueError):
+            create_index(time_bucket_ids=[100, 101])
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,12 @@
+from collections import Counter
 import functools
+import itertools
+import random
+import threading
 import time
 import unittest
 
-from common.utils import run_in_thread
+from common.utils import ReadWriteLock, WeightedSampler, run_in_thread
 
 
 class TestUtils(unittest.TestCase):
@@ -52,6 +56,93 @@ class TestUtils(unittest.TestCase):
         with self.assertRaises(ValueError):
             result = run_in_thread(func=partial, ttl=5)
 
+    def test_read_write_lock_shared_readers(self):
+        """Tests that readers hold the lock together while a writer waits for all of them."""
+        lock = ReadWriteLock()
+        events = []
+        both_reading = threading.Barrier(2, timeout=5)
+
+        def read():
+            with lock.read():
+                # Only passes if both readers hold the lock at once.
+                both_reading.wait()
+                time.sleep(0.1)
+                events.append("read")
+
+        def write():
+            with lock.write():
+                events.append("write")
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+        while lock._readers < 2:
+            time.sleep(0.01)
+        writer = threading.Thread(target=write)
+        writer.start()
+
+        for thread in readers + [writer]:
+            thread.join(timeout=5)
+        self.assertEqual(events, ["read", "read", "write"])
+
+    def test_read_write_lock_writer_preferred(self):
+        """Tests that a waiting writer goes ahead of readers that arrive after it."""
+        lock = ReadWriteLock()
+        events = []
+
+        def write():
+            with lock.write():
+                events.append("write")
+
+        def read():
+            with lock.read():
+                events.append("read")
+
+        with lock.read():
+            writer = threading.Thread(target=write)
+            writer.start()
+            # Wait until the writer is queued before starting the late reader.
+            while lock._waiting_writers == 0:
+                time.sleep(0.01)
+            reader = threading.Thread(target=read)
+            reader.start()
+            time.sleep(0.1)
+            self.assertEqual(events, [])
+
+        writer.join(timeout=5)
+        reader.join(timeout=5)
+        self.assertEqual(events, ["write", "read"])
+
+
+    def test_weighted_sampler_distribution(self):
+        """Samples pairs 20000 times and verifies each ordered pair is as likely as drawing one at a time without replacement."""
+        weights = [1, 0, 2, 3, 4]
+        total = sum(weights)
+        sampler = WeightedSampler(weights)
+        rng = random.Random(0)
+
+        samples = 20000
+        counts = Counter(tuple(sampler.sample(2, rng)) for _ in range(samples))
+
+        for first, second in itertools.permutations(range(len(weights)), 2):
+            expected = (weights[first] / total) * (
+                weights[second] / (total - weights[first])
+            )
+            self.assertAlmostEqual(
+                counts[(first, second)] / samples, expected, delta=0.01
+            )
+        # The index with no weight is never chosen while others remain.
+        self.assertFalse(any(1 in pair for pair in counts))
+
+    def test_weighted_sampler_edge_cases(self):
+        """Verifies sampling more indexes than exist, no weight and no indexes."""
+        rng = random.Random(0)
+
+        self.assertEqual(sorted(WeightedSampler([5, 0, 1]).sample(5, rng)), [0, 1, 2])
+        # Indexes without weight are only chosen once nothing else remains, in order.
+        self.assertEqual(WeightedSampler([0, 5, 0]).sample(3, rng), [1, 0, 2])
+        self.assertEqual(WeightedSampler([0, 0]).sample(1, rng), [0])
+        self.assertEqual(WeightedSampler([]).sample(2, rng), [])
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,263 @@
+import collections
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+import pyarrow as pa
+
+from huggingface_utils.dataset_stats import DatasetStats, TopItemsSketch
+
+
+def collect_statistics_with_pandas(df: pd.DataFrame, platform: str):
+    """Returns the counters and topic counts of the rows as the export computed them with pandas."""
+    if platform == "reddit":
+        counters = {
+            "posts_count": df[df["dataType"] == "post"].shape[0],
+            "comments_count": df[df["dataType"] == "comment"].shape[0],
+        }
+        topics = df["communityName"].value_counts().to_dict()
+    else:
+        tweets_with_hashtags = df[df["label"] != "NULL"]
+        tweets_without_hashtags = df[df["label"] == "NULL"]
+        counters = {
+            "tweets_with_hashtags_count": len(tweets_with_hashtags),
+            "tweets_without_hashtags_count": len(tweets_without_hashtags),
+        }
+        topics = tweets_with_hashtags["label"].str.split().explode().value_counts().to_dict()
+        topics["NULL"] = len(tweets_without_hashtags)
+    return counters, topics
+
+
+def create_tweets(labels):
+    return pa.table({
+        "label": pa.array(labels, type=pa.string()),
+        "datetime": [f"2024-01-0{i % 9 + 1}" for i in range(len(labels))],
+    })
+
+
+class TestTopItemsSketch(unittest.TestCase):
+    def test_exact_below_capacity(self):
+        """Tests that counts are exact while no more than capacity items are seen."""
+        sketch = TopItemsSketch(3)
+        sketch.add({"a": 5, "b": 2})
+        sketch.add({"b": 1, "c": 4})
+
+        self.assertEqual(sketch.top(), [("a", 5), ("c", 4), ("b", 3)])
+        self.assertEqual(sketch.top(1), [("a", 5)])
+        self.assertEqual(sketch.total, 12)
+        self.assertEqual(sketch.max_error, 0)
+
+    def test_error_is_bounded(self):
+        """Tests that pruned and merged counts undercount by at most max_error and keep every item above it."""
+        rng = random.Random(1)
+        true_counts = collections.Counter()
+        sketch = TopItemsSketch(50)
+        for _ in range(20):
+            # A few frequent items among many rare ones, counted a chunk at a time.
+            chunk = collections.Counter(f"frequent_{int(rng.paretovariate(1.0))}" for _ in range(1000))
+            chunk.update(f"rare_{rng.randrange(100_000)}" for _ in range(500))
+            true_counts.update(chunk)
+            chunk_sketch = TopItemsSketch(50)
+            chunk_sketch.add(dict(chunk))
+            sketch.merge(chunk_sketch)
+
+        self.assertLessEqual(len(sketch.counts), 100)
+        self.assertEqual(sketch.total, sum(true_counts.values()))
+        self.assertGreater(sketch.max_error, 0)
+        for item, count in sketch.counts.items():
+            self.assertLessEqual(count, true_counts[item])
+            self.assertGreaterEqual(count, true_counts[item] - sketch.max_error)
+        for item, count in true_counts.items():
+            if count > sketch.max_error:
+                self.assertIn(item, sketch.counts)
+
+    def test_ties_at_the_cut_are_kept(self):
+        """Tests that items tied with the capacity-th most frequent are kept with it."""
+        sketch = TopItemsSketch(3)
+        sketch.add({"a": 5, "b": 4, "c": 2, "d": 2, "e": 1})
+
+        self.assertEqual(sketch.counts, {"a": 4, "b": 3, "c": 1, "d": 1})
+        self.assertEqual(sketch.max_error, 1)
+
+    def test_all_tied_items_are_kept_within_twice_capacity(self):
+        """Tests that items that all occurred equally often are kept while they fit within twice capacity."""
+        sketch = TopItemsSketch(3)
+        sketch.add({f"item_{i}": 1 for i in range(6)})
+
+        self.assertEqual(len(sketch.counts), 6)
+        self.assertEqual(sketch.max_error, 0)
+
+    def test_too_many_ties_are_dropped(self):
+        """Tests that items tied at the cut are dropped when keeping them would track more than twice capacity."""
+        sketch = TopItemsSketch(2)
+        sketch.add({"frequent": 3, **{f"item_{i}": 1 for i in range(4)}})
+
+        self.assertEqual(sketch.top(), [("frequent", 2)])
+        self.assertEqual(sketch.max_error, 1)
+
+    def test_ties_below_topic_capacity_are_kept(self):
+        """Tests that a dataset tracks every topic while there are fewer distinct topics than TOPIC_CAPACITY."""
+        stats = DatasetStats("x")
+        stats.add_table(create_tweets([f"#tag{i}" for i in range(1001)]))
+
+        self.assertEqual(len(stats.topics.top()), 1002)
+        self.assertEqual(stats.topics.max_error, 0)
+
+
+class TestDatasetStats(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_tweets_match_pandas_statistics(self):
+        """Tests that tweets are counted as the export counted them with pandas, including the "NULL" topic."""
+        labels = ["#a", "NULL", "#a #b", None, " #b  #c ", "NULL", "#a"]
+        stats = DatasetStats("x")
+        stats.add_table(create_tweets(labels))
+
+        counters, topics = collect_statistics_with_pandas(pd.DataFrame({"label": labels}), "x")
+        self.assertEqual(dict(stats.counters), counters)
+        self.assertEqual(stats.topics.counts, topics)
+        self.assertEqual(stats.total_rows, len(labels))
+
+    def test_tweets_without_null_labels_match_pandas_statistics(self):
+        """Tests that the "NULL" topic is counted as pandas counted it when every tweet has hashtags."""
+        labels = ["#a", "#b"]
+        stats = DatasetStats("x")
+        stats.add_table(create_tweets(labels))
+
+        counters, topics = collect_statistics_with_pandas(pd.DataFrame({"label": labels}), "x")
+        self.assertEqual(dict(stats.counters), counters)
+        self.assertEqual(stats.topics.counts, topics)
+
+    def test_reddit_matches_pandas_statistics(self):
+        """Tests that posts, comments and subreddits are counted as the export counted them with pandas."""
+        columns = {
+            "dataType": ["post", "comment", "comment", "post", "comment"],
+            "communityName": ["r/a", "r/b", "r/a", None, "r/a"],
+        }
+        stats = DatasetStats("reddit")
+        stats.add_table(pa.table({**columns, "datetime": ["2024-01-03", "2024-01-01", "2024-01-02", "2024-01-05",
+                                                          "2024-01-04"]}))
+
+        counters, topics = collect_statistics_with_pandas(pd.DataFrame(columns), "reddit")
+        self.assertEqual(dict(stats.counters), counters)
+        self.assertEqual(stats.topics.counts, topics)
+        self.assertEqual((stats.start_date, stats.end_date), ("2024-01-01", "2024-01-05"))
+
+    def test_merge_matches_single_pass(self):
+        """Tests that merging the statistics of each chunk gives the statistics of all the rows at once."""
+        labels = [f"#tag{i % 7}" if i % 5 else "NULL" for i in range(100)]
+        table = create_tweets(labels)
+        single_pass = DatasetStats("x")
+        single_pass.add_table(table)
+
+        merged = DatasetStats("x")
+        for chunk_id, offset in enumerate(range(0, len(table), 30)):
+            chunk_stats = DatasetStats("x")
+            chunk_stats.add_table(table.slice(offset, 30))
+            chunk_stats.last_chunk_id = chunk_id
+            merged.merge(chunk_stats)
+
+        self.assertEqual(merged.total_rows, single_pass.total_rows)
+        self.assertEqual(merged.counters, single_pass.counters)
+        self.assertEqual(merged.topics.counts, single_pass.topics.counts)
+        self.assertEqual((merged.start_date, merged.end_date), (single_pass.start_date, single_pass.end_date))
+        self.assertEqual(merged.last_chunk_id, 3)
+
+    def test_includes_counted_chunks(self):
+        """Tests that statistics of chunks that were already merged are recognised, so a retry is not counted."""
+        dataset_stats = DatasetStats("x")
+        self.assertFalse(dataset_stats.includes(DatasetStats("x")))
+
+        unpublished = DatasetStats("x")
+        for chunk_id in [3, 4]:
+            chunk_stats = DatasetStats("x")
+            chunk_stats.add_table(create_tweets(["#a"]))
+            chunk_stats.last_chunk_id = chunk_id
+            unpublished.merge(chunk_stats)
+        self.assertFalse(dataset_stats.includes(unpublished))
+
+        dataset_stats.merge(unpublished)
+        self.assertTrue(dataset_stats.includes(unpublished))
+
+        newer = DatasetStats("x")
+        newer.last_chunk_id = 5
+        self.assertFalse(dataset_stats.includes(newer))
+
+    def test_stats_json_round_trip(self):
+        """Tests that statistics read from their stats.json give the same stats.json."""
+        for platform, table in [
+            ("x", create_tweets(["#a", "NULL", "#a #b", None])),
+            ("reddit", pa.table({
+                "dataType": ["post", "comment"], "communityName": ["r/a", "r/b"], "datetime": ["2024-01-01"] * 2,
+            })),
+        ]:
+            with self.subTest(platform):
+                stats = DatasetStats(platform)
+                stats.add_table(table)
+                stats.record_update("2024-01-10T00:00:00Z", len(table))
+
+                stats_json = json.loads(json.dumps(stats.to_stats_json()))
+                self.assertEqual(stats_json["summary"]["total_rows"], len(table))
+                self.assertEqual(stats_json["summary"]["last_update_dt"], "2024-01-10T00:00:00Z")
+                self.assertEqual(
+                    DatasetStats.from_stats_json(stats_json, platform).to_stats_json(), stats.to_stats_json()
+                )
+
+    def test_from_stats_json_prefers_full_topic_counts(self):
+        """Tests that a stats.json written by earlier exports is read from its count of every hashtag."""
+        stats_json = {
+            "summary": {"total_rows": 3, "start_dt": "2024-01-01T00:00:00Z", "end_dt": "2024-01-02T00:00:00Z"},
+            "topics": [{"topic": "#a", "topic_type": "hashtag", "total_count": 2, "total_percentage": 100}],
+            "hashtags": {"#a": {"count": 2, "percentage": 66.7}, "NULL": {"count": 1, "percentage": 33.3}},
+            "tweets_with_hashtags_count": 2,
+            "tweets_without_hashtags_count": 1,
+        }
+
+        stats = DatasetStats.from_stats_json(stats_json, "x")
+
+        self.assertEqual(stats.topics.counts, {"#a": 2, "NULL": 1})
+        self.assertEqual((stats.start_date, stats.end_date), ("2024-01-01", "2024-01-02"))
+        self.assertEqual(stats.counters["tweets_without_hashtags_count"], 1)
+
+    def test_save_and_load(self):
+        """Tests that saved statistics are loaded as they were saved."""
+        path = os.path.join(self.directory, "stats.json")
+        stats = DatasetStats("x")
+        stats.add_table(create_tweets(["#a", "NULL"]))
+        stats.last_chunk_id = 7
+        stats.record_update("2024-01-10T00:00:00Z", 2)
+        stats.save(path)
+
+        self.assertEqual(DatasetStats.load(path).to_dict(), stats.to_dict())
+
+    def test_failed_save_keeps_previous_statistics(self):
+        """Tests that a save interrupted while writing leaves the previously saved statistics in place."""
+        path = os.path.join(self.directory, "stats.json")
+        stats = DatasetStats("x")
+        stats.add_table(create_tweets(["#a"]))
+        stats.save(path)
+        saved = stats.to_dict()
+
+        def write_partially(data, f):
+            f.write('{"platform": ')
+            raise OSError("No space left on device")
+
+        stats.add_table(create_tweets(["#b"]))
+        with mock.patch("huggingface_utils.dataset_stats.json.dump", side_effect=write_partially):
+            with self.assertRaises(OSError):
+                stats.save(path)
+
+        self.assertEqual(DatasetStats.load(path).to_dict(), saved)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+import datetime as dt
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import pyarrow.parquet as pq
+from cryptography.fernet import Fernet
+
+from common.data import DataEntity, DataLabel, DataSource
+from huggingface_utils.dataset_stats import DatasetStats
+from huggingface_utils.encoding_system import SymKeyEncodingKeyManager, decode_url
+from huggingface_utils.huggingface_uploader import HuggingFaceUploader
+from huggingface_utils.utils import preprocess_in_worker
+from storage.miner.sqlite_miner_storage import SqliteMinerStorage
+
+
+# Rows share each datetime in groups of three so that chunks of four rows end in the middle of a group.
+ROWS_PER_DATETIME = 3
+DATETIME_COUNT = 10
+
+
+def create_tweet(i: int, datetime: dt.datetime) -> DataEntity:
+    url = f"https://x.com/user/status/{i}"
+    content = json.dumps({
+        "username": f"user{i}",
+        "text": f"tweet {i}",
+        "url": url,
+        "timestamp": datetime.isoformat(),
+        "tweet_hashtags": ["#tag"] if i % 2 else [],
+    }).encode()
+    return DataEntity(
+        uri=url,
+        datetime=datetime,
+        source=DataSource.X,
+        label=DataLabel(value="#tag") if i % 2 else None,
+        content=content,
+        content_size_bytes=len(content),
+    )
+
+
+class FakeHfApi:
+    """Copies uploaded files to a local folder, failing for any upload that includes a file in fail_on."""
+
+    def __init__(self, repo_path: str):
+        self.repo_path = repo_path
+        self.fail_on = set()
+        # The content of every file uploaded, in upload order.
+        self.uploads = []
+
+    def upload_folder(self, folder_path, allow_patterns, **kwargs):
+        if self.fail_on.intersection(allow_patterns):
+            raise RuntimeError("Upload failed.")
+        for filename in allow_patterns:
+            with open(os.path.join(folder_path, filename), "rb") as f:
+                content = f.read()
+            self.uploads.append((filename, content))
+            with open(os.path.join(self.repo_path, filename), "wb") as f:
+                f.write(content)
+
+    def upload_file(self, path_or_fileobj, path_in_repo, **kwargs):
+        self.uploads.append((path_in_repo, path_or_fileobj))
+
+
+class TestHuggingFaceUploaderResume(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.directory, "miner.sqlite")
+        self.repo_path = os.path.join(self.directory, "repo")
+        os.makedirs(self.repo_path)
+
+        start = dt.datetime.now(tz=dt.timezone.utc).replace(microsecond=0) - dt.timedelta(days=1)
+        self.datetimes = [start + dt.timedelta(minutes=i) for i in range(DATETIME_COUNT)]
+        self.entities = [
+            create_tweet(i, self.datetimes[i // ROWS_PER_DATETIME])
+            for i in range(DATETIME_COUNT * ROWS_PER_DATETIME)
+        ]
+        # The order the rows are exported in.
+        self.uris = [entity.uri for entity in sorted(self.entities, key=lambda entity: (entity.datetime, entity.uri))]
+        storage = SqliteMinerStorage(self.db_path)
+        storage.store_data_entities(self.entities)
+        storage.close()
+
+        self.key_manager = SymKeyEncodingKeyManager(Fernet.generate_key().decode())
+        self.private_key_manager = SymKeyEncodingKeyManager(Fernet.generate_key().decode())
+        self.hf_api = FakeHfApi(self.repo_path)
+
+        # Upload two chunks at a time and don't wait between retries of a failed upload.
+        for patcher in [
+            mock.patch.object(HuggingFaceUploader, "CHUNKS_PER_UPLOAD", 2),
+            mock.patch("huggingface_utils.huggingface_uploader.time.sleep"),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def create_uploader(self) -> HuggingFaceUploader:
+        uploader = HuggingFaceUploader(
+            self.db_path,
+            "hotkey",
+            self.key_manager,
+            self.private_key_manager,
+            os.path.join(self.directory, "state.json"),
+            output_dir=os.path.join(self.directory, "hf_storage"),
+            chunk_size=4,
+            max_workers=1,
+        )
+        uploader.hf_api = self.hf_api
+        uploader.check_hf_connection = lambda *args, **kwargs: True
+        return uploader
+
+    def export(self):
+        uploader = self.create_uploader()
+        state = uploader.load_state()
+        unpublished = uploader.export_source(DataSource.X.value, "user/x_dataset", state, 0)
+        return uploader, unpublished
+
+    def read_repo_urls(self):
+        """Returns the decoded urls of every row in the repo, in chunk order."""
+        chunk_ids = sorted(int(filename.split("_")[-1].split(".")[0]) for filename in os.listdir(self.repo_path))
+        self.assertEqual(chunk_ids, list(range(len(chunk_ids))))
+
+        urls = []
+        for chunk_id in chunk_ids:
+            table = pq.read_table(os.path.join(self.repo_path, HuggingFaceUploader.get_chunk_filename(chunk_id)))
+            urls.extend(
+                decode_url(url, self.private_key_manager.get_fernet())
+                for url in table["url_encoded"].to_pylist()
+            )
+        return urls
+
+    def test_resume_after_failed_upload(self):
+        """Tests that an export stopped by a failed upload resumes without duplicating or skipping rows."""
+        self.hf_api.fail_on = {HuggingFaceUploader.get_chunk_filename(2)}
+        with self.assertRaises(RuntimeError):
+            self.export()
+
+        uploader = self.create_uploader()
+        state = uploader.load_state()
+        pending_chunks = state["pending_chunks"]["2"]
+        self.assertEqual(
+            [(chunk["chunk_id"], chunk["status"]) for chunk in pending_chunks[:2]], [(2, "failed"), (3, "failed")]
+        )
+        self.assertEqual(state["total_rows"]["2"], 8)
+        # The first two chunks were uploaded, so the watermark is the middle one of the rows sharing the third datetime.
+        self.assertEqual(state["watermark"]["2"]["uri"], self.uris[7])
+        folder_path = os.path.join(uploader.output_dir, "source_2")
+        retained_files = {}
+        for chunk in pending_chunks:
+            filename = HuggingFaceUploader.get_chunk_filename(chunk["chunk_id"])
+            with open(os.path.join(folder_path, filename), "rb") as f:
+                retained_files[filename] = f.read()
+
+        self.hf_api.fail_on = set()
+        uploads_before = len(self.hf_api.uploads)
+        _, unpublished = self.export()
+
+        # The retained chunks are uploaded first and as they were written, since encoding again would change them.
+        retried_uploads = self.hf_api.uploads[uploads_before:uploads_before + len(retained_files)]
+        self.assertEqual(dict(retried_uploads), retained_files)
+
+        urls = self.read_repo_urls()
+        self.assertEqual(urls, self.uris)
+        self.assertEqual(unpublished.total_rows, len(self.entities))
+        self.assertEqual(os.listdir(folder_path), [])
+
+        state = self.create_uploader().load_state()
+        self.assertEqual(state["pending_chunks"]["2"], [])
+        self.assertEqual(state["total_rows"]["2"], len(self.entities))
+        self.assertEqual(state["watermark"]["2"]["uri"], self.uris[-1])
+
+        # Nothing is exported again once every row is in the repo.
+        uploads_before = len(self.hf_api.uploads)
+        self.export()
+        self.assertEqual(len(self.hf_api.uploads), uploads_before)
+
+    def test_resume_from_state_without_checkpoints(self):
+        """Tests that state saved before chunks were checkpointed resumes after the datetime of the last upload."""
+        uploader = self.create_uploader()
+        # The last upload ended with the rows of the fourth datetime.
+        last_upload = self.datetimes[3] + dt.timedelta(seconds=30)
+        with open(uploader.state_file, "w") as f:
+            json.dump({
+                "last_upload": {"1": None, "2": last_upload.strftime("%Y-%m-%d %H:%M:%S")},
+                "total_rows": {"1": 0, "2": 4 * ROWS_PER_DATETIME},
+            }, f)
+
+        _, unpublished = self.export()
+
+        self.assertEqual(self.read_repo_urls(), self.uris[4 * ROWS_PER_DATETIME:])
+        self.assertEqual(unpublished.total_rows, len(self.entities) - 4 * ROWS_PER_DATETIME)
+        state = self.create_uploader().load_state()
+        self.assertEqual(state["total_rows"]["2"], len(self.entities))
+        self.assertEqual(state["watermark"]["2"]["uri"], self.uris[-1])
+        self.assertEqual(state["pending_chunks"]["2"], [])
+
+    def test_workers_are_not_forked_from_the_exporting_process(self):
+        """Tests that the preprocessing workers start from a fork server, as the pipeline's threads are running."""
+        contexts = []
+        executor_class = ProcessPoolExecutor
+
+        def create_executor(*args, **kwargs):
+            contexts.append(kwargs["mp_context"].get_start_method())
+            return executor_class(*args, **kwargs)
+
+        with mock.patch("huggingface_utils.huggingface_uploader.ProcessPoolExecutor", side_effect=create_executor):
+            self.export()
+
+        self.assertEqual(contexts, ["forkserver"])
+        # The workers import the function they run, which must not need the miner's storage.
+        self.assertEqual(preprocess_in_worker.__module__, "huggingface_utils.utils")
+        self.assertEqual(self.read_repo_urls(), self.uris)
+
+    def test_publish_statistics_once(self):
+        """Tests that statistics published again after a crash are not counted twice in the dataset's statistics."""
+        uploader = self.create_uploader()
+        uploader.load_existing_stats = mock.Mock(return_value={
+            "summary": {"total_rows": 5, "update_history": [{"timestamp": "2024-01-01T00:00:00Z", "count": 5}]},
+            "hashtags": {"#tag": {"count": 2}, "NULL": {"count": 3}},
+            "tweets_with_hashtags_count": 2,
+            "tweets_without_hashtags_count": 3,
+        })
+        _, unpublished = self.export()
+
+        dataset_stats = uploader.publish_statistics(unpublished, "x", "user/x_dataset")
+        # A crash before the unpublished statistics were cleared from the state publishes them again.
+        retried_stats = uploader.publish_statistics(DatasetStats.from_dict(unpublished.to_dict()), "x", "user/x_dataset")
+
+        # The repo's stats.json is only read the first time, after which the statistics are kept locally.
+        uploader.load_existing_stats.assert_called_once()
+        for stats in [dataset_stats, retried_stats]:
+            self.assertEqual(stats.total_rows, 5 + len(self.entities))
+            self.assertEqual(len(stats.update_history), 2)
+            self.assertEqual(stats.topics.counts["#tag"], 2 + len(self.entities) // 2)
+        stats_json = json.loads(self.hf_api.uploads[-1][1])
+        self.assertEqual(self.hf_api.uploads[-1][0], "stats.json")
+        self.assertEqual(stats_json["summary"]["total_rows"], 5 + len(self.entities))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+import threading
+import time
+import unittest
+
+from huggingface_utils.pipeline import BackgroundIterator, BackgroundWorker, StageStats
+
+
+class TestBackgroundIterator(unittest.TestCase):
+    def test_yields_items_in_order(self):
+        """Tests that every item of the iterable is yielded in order."""
+        stats = StageStats("read")
+        iterator = BackgroundIterator(([i] * 2 for i in range(10)), maxsize=2, stats=stats)
+
+        self.assertEqual(list(iterator), [[i] * 2 for i in range(10)])
+        iterator.close()
+        self.assertEqual(stats.rows, 20)
+
+    def test_reraises_iterable_errors(self):
+        """Tests that an exception raised by the iterable is re-raised to the consumer after the items before it."""
+
+        def items():
+            yield [1]
+            raise ValueError("read failed")
+
+        iterator = BackgroundIterator(items(), maxsize=2)
+        consumed = []
+        with self.assertRaisesRegex(ValueError, "read failed"):
+            for item in iterator:
+                consumed.append(item)
+        iterator.close()
+
+        self.assertEqual(consumed, [[1]])
+        self.assertFalse(iterator.thread.is_alive())
+
+    def test_maxsize_bounds_read_ahead(self):
+        """Tests that the background thread reads at most maxsize items ahead of the consumer."""
+        read = []
+
+        def items():
+            for i in range(100):
+                read.append(i)
+                yield [i]
+
+        iterator = BackgroundIterator(items(), maxsize=3)
+        # Give the thread time to read as far ahead as it is allowed to.
+        time.sleep(0.5)
+        # maxsize items are queued and one more is read while waiting for room to queue it.
+        self.assertEqual(len(read), 4)
+
+        consumer = iter(iterator)
+        next(consumer)
+        time.sleep(0.5)
+        self.assertEqual(len(read), 5)
+        iterator.close()
+
+    def test_close_stops_thread_and_releases_iterable(self):
+        """Tests that closing partway through stops the thread and closes the iterable on it."""
+        released = threading.Event()
+
+        def items():
+            try:
+                for i in range(100):
+                    yield [i]
+            finally:
+                released.set()
+
+        iterator = BackgroundIterator(items(), maxsize=1)
+        for item in iterator:
+            if item == [2]:
+                break
+        iterator.close()
+
+        self.assertFalse(iterator.thread.is_alive())
+        self.assertTrue(released.is_set())
+
+    def test_abandoned_iteration_stops_thread(self):
+        """Tests that the thread exits when the consumer stops iterating early without calling close."""
+        iterator = BackgroundIterator(([i] for i in range(100)), maxsize=1)
+        for item in iterator:
+            if item == [2]:
+                break
+
+        iterator.thread.join(timeout=5)
+        self.assertFalse(iterator.thread.is_alive())
+
+
+class TestBackgroundWorker(unittest.TestCase):
+    def test_handles_items_in_order(self):
+        """Tests that every submitted item is handled in order before close returns."""
+        handled = []
+        worker = BackgroundWorker(handled.append, maxsize=1)
+        for i in range(10):
+            worker.submit(i)
+        worker.close()
+
+        self.assertEqual(handled, list(range(10)))
+
+    def test_error_is_raised_by_next_submit(self):
+        """Tests that a failed item is re-raised by the next submit and that later items are not handled."""
+        handled = []
+        failed = threading.Event()
+
+        def handle(item):
+            if item == 1:
+                failed.set()
+                raise ValueError("upload failed")
+            handled.append(item)
+
+        worker = BackgroundWorker(handle, maxsize=1)
+        worker.submit(0)
+        worker.submit(1)
+        self.assertTrue(failed.wait(timeout=5))
+        # The error is recorded just after handle raises.
+        deadline = time.monotonic() + 5
+        while worker.error is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        with self.assertRaisesRegex(ValueError, "upload failed"):
+            worker.submit(2)
+        with self.assertRaisesRegex(ValueError, "upload failed"):
+            worker.close()
+        self.assertEqual(handled, [0])
+        self.assertFalse(worker.thread.is_alive())
+
+    def test_error_is_raised_by_close(self):
+        """Tests that close raises the error of a failed item instead of hanging, even with items still queued."""
+        release = threading.Event()
+
+        def handle(item):
+            release.wait(timeout=5)
+            raise ValueError("upload failed")
+
+        worker = BackgroundWorker(handle, maxsize=1)
+        worker.submit(0)
+        worker.submit(1)
+        release.set()
+
+        closer = threading.Thread(target=lambda: self.assertRaises(ValueError, worker.close), daemon=True)
+        closer.start()
+        closer.join(timeout=5)
+        self.assertFalse(closer.is_alive())
+        self.assertFalse(worker.thread.is_alive())
+
+
+class TestStageStats(unittest.TestCase):
+    def test_utilization(self):
+        """Tests that utilization is the busy time over the wall time of every unit of parallelism."""
+        stats = StageStats("preprocess", parallelism=2)
+        stats.add(100, 1.0)
+        stats.add(300, 2.0)
+
+        self.assertEqual(stats.rows, 400)
+        self.assertAlmostEqual(stats.rows_per_sec, 400 / 3)
+        self.assertAlmostEqual(stats.utilization(3.0), 0.5)
+        self.assertEqual(stats.utilization(0), 0.0)
+
+    def test_measure(self):
+        """Tests that measure adds the rows and the time spent in the context, even if it raises."""
+        stats = StageStats("write")
+        with self.assertRaises(ValueError):
+            with stats.measure(10):
+                time.sleep(0.05)
+                raise ValueError()
+
+        self.assertEqual(stats.rows, 10)
+        self.assertGreaterEqual(stats.busy_secs, 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,222 @@
+import datetime as dt
+import json
+import unittest
+from unittest import mock
+
+import pyarrow as pa
+from cryptography.fernet import Fernet
+
+from huggingface_utils import utils
+from huggingface_utils.encoding_system import SymKeyEncodingKeyManager, decode_url
+from huggingface_utils.utils import (
+    REDDIT_CONTENT_SCHEMA,
+    TWEET_CONTENT_SCHEMA,
+    decode_content,
+    parse_json_contents,
+    preprocess_reddit_table,
+    preprocess_twitter_table,
+    value_counts,
+)
+
+
+CHUNK_SCHEMA = pa.schema([
+    ('datetime', pa.string()),
+    ('uri', pa.string()),
+    ('label', pa.string()),
+    ('content', pa.large_binary()),
+])
+
+
+def tweet(text, username="user", url="https://x.com/user/status/1", hashtags=None):
+    return json.dumps({
+        "text": text,
+        "username": username,
+        "url": url,
+        "tweet_hashtags": hashtags or [],
+        "timestamp": "2024-01-01T00:00:00Z",
+    }).encode()
+
+
+def create_chunk(contents, labels=None):
+    return pa.table({
+        'datetime': [f"2024-01-0{i % 9 + 1} 12:34:56+00:00" for i in range(len(contents))],
+        'uri': [f"uri_{i}" for i in range(len(contents))],
+        'label': labels or [None] * len(contents),
+        'content': contents,
+    }, schema=CHUNK_SCHEMA)
+
+
+class TestParseJsonContents(unittest.TestCase):
+    def parse(self, contents, schema=TWEET_CONTENT_SCHEMA):
+        return parse_json_contents(pa.array(contents, type=pa.large_binary()), schema)
+
+    def test_parses_fields_in_bulk(self):
+        """Tests that well formed contents are parsed together, ignoring fields outside the schema."""
+        contents = [tweet("first", hashtags=["#a", "#b"]), b'{"text": "second"}']
+        with mock.patch.object(
+            utils, "_parse_json_contents_one_by_one", wraps=utils._parse_json_contents_one_by_one
+        ) as one_by_one:
+            table = self.parse(contents)
+
+        one_by_one.assert_not_called()
+        self.assertEqual(table.schema, TWEET_CONTENT_SCHEMA)
+        self.assertEqual(
+            table.to_pylist(),
+            [
+                {"text": "first", "tweet_hashtags": ["#a", "#b"], "username": "user",
+                 "url": "https://x.com/user/status/1"},
+                {"text": "second", "tweet_hashtags": None, "username": None, "url": None},
+            ],
+        )
+
+    def test_escaped_and_raw_newlines(self):
+        """Tests that escaped newlines stay in the text and newlines between tokens do not split a content."""
+        contents = [tweet("line one\nline two\r\n"), b'{\n  "text": "spread",\r\n  "username": "u"\n}']
+        with mock.patch.object(
+            utils, "_parse_json_contents_one_by_one", wraps=utils._parse_json_contents_one_by_one
+        ) as one_by_one:
+            table = self.parse(contents)
+
+        one_by_one.assert_not_called()
+        self.assertEqual(table['text'].to_pylist(), ["line one\nline two\r\n", "spread"])
+        self.assertEqual(table['username'].to_pylist(), ["user", "u"])
+
+    def test_falls_back_to_one_by_one(self):
+        """Tests that contents Arrow cannot parse together are read as null while the rest keep their rows."""
+        cases = {
+            "malformed JSON": b'{"text": ',
+            "non-object JSON": b'["text"]',
+            "string JSON": b'"text"',
+            "wrong typed field": b'{"text": 5, "username": "kept"}',
+            "wrong typed list item": b'{"text": "kept", "tweet_hashtags": [1]}',
+            "blank content": b'',
+            "whitespace content": b'  ',
+            "invalid UTF-8": b'{"text": "\xff\xfe"}',
+        }
+        for name, bad_content in cases.items():
+            with self.subTest(name):
+                contents = [tweet("before"), bad_content, tweet("after", username="other")]
+                with mock.patch.object(
+                    utils, "_parse_json_contents_one_by_one", wraps=utils._parse_json_contents_one_by_one
+                ) as one_by_one:
+                    table = self.parse(contents)
+
+                one_by_one.assert_called_once()
+                self.assertEqual(len(table), 3)
+                self.assertEqual(table['text'][0].as_py(), "before")
+                self.assertEqual(table['text'][2].as_py(), "after")
+                self.assertEqual(table['username'][2].as_py(), "other")
+
+                # Each field is read as decode_content reads it, or as null if it is not of the schema's type.
+                decoded = decode_content(bad_content)
+                decoded = decoded if isinstance(decoded, dict) else {}
+                text = decoded.get("text")
+                self.assertEqual(table['text'][1].as_py(), text if isinstance(text, str) else None)
+                self.assertEqual(table['username'][1].as_py(), decoded.get("username"))
+                self.assertIsNone(table['tweet_hashtags'][1].as_py())
+
+    def test_empty_and_chunked_contents(self):
+        """Tests that no contents give an empty table and that chunked contents are parsed as one array."""
+        self.assertEqual(self.parse([]), TWEET_CONTENT_SCHEMA.empty_table())
+
+        contents = pa.chunked_array(
+            [[tweet("first")], [b'{"body": "second", "dataType": "comment"}']], type=pa.large_binary()
+        )
+        table = parse_json_contents(contents, REDDIT_CONTENT_SCHEMA)
+        self.assertEqual(table['body'].to_pylist(), [None, "second"])
+        self.assertEqual(table['dataType'].to_pylist(), [None, "comment"])
+
+
+class TestPreprocessTables(unittest.TestCase):
+    """Checks the preprocessed tables against decoding each row on its own, as the export did with pandas."""
+
+    def setUp(self):
+        self.key_manager = SymKeyEncodingKeyManager(Fernet.generate_key().decode())
+        self.private_key_manager = SymKeyEncodingKeyManager(Fernet.generate_key().decode())
+
+    def decode_user_columns(self, rows):
+        for row in rows:
+            row['username'] = decode_url(row.pop('username_encoded'), self.key_manager.get_fernet())
+            row['url'] = decode_url(row.pop('url_encoded'), self.private_key_manager.get_fernet())
+        return rows
+
+    def expected_rows(self, chunk, text_field, fields):
+        expected = []
+        for row in chunk.to_pylist():
+            content = decode_content(row['content'])
+            text = content.get(text_field)
+            if text is None or text.strip() == '':
+                continue
+            expected.append({
+                'text': text,
+                'label': row['label'],
+                **{field: content.get(field) for field in fields},
+                'datetime': dt.datetime.fromisoformat(row['datetime']).strftime('%Y-%m-%d'),
+                'username': content.get('username') or '',
+                'url': content.get('url') or '',
+            })
+        return expected
+
+    def test_twitter_matches_row_by_row_decoding(self):
+        """Tests that Twitter rows are filtered, parsed and encoded as decoding each row would."""
+        chunk = create_chunk(
+            [
+                tweet("hello\nworld", hashtags=["#a"]),
+                tweet("   "),
+                tweet("unicode ✓ \"quoted\"", username="ünïcode"),
+                b'{"text": "no user"}',
+                b'{"username": "no text"}',
+                tweet("last", hashtags=["#a", "#b"]),
+            ],
+            labels=["#a", None, None, None, None, "#a"],
+        )
+
+        table = preprocess_twitter_table(chunk, self.key_manager, self.private_key_manager)
+
+        self.assertEqual(table.schema, utils.TWEET_DATASET_SCHEMA)
+        self.assertEqual(
+            self.decode_user_columns(table.to_pylist()),
+            self.expected_rows(chunk, 'text', ['tweet_hashtags']),
+        )
+
+    def test_reddit_matches_row_by_row_decoding(self):
+        """Tests that Reddit rows are filtered, parsed and encoded as decoding each row would."""
+        contents = [
+            {"body": "a post", "dataType": "post", "communityName": "r/one", "username": "u1", "url": "https://r/1"},
+            {"body": "", "dataType": "comment", "communityName": "r/one", "username": "u2", "url": "https://r/2"},
+            {"body": "a comment", "dataType": "comment", "communityName": "r/two", "username": "u3",
+             "url": "https://r/3", "title": "ignored"},
+        ]
+        chunk = create_chunk(
+            [json.dumps(content).encode() for content in contents] + [b'not json'],
+            labels=["r/one", "r/one", "r/two", None],
+        )
+
+        table = preprocess_reddit_table(chunk, self.key_manager, self.private_key_manager)
+
+        self.assertEqual(table.schema, utils.REDDIT_DATASET_SCHEMA)
+        self.assertEqual(
+            self.decode_user_columns(table.to_pylist()),
+            self.expected_rows(chunk, 'body', ['dataType', 'communityName']),
+        )
+
+    def test_all_rows_filtered(self):
+        """Tests that a chunk without any text gives an empty table with the dataset's schema."""
+        table = preprocess_twitter_table(
+            create_chunk([tweet(""), b'{}']), self.key_manager, self.private_key_manager
+        )
+
+        self.assertEqual(len(table), 0)
+        self.assertEqual(table.schema, utils.TWEET_DATASET_SCHEMA)
+
+
+class TestValueCounts(unittest.TestCase):
+    def test_most_common_first_without_nulls(self):
+        """Tests that values are counted most common first and nulls are dropped."""
+        counts = value_counts(pa.array(["b", "a", None, "b", "c", "b", "a", None]))
+
+        self.assertEqual(list(counts.items()), [("b", 3), ("a", 2), ("c", 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,7 +2,7 @@ import unittest
 
 from attr import dataclass
 from common import constants, utils
-from common.data_v2 import ScorableDataEntityBucket
+from common.data_v2 import ScorableDataEntityBucket, ScorableMinerIndex
 from rewards.data import DataSourceDesirability, DataDesirabilityLookup
 from rewards.data_value_calculator import DataValueCalculator
 from common.data import (
@@ -165,5 +165,65 @@ class TestDataValueCalculator(unittest.TestCase):
             previous_score = score
 
 
+    def test_get_scores_for_buckets_matches_per_bucket_scores(self):
+        """Verifies that scoring buckets as a batch matches scoring each bucket on its own."""
+        now = dt.datetime(2023, 12, 12, 12, 30, 0, tzinfo=dt.timezone.utc)
+        current_time_bucket = TimeBucket.from_datetime(now)
+        max_age_in_hours = constants.DATA_ENTITY_BUCKET_AGE_LIMIT_DAYS * 24
+
+        buckets = [
+            ScorableDataEntityBucket(
+                time_bucket_id=current_time_bucket.id - hours_back,
+                source=source,
+                label=label,
+                size_bytes=1000,
+                scorable_bytes=100 + hours_back,
+            )
+            for source, labels in [
+                (DataSource.REDDIT, ["testlabel", "unscoredlabel", "penalizedlabel", "other-label", None]),
+                (DataSource.X, ["#testlabel", "#unscoredlabel", "#penalizedlabel", "testlabel", None]),
+            ]
+            for label in labels
+            # Includes data from the future and past the max age.
+            for hours_back in [-2, 0, 1, max_age_in_hours, max_age_in_hours + 1]
+        ]
+
+        scores = self.value_calculator.get_scores_for_buckets(
+            sources=[bucket.source for bucket in buckets],
+            label_ids=self.value_calculator.get_label_ids(
+                bucket.label for bucket in buckets
+            ),
+            time_bucket_ids=[bucket.time_bucket_id for bucket in buckets],
+            scorable_bytes=[bucket.scorable_bytes for bucket in buckets],
+            current_time_bucket_id=current_time_bucket.id,
+        )
+        expected_scores = [
+            self.value_calculator.get_score_for_data_entity_bucket(
+                bucket, current_time_bucket
+            )
+            for bucket in buckets
+        ]
+        self.assertEqual(len(scores), len(expected_scores))
+        for score, expected_score in zip(scores, expected_scores):
+            self.assertAlmostEqual(score, expected_score, places=5)
+
+        self.assertAlmostEqual(
+            self.value_calculator.get_total_score_for_index(
+                ScorableMinerIndex(
+                    scorable_data_entity_buckets=buckets, last_updated=now
+                ),
+                current_time_bucket,
+            ),
+            sum(expected_scores),
+            places=5,
+        )
+        self.assertEqual(
+            self.value_calculator.get_total_score_for_index(
+                ScorableMinerIndex(scorable_data_entity_buckets=[], last_updated=now),
+                current_time_bucket,
+            ),
+            0.0,
+        )
+
 if __name__ == "__main__":
     unittest.main()
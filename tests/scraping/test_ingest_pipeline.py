@@ -0,0 +1,155 @@
+import asyncio
+import datetime as dt
+import threading
+import unittest
+from unittest.mock import Mock
+
+from common.data import DataEntity, DataSource
+from scraping.ingest_pipeline import IngestPipeline
+from storage.miner.miner_storage import MinerStorage
+
+
+def create_entities(count: int, prefix: str = "entity"):
+    now = dt.datetime.now(tz=dt.timezone.utc)
+    return [
+        DataEntity(
+            uri=f"{prefix}_{i}",
+            datetime=now,
+            source=DataSource.REDDIT,
+            content=b"content",
+            content_size_bytes=7,
+        )
+        for i in range(count)
+    ]
+
+
+class TestIngestPipeline(unittest.TestCase):
+    def test_coalesces_into_flush_size_batches(self):
+        """Tests that entities from many puts are stored in batches of flush_size."""
+        storage = Mock(spec=MinerStorage)
+        pipeline = IngestPipeline(
+            storage,
+            flush_size=10,
+            flush_latency=dt.timedelta(seconds=60),
+            max_pending_entities=100,
+        )
+
+        async def run():
+            task = asyncio.create_task(pipeline.run())
+            for i in range(5):
+                await pipeline.put(create_entities(5, prefix=f"scrape{i}"))
+            await pipeline.stop()
+            await task
+
+        asyncio.run(run())
+
+        batch_sizes = [len(call.args[0]) for call in storage.store_data_entities.call_args_list]
+        self.assertEqual(batch_sizes, [10, 10, 5])
+
+    def test_flushes_partial_batch_after_latency(self):
+        """Tests that a partial batch is stored once flush_latency has passed."""
+        storage = Mock(spec=MinerStorage)
+        pipeline = IngestPipeline(
+            storage,
+            flush_size=100,
+            flush_latency=dt.timedelta(milliseconds=50),
+            max_pending_entities=100,
+        )
+
+        async def run():
+            task = asyncio.create_task(pipeline.run())
+            await pipeline.put(create_entities(3))
+            await asyncio.sleep(0.5)
+            self.assertEqual(storage.store_data_entities.call_count, 1)
+            await pipeline.stop()
+            await task
+
+        asyncio.run(run())
+
+    def test_backpressure_when_writer_falls_behind(self):
+        """Tests that put waits while the writer is busy and the queue is full."""
+        release = threading.Event()
+        storage = Mock(spec=MinerStorage)
+        storage.store_data_entities.side_effect = lambda _: release.wait(timeout=5)
+        pipeline = IngestPipeline(
+            storage,
+            flush_size=2,
+            flush_latency=dt.timedelta(seconds=60),
+            max_pending_entities=2,
+        )
+
+        async def run():
+            task = asyncio.create_task(pipeline.run())
+            # The first batch is taken by the blocked writer and the next one fills the queue.
+            await pipeline.put(create_entities(4))
+            blocked_put = asyncio.create_task(pipeline.put(create_entities(1, "late")))
+            await asyncio.sleep(0.2)
+            self.assertFalse(blocked_put.done())
+
+            release.set()
+            await asyncio.wait_for(blocked_put, timeout=5)
+            await pipeline.stop()
+            await task
+
+        asyncio.run(run())
+
+        stored = sum(len(call.args[0]) for call in storage.store_data_entities.call_args_list)
+        self.assertEqual(stored, 5)
+
+    def test_storage_errors_do_not_stop_the_pipeline(self):
+        """Tests that a failed store is logged and later batches are still stored."""
+        storage = Mock(spec=MinerStorage)
+        storage.store_data_entities.side_effect = [ValueError("full"), None]
+        pipeline = IngestPipeline(
+            storage,
+            flush_size=1,
+            flush_latency=dt.timedelta(seconds=60),
+            max_pending_entities=10,
+        )
+
+        async def run():
+            task = asyncio.create_task(pipeline.run())
+            await pipeline.put(create_entities(2))
+            await pipeline.stop()
+            await task
+
+        asyncio.run(run())
+
+        self.assertEqual(storage.store_data_entities.call_count, 2)
+
+    def test_restart_after_stop(self):
+        """Tests that a stopped pipeline can be run again, on the same or a new event loop."""
+        storage = Mock(spec=MinerStorage)
+        pipeline = IngestPipeline(
+            storage,
+            flush_size=10,
+            flush_latency=dt.timedelta(seconds=60),
+            max_pending_entities=100,
+        )
+
+        async def run(prefix: str):
+            task = asyncio.create_task(pipeline.run())
+            await pipeline.put(create_entities(3, prefix=prefix))
+            await pipeline.stop()
+            await asyncio.wait_for(task, timeout=5)
+
+        async def run_twice():
+            await run("first")
+            await run("second")
+
+        asyncio.run(run_twice())
+        # A restarted coordinator runs the pipeline on a new event loop.
+        asyncio.run(run("third"))
+
+        stored = [
+            data_entity.uri
+            for call in storage.store_data_entities.call_args_list
+            for data_entity in call.args[0]
+        ]
+        self.assertEqual(
+            stored, [f"{prefix}_{i}" for prefix in ["first", "second", "third"] for i in range(3)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import threading
+import unittest
+
+from storage.miner.connection_pool import SqliteConnectionPool
+
+
+class TestSqliteConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = SqliteConnectionPool("TestPoolDb.sqlite", max_reader_connections=2)
+        with self.pool.writer() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS Test (value INTEGER)")
+            connection.execute("pragma journal_mode=wal").fetchone()
+
+    def tearDown(self):
+        self.pool.close()
+        os.remove(self.pool.database)
+
+    def test_reader_reuses_connections(self):
+        """Tests that a returned reader connection is reused by the next reader."""
+        with self.pool.reader() as connection:
+            first = connection
+
+        with self.pool.reader() as connection:
+            self.assertIs(first, connection)
+
+    def test_reader_connections_are_bounded(self):
+        """Tests that readers block once all pooled connections are checked out."""
+        acquired = threading.Event()
+
+        def acquire_reader():
+            with self.pool.reader():
+                acquired.set()
+
+        with self.pool.reader(), self.pool.reader():
+            thread = threading.Thread(target=acquire_reader, daemon=True)
+            thread.start()
+            self.assertFalse(acquired.wait(timeout=0.5))
+
+        self.assertTrue(acquired.wait(timeout=5))
+        thread.join()
+
+    def test_unpooled_reader_opens_new_connections(self):
+        """Tests that a pool with no reader connections opens a fresh connection each time."""
+        pool = SqliteConnectionPool(self.pool.database, max_reader_connections=0)
+
+        with pool.reader() as connection:
+            first = connection
+
+        with pool.reader() as connection:
+            self.assertIsNot(first, connection)
+
+        pool.close()
+
+    def test_writer_is_reentrant(self):
+        """Tests that the writer can be acquired again on the same thread."""
+        with self.pool.writer() as outer:
+            with self.pool.writer() as inner:
+                self.assertIs(outer, inner)
+
+    def test_writer_rolls_back_on_exception(self):
+        """Tests that uncommitted writes are rolled back if the writer context raises."""
+        with self.assertRaises(ValueError):
+            with self.pool.writer() as connection:
+                connection.execute("INSERT INTO Test VALUES (1)")
+                raise ValueError()
+
+        with self.pool.writer() as connection:
+            connection.execute("INSERT INTO Test VALUES (2)")
+            connection.commit()
+
+        with self.pool.reader() as connection:
+            values = [row["value"] for row in connection.execute("SELECT value FROM Test")]
+            self.assertEqual(values, [2])
+
+    def test_connection_pragmas(self):
+        """Tests that every connection is configured with the pool's PRAGMAs."""
+        with self.pool.reader() as connection:
+            self.assertEqual(
+                connection.execute("PRAGMA cache_size").fetchone()[0],
+                -self.pool.cache_size_kib,
+            )
+            # 2 = MEMORY.
+            self.assertEqual(connection.execute("PRAGMA temp_store").fetchone()[0], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import contextlib
+import json
+import os
+import sqlite3
+import unittest
+
+from storage.miner.content_codec import (
+    RAW_CODEC,
+    ContentCodec,
+    MAX_DICTIONARY_SIZE_BYTES,
+    train_dictionary,
+)
+
+
+def create_contents(count: int):
+    return [
+        json.dumps(
+            {
+                "id": f"t3_{i}",
+                "url": f"https://www.reddit.com/r/bittensor_/comments/{i}/",
+                "username": f"user_{i}",
+                "communityName": "r/bittensor_",
+                "body": f"Post number {i}",
+                "createdAt": "2024-01-01T00:00:00+00:00",
+                "dataType": "post",
+            }
+        ).encode("utf-8")
+        for i in range(count)
+    ]
+
+
+class TestContentCodec(unittest.TestCase):
+    def setUp(self):
+        self.database = "TestContentCodec.sqlite"
+        self.connection = sqlite3.connect(self.database)
+        self.connection.execute(ContentCodec.CONTENT_DICTIONARY_TABLE_CREATE)
+
+    def tearDown(self):
+        self.connection.close()
+        os.remove(self.database)
+
+    def test_train_dictionary(self):
+        """Tests that the dictionary holds the fragments shared across samples and none that are unique."""
+        dictionary = train_dictionary(create_contents(100))
+
+        self.assertLessEqual(len(dictionary), MAX_DICTIONARY_SIZE_BYTES)
+        self.assertIn(b'"communityName": "r/bittensor_"', dictionary)
+        self.assertNotIn(b"user_42", dictionary)
+
+    def test_encode_without_dictionary(self):
+        """Tests that content from a source without a dictionary is stored as is."""
+        codec = ContentCodec()
+        self.assertEqual(codec.encode(1, b"content"), (RAW_CODEC, b"content"))
+        self.assertEqual(codec.decode(RAW_CODEC, b"content"), b"content")
+
+    def test_round_trip(self):
+        """Tests that content encoded with a trained dictionary decodes to the original and is smaller."""
+        contents = create_contents(200)
+        codec = ContentCodec()
+        codec_id = codec.add_dictionary(self.connection, 1, train_dictionary(contents))
+
+        for content in contents:
+            encoded_codec_id, encoded = codec.encode(1, content)
+            self.assertEqual(encoded_codec_id, codec_id)
+            self.assertLess(len(encoded), len(content) / 2)
+            self.assertEqual(codec.decode(codec_id, encoded), content)
+
+        # Other sources are unaffected.
+        self.assertEqual(codec.codec_for_source(2), RAW_CODEC)
+
+    def test_old_dictionaries_remain_decodable(self):
+        """Tests that content encoded before a source was retrained still decodes."""
+        contents = create_contents(200)
+        codec = ContentCodec()
+        old_codec_id = codec.add_dictionary(self.connection, 1, train_dictionary(contents))
+        _, old_encoded = codec.encode(1, contents[0])
+
+        new_codec_id = codec.add_dictionary(self.connection, 1, train_dictionary(contents[100:]))
+
+        self.assertNotEqual(old_codec_id, new_codec_id)
+        self.assertEqual(codec.codec_for_source(1), new_codec_id)
+        self.assertEqual(codec.decode(old_codec_id, old_encoded), contents[0])
+
+    def test_decode_all_loads_new_dictionaries(self):
+        """Tests that decode_all loads dictionaries added by another codec before decoding."""
+        contents = create_contents(200)
+        writer = ContentCodec()
+        codec_id = writer.add_dictionary(self.connection, 1, train_dictionary(contents))
+        self.connection.commit()
+        encoded = [writer.encode(1, content)[1] for content in contents[:3]]
+
+        reader = ContentCodec()
+        with self.assertRaises(KeyError):
+            reader.decode(codec_id, encoded[0])
+
+        with contextlib.closing(sqlite3.connect(self.database)) as connection:
+            decoded = reader.decode_all(
+                connection, [codec_id, codec_id, codec_id, RAW_CODEC], encoded + [b"raw"]
+            )
+
+        self.assertEqual(decoded, contents[:3] + [b"raw"])
+
+
+if __name__ == "__main__":
+    unittest.main()
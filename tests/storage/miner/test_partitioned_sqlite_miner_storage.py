@@ -0,0 +1,314 @@
+import datetime as dt
+import os
+import shutil
+import threading
+import unittest
+from unittest import mock
+
+from common.data import (
+    DataEntity,
+    DataEntityBucketId,
+    DataLabel,
+    DataSource,
+    TimeBucket,
+)
+from storage.miner.partitioned_sqlite_miner_storage import (
+    PartitionedSqliteMinerStorage,
+    partition_id_from_time_bucket_id,
+)
+from storage.miner.sqlite_miner_storage import SqliteMinerStorage
+
+
+def create_entity(uri: str, datetime: dt.datetime, size: int, label: str = "label_1"):
+    return DataEntity(
+        uri=uri,
+        datetime=datetime,
+        source=DataSource.REDDIT,
+        label=DataLabel(value=label),
+        content=bytes(size),
+        content_size_bytes=size,
+    )
+
+
+def bucket_id_for(datetime: dt.datetime, label: str = "label_1") -> DataEntityBucketId:
+    return DataEntityBucketId(
+        time_bucket=TimeBucket.from_datetime(datetime),
+        source=DataSource.REDDIT,
+        label=DataLabel(value=label),
+    )
+
+
+class TestPartitionedSqliteMinerStorage(unittest.TestCase):
+    def setUp(self):
+        self.directory = "TestPartitionedDb"
+        self.test_storage = PartitionedSqliteMinerStorage(
+            self.directory, max_database_size_gb_hint=1
+        )
+        # Midday on each of the last few days so that every datetime falls in a different partition.
+        noon = dt.datetime.now(tz=dt.timezone.utc).replace(
+            hour=12, minute=0, second=0, microsecond=0
+        )
+        self.days = [noon - dt.timedelta(days=i) for i in range(3, 0, -1)]
+
+    def tearDown(self):
+        self.test_storage.close()
+        shutil.rmtree(self.directory)
+
+    def test_store_partitions_by_day(self):
+        """Tests that each day of entities is stored in its own partition and read back from it."""
+        entities = [
+            create_entity(f"entity_{i}", day, 10 * (i + 1))
+            for i, day in enumerate(self.days)
+        ]
+        self.test_storage.store_data_entities(entities)
+
+        self.assertEqual(
+            [
+                os.path.basename(path)
+                for path in PartitionedSqliteMinerStorage.list_partition_paths(
+                    self.directory
+                )
+            ],
+            [
+                f"DataEntity_{partition_id_from_time_bucket_id(TimeBucket.from_datetime(day).id)}.sqlite"
+                for day in self.days
+            ],
+        )
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 60)
+
+        for entity, day in zip(entities, self.days):
+            self.assertEqual(
+                [
+                    stored.uri
+                    for stored in self.test_storage.list_data_entities_in_data_entity_bucket(
+                        bucket_id_for(day)
+                    )
+                ],
+                [entity.uri],
+            )
+        self.assertEqual(
+            self.test_storage.list_data_entities_in_data_entity_bucket(
+                bucket_id_for(self.days[0] - dt.timedelta(days=1))
+            ),
+            [],
+        )
+
+    def test_reopen_loads_partitions(self):
+        """Tests that partitions written before a restart are served after it."""
+        self.test_storage.store_data_entities(
+            [create_entity("entity_1", self.days[0], 10)]
+        )
+        self.test_storage.close()
+
+        self.test_storage = PartitionedSqliteMinerStorage(
+            self.directory, max_database_size_gb_hint=1
+        )
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 10)
+        self.assertEqual(
+            len(
+                self.test_storage.list_data_entities_in_data_entity_bucket(
+                    bucket_id_for(self.days[0])
+                )
+            ),
+            1,
+        )
+
+    def test_expired_partitions_are_dropped(self):
+        """Tests that days past the age limit are not stored and expired partitions are deleted."""
+        expired_datetime = dt.datetime.now(tz=dt.timezone.utc) - dt.timedelta(days=40)
+        self.test_storage.store_data_entities(
+            [create_entity("expired", expired_datetime, 10)]
+        )
+        self.assertEqual(
+            PartitionedSqliteMinerStorage.list_partition_paths(self.directory), []
+        )
+
+        # Simulate a partition that expired while the miner was running.
+        expired_partition_id = partition_id_from_time_bucket_id(
+            TimeBucket.from_datetime(expired_datetime).id
+        )
+        self.test_storage._get_or_create_partition(
+            expired_partition_id
+        ).store_data_entities([create_entity("expired", expired_datetime, 10)])
+        self.test_storage.store_data_entities(
+            [create_entity("entity_1", self.days[0], 10)]
+        )
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 20)
+
+        self.assertEqual(self.test_storage.drop_expired_partitions(), 1)
+        self.assertEqual(
+            len(PartitionedSqliteMinerStorage.list_partition_paths(self.directory)), 1
+        )
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 10)
+
+    def test_list_contents_matches_single_database(self):
+        """Tests that listing contents across partitions applies the overall limits like a single database."""
+        entities = [
+            create_entity(f"entity_{i}_{j}", day, 10)
+            for i, day in enumerate(self.days)
+            for j in range(3)
+        ]
+        bucket_ids = [bucket_id_for(day) for day in self.days]
+        self.test_storage.store_data_entities(entities)
+
+        single_storage = SqliteMinerStorage("TestDb.sqlite", max_database_size_gb_hint=1)
+        try:
+            single_storage.store_data_entities(entities)
+            for size_limit, count_limit in [(45, 100), (1000, 4), (1000, 100)]:
+                self.assertEqual(
+                    self.test_storage._list_contents_in_data_entity_buckets(
+                        bucket_ids, size_limit, count_limit
+                    ),
+                    single_storage._list_contents_in_data_entity_buckets(
+                        bucket_ids, size_limit, count_limit
+                    ),
+                )
+        finally:
+            single_storage.close()
+            os.remove(single_storage.database)
+
+        contents = self.test_storage._list_contents_in_data_entity_buckets(
+            bucket_ids, 45, 100
+        )
+        self.assertEqual([len(contents[0][bucket_id]) for bucket_id in bucket_ids], [3, 2, 0])
+
+    def test_get_compressed_index(self):
+        """Tests that the index holds the buckets of every partition in size order."""
+        self.test_storage.store_data_entities(
+            [
+                create_entity("entity_1", self.days[0], 10),
+                create_entity("entity_2", self.days[1], 30),
+                create_entity("entity_3", self.days[2], 20, label="label_2"),
+            ]
+        )
+
+        buckets = self.test_storage.list_data_entity_buckets()
+        self.assertEqual(
+            [(bucket.id, bucket.size_bytes) for bucket in buckets],
+            [
+                (bucket_id_for(self.days[1]), 30),
+                (bucket_id_for(self.days[2], "label_2"), 20),
+                (bucket_id_for(self.days[0]), 10),
+            ],
+        )
+
+        index = self.test_storage.get_compressed_index()
+        self.assertEqual(
+            sorted(
+                (bucket.label, sorted(bucket.sizes_bytes))
+                for bucket in index.sources[DataSource.REDDIT]
+            ),
+            [("label_1", [10, 30]), ("label_2", [20])],
+        )
+
+    def test_clear_content_from_oldest_drops_partitions(self):
+        """Tests that clearing space deletes whole partitions oldest first and then clears within a partition."""
+        self.test_storage.store_data_entities(
+            [
+                create_entity(f"entity_{i}_{hour}", day + dt.timedelta(hours=hour), 50)
+                for i, day in enumerate(self.days)
+                for hour in range(2)
+            ]
+        )
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 300)
+
+        # The oldest day holds 100 bytes so it is dropped and the remaining 50 bytes come from the next day.
+        self.test_storage.clear_content_from_oldest(150)
+
+        self.assertEqual(
+            len(PartitionedSqliteMinerStorage.list_partition_paths(self.directory)), 2
+        )
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 150)
+        self.assertEqual(
+            self.test_storage.list_data_entities_in_data_entity_bucket(
+                bucket_id_for(self.days[1])
+            ),
+            [],
+        )
+
+    def test_clear_content_from_oldest_blocks_partition_changes(self):
+        """Tests that no partition is created or dropped while the oldest partitions are being cleared."""
+        self.test_storage.store_data_entities(
+            [
+                create_entity(f"entity_{i}_{hour}", day + dt.timedelta(hours=hour), 50)
+                for i, day in enumerate(self.days)
+                for hour in range(2)
+            ]
+        )
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        store_thread = threading.Thread(
+            target=self.test_storage.store_data_entities,
+            args=([create_entity("entity_now", now, 50)],),
+        )
+        get_partition_capacity_bytes = self.test_storage._get_partition_capacity_bytes
+        blocked = []
+
+        def store_while_measuring(partition):
+            # Try to store into a new partition while the clearing is measuring the first one.
+            if not store_thread.is_alive() and not blocked:
+                store_thread.start()
+                store_thread.join(timeout=0.2)
+                blocked.append(store_thread.is_alive())
+            return get_partition_capacity_bytes(partition)
+
+        with mock.patch.object(
+            self.test_storage,
+            "_get_partition_capacity_bytes",
+            side_effect=store_while_measuring,
+        ):
+            self.test_storage.clear_content_from_oldest(150)
+        store_thread.join(timeout=5)
+
+        self.assertEqual(blocked, [True])
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 200)
+        self.assertEqual(
+            len(
+                self.test_storage.list_data_entities_in_data_entity_bucket(
+                    bucket_id_for(now)
+                )
+            ),
+            1,
+        )
+
+
+    def test_partitions_use_small_connection_pools(self):
+        """Tests that each partition's connection pool is smaller than that of a single database."""
+        self.test_storage.store_data_entities(
+            [create_entity("entity_1", self.days[0], 10)]
+        )
+
+        for _, partition in self.test_storage._list_partitions():
+            pool = partition.connection_pool
+            self.assertEqual(
+                pool.max_reader_connections,
+                PartitionedSqliteMinerStorage.PARTITION_MAX_READER_CONNECTIONS,
+            )
+            with pool.reader() as connection:
+                self.assertEqual(
+                    connection.execute("PRAGMA cache_size").fetchone()[0],
+                    -PartitionedSqliteMinerStorage.PARTITION_CACHE_SIZE_KIB,
+                )
+
+    def test_catalog_only_holds_hf_metadata(self):
+        """Tests that the catalog has no DataEntity schema, including one created by earlier versions."""
+        self.test_storage.close()
+        # Recreate the full schema in the catalog, as earlier versions did.
+        SqliteMinerStorage(
+            os.path.join(self.directory, PartitionedSqliteMinerStorage.CATALOG_FILE_NAME)
+        ).close()
+
+        self.test_storage = PartitionedSqliteMinerStorage(
+            self.directory, max_database_size_gb_hint=1
+        )
+
+        with self.test_storage.connection_pool.reader() as connection:
+            tables = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            ]
+        self.assertEqual(tables, ["HFMetaData"])
+
+if __name__ == "__main__":
+    unittest.main()
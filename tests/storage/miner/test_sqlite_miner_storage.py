@@ -1,4 +1,6 @@
 import contextlib
+import gzip
+import json
 import time
 import unittest
 import os
@@ -17,11 +19,41 @@ from common.data import (
 import datetime as dt
 import pytz
 
+from rewards.data import DataDesirabilityLookup, DataSourceDesirability
 from tests import utils
 
+from storage.miner.content_codec import RAW_CODEC
 from storage.miner.sqlite_miner_storage import SqliteMinerStorage
 
 
+def create_json_entities(count: int, datetime: dt.datetime, label: DataLabel = None):
+    """Creates entities with content similar to what the scrapers store, which compresses well."""
+    data_entities = []
+    for i in range(count):
+        content = json.dumps(
+            {
+                "id": f"t3_{i}",
+                "url": f"https://www.reddit.com/r/bittensor_/comments/{i}/",
+                "username": f"user_{i}",
+                "communityName": "r/bittensor_",
+                "body": f"Post number {i}",
+                "createdAt": datetime.isoformat(),
+                "dataType": "post",
+            }
+        ).encode("utf-8")
+        data_entities.append(
+            DataEntity(
+                uri=f"https://www.reddit.com/r/bittensor_/comments/{i}/",
+                datetime=datetime,
+                source=DataSource.REDDIT,
+                label=label,
+                content=content,
+                content_size_bytes=len(content),
+            )
+        )
+    return data_entities
+
+
 class TestSqliteMinerStorage(unittest.TestCase):
     def setUp(self):
         # Make a test database for the test to operate against.
@@ -31,6 +63,7 @@ class TestSqliteMinerStorage(unittest.TestCase):
 
     def tearDown(self):
         # Clean up the test database.
+        self.test_storage.close()
         os.remove(self.test_storage.database)
 
     def test_instantiate_sqlite_miner_storage(self):
@@ -167,6 +200,322 @@ class TestSqliteMinerStorage(unittest.TestCase):
 
             self.assertEqual(uris, ["test_entity_2", "test_entity_3"])
 
+    def test_clear_content_from_oldest_in_batches(self):
+        """Tests that clearing content removes whole time buckets from the oldest, across multiple batches."""
+        now = dt.datetime(2024, 1, 1, 1, 30, tzinfo=dt.timezone.utc)
+        entities = [
+            DataEntity(
+                uri=f"test_entity_{hour}_{i}",
+                datetime=now + dt.timedelta(hours=hour),
+                source=DataSource.REDDIT,
+                content=bytes(10),
+                content_size_bytes=10,
+            )
+            for hour in range(3)
+            for i in range(5)
+        ]
+        self.test_storage.store_data_entities(entities)
+        self.test_storage.eviction_batch_size = 2
+
+        # Clearing part of the second hour clears the whole of the first two hours.
+        self.test_storage.clear_content_from_oldest(60)
+
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT DISTINCT timeBucketId FROM DataEntity")
+            time_bucket_ids = [row["timeBucketId"] for row in cursor]
+
+        self.assertEqual(time_bucket_ids, [TimeBucket.from_datetime(now).id + 2])
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 50)
+
+    def test_clear_content_least_desirable_first(self):
+        """Tests that with a desirability lookup the least valuable buckets are cleared before older ones."""
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        desirable_entity = DataEntity(
+            uri="test_entity_1",
+            datetime=now - dt.timedelta(hours=2),
+            source=DataSource.REDDIT,
+            label=DataLabel(value="r/desirable"),
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        undesirable_entity = DataEntity(
+            uri="test_entity_2",
+            datetime=now,
+            source=DataSource.REDDIT,
+            label=DataLabel(value="r/undesirable"),
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        self.test_storage.store_data_entities([desirable_entity, undesirable_entity])
+        self.test_storage.update_desirability_lookup(
+            DataDesirabilityLookup(
+                distribution={
+                    DataSource.REDDIT: DataSourceDesirability(
+                        weight=0.5,
+                        default_scale_factor=0.5,
+                        label_scale_factors={
+                            DataLabel(value="r/desirable"): 1.0,
+                            DataLabel(value="r/undesirable"): -1.0,
+                        },
+                    ),
+                    DataSource.X: DataSourceDesirability(weight=0.5),
+                },
+                max_age_in_hours=24,
+            )
+        )
+
+        self.test_storage.clear_content_from_oldest(10)
+
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT uri FROM DataEntity")
+            uris = [row["uri"] for row in cursor]
+
+        self.assertEqual(uris, ["test_entity_1"])
+
+    def test_export_index(self):
+        """Tests that reading a source in (datetime, uri) order after a key seeks the export index instead of sorting."""
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            plan = connection.execute(
+                """EXPLAIN QUERY PLAN
+                SELECT datetime, uri, content FROM DataEntity
+                WHERE source = ? AND (datetime, uri) > (?, ?)
+                ORDER BY datetime ASC, uri ASC
+                LIMIT ?""",
+                [DataSource.X.value, "2024-01-01 00:00:00+00:00", "uri", 10],
+            ).fetchall()
+
+        details = " ".join(row[-1] for row in plan)
+        self.assertIn("data_entity_export_index", details)
+        self.assertNotIn("TEMP B-TREE", details)
+
+    def test_content_size_ledger(self):
+        """Tests that the content size ledger tracks inserts, overwrites and deletes per time bucket and source."""
+        now = dt.datetime(2024, 1, 1, 1, 30, tzinfo=dt.timezone.utc)
+        entity1 = DataEntity(
+            uri="test_entity_1",
+            datetime=now,
+            source=DataSource.REDDIT,
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        entity2 = DataEntity(
+            uri="test_entity_2",
+            datetime=now,
+            source=DataSource.X,
+            label=DataLabel(value="label_2"),
+            content=bytes(20),
+            content_size_bytes=20,
+        )
+        entity3 = DataEntity(
+            uri="test_entity_3",
+            datetime=now + dt.timedelta(hours=1),
+            source=DataSource.X,
+            content=bytes(30),
+            content_size_bytes=30,
+        )
+        self.test_storage.store_data_entities([entity1, entity2, entity3])
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 60)
+
+        # Overwrite entity2 with a larger version in a later time bucket.
+        updated_entity2 = DataEntity(
+            uri="test_entity_2",
+            datetime=now + dt.timedelta(hours=1),
+            source=DataSource.X,
+            label=DataLabel(value="label_2"),
+            content=bytes(100),
+            content_size_bytes=100,
+        )
+        self.test_storage.store_data_entities([updated_entity2])
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 140)
+
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            connection.execute("DELETE FROM DataEntity WHERE uri = 'test_entity_1'")
+            connection.commit()
+
+            cursor = connection.cursor()
+            cursor.execute(
+                "SELECT timeBucketId, source, contentSizeBytes, entityCount FROM ContentSizeLedger"
+            )
+            ledger = [tuple(row) for row in cursor.fetchall()]
+
+        time_bucket_id = TimeBucket.from_datetime(now).id
+        self.assertEqual(ledger, [(time_bucket_id + 1, DataSource.X, 130, 2)])
+        self.assertFalse(self.test_storage.reconcile_content_size_ledger())
+
+    def test_bucket_summary(self):
+        """Tests that the bucket summary tracks inserts, overwrites that move buckets and deletes."""
+        now = dt.datetime(2024, 1, 1, 1, 30, tzinfo=dt.timezone.utc)
+        time_bucket_id = TimeBucket.from_datetime(now).id
+        entity1 = DataEntity(
+            uri="test_entity_1",
+            datetime=now,
+            source=DataSource.REDDIT,
+            label=DataLabel(value="label_1"),
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        entity2 = DataEntity(
+            uri="test_entity_2",
+            datetime=now,
+            source=DataSource.REDDIT,
+            label=DataLabel(value="label_1"),
+            content=bytes(20),
+            content_size_bytes=20,
+        )
+        self.test_storage.store_data_entities([entity1, entity2])
+
+        # Overwrite entity2 with new content under a different label.
+        updated_entity2 = DataEntity(
+            uri="test_entity_2",
+            datetime=now,
+            source=DataSource.REDDIT,
+            content=bytes(50),
+            content_size_bytes=50,
+        )
+        self.test_storage.store_data_entities([updated_entity2])
+
+        def get_summary():
+            with contextlib.closing(
+                self.test_storage._create_connection()
+            ) as connection:
+                cursor = connection.cursor()
+                cursor.execute(
+                    "SELECT timeBucketId, source, label, contentSizeBytes, entityCount FROM BucketSummary ORDER BY label"
+                )
+                return [tuple(row) for row in cursor.fetchall()]
+
+        self.assertEqual(
+            get_summary(),
+            [
+                (time_bucket_id, DataSource.REDDIT, "NULL", 50, 1),
+                (time_bucket_id, DataSource.REDDIT, "label_1", 10, 1),
+            ],
+        )
+
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            connection.execute("DELETE FROM DataEntity WHERE uri = 'test_entity_1'")
+            connection.commit()
+
+        self.assertEqual(
+            get_summary(), [(time_bucket_id, DataSource.REDDIT, "NULL", 50, 1)]
+        )
+
+    def test_reconcile_content_size_ledger(self):
+        """Tests that reconciling the ledger and bucket summary corrects any drift from the stored content."""
+        entity = DataEntity(
+            uri="test_entity_1",
+            datetime=dt.datetime.now(),
+            source=DataSource.REDDIT,
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        self.test_storage.store_data_entities([entity])
+
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            connection.execute("UPDATE ContentSizeLedger SET contentSizeBytes = 1000")
+            connection.execute("DELETE FROM BucketSummary")
+            connection.commit()
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 1000)
+
+        self.assertTrue(self.test_storage.reconcile_content_size_ledger())
+        self.assertEqual(self.test_storage.get_content_size_bytes(), 10)
+        self.assertEqual(len(self.test_storage.list_data_entity_buckets()), 1)
+
+    def test_store_compressed_content(self):
+        """Tests that compressed content is returned as stored while reported and on disk sizes are both tracked."""
+        self.test_storage.close()
+        os.remove(self.test_storage.database)
+        self.test_storage = SqliteMinerStorage(
+            "TestDb.sqlite", max_database_size_gb_hint=1, compress_content=True
+        )
+
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        label = DataLabel(value="r/bittensor_")
+        data_entities = create_json_entities(200, now, label)
+        self.test_storage.store_data_entities(data_entities)
+
+        content_size = sum(entity.content_size_bytes for entity in data_entities)
+        self.assertEqual(self.test_storage.get_content_size_bytes(), content_size)
+        self.assertLess(
+            self.test_storage.get_stored_content_size_bytes(), content_size / 2
+        )
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            codecs = connection.execute(
+                "SELECT DISTINCT contentCodec FROM DataEntity"
+            ).fetchall()
+        self.assertEqual(len(codecs), 1)
+        self.assertNotEqual(codecs[0][0], RAW_CODEC)
+
+        bucket_id = DataEntityBucketId(
+            time_bucket=TimeBucket.from_datetime(now),
+            source=DataSource.REDDIT,
+            label=label,
+        )
+        self.assertEqual(
+            sorted(
+                entity.content
+                for entity in self.test_storage.list_data_entities_in_data_entity_bucket(
+                    bucket_id
+                )
+            ),
+            sorted(entity.content for entity in data_entities),
+        )
+        self.assertEqual(
+            sorted(
+                self.test_storage.list_contents_in_data_entity_buckets([bucket_id])[
+                    bucket_id
+                ]
+            ),
+            sorted(entity.content for entity in data_entities),
+        )
+        self.assertEqual(
+            self.test_storage.list_data_entity_buckets()[0].size_bytes, content_size
+        )
+        self.assertFalse(self.test_storage.reconcile_content_size_ledger())
+
+    def test_migrate_content_encoding(self):
+        """Tests that existing content can be compressed and decompressed in place."""
+        now = dt.datetime.now(tz=dt.timezone.utc)
+        data_entities = create_json_entities(250, now)
+        self.test_storage.store_data_entities(data_entities)
+        content_size = self.test_storage.get_content_size_bytes()
+        self.assertEqual(self.test_storage.get_stored_content_size_bytes(), content_size)
+        self.test_storage.close()
+
+        # Reopening with compression enabled trains a dictionary from the existing content.
+        self.test_storage = SqliteMinerStorage(
+            "TestDb.sqlite", max_database_size_gb_hint=1, compress_content=True
+        )
+        self.assertEqual(self.test_storage.migrate_content_encoding(batch_size=100), 250)
+        self.assertEqual(self.test_storage.migrate_content_encoding(batch_size=100), 0)
+        self.assertEqual(self.test_storage.get_content_size_bytes(), content_size)
+        self.assertLess(
+            self.test_storage.get_stored_content_size_bytes(), content_size / 2
+        )
+        self.assertFalse(self.test_storage.reconcile_content_size_ledger())
+        self.test_storage.close()
+
+        self.test_storage = SqliteMinerStorage(
+            "TestDb.sqlite", max_database_size_gb_hint=1
+        )
+        self.assertEqual(self.test_storage.migrate_content_encoding(batch_size=100), 250)
+        self.assertEqual(self.test_storage.get_stored_content_size_bytes(), content_size)
+
+        bucket_id = DataEntityBucketId(
+            time_bucket=TimeBucket.from_datetime(now), source=DataSource.REDDIT
+        )
+        self.assertEqual(
+            sorted(
+                entity.content
+                for entity in self.test_storage.list_data_entities_in_data_entity_bucket(
+                    bucket_id
+                )
+            ),
+            sorted(entity.content for entity in data_entities),
+        )
+
     def test_get_compressed_index(self):
         """Tests that we can get the compressed miner index from storage."""
         now = dt.datetime.now()
@@ -536,6 +885,71 @@ class TestSqliteMinerStorage(unittest.TestCase):
         # Confirm we get back exactly two of the entities.
         self.assertEqual(len(data_entities), 2)
 
+    def test_list_entities_in_data_entity_bucket_stops_at_max_size(self):
+        """Tests that the running size limit is applied in storage and smaller entities are returned first."""
+        bucket_datetime = dt.datetime(2023, 12, 12, 2, 30, tzinfo=dt.timezone.utc)
+        label = DataLabel(value="label_1")
+        sizes = [
+            constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES // 2,
+            constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES // 4,
+            constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES // 4,
+            10,
+        ]
+        entities = [
+            DataEntity(
+                uri=f"test_entity_{i}",
+                datetime=bucket_datetime,
+                source=DataSource.X,
+                label=label,
+                content=bytes(i + 1),
+                content_size_bytes=size,
+            )
+            for i, size in enumerate(sizes)
+        ]
+        self.test_storage.store_data_entities(entities)
+
+        data_entities = self.test_storage.list_data_entities_in_data_entity_bucket(
+            DataEntityBucketId(
+                time_bucket=TimeBucket.from_datetime(bucket_datetime),
+                source=DataSource.X,
+                label=label,
+            )
+        )
+
+        # The three smallest entities fit with room to spare, so the largest is still included after them.
+        self.assertEqual(
+            [entity.uri for entity in data_entities],
+            ["test_entity_3", "test_entity_1", "test_entity_2", "test_entity_0"],
+        )
+
+        self.test_storage.store_data_entities(
+            [
+                DataEntity(
+                    uri="test_entity_4",
+                    datetime=bucket_datetime,
+                    source=DataSource.X,
+                    label=label,
+                    content=bytes(5),
+                    content_size_bytes=constants.DATA_ENTITY_BUCKET_SIZE_LIMIT_BYTES // 2 - 5,
+                )
+            ]
+        )
+        data_entities = self.test_storage.list_data_entities_in_data_entity_bucket(
+            DataEntityBucketId(
+                time_bucket=TimeBucket.from_datetime(bucket_datetime),
+                source=DataSource.X,
+                label=label,
+            )
+        )
+
+        # Once the bucket is full the remaining entities are not returned.
+        self.assertEqual(
+            [entity.uri for entity in data_entities],
+            ["test_entity_3", "test_entity_1", "test_entity_2", "test_entity_4"],
+        )
+        self.assertEqual(data_entities[0].label, label)
+        self.assertEqual(data_entities[0].content, bytes(4))
+
     def test_list_entities_in_data_entity_bucket_exactly_max_size(self):
         """Tests getting up to exactly the max size in a over max size data entity bucket"""
         # Create two entities for the bucket.
@@ -826,6 +1240,42 @@ class TestSqliteMinerStorage(unittest.TestCase):
             utils.are_compressed_indexes_equal(cached_index, expected_index)
         )
 
+    def test_get_serialized_compressed_index(self):
+        """Tests that the serialized index matches the cached index and is reused across requests."""
+        now = dt.datetime.now()
+        entity = DataEntity(
+            uri="test_entity_1",
+            datetime=now,
+            source=DataSource.REDDIT,
+            label=DataLabel(value="label_1"),
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        self.test_storage.store_data_entities([entity])
+
+        serialized_index = self.test_storage.get_serialized_compressed_index()
+        self.assertTrue(
+            utils.are_compressed_indexes_equal(
+                CompressedMinerIndex.model_validate_json(serialized_index.json),
+                self.test_storage.get_compressed_index(),
+            )
+        )
+        self.assertEqual(serialized_index.size_bytes, 10)
+        self.assertEqual(serialized_index.bucket_count, 1)
+        self.assertEqual(
+            gzip.decompress(serialized_index.gzip()).decode("utf-8"),
+            serialized_index.json,
+        )
+
+        # A second request is served the same serialized index.
+        self.assertIs(
+            self.test_storage.get_serialized_compressed_index(), serialized_index
+        )
+        self.assertEqual(
+            self.test_storage.index_serialization_seconds_saved,
+            2 * serialized_index.serialization_seconds,
+        )
+
     def test_list_contents_in_data_entity_buckets_empty_bucket(self):
         """Tests getting back no contents from an empty bucket."""
         # Create the DataEntityBucketId to query by.
@@ -1217,6 +1667,77 @@ class TestSqliteMinerStorage(unittest.TestCase):
             [content2],
         )
 
+    def test_list_contents_in_data_entity_buckets_matches_source(self):
+        """Tests getting back contents only from the requested source when time bucket and label match."""
+        label = DataLabel(value="label_1")
+        bucket_datetime = dt.datetime(2023, 12, 12, 1, 30, 0, tzinfo=dt.timezone.utc)
+        reddit_entity = DataEntity(
+            uri="test_entity_1",
+            datetime=bucket_datetime,
+            source=DataSource.REDDIT,
+            label=label,
+            content=bytes(10),
+            content_size_bytes=10,
+        )
+        x_entity = DataEntity(
+            uri="test_entity_2",
+            datetime=bucket_datetime,
+            source=DataSource.X,
+            label=label,
+            content=bytes(20),
+            content_size_bytes=20,
+        )
+        self.test_storage.store_data_entities([reddit_entity, x_entity])
+
+        bucket_id = DataEntityBucketId(
+            time_bucket=TimeBucket.from_datetime(bucket_datetime),
+            source=DataSource.X,
+            label=label,
+        )
+
+        # Request the same bucket twice to confirm duplicates are not returned twice.
+        buckets_to_entities = self.test_storage.list_contents_in_data_entity_buckets(
+            [bucket_id, bucket_id]
+        )
+
+        self.assertEqual(dict(buckets_to_entities), {bucket_id: [bytes(20)]})
+
+    def test_list_contents_in_data_entity_buckets_over_total_size(self):
+        """Tests that the total size limit applies across buckets once each bucket is within its own limit."""
+        bucket_datetime = dt.datetime(2023, 12, 12, 1, 30, 0, tzinfo=dt.timezone.utc)
+        size = constants.BULK_CONTENTS_SIZE_LIMIT_BYTES // 2
+        bucket_ids = []
+        entities = []
+        for i in range(3):
+            label = DataLabel(value=f"label_{i}")
+            bucket_ids.append(
+                DataEntityBucketId(
+                    time_bucket=TimeBucket.from_datetime(bucket_datetime),
+                    source=DataSource.REDDIT,
+                    label=label,
+                )
+            )
+            entities.append(
+                DataEntity(
+                    uri=f"test_entity_{i}",
+                    datetime=bucket_datetime,
+                    source=DataSource.REDDIT,
+                    label=label,
+                    content=bytes(i + 1),
+                    content_size_bytes=size,
+                )
+            )
+        self.test_storage.store_data_entities(entities)
+
+        buckets_to_entities = self.test_storage.list_contents_in_data_entity_buckets(
+            bucket_ids
+        )
+
+        # Only the first two contents fit within the total size limit.
+        self.assertEqual(
+            sum(len(contents) for contents in buckets_to_entities.values()), 2
+        )
+
     def test_list_contents_in_data_entity_buckets_over_size(self):
         """Tests getting back enough obfuscated data entities from one over-size bucket."""
         # Create an entity for bucket 1.
@@ -0,0 +1,406 @@
+import datetime as dt
+import random
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from common.data import (
+    CompressedEntityBucket,
+    CompressedMinerIndex,
+    DataSource,
+    HuggingFaceMetadata,
+    TimeBucket,
+)
+from common.data_v2 import ScorableDataEntityBucket
+from storage.validator.columnar_validator_storage import (
+    BucketAggregate,
+    ColumnarValidatorStorage,
+)
+from storage.validator.label_table import LabelTable
+from storage.validator.sqlite_memory_validator_storage import (
+    SqliteMemoryValidatorStorage,
+)
+from storage.validator.validator_storage import MinerIndexDiff
+
+
+def create_random_index(
+    rng: random.Random, time_bucket_ids, labels, bucket_count: int
+) -> CompressedMinerIndex:
+    """Creates an index with buckets drawn from a small space so that miners overlap."""
+    sources = {}
+    for source in [DataSource.REDDIT.value, DataSource.X.value]:
+        compressed_buckets = []
+        for label in rng.sample(labels, 3):
+            chosen_time_bucket_ids = rng.sample(time_bucket_ids, bucket_count)
+            compressed_buckets.append(
+                CompressedEntityBucket(
+                    label=label,
+                    time_bucket_ids=chosen_time_bucket_ids,
+                    sizes_bytes=[rng.randint(1, 1000) for _ in chosen_time_bucket_ids],
+                )
+            )
+        sources[source] = compressed_buckets
+    return CompressedMinerIndex(sources=sources)
+
+
+class TestBucketAggregate(unittest.TestCase):
+    def test_add_and_remove(self):
+        """Tests that totals sum the contributions of every miner and slots are released when no miner holds them."""
+        aggregate = BucketAggregate(initial_capacity=2)
+
+        slots_1 = aggregate.add(np.array([1, 2, 3]), np.array([10.0, 20.0, 30.0]))
+        slots_2 = aggregate.add(np.array([2, 3, 4]), np.array([1.0, 2.0, 3.0]))
+        self.assertEqual(len(aggregate), 4)
+        np.testing.assert_array_equal(slots_1[1:], slots_2[:2])
+        np.testing.assert_array_equal(aggregate.get_totals(slots_2), [21.0, 32.0, 3.0])
+
+        aggregate.remove(slots_1, np.array([10.0, 20.0, 30.0]))
+        self.assertEqual(len(aggregate), 3)
+        np.testing.assert_array_equal(aggregate.get_totals(slots_2), [1.0, 2.0, 3.0])
+
+        # The slot of the released key is reused for the next new key.
+        slots_3 = aggregate.add(np.array([5]), np.array([7.0]))
+        self.assertEqual(slots_3[0], slots_1[0])
+        np.testing.assert_array_equal(aggregate.get_totals(slots_3), [7.0])
+
+
+class TestColumnarValidatorStorage(unittest.TestCase):
+    def setUp(self):
+        self.test_storage = ColumnarValidatorStorage()
+
+    def test_read_miner_index(self):
+        """Tests that buckets are read back in key order and scored by their share across miners."""
+        time_bucket_id = TimeBucket.from_datetime(dt.datetime.utcnow()).id
+        index_1 = CompressedMinerIndex(
+            sources={
+                DataSource.X.value: [
+                    CompressedEntityBucket(
+                        label=None, time_bucket_ids=[time_bucket_id], sizes_bytes=[50]
+                    )
+                ],
+                DataSource.REDDIT.value: [
+                    CompressedEntityBucket(
+                        label="#Bittensor",
+                        time_bucket_ids=[time_bucket_id, time_bucket_id - 1],
+                        sizes_bytes=[10, 20],
+                    )
+                ],
+            }
+        )
+        index_2 = CompressedMinerIndex(
+            sources={
+                DataSource.REDDIT.value: [
+                    CompressedEntityBucket(
+                        label="#bittensor",
+                        time_bucket_ids=[time_bucket_id],
+                        sizes_bytes=[40],
+                    )
+                ],
+            }
+        )
+
+        self.test_storage.upsert_compressed_miner_index(index_1, "hotkey1", 1)
+        self.test_storage.upsert_compressed_miner_index(index_2, "hotkey2", 1)
+
+        self.assertEqual(
+            self.test_storage.read_miner_index("hotkey1").scorable_data_entity_buckets,
+            [
+                ScorableDataEntityBucket(
+                    time_bucket_id=time_bucket_id - 1,
+                    source=DataSource.REDDIT,
+                    label="#bittensor",
+                    size_bytes=20,
+                    scorable_bytes=20,
+                ),
+                ScorableDataEntityBucket(
+                    time_bucket_id=time_bucket_id,
+                    source=DataSource.REDDIT,
+                    label="#bittensor",
+                    size_bytes=10,
+                    scorable_bytes=2,
+                ),
+                ScorableDataEntityBucket(
+                    time_bucket_id=time_bucket_id,
+                    source=DataSource.X,
+                    label=None,
+                    size_bytes=50,
+                    scorable_bytes=50,
+                ),
+            ],
+        )
+
+        # Once the other miner is deleted the shared bucket is unique again.
+        self.test_storage.delete_miner("hotkey2")
+        self.assertIsNone(self.test_storage.read_miner_index("hotkey2"))
+        self.assertEqual(
+            self.test_storage.read_miner_index("hotkey1")
+            .scorable_data_entity_buckets[1]
+            .scorable_bytes,
+            10,
+        )
+
+    def test_upsert_with_duplicates_keeps_first(self):
+        """Tests that a bucket repeated in an index is only stored once, keeping its first size."""
+        time_bucket_id = TimeBucket.from_datetime(dt.datetime.utcnow()).id
+        index = CompressedMinerIndex(
+            sources={
+                DataSource.REDDIT.value: [
+                    CompressedEntityBucket(
+                        label="label_1", time_bucket_ids=[time_bucket_id], sizes_bytes=[10]
+                    ),
+                    CompressedEntityBucket(
+                        label="label_1", time_bucket_ids=[time_bucket_id], sizes_bytes=[30]
+                    ),
+                ]
+            }
+        )
+        self.test_storage.upsert_compressed_miner_index(index, "hotkey1", 1)
+
+        buckets = self.test_storage.read_miner_index("hotkey1").scorable_data_entity_buckets
+        self.assertEqual([(bucket.size_bytes, bucket.scorable_bytes) for bucket in buckets], [(10, 10)])
+
+    def test_upsert_returns_diff(self):
+        """Tests that upserting an index over a previous one reports the inserted, removed and resized buckets."""
+        time_bucket_id = TimeBucket.from_datetime(dt.datetime.utcnow()).id
+
+        def create_index(time_bucket_ids, sizes_bytes):
+            return CompressedMinerIndex(
+                sources={
+                    DataSource.REDDIT.value: [
+                        CompressedEntityBucket(
+                            label="label_1",
+                            time_bucket_ids=time_bucket_ids,
+                            sizes_bytes=sizes_bytes,
+                        )
+                    ]
+                }
+            )
+
+        self.assertEqual(
+            self.test_storage.upsert_compressed_miner_index(
+                create_index([time_bucket_id, time_bucket_id - 1, time_bucket_id - 2], [10, 20, 30]),
+                "hotkey1",
+                1,
+            ),
+            MinerIndexDiff(inserted=3),
+        )
+        # Another miner shares the removed bucket, so its total is reduced rather than released.
+        self.test_storage.upsert_compressed_miner_index(
+            create_index([time_bucket_id - 2], [30]), "hotkey2", 1
+        )
+
+        self.assertEqual(
+            self.test_storage.upsert_compressed_miner_index(
+                create_index([time_bucket_id, time_bucket_id - 1, time_bucket_id - 3], [10, 25, 40]),
+                "hotkey1",
+                0.5,
+            ),
+            MinerIndexDiff(inserted=1, removed=1, resized=1, unchanged=1),
+        )
+        self.assertEqual(len(self.test_storage.bucket_aggregate), 4)
+        self.assertEqual(
+            [
+                (bucket.time_bucket_id, bucket.size_bytes, bucket.scorable_bytes)
+                for bucket in self.test_storage.read_miner_index(
+                    "hotkey1"
+                ).scorable_data_entity_buckets
+            ],
+            [
+                (time_bucket_id - 3, 40, 40),
+                (time_bucket_id - 1, 25, 25),
+                (time_bucket_id, 10, 10),
+            ],
+        )
+        self.assertEqual(
+            self.test_storage.read_miner_index("hotkey2")
+            .scorable_data_entity_buckets[0]
+            .scorable_bytes,
+            30,
+        )
+
+    def test_zero_credibility(self):
+        """Tests that buckets only held by miners without credibility have no scorable bytes."""
+        index = CompressedMinerIndex(
+            sources={
+                DataSource.REDDIT.value: [
+                    CompressedEntityBucket(label="label_1", time_bucket_ids=[1], sizes_bytes=[10])
+                ]
+            }
+        )
+        self.test_storage.upsert_compressed_miner_index(index, "hotkey1", 0)
+
+        buckets = self.test_storage.read_miner_index("hotkey1").scorable_data_entity_buckets
+        self.assertEqual(buckets[0].scorable_bytes, 0)
+
+    def test_matches_sqlite_storage(self):
+        """Tests that scoring matches the SQLite storage across upserts, updates and deletes."""
+        sqlite_storage = SqliteMemoryValidatorStorage()
+        # Delete the shared in memory db afterwards so it does not leak into other tests.
+        self.addCleanup(sqlite_storage.continuous_connection_do_not_reuse.close)
+        rng = random.Random(42)
+        time_bucket_ids = list(range(480_000, 480_050))
+        labels = [None] + [f"label_{i}" for i in range(6)]
+        hotkeys = [f"hotkey{i}" for i in range(6)]
+
+        def upsert(hotkey):
+            index = create_random_index(rng, time_bucket_ids, labels, 20)
+            # Dyadic credibilities keep the floating point arithmetic of both storages exact.
+            credibility = rng.choice([0, 0.25, 0.5, 1])
+            for storage in [sqlite_storage, self.test_storage]:
+                storage.upsert_compressed_miner_index(index, hotkey, credibility)
+
+        def assert_indexes_match():
+            for hotkey in hotkeys:
+                expected = sqlite_storage.read_miner_index(hotkey)
+                actual = self.test_storage.read_miner_index(hotkey)
+                if expected is None:
+                    self.assertIsNone(actual)
+                else:
+                    self.assertEqual(
+                        actual.scorable_data_entity_buckets,
+                        expected.scorable_data_entity_buckets,
+                    )
+
+        for hotkey in hotkeys:
+            upsert(hotkey)
+        assert_indexes_match()
+
+        upsert(hotkeys[0])
+        upsert(hotkeys[3])
+        for storage in [sqlite_storage, self.test_storage]:
+            storage.delete_miner(hotkeys[1])
+        assert_indexes_match()
+
+        # The query API used by the validator API matches too.
+        for source in [DataSource.REDDIT.value, DataSource.X.value]:
+            self.assertEqual(
+                sorted(self.test_storage.read_label_sizes(source)),
+                sorted(sqlite_storage.read_label_sizes(source)),
+            )
+            self.assertEqual(
+                self.test_storage.read_time_bucket_sizes(source, limit=10),
+                sqlite_storage.read_time_bucket_sizes(source, limit=10),
+            )
+            for start, end in [(480_000, 480_049), (480_000, 480_010), (0, 10)]:
+                expected = sqlite_storage.find_latest_bucket_miner(source, start, end)
+                actual = self.test_storage.find_latest_bucket_miner(source, start, end)
+                # Miners with equal credibility may be chosen in either order.
+                self.assertEqual(
+                    actual[1::2] if actual else None, expected[1::2] if expected else None
+                )
+        for label in labels + ["unknown"]:
+            self.assertEqual(
+                self.test_storage.read_label_total_bytes(label),
+                sqlite_storage.read_label_total_bytes(label),
+            )
+
+    def test_labels_released_and_compacted(self):
+        """Tests that labels no miner holds anymore are released, and that both storages still match the other after
+        their label ids are compacted."""
+        sqlite_storage = SqliteMemoryValidatorStorage()
+        # Delete the shared in memory db afterwards so it does not leak into other tests.
+        self.addCleanup(sqlite_storage.continuous_connection_do_not_reuse.close)
+        rng = random.Random(7)
+        time_bucket_ids = list(range(480_000, 480_020))
+        hotkeys = [f"hotkey{i}" for i in range(4)]
+        labels_by_hotkey = {}
+
+        with patch.object(LabelTable, "MIN_FREE_IDS_TO_COMPACT", 4):
+            # Every round moves on to new labels, so that the labels of earlier rounds are released.
+            for round in range(8):
+                labels = [f"label_{round * 4 + i}" for i in range(6)]
+                for hotkey in hotkeys:
+                    if rng.random() < 0.2:
+                        for storage in [sqlite_storage, self.test_storage]:
+                            storage.delete_miner(hotkey)
+                        labels_by_hotkey.pop(hotkey, None)
+                        continue
+
+                    index = create_random_index(rng, time_bucket_ids, labels, 5)
+                    for storage in [sqlite_storage, self.test_storage]:
+                        storage.upsert_compressed_miner_index(index, hotkey, 0.5)
+                    labels_by_hotkey[hotkey] = {
+                        bucket.label
+                        for buckets in index.sources.values()
+                        for bucket in buckets
+                    }
+
+                labels_in_use = set().union(*labels_by_hotkey.values())
+                for storage in [sqlite_storage, self.test_storage]:
+                    self.assertEqual(len(storage.label_table), len(labels_in_use))
+                    # Compacting bounds the ids to twice those in use.
+                    self.assertLessEqual(
+                        storage.label_table.capacity, max(2 * len(labels_in_use), 4)
+                    )
+
+                for hotkey in hotkeys:
+                    expected = sqlite_storage.read_miner_index(hotkey)
+                    actual = self.test_storage.read_miner_index(hotkey)
+                    if expected is None:
+                        self.assertIsNone(actual)
+                        continue
+                    self.assertEqual(
+                        {bucket.label for bucket in actual.scorable_data_entity_buckets},
+                        labels_by_hotkey[hotkey],
+                    )
+                    # Label ids may be assigned in a different order by each storage.
+                    self.assertEqual(
+                        sorted(actual.scorable_data_entity_buckets, key=repr),
+                        sorted(expected.scorable_data_entity_buckets, key=repr),
+                    )
+                for label in labels_in_use:
+                    self.assertEqual(
+                        self.test_storage.read_label_total_bytes(label),
+                        sqlite_storage.read_label_total_bytes(label),
+                    )
+
+    def test_read_miner_last_updated(self):
+        """Tests getting the last time a miner was updated."""
+        self.assertIsNone(self.test_storage.read_miner_last_updated("hotkey1"))
+
+        before = dt.datetime.utcnow()
+        self.test_storage.upsert_compressed_miner_index(
+            CompressedMinerIndex(sources={}), "hotkey1", 1
+        )
+
+        last_updated = self.test_storage.read_miner_last_updated("hotkey1")
+        self.assertLessEqual(before, last_updated)
+        self.assertEqual(self.test_storage.read_miner_index("hotkey1").last_updated, last_updated)
+
+    def test_hf_metadata(self):
+        """Tests storing, replacing and deleting a miner's HuggingFace metadata."""
+        updated_at = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+        metadata = [
+            HuggingFaceMetadata(repo_name="repo_b", source=DataSource.X, updated_at=updated_at),
+            HuggingFaceMetadata(repo_name="repo_a", source=DataSource.REDDIT, updated_at=updated_at),
+        ]
+
+        # Metadata for unknown miners is ignored.
+        self.test_storage.upsert_hf_metadata("hotkey1", metadata)
+        self.assertFalse(self.test_storage.has_hf_metadata("hotkey1"))
+
+        self.test_storage.upsert_compressed_miner_index(
+            CompressedMinerIndex(sources={}), "hotkey1", 1
+        )
+        self.test_storage.upsert_hf_metadata("hotkey1", metadata)
+        later = updated_at + dt.timedelta(days=1)
+        self.test_storage.upsert_hf_metadata(
+            "hotkey1",
+            [HuggingFaceMetadata(repo_name="repo_b", source=DataSource.X, updated_at=later)],
+        )
+
+        self.assertTrue(self.test_storage.has_hf_metadata("hotkey1"))
+        self.assertEqual(
+            [entry.repo_name for entry in self.test_storage.read_hf_metadata("hotkey1")],
+            ["repo_a", "repo_b"],
+        )
+        self.assertEqual(self.test_storage.read_hf_metadata_last_updated("hotkey1"), later)
+
+        self.test_storage.delete_miner("hotkey1")
+        self.assertEqual(self.test_storage.read_hf_metadata("hotkey1"), [])
+        self.assertIsNone(self.test_storage.read_hf_metadata_last_updated("hotkey1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from storage.validator.label_table import LabelTable
+
+
+class TestLabelTable(unittest.TestCase):
+    def test_get_or_insert(self):
+        """Tests that labels are assigned ids once and can be looked up both ways."""
+        table = LabelTable()
+
+        self.assertEqual(table.get_or_insert("NULL"), 0)
+        self.assertEqual(table.get_or_insert("#bittensor"), 1)
+        self.assertEqual(table.get_or_insert("NULL"), 0)
+
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table.get_id("#bittensor"), 1)
+        self.assertIsNone(table.get_id("#tao"))
+        self.assertEqual(table.get_by_id(1), "#bittensor")
+        # Looking up a missing label does not assign it an id.
+        self.assertEqual(len(table), 2)
+
+    def test_remove_references_frees_ids(self):
+        """Tests that an id is freed once its last reference is removed, and that freed ids are reused lowest first."""
+        table = LabelTable()
+        ids = np.array([table.get_or_insert(f"label_{i}") for i in range(4)])
+        table.add_references(np.array([0, 0, 1, 2, 3, 3]))
+
+        table.remove_references(np.array([0, 3]))
+        self.assertEqual(len(table), 4)
+
+        table.remove_references(np.array([0, 1, 3]))
+        self.assertEqual(len(table), 1)
+        self.assertIsNone(table.get_by_id(ids[0]))
+        self.assertIsNone(table.get_id("label_0"))
+        self.assertEqual(table.get_by_id(2), "label_2")
+
+        self.assertEqual(table.get_or_insert("label_4"), 0)
+        self.assertEqual(table.get_or_insert("label_5"), 1)
+        self.assertEqual(table.get_or_insert("label_6"), 3)
+        self.assertEqual(table.get_or_insert("label_7"), 4)
+        self.assertEqual(table.capacity, 5)
+
+    def test_compact(self):
+        """Tests that compacting renumbers the referenced ids in order and drops the rest."""
+        table = LabelTable()
+        for i in range(10):
+            table.get_or_insert(f"label_{i}")
+        # label_9 is never referenced, e.g. because storing the index that needed it failed.
+        table.add_references(np.arange(9))
+        table.remove_references(np.array([0, 1, 2, 4, 5, 7]))
+        self.assertEqual(len(table), 4)
+
+        # Too few free ids to be worth renumbering.
+        self.assertIsNone(table.compact())
+
+        with patch.object(LabelTable, "MIN_FREE_IDS_TO_COMPACT", 2):
+            id_map = table.compact()
+
+        np.testing.assert_array_equal(id_map, [-1, -1, -1, 0, -1, -1, 1, -1, 2, -1])
+        self.assertEqual(table.capacity, 3)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(
+            [table.get_by_id(label_id) for label_id in range(3)],
+            ["label_3", "label_6", "label_8"],
+        )
+        self.assertEqual(table.get_id("label_8"), 2)
+        self.assertIsNone(table.get_id("label_9"))
+
+        # The references moved with the ids.
+        table.remove_references(np.array([1]))
+        self.assertIsNone(table.get_id("label_6"))
+        self.assertEqual(table.get_or_insert("label_10"), 1)
+        self.assertEqual(table.get_or_insert("label_11"), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import datetime as dt
+import os
+import random
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from storage.validator.columnar_validator_storage import ColumnarValidatorStorage
+from storage.validator.miner_index_snapshot import MinerIndexSnapshot
+from storage.validator.sqlite_memory_validator_storage import (
+    SqliteMemoryValidatorStorage,
+)
+from tests.storage.validator.test_columnar_validator_storage import (
+    create_random_index,
+)
+
+
+class TestMinerIndexSnapshot(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.path = os.path.join(temp_dir.name, "miner_indexes.npz")
+
+        # Only one SqliteMemoryValidatorStorage is created per test since every instance shares the same in memory db.
+        self.sqlite_storage = SqliteMemoryValidatorStorage()
+        # Delete the shared in memory db afterwards so it does not leak into other tests.
+        self.addCleanup(self.sqlite_storage.continuous_connection_do_not_reuse.close)
+
+        rng = random.Random(7)
+        time_bucket_ids = list(range(480_000, 480_050))
+        labels = [None] + [f"label_{i}" for i in range(6)]
+        self.hotkeys = [f"hotkey{i}" for i in range(5)]
+        self.credibilities = {}
+        self.indexes = {}
+        for hotkey in self.hotkeys:
+            self.indexes[hotkey] = create_random_index(rng, time_bucket_ids, labels, 20)
+            self.credibilities[hotkey] = rng.choice([0, 0.25, 0.5, 1])
+
+    def upsert_all(self, storage):
+        for hotkey in self.hotkeys:
+            storage.upsert_compressed_miner_index(
+                self.indexes[hotkey], hotkey, self.credibilities[hotkey]
+            )
+
+    def assert_storages_match(self, expected_storage, actual_storage):
+        for hotkey in self.hotkeys:
+            expected = expected_storage.read_miner_index(hotkey)
+            actual = actual_storage.read_miner_index(hotkey)
+            # Buckets are read in the order of each storage's label ids, which depends on the order labels were seen.
+            self.assertEqual(
+                sorted(actual.scorable_data_entity_buckets, key=repr),
+                sorted(expected.scorable_data_entity_buckets, key=repr),
+            )
+            self.assertEqual(
+                actual_storage.read_miner_last_updated(hotkey),
+                expected_storage.read_miner_last_updated(hotkey),
+            )
+
+    def save_and_load(self, storage) -> MinerIndexSnapshot:
+        storage.export_snapshot().save(self.path)
+        return MinerIndexSnapshot.load(self.path)
+
+    def test_columnar_round_trip(self):
+        """Tests that a columnar storage restored from a snapshot matches the storage it was taken from."""
+        storage = ColumnarValidatorStorage()
+        self.upsert_all(storage)
+
+        restored = ColumnarValidatorStorage()
+        restored.import_snapshot(self.save_and_load(storage))
+
+        self.assert_storages_match(storage, restored)
+
+    def test_sqlite_to_columnar_round_trip(self):
+        """Tests that a snapshot of the sqlite storage restores the same indexes into a columnar storage."""
+        self.upsert_all(self.sqlite_storage)
+
+        restored = ColumnarValidatorStorage()
+        restored.import_snapshot(self.save_and_load(self.sqlite_storage))
+
+        self.assert_storages_match(self.sqlite_storage, restored)
+
+    def test_columnar_to_sqlite_round_trip(self):
+        """Tests that a snapshot of the columnar storage restores the same indexes into the sqlite storage."""
+        storage = ColumnarValidatorStorage()
+        self.upsert_all(storage)
+
+        self.sqlite_storage.import_snapshot(self.save_and_load(storage))
+
+        self.assert_storages_match(storage, self.sqlite_storage)
+
+    def test_import_replaces_existing_index(self):
+        """Tests that importing a snapshot replaces the existing index of a miner rather than adding to it."""
+        storage = ColumnarValidatorStorage()
+        self.upsert_all(storage)
+        snapshot = self.save_and_load(storage)
+
+        restored = ColumnarValidatorStorage()
+        restored.upsert_compressed_miner_index(
+            self.indexes[self.hotkeys[1]], self.hotkeys[0], 1
+        )
+        restored.import_snapshot(snapshot)
+
+        self.assert_storages_match(storage, restored)
+
+    def test_save_and_load(self):
+        """Tests that every field of a snapshot survives saving and loading."""
+        snapshot = MinerIndexSnapshot(
+            labels=["NULL", "#bittensor"],
+            hotkeys=["hotkey1", "hotkey2"],
+            credibilities=np.array([0.5, 1.0]),
+            last_updated=[
+                dt.datetime(2024, 5, 1, 12, 30, 15, 123456),
+                dt.datetime(2024, 5, 2),
+            ],
+            bucket_offsets=np.array([0, 2, 3]),
+            sources=np.array([1, 2, 2]),
+            label_ids=np.array([0, 1, 0]),
+            time_bucket_ids=np.array([480_000, 480_001, 480_002]),
+            sizes_bytes=np.array([10, 20, 30]),
+        )
+        snapshot.save(self.path)
+
+        loaded = MinerIndexSnapshot.load(self.path)
+
+        self.assertFalse(os.path.exists(f"{self.path}.tmp"))
+        self.assertEqual(loaded.labels, snapshot.labels)
+        self.assertEqual(loaded.hotkeys, snapshot.hotkeys)
+        self.assertEqual(loaded.last_updated, snapshot.last_updated)
+        self.assertEqual(loaded.bucket_count, 3)
+        for field in [
+            "credibilities",
+            "bucket_offsets",
+            "sources",
+            "label_ids",
+            "time_bucket_ids",
+            "sizes_bytes",
+        ]:
+            np.testing.assert_array_equal(
+                getattr(loaded, field), getattr(snapshot, field)
+            )
+
+    def test_load_rejects_other_version(self):
+        """Tests that a snapshot saved in a different format version is not loaded."""
+        storage = ColumnarValidatorStorage()
+        self.upsert_all(storage)
+        snapshot = storage.export_snapshot()
+
+        with patch.object(MinerIndexSnapshot, "VERSION", 0):
+            snapshot.save(self.path)
+
+        with self.assertRaises(ValueError):
+            MinerIndexSnapshot.load(self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
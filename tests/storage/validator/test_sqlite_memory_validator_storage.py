@@ -23,12 +23,16 @@ from common.data_v2 import ScorableDataEntityBucket, ScorableMinerIndex
 from storage.validator.sqlite_memory_validator_storage import (
     SqliteMemoryValidatorStorage,
 )
+from storage.validator.validator_storage import MinerIndexDiff
 
 
 class TestSqliteMemoryValidatorStorage(unittest.TestCase):
     def setUp(self):
         self.test_storage = SqliteMemoryValidatorStorage()
-        # When test_storage goes out of scope the in memory db automatically gets deleted.
+
+    def tearDown(self):
+        # The in memory db is deleted once its last connection is closed.
+        self.test_storage.continuous_connection_do_not_reuse.close()
 
     def test_upsert_miner(self):
         """Tests that we can store a newly encountered miner."""
@@ -364,6 +368,220 @@ class TestSqliteMemoryValidatorStorage(unittest.TestCase):
             scored_index.scorable_data_entity_buckets[0], expected_bucket_1
         )
 
+    def assert_bucket_totals_match_recomputed(self):
+        """Asserts that the maintained BucketTotals match totals recomputed from every miner's index."""
+        with contextlib.closing(self.test_storage._create_connection()) as connection:
+            cursor = connection.cursor()
+            cursor.execute(
+                """SELECT source, labelId, timeBucketId, minerCount, totalAdjContentSizeBytes
+                FROM BucketTotals ORDER BY source, labelId, timeBucketId"""
+            )
+            maintained = cursor.fetchall()
+            cursor.execute(
+                """SELECT source, labelId, timeBucketId, COUNT(*), SUM(contentSizeBytes * credibility)
+                FROM MinerIndex JOIN Miner USING (minerId)
+                GROUP BY source, labelId, timeBucketId ORDER BY source, labelId, timeBucketId"""
+            )
+            recomputed = cursor.fetchall()
+        self.assertEqual(maintained, recomputed)
+
+    def test_bucket_totals_maintained(self):
+        """Tests that the bucket totals follow index upserts, credibility changes and miner deletes."""
+        now = dt.datetime.utcnow()
+        time_bucket_id = TimeBucket.from_datetime(now).id
+
+        def create_index(sizes_bytes):
+            return CompressedMinerIndex(
+                sources={
+                    DataSource.REDDIT.value: [
+                        CompressedEntityBucket(
+                            label="totals_label",
+                            time_bucket_ids=[time_bucket_id, time_bucket_id - 1],
+                            sizes_bytes=sizes_bytes,
+                        )
+                    ]
+                }
+            )
+
+        self.test_storage.upsert_compressed_miner_index(
+            create_index([10, 20]), "totals_hotkey1", credibility=0.5
+        )
+        self.test_storage.upsert_compressed_miner_index(
+            create_index([30, 40]), "totals_hotkey2", credibility=1.0
+        )
+        self.assert_bucket_totals_match_recomputed()
+
+        # The same index with a new credibility.
+        self.test_storage.upsert_compressed_miner_index(
+            create_index([10, 20]), "totals_hotkey1", credibility=0.25
+        )
+        self.assert_bucket_totals_match_recomputed()
+        scorable_bytes = [
+            bucket.scorable_bytes
+            for bucket in self.test_storage.read_miner_index(
+                "totals_hotkey1"
+            ).scorable_data_entity_buckets
+        ]
+        # 10 * 2.5 / (2.5 + 30) and 20 * 5 / (5 + 40).
+        self.assertEqual(scorable_bytes, [2, 0])
+
+        # A miner with only one of the buckets.
+        self.test_storage.upsert_compressed_miner_index(
+            CompressedMinerIndex(
+                sources={
+                    DataSource.REDDIT.value: [
+                        CompressedEntityBucket(
+                            label="totals_label",
+                            time_bucket_ids=[time_bucket_id],
+                            sizes_bytes=[15],
+                        )
+                    ]
+                }
+            ),
+            "totals_hotkey2",
+            credibility=1.0,
+        )
+        self.assert_bucket_totals_match_recomputed()
+
+        self.test_storage.delete_miner("totals_hotkey2")
+        self.test_storage.delete_miner("totals_hotkey1")
+        self.assert_bucket_totals_match_recomputed()
+
+    def test_upsert_compressed_miner_index_applies_diff(self):
+        """Tests that upserting an index over a previous one only inserts, removes and resizes the changed buckets."""
+        time_bucket_id = TimeBucket.from_datetime(dt.datetime.utcnow()).id
+
+        def create_index(time_bucket_ids, sizes_bytes):
+            return CompressedMinerIndex(
+                sources={
+                    DataSource.REDDIT.value: [
+                        CompressedEntityBucket(
+                            label="diff_label",
+                            time_bucket_ids=time_bucket_ids,
+                            sizes_bytes=sizes_bytes,
+                        )
+                    ]
+                }
+            )
+
+        diff = self.test_storage.upsert_compressed_miner_index(
+            create_index([time_bucket_id, time_bucket_id - 1, time_bucket_id - 2], [10, 20, 30]),
+            "diff_hotkey",
+            credibility=1.0,
+        )
+        self.assertEqual(diff, MinerIndexDiff(inserted=3))
+
+        diff = self.test_storage.upsert_compressed_miner_index(
+            create_index([time_bucket_id, time_bucket_id - 1, time_bucket_id - 3], [10, 25, 40]),
+            "diff_hotkey",
+            credibility=0.5,
+        )
+        self.assertEqual(
+            diff, MinerIndexDiff(inserted=1, removed=1, resized=1, unchanged=1)
+        )
+        self.assert_bucket_totals_match_recomputed()
+
+        index = self.test_storage.read_miner_index("diff_hotkey")
+        self.assertEqual(
+            [
+                (bucket.time_bucket_id, bucket.size_bytes, bucket.scorable_bytes)
+                for bucket in index.scorable_data_entity_buckets
+            ],
+            [
+                (time_bucket_id - 3, 40, 40),
+                (time_bucket_id - 1, 25, 25),
+                (time_bucket_id, 10, 10),
+            ],
+        )
+
+        self.test_storage.delete_miner("diff_hotkey")
+        self.assert_bucket_totals_match_recomputed()
+
+    def test_reads_run_alongside_readers_and_wait_for_writers(self):
+        """Tests that reads are only blocked while an index is being written, not by other reads."""
+        index = CompressedMinerIndex(
+            sources={
+                DataSource.REDDIT.value: [
+                    CompressedEntityBucket(
+                        label="label_1",
+                        time_bucket_ids=[TimeBucket.from_datetime(dt.datetime.utcnow()).id],
+                        sizes_bytes=[10],
+                    )
+                ]
+            }
+        )
+        self.test_storage.upsert_compressed_miner_index(index, "hotkey1", 1)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            # Another reader holding the lock does not block a read.
+            with self.test_storage.lock.read():
+                read = executor.submit(self.test_storage.read_miner_index, "hotkey1")
+                self.assertIsNotNone(read.result(timeout=5))
+
+            # A writer holding the lock does.
+            with self.test_storage.lock.write():
+                read = executor.submit(self.test_storage.read_label_sizes, DataSource.REDDIT.value)
+                with self.assertRaises(concurrent.futures.TimeoutError):
+                    read.result(timeout=0.2)
+            self.assertEqual(read.result(timeout=5), [("label_1", 10, 10.0)])
+
+    def test_find_latest_bucket_miner(self):
+        """Tests finding the most credible miner with the latest bucket in a range, optionally for a label."""
+        time_bucket_id = TimeBucket.from_datetime(dt.datetime.utcnow()).id
+
+        def create_index(label, time_bucket_ids, size_bytes):
+            return CompressedMinerIndex(
+                sources={
+                    DataSource.X.value: [
+                        CompressedEntityBucket(
+                            label=label,
+                            time_bucket_ids=time_bucket_ids,
+                            sizes_bytes=[size_bytes] * len(time_bucket_ids),
+                        )
+                    ]
+                }
+            )
+
+        self.test_storage.upsert_compressed_miner_index(
+            create_index("#bittensor", [time_bucket_id - 2, time_bucket_id], 10), "hotkey1", 0.5
+        )
+        self.test_storage.upsert_compressed_miner_index(
+            create_index("#tao", [time_bucket_id - 2, time_bucket_id], 20), "hotkey2", 1.0
+        )
+        self.test_storage.upsert_compressed_miner_index(
+            create_index("#tao", [time_bucket_id - 1], 30), "hotkey3", 0.25
+        )
+
+        self.assertEqual(
+            self.test_storage.find_latest_bucket_miner(
+                DataSource.X.value, time_bucket_id - 5, time_bucket_id
+            ),
+            ("hotkey2", 1.0, 20, time_bucket_id),
+        )
+        self.assertEqual(
+            self.test_storage.find_latest_bucket_miner(
+                DataSource.X.value, time_bucket_id - 5, time_bucket_id, "#Bittensor"
+            ),
+            ("hotkey1", 0.5, 10, time_bucket_id),
+        )
+        self.assertEqual(
+            self.test_storage.find_latest_bucket_miner(
+                DataSource.X.value, time_bucket_id - 5, time_bucket_id - 1
+            ),
+            ("hotkey3", 0.25, 30, time_bucket_id - 1),
+        )
+        self.assertIsNone(
+            self.test_storage.find_latest_bucket_miner(
+                DataSource.REDDIT.value, time_bucket_id - 5, time_bucket_id
+            )
+        )
+        self.assertIsNone(
+            self.test_storage.find_latest_bucket_miner(
+                DataSource.X.value, time_bucket_id - 5, time_bucket_id, "#unknown"
+            )
+        )
+        self.assertEqual(self.test_storage.read_label_total_bytes("#TAO"), (70, 47.5))
+
     def test_read_non_existing_miner_index(self):
         """Tests that we correctly return none for a non existing miner index."""
         # Read the index.
@@ -434,6 +652,27 @@ class TestSqliteMemoryValidatorStorage(unittest.TestCase):
         # Confirm the last updated is None.
         self.assertEqual(None, last_updated)
 
+    def test_read_database_size_bytes(self):
+        """Tests that the database size grows as indexes are stored."""
+        empty_size = self.test_storage.read_database_size_bytes()
+        self.assertGreater(empty_size, 0)
+
+        index = CompressedMinerIndex(
+            sources={
+                DataSource.REDDIT.value: [
+                    CompressedEntityBucket(
+                        label=f"label{i}",
+                        time_bucket_ids=list(range(1000)),
+                        sizes_bytes=[100] * 1000,
+                    )
+                    for i in range(10)
+                ]
+            }
+        )
+        self.test_storage.upsert_compressed_miner_index(index, "hotkey1", credibility=1.0)
+
+        self.assertGreater(self.test_storage.read_database_size_bytes(), empty_size)
+
     @unittest.skip("Skip the multi threaded test by default.")
     def test_multithreaded_inserts(self):
         """In a multi-threaded environment, insert 5 indexes for 5 miners, then read them back and verify they're correct."""
@@ -0,0 +1,42 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, Mock, patch
+
+from vali_utils.dendrite_pool import DendritePool
+
+
+class TestDendritePool(unittest.TestCase):
+    def create_pool(self, size):
+        with patch("vali_utils.dendrite_pool.bt.dendrite", side_effect=lambda wallet: Mock(aclose_session=AsyncMock())):
+            return DendritePool(Mock(), size)
+
+    def test_acquire_waits_for_a_free_dendrite(self):
+        """Verifies a dendrite is only handed to one evaluation at a time."""
+        pool = self.create_pool(1)
+
+        async def run():
+            async with pool.acquire() as first:
+                waiting = asyncio.create_task(pool.acquire().__aenter__())
+                await asyncio.sleep(0.01)
+                self.assertFalse(waiting.done())
+            self.assertIs(await asyncio.wait_for(waiting, timeout=5), first)
+
+        asyncio.run(run())
+
+    def test_close_closes_every_session(self):
+        """Verifies closing the pool closes the session of every dendrite, including one still in use."""
+        pool = self.create_pool(3)
+
+        async def run():
+            async with pool.acquire():
+                await pool.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(len(pool.all_dendrites), 3)
+        for dendrite in pool.all_dendrites:
+            dendrite.aclose_session.assert_awaited_once()
+
+
+if __name__ == "__main__":
+    unittest.main()
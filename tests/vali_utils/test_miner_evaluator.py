@@ -0,0 +1,167 @@
+import asyncio
+import datetime as dt
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from common import constants
+from vali_utils.miner_evaluator import MinerEvaluator
+from vali_utils.miner_iterator import MinerIterator
+
+
+class FakeStorage:
+    """Records when each miner was last evaluated, like the validator storage does when storing its index."""
+
+    def __init__(self, last_updated):
+        self.last_updated = last_updated
+        # The threads the storage was read on.
+        self.reader_threads = set()
+
+    def read_miner_last_updated(self, hotkey):
+        self.reader_threads.add(threading.current_thread())
+        return self.last_updated.get(hotkey)
+
+
+class TestMinerEvaluator(unittest.TestCase):
+    def create_evaluator(self, uids, last_updated, max_concurrent_evaluations):
+        """Creates a MinerEvaluator with only the state needed to schedule evaluations."""
+        evaluator = MinerEvaluator.__new__(MinerEvaluator)
+        evaluator.lock = threading.RLock()
+        evaluator.metagraph = SimpleNamespace(hotkeys=[f"hotkey{uid}" for uid in uids])
+        evaluator.miner_iterator = MinerIterator(uids)
+        evaluator.storage = FakeStorage(last_updated)
+        evaluator.max_concurrent_evaluations = max_concurrent_evaluations
+
+        # Start the iterator at the first uid.
+        while evaluator.miner_iterator.peek() != uids[0]:
+            next(evaluator.miner_iterator)
+        return evaluator
+
+    def test_run_next_eval_batch_bounds_concurrency(self):
+        """Verifies every due miner is evaluated once, without exceeding the maximum concurrent evaluations."""
+        uids = list(range(10))
+        evaluator = self.create_evaluator(uids, {}, max_concurrent_evaluations=3)
+
+        evaluated_uids = []
+        running = 0
+        max_running = 0
+
+        async def eval_miner(uid):
+            nonlocal running, max_running
+            running += 1
+            max_running = max(max_running, running)
+            # Later miners finish first, so new evaluations must start as slots free up.
+            await asyncio.sleep(0.01 * (10 - uid))
+            evaluator.storage.last_updated[f"hotkey{uid}"] = dt.datetime.utcnow()
+            evaluated_uids.append(uid)
+            running -= 1
+
+        evaluator.eval_miner = eval_miner
+        wait_secs = asyncio.run(evaluator.run_next_eval_batch())
+
+        self.assertEqual(sorted(evaluated_uids), uids)
+        self.assertEqual(max_running, 3)
+        self.assertEqual(wait_secs, 0)
+        # The storage is read off the event loop, so that it doesn't stall the running evaluations.
+        self.assertNotIn(threading.main_thread(), evaluator.storage.reader_threads)
+
+    def test_run_next_eval_batch_stops_at_miner_not_due(self):
+        """Verifies the batch stops at the first miner that isn't due and waits until it is."""
+        now = dt.datetime.utcnow()
+        last_updated = {
+            "hotkey2": now - dt.timedelta(minutes=30),
+            "hotkey3": now,
+        }
+        evaluator = self.create_evaluator([0, 1, 2, 3], last_updated, max_concurrent_evaluations=5)
+
+        evaluated_uids = []
+
+        async def eval_miner(uid):
+            evaluated_uids.append(uid)
+
+        evaluator.eval_miner = eval_miner
+        wait_secs = asyncio.run(evaluator.run_next_eval_batch())
+
+        self.assertEqual(sorted(evaluated_uids), [0, 1])
+        self.assertEqual(evaluator.miner_iterator.peek(), 2)
+        expected_wait_secs = (constants.MIN_EVALUATION_PERIOD - dt.timedelta(minutes=30)).total_seconds()
+        self.assertAlmostEqual(wait_secs, expected_wait_secs, delta=5)
+
+    def test_run_next_eval_batch_continues_after_failed_evaluation(self):
+        """Verifies a failed evaluation releases its slot and doesn't stop the batch."""
+        evaluator = self.create_evaluator([0, 1, 2], {}, max_concurrent_evaluations=1)
+
+        evaluated_uids = []
+
+        async def eval_miner(uid):
+            evaluated_uids.append(uid)
+            if uid == 0:
+                raise RuntimeError("Failed to evaluate.")
+
+        evaluator.eval_miner = eval_miner
+        asyncio.run(evaluator.run_next_eval_batch())
+
+        self.assertEqual(evaluated_uids, [0, 1, 2])
+
+    def test_run_next_eval_batch_stops_after_max_duration(self):
+        """Verifies no new evaluations start once the batch has run for MAX_BATCH_DURATION."""
+        evaluator = self.create_evaluator([0, 1, 2], {}, max_concurrent_evaluations=1)
+
+        evaluated_uids = []
+
+        async def eval_miner(uid):
+            evaluated_uids.append(uid)
+            await asyncio.sleep(0.05)
+
+        evaluator.eval_miner = eval_miner
+        with patch.object(MinerEvaluator, "MAX_BATCH_DURATION", dt.timedelta(seconds=0.01)):
+            wait_secs = asyncio.run(evaluator.run_next_eval_batch())
+
+        self.assertEqual(evaluated_uids, [0])
+        self.assertEqual(wait_secs, 0)
+
+    def test_run_next_eval_batch_cancels_evaluations_that_do_not_finish(self):
+        """Verifies the batch waits at most MAX_BATCH_FINISH_DURATION for running evaluations, then cancels them."""
+        evaluator = self.create_evaluator([0, 1], {}, max_concurrent_evaluations=2)
+
+        evaluated_uids = []
+        cancelled_uids = []
+
+        async def eval_miner(uid):
+            try:
+                # The first miner never responds.
+                await asyncio.sleep(60 if uid == 0 else 0)
+                evaluated_uids.append(uid)
+            except asyncio.CancelledError:
+                cancelled_uids.append(uid)
+                raise
+
+        evaluator.eval_miner = eval_miner
+        with patch.object(MinerEvaluator, "MAX_BATCH_FINISH_DURATION", dt.timedelta(seconds=0.1)):
+            asyncio.run(asyncio.wait_for(evaluator.run_next_eval_batch(), timeout=5))
+
+        self.assertEqual(evaluated_uids, [1])
+        self.assertEqual(cancelled_uids, [0])
+
+    def test_eval_miner_scores_off_the_event_loop(self):
+        """Verifies the scorer is updated off the event loop, so that it doesn't stall the running evaluations."""
+        evaluator = self.create_evaluator([0], {}, max_concurrent_evaluations=1)
+        evaluator.metagraph.axons = [None]
+        scorer_threads = []
+        evaluator.scorer = SimpleNamespace(
+            on_miner_evaluated=lambda *args: scorer_threads.append(threading.current_thread())
+        )
+
+        async def update_and_get_miner_index(hotkey, uid, axon_info):
+            return None
+
+        evaluator._update_and_get_miner_index = update_and_get_miner_index
+        asyncio.run(evaluator.eval_miner(0))
+
+        self.assertEqual(len(scorer_threads), 1)
+        self.assertIsNot(scorer_threads[0], threading.main_thread())
+
+
+if __name__ == "__main__":
+    unittest.main()
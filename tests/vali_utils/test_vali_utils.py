@@ -70,6 +70,36 @@ class TestValiUtils(unittest.TestCase):
         self.assertAlmostEqual(ratios[1], 1 / 3, delta=0.05)
         self.assertAlmostEqual(ratios[2], 0.5, delta=0.05)
 
+    def test_choose_data_entity_buckets_to_query(self):
+        """Verifies that several distinct buckets can be chosen at once, and that buckets without scorable bytes are chosen last."""
+        time_bucket_id = utils.time_bucket_id_from_datetime(
+            dt.datetime.now(tz=dt.timezone.utc)
+        )
+        index = ScorableMinerIndex(
+            scorable_data_entity_buckets=[
+                ScorableDataEntityBucket(
+                    time_bucket_id=time_bucket_id,
+                    source=DataSource.REDDIT,
+                    label=str(i),
+                    size_bytes=300,
+                    scorable_bytes=scorable_bytes,
+                )
+                for i, scorable_bytes in enumerate([100, 0, 200])
+            ],
+            last_updated=dt.datetime.now(tz=dt.timezone.utc),
+        )
+
+        for _ in range(100):
+            chosen_buckets = vali_utils.choose_data_entity_buckets_to_query(index, 2)
+            self.assertEqual(
+                sorted(bucket.id.label.value for bucket in chosen_buckets), ["0", "2"]
+            )
+
+        chosen_buckets = vali_utils.choose_data_entity_buckets_to_query(index, 5)
+        self.assertEqual(
+            [bucket.id.label.value for bucket in chosen_buckets][-1], "1"
+        )
+
     def test_choose_entities_to_verify(self):
         """Calls choose_entity_to_verify 10000 times and verifies the distribution of entities chosen is as expected."""
         entities = [
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException, Depends
+import asyncio
 import bittensor as bt
 import datetime as dt
 from pathlib import Path
@@ -542,105 +543,80 @@ async def query_bucket(
 
         bt.logging.info(f"Querying buckets {start_bucket} to {end_bucket}")
 
-        # Single optimized query to get both latest bucket and miner in one go
-        query = """
-            WITH latest_bucket AS (
-                SELECT MAX(timeBucketId) as bucket_id
-                FROM MinerIndex
-                WHERE source = ? 
-                AND timeBucketId BETWEEN ? AND ?
-                LIMIT 1
-            )
-            SELECT m.hotkey, m.credibility, mi.contentSizeBytes, mi.timeBucketId
-            FROM MinerIndex mi
-            JOIN Miner m ON mi.minerId = m.minerId
-            JOIN latest_bucket lb
-            WHERE mi.source = ?
-            AND mi.timeBucketId = lb.bucket_id
-        """
-        params = [source_id, start_bucket, end_bucket, source_id]
-
-        if label:
-            query += " AND mi.labelId = ?"
-            label_id = validator.evaluator.storage.label_dict.get_or_insert(label.strip().casefold())
-            params.append(label_id)
-
-        query += " ORDER BY m.credibility DESC LIMIT 1"
-
-        with validator.evaluator.storage.lock:
-            connection = validator.evaluator.storage._create_connection()
-            cursor = connection.cursor()
-
-            bt.logging.info("Executing SQL query...")
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-            connection.close()
-
-            if not result:
-                return {
-                    "status": "error",
-                    "message": "No data found in specified time range"
-                }
-
-            target_hotkey, credibility, expected_size, latest_bucket = result
-            bt.logging.info(f"Found miner with bucket {latest_bucket}")
+        # Find the most credible miner holding the latest bucket in one go.
+        result = await asyncio.to_thread(
+            validator.evaluator.storage.find_latest_bucket_miner,
+            source_id,
+            start_bucket,
+            end_bucket,
+            label.strip() if label else None,
+        )
 
-            # Find miner's UID
-            uid = validator.metagraph.hotkeys.index(target_hotkey)
-            axon = validator.metagraph.axons[uid]
+        if not result:
+            return {
+                "status": "error",
+                "message": "No data found in specified time range"
+            }
 
-            # Create bucket request
-            bucket_id = DataEntityBucketId(
-                time_bucket=TimeBucket(id=latest_bucket),
-                source=DataSource(source_id),
-                label=DataLabel(value=label) if label else None
-            )
+        target_hotkey, credibility, expected_size, latest_bucket = result
+        bt.logging.info(f"Found miner with bucket {latest_bucket}")
 
-            # Query miner
-            bt.logging.info(f"Querying miner {uid} for bucket {latest_bucket}")
-            async with bt.dendrite(wallet=validator.wallet) as dendrite:
-                response = await dendrite.forward(
-                    axons=[axon],
-                    synapse=GetDataEntityBucket(
-                        data_entity_bucket_id=bucket_id,
-                        version=constants.PROTOCOL_VERSION,
-                    ),
-                    timeout=30
-                )
+        # Find miner's UID
+        uid = validator.metagraph.hotkeys.index(target_hotkey)
+        axon = validator.metagraph.axons[uid]
 
-            if not response:
-                return {
-                    "status": "error",
-                    "message": "No response from miner"
-                }
+        # Create bucket request
+        bucket_id = DataEntityBucketId(
+            time_bucket=TimeBucket(id=latest_bucket),
+            source=DataSource(source_id),
+            label=DataLabel(value=label) if label else None
+        )
 
-            data = []
-            for entity in response[0].data_entities:
-                data.append({
-                    'uri': entity.uri,
-                    'datetime': entity.datetime.isoformat(),
-                    'source': DataSource(entity.source).name,
-                    'label': entity.label.value if entity.label else None,
-                    'content': entity.content.decode('utf-8')
-                })
+        # Query miner
+        bt.logging.info(f"Querying miner {uid} for bucket {latest_bucket}")
+        async with bt.dendrite(wallet=validator.wallet) as dendrite:
+            response = await dendrite.forward(
+                axons=[axon],
+                synapse=GetDataEntityBucket(
+                    data_entity_bucket_id=bucket_id,
+                    version=constants.PROTOCOL_VERSION,
+                ),
+                timeout=30
+            )
 
+        if not response:
             return {
-                "status": "success",
-                "miner": {
-                    "hotkey": target_hotkey,
-                    "uid": uid
-                },
-                "bucket": {
-                    "id": latest_bucket,
-                    "start": TimeBucket.to_date_range(TimeBucket(id=latest_bucket)).start.isoformat(),
-                    "end": TimeBucket.to_date_range(TimeBucket(id=latest_bucket)).end.isoformat(),
-                    "source": source.upper(),
-                    "label": label,
-                    "expected_size": expected_size
-                },
-                "data": data
+                "status": "error",
+                "message": "No response from miner"
             }
 
+        data = []
+        for entity in response[0].data_entities:
+            data.append({
+                'uri': entity.uri,
+                'datetime': entity.datetime.isoformat(),
+                'source': DataSource(entity.source).name,
+                'label': entity.label.value if entity.label else None,
+                'content': entity.content.decode('utf-8')
+            })
+
+        return {
+            "status": "success",
+            "miner": {
+                "hotkey": target_hotkey,
+                "uid": uid
+            },
+            "bucket": {
+                "id": latest_bucket,
+                "start": TimeBucket.to_date_range(TimeBucket(id=latest_bucket)).start.isoformat(),
+                "end": TimeBucket.to_date_range(TimeBucket(id=latest_bucket)).end.isoformat(),
+                "source": source.upper(),
+                "label": label,
+                "expected_size": expected_size
+            },
+            "data": data
+        }
+
     except Exception as e:
         bt.logging.error(f"Error querying bucket: {str(e)}")
         raise HTTPException(500, str(e))
@@ -706,36 +682,17 @@ async def get_label_sizes(
         except KeyError:
             raise HTTPException(400, f"Invalid source: {source}")
 
-        with validator.evaluator.storage.lock:
-            connection = validator.evaluator.storage._create_connection()
-            cursor = connection.cursor()
-
-            # Direct query from MinerIndex and Miner tables
-            cursor.execute("""
-                SELECT 
-                    labelId,
-                    SUM(contentSizeBytes) as contentSizeBytes,
-                    SUM(contentSizeBytes * credibility) as adjContentSizeBytes
-                FROM MinerIndex
-                JOIN Miner USING (minerId)
-                WHERE source = ?
-                GROUP BY labelId
-                ORDER BY adjContentSizeBytes DESC
-                LIMIT 1000
-            """, [source_id])
-
-            # Translate labelIds to label values using label_dict
-            labels = [
-                LabelSize(
-                    label_value=validator.evaluator.storage.label_dict.get_by_id(row[0]),
-                    content_size_bytes=int(row[1]),
-                    adj_content_size_bytes=int(row[2])
-                )
-                for row in cursor.fetchall()
-            ]
-
-            connection.close()
-            return labels
+        label_sizes = await asyncio.to_thread(
+            validator.evaluator.storage.read_label_sizes, source_id
+        )
+        return [
+            LabelSize(
+                label_value=label_value,
+                content_size_bytes=content_size_bytes,
+                adj_content_size_bytes=int(adj_content_size_bytes)
+            )
+            for label_value, content_size_bytes, adj_content_size_bytes in label_sizes
+        ]
 
     except Exception as e:
         bt.logging.error(f"Error getting label sizes: {str(e)}")
@@ -758,33 +715,17 @@ async def get_age_sizes(
         except KeyError:
             raise HTTPException(400, f"Invalid source: {source}")
 
-        with validator.evaluator.storage.lock:
-            connection = validator.evaluator.storage._create_connection()
-            cursor = connection.cursor()
-
-            cursor.execute("""
-                SELECT 
-                    timeBucketId,
-                    SUM(contentSizeBytes) as contentSizeBytes,
-                    SUM(contentSizeBytes * credibility) as adjContentSizeBytes
-                FROM Miner
-                JOIN MinerIndex USING (minerId)
-                WHERE source = ?
-                GROUP BY timeBucketId
-                ORDER BY timeBucketId DESC
-                LIMIT 1000
-            """, [source_id])
-
-            ages = [
-                AgeSize(
-                    time_bucket_id=row[0],
-                    content_size_bytes=int(row[1]),
-                    adj_content_size_bytes=int(row[2])
-                )
-                for row in cursor.fetchall()
-            ]
-            connection.close()
-            return ages
+        time_bucket_sizes = await asyncio.to_thread(
+            validator.evaluator.storage.read_time_bucket_sizes, source_id
+        )
+        return [
+            AgeSize(
+                time_bucket_id=time_bucket_id,
+                content_size_bytes=content_size_bytes,
+                adj_content_size_bytes=int(adj_content_size_bytes)
+            )
+            for time_bucket_id, content_size_bytes, adj_content_size_bytes in time_bucket_sizes
+        ]
     except Exception as e:
         raise HTTPException(500, f"Error retrieving age sizes: {str(e)}")
 
@@ -842,34 +783,14 @@ async def get_bytes_by_label(
         if not normalized_label:
             return LabelBytes(label=label, total_bytes=0, adj_total_bytes=0.0)
 
-        with validator.evaluator.storage.lock:
-            connection = validator.evaluator.storage._create_connection()
-            cursor = connection.cursor()
-
-            # Get label ID from label dictionary
-            label_id = validator.evaluator.storage.label_dict.get_or_insert(normalized_label)
-
-            # Query both raw bytes and adjusted bytes (weighted by credibility)
-            cursor.execute("""
-                SELECT 
-                    SUM(contentSizeBytes) as total_bytes,
-                    SUM(contentSizeBytes * credibility) as adj_total_bytes
-                FROM MinerIndex
-                JOIN Miner USING (minerId)
-                WHERE labelId = ?
-            """, [label_id])
-
-            row = cursor.fetchone()
-            total_bytes = row[0] if row and row[0] is not None else 0
-            adj_total_bytes = row[1] if row and row[1] is not None else 0.0
-
-            connection.close()
-
-            return LabelBytes(
-                label=label,
-                total_bytes=int(total_bytes),
-                adj_total_bytes=int(adj_total_bytes)
-            )
+        total_bytes, adj_total_bytes = await asyncio.to_thread(
+            validator.evaluator.storage.read_label_total_bytes, normalized_label
+        )
+        return LabelBytes(
+            label=label,
+            total_bytes=total_bytes,
+            adj_total_bytes=int(adj_total_bytes)
+        )
 
     except Exception as e:
         bt.logging.error(f"Error getting bytes for label {label}: {str(e)}")
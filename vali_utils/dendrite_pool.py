@@ -0,0 +1,32 @@
+import asyncio
+import contextlib
+from typing import AsyncIterator, List
+
+import bittensor as bt
+
+
+class DendritePool:
+    """A fixed set of dendrites shared by the miner evaluations running on one event loop.
+
+    Each dendrite keeps its HTTP session open between queries, rather than opening a new session for every query.
+    """
+
+    def __init__(self, wallet: bt.wallet, size: int):
+        self.all_dendrites: List[bt.dendrite] = [bt.dendrite(wallet=wallet) for _ in range(size)]
+        self.dendrites: asyncio.Queue = asyncio.Queue()
+        for dendrite in self.all_dendrites:
+            self.dendrites.put_nowait(dendrite)
+
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[bt.dendrite]:
+        """Holds a dendrite for the duration of the context, waiting for one to be returned if all are in use."""
+        dendrite = await self.dendrites.get()
+        try:
+            yield dendrite
+        finally:
+            self.dendrites.put_nowait(dendrite)
+
+    async def close(self):
+        """Closes the HTTP session of every dendrite, including any still in use."""
+        for dendrite in self.all_dendrites:
+            await dendrite.aclose_session()
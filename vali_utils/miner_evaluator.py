@@ -1,5 +1,4 @@
 import copy
-import datetime
 import traceback
 import asyncio
 import threading
@@ -7,7 +6,7 @@ import os
 import sys
 import time
 from common import constants
-from common.data_v2 import ScorableMinerIndex
+from common.data_v2 import ColumnarScorableMinerIndex
 from common.metagraph_syncer import MetagraphSyncer
 import common.utils as utils
 import datetime as dt
@@ -23,12 +22,15 @@ from common.protocol import GetDataEntityBucket, GetMinerIndex, GetHuggingFaceMe
 from rewards.data_value_calculator import DataValueCalculator
 from scraping.provider import ScraperProvider
 from scraping.scraper import ScraperId, ValidationResult, HFValidationResult
+from storage.validator.columnar_validator_storage import ColumnarValidatorStorage
 from storage.validator.sqlite_memory_validator_storage import (
     SqliteMemoryValidatorStorage,
 )
 
 from storage.validator.hf_validator_storage import HFValidationStorage
+from storage.validator.miner_index_snapshot import MinerIndexSnapshot
 
+from vali_utils.dendrite_pool import DendritePool
 from vali_utils.miner_iterator import MinerIterator
 from vali_utils import utils as vali_utils
 
@@ -50,6 +52,10 @@ class MinerEvaluator:
     """MinerEvaluator is responsible for evaluating miners and updating their scores."""
 
     SCORER_FILENAME = "scorer.pickle"
+    MINER_INDEX_SNAPSHOT_FILENAME = "miner_indexes.npz"
+
+    # How often to snapshot the stored miner indexes, so that a restarted validator can score with them right away.
+    MINER_INDEX_SNAPSHOT_INTERVAL = dt.timedelta(minutes=30)
 
     # Mapping of scrapers to use based on the data source to validate.
     PREFERRED_SCRAPERS = {
@@ -57,6 +63,17 @@ class MinerEvaluator:
         DataSource.REDDIT: ScraperId.REDDIT_CUSTOM
     }
 
+    # The longest each stage of an evaluation may take before it's abandoned.
+    INDEX_TIMEOUT_SECS = 180
+    HF_VALIDATION_TIMEOUT_SECS = 300
+    BUCKET_TIMEOUT_SECS = 160
+    SCRAPER_VALIDATION_TIMEOUT_SECS = 180
+
+    # How long a batch keeps starting new evaluations before returning to the validator's main loop.
+    MAX_BATCH_DURATION = dt.timedelta(minutes=5)
+    # How long a batch then waits for the evaluations still running, before cancelling them.
+    MAX_BATCH_FINISH_DURATION = dt.timedelta(minutes=5)
+
     def __init__(self, config: bt.config, uid: int, metagraph_syncer: MetagraphSyncer):
         self.config = config
         self.uid = uid
@@ -76,8 +93,16 @@ class MinerEvaluator:
             utils.get_miner_uids(self.metagraph, self.uid, self.vpermit_rao_limit)
         )
         self.scraper_provider = ScraperProvider()
-        self.storage = SqliteMemoryValidatorStorage()
+        self.storage = (
+            ColumnarValidatorStorage()
+            if self.config.neuron.validator_storage_type == "columnar"
+            else SqliteMemoryValidatorStorage()
+        )
         self.hf_storage = HFValidationStorage(self.config.hf_results_path)
+        # Evaluations all run on the validator's event loop and share a dendrite per concurrent evaluation.
+        self.max_concurrent_evaluations = self.config.neuron.max_concurrent_evaluations
+        self.dendrite_pool = DendritePool(self.wallet, self.max_concurrent_evaluations)
+        self.last_snapshot_time = dt.datetime.utcnow()
         # Instantiate runners
         self.should_exit: bool = False
         self.is_running: bool = False
@@ -88,10 +113,6 @@ class MinerEvaluator:
         """Returns the scorer used by the evaluator."""
         return self.scorer
 
-    def eval_miner_sync(self, uid: int) -> None:
-        """Synchronous version of eval_miner."""
-        asyncio.run(self.eval_miner(uid))
-
     async def eval_miner(self, uid: int) -> None:
         """Evaluates a miner and updates their score.
 
@@ -112,13 +133,23 @@ class MinerEvaluator:
         bt.logging.info(f"{hotkey}: Evaluating miner.")
 
         # Query the miner for the latest index.
-        index = await self._update_and_get_miner_index(hotkey, uid, axon_info)
-        if not index:
+        try:
+            index = await asyncio.wait_for(
+                self._update_and_get_miner_index(hotkey, uid, axon_info),
+                timeout=MinerEvaluator.INDEX_TIMEOUT_SECS,
+            )
+        except asyncio.TimeoutError:
+            bt.logging.info(
+                f"{hotkey}: Timed out updating the miner index. Using last known index if present."
+            )
+            index = await asyncio.to_thread(self.storage.read_miner_index, hotkey)
+        if index is None:
             # The miner hasn't provided an index yet, so we can't validate them. Count as a failed validation.
             bt.logging.info(
                 f"{hotkey}: Failed to get an index for miner. Counting as a failed validation."
             )
-            self.scorer.on_miner_evaluated(
+            await asyncio.to_thread(
+                self.scorer.on_miner_evaluated,
                 uid,
                 None,
                 [
@@ -134,10 +165,16 @@ class MinerEvaluator:
         ##########
         # Query HuggingFace metadata and perform enhanced HF validation.
         current_block = int(self.metagraph.block)
-        validation_info = self.hf_storage.get_validation_info(hotkey)
+        validation_info = await asyncio.to_thread(self.hf_storage.get_validation_info, hotkey)
         hf_validation_result = None
         if validation_info is None or (current_block - validation_info['block']) > 5100:  # ~17 hrs
-            hf_validation_result = await self._perform_hf_validation(hotkey, uid, axon_info, current_block)
+            try:
+                hf_validation_result = await asyncio.wait_for(
+                    self._perform_hf_validation(hotkey, uid, axon_info, current_block),
+                    timeout=MinerEvaluator.HF_VALIDATION_TIMEOUT_SECS,
+                )
+            except asyncio.TimeoutError:
+                bt.logging.info(f"{hotkey}: Timed out performing HF validation.")
         ##########
 
         # From that index, find a data entity bucket to sample and get it from the miner.
@@ -149,14 +186,22 @@ class MinerEvaluator:
         )
 
         responses = None
-        async with bt.dendrite(wallet=self.wallet) as dendrite:
-            responses = await dendrite.forward(
-                axons=[axon_info],
-                synapse=GetDataEntityBucket(
-                    data_entity_bucket_id=chosen_data_entity_bucket.id,
-                    version=constants.PROTOCOL_VERSION,
-                ),
-                timeout=140,
+        try:
+            async with self.dendrite_pool.acquire() as dendrite:
+                responses = await asyncio.wait_for(
+                    dendrite.forward(
+                        axons=[axon_info],
+                        synapse=GetDataEntityBucket(
+                            data_entity_bucket_id=chosen_data_entity_bucket.id,
+                            version=constants.PROTOCOL_VERSION,
+                        ),
+                        timeout=140,
+                    ),
+                    timeout=MinerEvaluator.BUCKET_TIMEOUT_SECS,
+                )
+        except asyncio.TimeoutError:
+            bt.logging.info(
+                f"{hotkey}: Timed out getting Bucket ID: {chosen_data_entity_bucket.id}."
             )
 
         data_entity_bucket = vali_utils.get_single_successful_response(
@@ -168,7 +213,8 @@ class MinerEvaluator:
             bt.logging.info(
                 f"{hotkey}: Miner returned an invalid/failed response for Bucket ID: {chosen_data_entity_bucket.id}."
             )
-            self.scorer.on_miner_evaluated(
+            await asyncio.to_thread(
+                self.scorer.on_miner_evaluated,
                 uid,
                 index,
                 [
@@ -195,7 +241,8 @@ class MinerEvaluator:
             bt.logging.info(
                 f"{hotkey}: Failed basic entity validation on Bucket ID: {chosen_data_entity_bucket.id} with reason: {reason}"
             )
-            self.scorer.on_miner_evaluated(
+            await asyncio.to_thread(
+                self.scorer.on_miner_evaluated,
                 uid,
                 index,
                 [
@@ -215,7 +262,8 @@ class MinerEvaluator:
             bt.logging.info(
                 f"{hotkey}: Failed enitity uniqueness checks on Bucket ID: {chosen_data_entity_bucket.id}."
             )
-            self.scorer.on_miner_evaluated(
+            await asyncio.to_thread(
+                self.scorer.on_miner_evaluated,
                 uid,
                 index,
                 [
@@ -242,13 +290,21 @@ class MinerEvaluator:
         scraper = self.scraper_provider.get(
             MinerEvaluator.PREFERRED_SCRAPERS[chosen_data_entity_bucket.id.source]
         )
-        validation_results = await scraper.validate(entities_to_validate)
-
-        bt.logging.success(
-            f"{hotkey}: Data validation on selected entities finished with results: {validation_results}"
-        )
+        try:
+            validation_results = await asyncio.wait_for(
+                scraper.validate(entities_to_validate),
+                timeout=MinerEvaluator.SCRAPER_VALIDATION_TIMEOUT_SECS,
+            )
+            bt.logging.success(
+                f"{hotkey}: Data validation on selected entities finished with results: {validation_results}"
+            )
 
-        self.scorer.on_miner_evaluated(uid, index, validation_results)
+            await asyncio.to_thread(self.scorer.on_miner_evaluated, uid, index, validation_results)
+        except asyncio.TimeoutError:
+            # The miner isn't at fault, so leave its score as is until the next evaluation.
+            bt.logging.warning(
+                f"{hotkey}: Timed out validating uris: {entity_uris}. Not updating the miner's score."
+            )
 
         if hf_validation_result:
             if hf_validation_result.is_valid == True:
@@ -256,7 +312,9 @@ class MinerEvaluator:
             else:
                 bt.logging.info(f"{hotkey}: Miner {uid} did not pass HF validation, no bonus awarded. Reason: {hf_validation_result.reason}")
 
-            self.scorer.update_hf_boost_and_cred(uid, hf_validation_result.validation_percentage)
+            await asyncio.to_thread(
+                self.scorer.update_hf_boost_and_cred, uid, hf_validation_result.validation_percentage
+            )
 
     async def _perform_hf_validation(
             self, hotkey: str, uid: int, axon_info: bt.AxonInfo, current_block: int
@@ -278,7 +336,9 @@ class MinerEvaluator:
                 bt.logging.info(f"{hotkey}: Trying to validate {hf_metadata.repo_name}")
 
                 # Get parquet files and commit date from the latest commit.
-                new_parquet_files, commit_date = get_latest_commit_files(hf_metadata.repo_name)
+                new_parquet_files, commit_date = await asyncio.to_thread(
+                    get_latest_commit_files, hf_metadata.repo_name
+                )
                 if not new_parquet_files:
                     bt.logging.warning(f"No new parquet files found for {hf_metadata.repo_name}")
                     continue
@@ -316,11 +376,13 @@ class MinerEvaluator:
                         reason="Latest commit is too old (>19 hours)",
                         validation_percentage=0.0,
                     )
-                    self.hf_storage.update_validation_info(hotkey, str(hf_metadata.repo_name), current_block)
+                    await asyncio.to_thread(self.hf_storage.update_validation_info, hotkey, str(hf_metadata.repo_name), current_block)
                     continue
 
                 # Get encoded URLs and a DataFrame from the parquet files.
-                encoded_urls, encoded_df = get_validation_data(hf_metadata.repo_name, new_parquet_files)
+                encoded_urls, encoded_df = await asyncio.to_thread(
+                    get_validation_data, hf_metadata.repo_name, new_parquet_files
+                )
                 if encoded_urls:
                     # Retrieve decoded URLs from the miner.
                     success, decoded_urls = await self._get_decoded_urls(hotkey, uid, axon_info, encoded_urls)
@@ -358,16 +420,16 @@ class MinerEvaluator:
                                 validation_percentage=0.0,
                             )
                 # Update the HF validation storage with the current block for this repo.
-                self.hf_storage.update_validation_info(hotkey, str(hf_metadata.repo_name), current_block)
+                await asyncio.to_thread(self.hf_storage.update_validation_info, hotkey, str(hf_metadata.repo_name), current_block)
         else:
-            self.hf_storage.update_validation_info(hotkey, "no_dataset_provided", current_block)
+            await asyncio.to_thread(self.hf_storage.update_validation_info, hotkey, "no_dataset_provided", current_block)
         return hf_validation_result
 
     async def run_next_eval_batch(self) -> int:
-        """Asynchronously runs the next batch of miner evaluations and returns the number of seconds to wait until the next batch.
+        """Evaluates the miners that are due an evaluation and returns the number of seconds to wait until the next batch.
 
-        Args:
-            block (int): The block at which we started this evaluation.
+        Up to max_concurrent_evaluations miners are evaluated at once. A new evaluation starts as soon as a previous one
+        finishes, until the next miner isn't due, every miner has been started, or the batch has run for MAX_BATCH_DURATION.
         """
 
         # Grab a snapshot of the metagraph
@@ -375,50 +437,76 @@ class MinerEvaluator:
         with self.lock:
             metagraph = copy.deepcopy(self.metagraph)
 
-        # Check if the next miner is due an update.
-        next_uid = self.miner_iterator.peek()
-        hotkey = metagraph.hotkeys[next_uid]
-        last_evaluated = self.storage.read_miner_last_updated(hotkey)
-        now = dt.datetime.utcnow()
-        due_update = (
-            last_evaluated is None
-            or (now - last_evaluated) >= constants.MIN_EVALUATION_PERIOD
-        )
-
-        # If the next miner is not due an update, then all subsequent miners are also not due an update.
-        # So we wait until this miner is due an update.
-        if not due_update:
-            return (
-                last_evaluated + constants.MIN_EVALUATION_PERIOD - now
-            ).total_seconds()
-
-        # Run in batches of 15.
-        miners_to_eval = 15
-
-        # Otherwise, execute the next batch of evaluations.
-        # Use a set in case the network has fewer than 15 miners.
-        uids_to_eval = {next(self.miner_iterator) for _ in range(miners_to_eval)}
+        semaphore = asyncio.BoundedSemaphore(self.max_concurrent_evaluations)
+        start = dt.datetime.utcnow()
+        started_uids = set()
+        tasks = {}
+        wait_secs = 0
+        while True:
+            # Wait for a free slot before checking the next miner, so that it's checked as late as possible.
+            await semaphore.acquire()
+            if dt.datetime.utcnow() - start >= MinerEvaluator.MAX_BATCH_DURATION:
+                semaphore.release()
+                break
+
+            next_uid = self.miner_iterator.peek()
+            if next_uid in started_uids:
+                semaphore.release()
+                break
+
+            # If the next miner is not due an update, then all subsequent miners are also not due an update.
+            # So we wait until this miner is due an update.
+            wait_secs = await asyncio.to_thread(self._get_secs_until_due, metagraph.hotkeys[next_uid])
+            if wait_secs > 0:
+                semaphore.release()
+                break
+
+            next(self.miner_iterator)
+            started_uids.add(next_uid)
+            tasks[asyncio.create_task(self._eval_miner_and_release(next_uid, semaphore))] = next_uid
+
+        bt.logging.trace(f"Waiting for {len(tasks)} miner evals to finish.")
+        if tasks:
+            _, pending = await asyncio.wait(
+                tasks, timeout=MinerEvaluator.MAX_BATCH_FINISH_DURATION.total_seconds()
+            )
+            if pending:
+                bt.logging.warning(
+                    f"Cancelling the evaluations of miners {sorted(tasks[task] for task in pending)} that did not "
+                    + f"finish within {MinerEvaluator.MAX_BATCH_FINISH_DURATION}."
+                )
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
 
+        duration_secs = (dt.datetime.utcnow() - start).total_seconds()
         bt.logging.info(
-            f"Running validation on the following batch of uids: {uids_to_eval}."
+            f"Evaluated {len(tasks)} miners in {duration_secs:.1f} seconds, with up to {self.max_concurrent_evaluations} at once."
+        )
+        return wait_secs
+
+    def _get_secs_until_due(self, hotkey: str) -> float:
+        """Returns the number of seconds until the miner is due an evaluation, or 0 if it's already due."""
+        last_evaluated = self.storage.read_miner_last_updated(hotkey)
+        if last_evaluated is None:
+            return 0
+        return max(
+            0,
+            (
+                last_evaluated + constants.MIN_EVALUATION_PERIOD - dt.datetime.utcnow()
+            ).total_seconds(),
         )
-        threads = [
-            threading.Thread(target=self.eval_miner_sync, args=(uid,))
-            for uid in uids_to_eval
-        ]
-        for thread in threads:
-            thread.start()
-
-        bt.logging.trace(f"Waiting for {len(threads)} miner evals to finish.")
-        end = datetime.datetime.now() + datetime.timedelta(seconds=300)
-        for t in threads:
-            # Compute the timeout, so that all threads are waited for a total of 5 minutes.
-            timeout = max(0, (end - datetime.datetime.now()).total_seconds())
-            t.join(timeout=timeout)
-        bt.logging.trace(f"Finished waiting for {len(threads)} miner eval.")
-
-        # Run the next evaluation batch immediately.
-        return 0
+
+    async def _eval_miner_and_release(
+        self, uid: int, semaphore: asyncio.BoundedSemaphore
+    ) -> None:
+        """Evaluates the miner and then releases its slot in the batch."""
+        try:
+            await self.eval_miner(uid)
+        except Exception:
+            bt.logging.error(f"Failed to evaluate miner {uid}.", traceback.format_exc())
+        finally:
+            semaphore.release()
 
     def save_state(self):
         """Saves the state of the validator to a file."""
@@ -432,11 +520,64 @@ class MinerEvaluator:
             os.path.join(self.config.neuron.full_path, MinerEvaluator.SCORER_FILENAME)
         )
 
+        if (
+            dt.datetime.utcnow() - self.last_snapshot_time
+            >= MinerEvaluator.MINER_INDEX_SNAPSHOT_INTERVAL
+        ):
+            self._save_miner_index_snapshot()
+
+    def _save_miner_index_snapshot(self):
+        """Saves a snapshot of the stored miner indexes to a file."""
+        start = time.perf_counter()
+        snapshot = self.storage.export_snapshot()
+        snapshot.save(
+            os.path.join(
+                self.config.neuron.full_path, MinerEvaluator.MINER_INDEX_SNAPSHOT_FILENAME
+            )
+        )
+        self.last_snapshot_time = dt.datetime.utcnow()
+        bt.logging.info(
+            f"Saved a snapshot of {len(snapshot.hotkeys)} miner indexes with {snapshot.bucket_count} buckets in {time.perf_counter() - start:.1f} seconds."
+        )
+
+    def _load_miner_index_snapshot(self):
+        """Stores the miner indexes from the last snapshot, if there is one.
+
+        Requires: self.lock is held.
+        """
+        filepath = os.path.join(
+            self.config.neuron.full_path, MinerEvaluator.MINER_INDEX_SNAPSHOT_FILENAME
+        )
+        if not os.path.exists(filepath):
+            bt.logging.info("No miner index snapshot found. Miner indexes will be fetched as miners are evaluated.")
+            return
+
+        try:
+            start = time.perf_counter()
+            snapshot = MinerIndexSnapshot.load(filepath)
+            self.storage.import_snapshot(snapshot)
+
+            # Drop any miners that were deregistered while the validator was stopped.
+            hotkeys = set(self.metagraph.hotkeys)
+            for hotkey in snapshot.hotkeys:
+                if hotkey not in hotkeys:
+                    self.storage.delete_miner(hotkey)
+
+            bt.logging.success(
+                f"Loaded a snapshot of {len(snapshot.hotkeys)} miner indexes with {snapshot.bucket_count} buckets in {time.perf_counter() - start:.1f} seconds."
+            )
+        except Exception as e:
+            bt.logging.warning(
+                f"Failed to load miner index snapshot. Reason: {e}. Miner indexes will be fetched as miners are evaluated."
+            )
+
     def load_state(self):
         """Loads the state of the validator from a file."""
         bt.logging.info("Loading evaluator state.")
 
         with self.lock:
+            self._load_miner_index_snapshot()
+
             # Load the state of the validator from file.
             filepath = os.path.join(
                 self.config.neuron.full_path, MinerEvaluator.SCORER_FILENAME
@@ -458,14 +599,14 @@ class MinerEvaluator:
 
     async def _update_and_get_miner_index(
         self, hotkey: str, uid: int, miner_axon: bt.AxonInfo
-    ) -> Optional[ScorableMinerIndex]:
+    ) -> Optional[ColumnarScorableMinerIndex]:
         """Updates the index for the specified miner, and returns the latest known index or None if the miner hasn't yet provided an index."""
 
         bt.logging.info(f"{hotkey}: Getting MinerIndex from miner.")
 
         try:
             responses: List[GetMinerIndex] = None
-            async with bt.dendrite(wallet=self.wallet) as dendrite:
+            async with self.dendrite_pool.acquire() as dendrite:
                 responses = await dendrite.forward(
                     axons=[miner_axon],
                     synapse=GetMinerIndex(version=constants.PROTOCOL_VERSION),
@@ -480,18 +621,20 @@ class MinerEvaluator:
                     f"{hotkey}: Miner failed to respond with an index. Using last known index if present."
                 )
                 # Miner failed to update the index. Use the latest index, if present.
-                return self.storage.read_miner_index(hotkey)
+                return await asyncio.to_thread(self.storage.read_miner_index, hotkey)
 
             # Validate the index.
             miner_index = None
             try:
-                miner_index = vali_utils.get_miner_index_from_response(response)
+                miner_index = await asyncio.to_thread(
+                    vali_utils.get_miner_index_from_response, response
+                )
             except ValueError as e:
                 bt.logging.info(
                     f"{hotkey}: Miner returned an invalid index. Reason: {e}. Using last known index if present."
                 )
                 # Miner returned an invalid index. Use the latest index, if present.
-                return self.storage.read_miner_index(hotkey)
+                return await asyncio.to_thread(self.storage.read_miner_index, hotkey)
 
             assert miner_index is not None, "Miner index should not be None."
 
@@ -501,11 +644,18 @@ class MinerEvaluator:
                 f"{hotkey}: Got new compressed miner index of {CompressedMinerIndex.size_bytes(miner_index)} bytes "
                 + f"across {CompressedMinerIndex.bucket_count(miner_index)} buckets."
             )
-            self.storage.upsert_compressed_miner_index(
-                miner_index, hotkey, miner_credibility
+            diff = await asyncio.to_thread(
+                self.storage.upsert_compressed_miner_index,
+                miner_index,
+                hotkey,
+                miner_credibility,
+            )
+            bt.logging.info(
+                f"{hotkey}: Stored index changes: {diff.inserted} buckets inserted, {diff.removed} removed, "
+                + f"{diff.resized} resized and {diff.unchanged} unchanged."
             )
 
-            return self.storage.read_miner_index(hotkey)
+            return await asyncio.to_thread(self.storage.read_miner_index, hotkey)
         except Exception:
             bt.logging.error(
                 f"{hotkey} Failed to update and get miner index.",
@@ -520,7 +670,7 @@ class MinerEvaluator:
 
         try:
             synapse = GetHuggingFaceMetadata(version=constants.PROTOCOL_VERSION)
-            async with bt.dendrite(wallet=self.wallet) as dendrite:
+            async with self.dendrite_pool.acquire() as dendrite:
                 responses = await dendrite.forward(
                     axons=[miner_axon],
                     synapse=synapse,
@@ -549,7 +699,7 @@ class MinerEvaluator:
             Tuple[bool, List[str]]: (success, decoded_urls)
         """
         try:
-            async with bt.dendrite(wallet=self.wallet) as dendrite:
+            async with self.dendrite_pool.acquire() as dendrite:
                 responses = await dendrite.forward(
                     axons=[axon_info],
                     synapse=DecodeURLRequest(
@@ -611,6 +761,10 @@ class MinerEvaluator:
 
 
 
+    async def close(self):
+        """Releases the evaluator's network resources. Must be called on the loop that ran the evaluations."""
+        await self.dendrite_pool.close()
+
     def exit(self):
         self.should_exit = True
 
@@ -1,40 +1,47 @@
 import bittensor as bt
 import hashlib
-import random
 from typing import List, Optional, Tuple, Type, Union
 import datetime as dt
-from common import constants
+from common import constants, utils
 from common.data import (
     CompressedMinerIndex,
     DataEntity,
     DataEntityBucket,
     TimeBucket,
 )
-from common.data_v2 import ScorableMinerIndex
+from common.data_v2 import ColumnarScorableMinerIndex, ScorableMinerIndex
 from common.date_range import DateRange
 from common.protocol import GetMinerIndex
 from scraping.x import utils as x_utils
 
 
-def choose_data_entity_bucket_to_query(index: ScorableMinerIndex) -> DataEntityBucket:
+def choose_data_entity_bucket_to_query(
+    index: Union[ScorableMinerIndex, ColumnarScorableMinerIndex]
+) -> DataEntityBucket:
     """Chooses a random DataEntityBucket to query from a MinerIndex.
 
     The random selection is done based on choosing a random scorable byte in the total index to query, and then
     selecting that DataEntityBucket.
     """
-    total_size = sum(
-        scorable_bucket.scorable_bytes
-        for scorable_bucket in index.scorable_data_entity_buckets
-    )
-    chosen_byte = random.uniform(0, total_size)
-    iterated_bytes = 0
-    for scorable_bucket in index.scorable_data_entity_buckets:
-        if iterated_bytes + scorable_bucket.scorable_bytes >= chosen_byte:
-            return scorable_bucket.to_data_entity_bucket()
-        iterated_bytes += scorable_bucket.scorable_bytes
+    buckets = choose_data_entity_buckets_to_query(index, 1)
     assert (
-        False
+        buckets
     ), "Failed to choose a DataEntityBucket to query... which should never happen"
+    return buckets[0]
+
+
+def choose_data_entity_buckets_to_query(
+    index: Union[ScorableMinerIndex, ColumnarScorableMinerIndex], count: int
+) -> List[DataEntityBucket]:
+    """Chooses up to count distinct DataEntityBuckets to query from a MinerIndex, weighted by their scorable bytes.
+
+    Only the chosen buckets are materialized.
+    """
+    index = ColumnarScorableMinerIndex.from_index(index)
+    sampler = utils.WeightedSampler(index.scorable_bytes)
+    return [
+        index.get_bucket(i).to_data_entity_bucket() for i in sampler.sample(count)
+    ]
 
 
 def choose_entities_to_verify(entities: List[DataEntity]) -> List[DataEntity]:
@@ -42,28 +49,10 @@ def choose_entities_to_verify(entities: List[DataEntity]) -> List[DataEntity]:
 
     # For now, we just sample 2 entities, based on size. Ensure we choose different entities.
     # In future, consider sampling every N bytes.
-    chosen_entities = []
-    total_size = sum(entity.content_size_bytes for entity in entities)
-
-    # Ensure we don't try to choose more entities than exist to choose from.
-    num_entities_to_choose = min(2, len(entities))
-    for _ in range(num_entities_to_choose):
-        chosen_byte = random.uniform(0, total_size)
-        iterated_bytes = 0
-        for entity in entities:
-            if entity in chosen_entities:
-                # Ensure we skip over already chosen entities if we see them again.
-                continue
-
-            if iterated_bytes + entity.content_size_bytes >= chosen_byte:
-                chosen_entities.append(entity)
-                # Adjust total_size to account for the entity we already selected.
-                total_size -= entity.content_size_bytes
-                break
-
-            iterated_bytes += entity.content_size_bytes
-
-    return chosen_entities
+    sampler = utils.WeightedSampler(
+        [entity.content_size_bytes for entity in entities]
+    )
+    return [entities[i] for i in sampler.sample(2)]
 
 
 def are_entities_valid(